@@ -38,6 +38,44 @@ async def list_pending_payments(
     result = await session.exec(statement)
     return result.all()
 
+@router.get("/payment-sessions/metrics", response_model=Dict[str, Any])
+async def get_payment_session_metrics(
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Open / matched / expired counters of PRO payment sessions.
+    """
+    from app.services.payment_session_service import payment_session_engine
+    return await payment_session_engine.get_metrics()
+
+@router.get("/telegram-client/metrics", response_model=Dict[str, Any])
+async def get_telegram_client_metrics(
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Per-method Bot API counters of this worker (calls, cache hits, coalesced waits, errors, latency)
+    plus the webhook intake queue counters.
+    """
+    from app.services.bot_update_queue import bot_update_queue
+    from app.services.telegram_client import telegram_client
+    return {"bot_api": telegram_client.stats(), "update_queue": bot_update_queue.stats()}
+
+@router.get("/prices/{symbol}/history", response_model=Dict[str, Any])
+async def get_price_history(
+    symbol: str,
+    hours: int = 24,
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Current quote (with staleness) and rolling price history from the price oracle.
+    """
+    from app.services.price_oracle_service import price_oracle
+    quote = price_oracle.get_quote(symbol.upper())
+    return {
+        "quote": quote.to_dict() if quote else None,
+        "history": await price_oracle.get_history(symbol.upper(), hours=min(hours, 168))
+    }
+
 @router.post("/approve-payment/{transaction_id}")
 async def approve_payment(
     transaction_id: int,
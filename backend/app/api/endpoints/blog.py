@@ -1,4 +1,5 @@
 import secrets
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import select
@@ -6,7 +7,8 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.security import get_current_user, get_tg_user
 from app.models.blog import BlogPostEngagement, PartnerBlogLike
-from app.models.partner import Partner, get_session
+from app.models.partner import get_session
+from app.services.partner_identity_service import PartnerIdentity, get_partner_identity
 
 router = APIRouter()
 
@@ -24,16 +26,10 @@ async def get_blog_stats(
 @router.get("/{slug}/engagement")
 async def get_post_engagement(
     slug: str,
-    user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """Get engagement stats for a specific post and check if current user liked it."""
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    # Get partner
-    p_stmt = select(Partner).where(Partner.telegram_id == tg_id)
-    partner = (await session.exec(p_stmt)).first()
 
     # Get or create engagement
     e_stmt = select(BlogPostEngagement).where(BlogPostEngagement.post_slug == slug)
@@ -53,9 +49,9 @@ async def get_post_engagement(
         fb_likes = engagement.base_likes + engagement.user_likes
 
     liked = False
-    if partner:
+    if identity:
         l_stmt = select(PartnerBlogLike).where(
-            PartnerBlogLike.partner_id == partner.id,
+            PartnerBlogLike.partner_id == identity.partner_id,
             PartnerBlogLike.post_slug == slug
         )
         liked = (await session.exec(l_stmt)).first() is not None
@@ -69,16 +65,15 @@ async def get_post_engagement(
 async def like_post(
     slug: str,
     user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """Add a like to a post."""
     tg_user = get_tg_user(user_data)
     tg_id = str(tg_user.get("id"))
 
-    p_stmt = select(Partner).where(Partner.telegram_id == tg_id)
-    partner = (await session.exec(p_stmt)).first()
-
-    if not partner:
+    partner_id = identity.partner_id if identity else None
+    if partner_id is None:
         # Lazy creation for Blog interactions (supports Dev mode & new users)
         from app.services.partner_service import create_partner
         partner, _ = await create_partner(
@@ -90,10 +85,11 @@ async def like_post(
             language_code=tg_user.get("language_code"),
             photo_file_id=None # We don't have this in simple webapp init usually
         )
+        partner_id = partner.id
 
     # Check if already liked
     l_stmt = select(PartnerBlogLike).where(
-        PartnerBlogLike.partner_id == partner.id,
+        PartnerBlogLike.partner_id == partner_id,
         PartnerBlogLike.post_slug == slug
     )
     existing_like = (await session.exec(l_stmt)).first()
@@ -102,7 +98,7 @@ async def like_post(
         return {"status": "already_liked"}
 
     # Add like
-    new_like = PartnerBlogLike(partner_id=partner.id, post_slug=slug)
+    new_like = PartnerBlogLike(partner_id=partner_id, post_slug=slug)
     session.add(new_like)
 
     # Update engagement
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 import logging
 
 from app.middleware.rate_limit import limiter
@@ -7,8 +7,9 @@ from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.security import get_current_user, get_tg_user
-from app.models.partner import Earning, Partner, get_session
+from app.models.partner import Earning, get_session
 from app.models.schemas import EarningSchema
+from app.services.partner_identity_service import PartnerIdentity, get_partner_identity
 from app.services.redis_service import redis_service
 
 
@@ -21,6 +22,7 @@ router = APIRouter()
 async def get_my_earnings(
     request: Request,
     user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     tg_user = get_tg_user(user_data)
@@ -36,13 +38,10 @@ async def get_my_earnings(
         logger.warning(f"Earnings cache read failed: {e}")
 
     # 2. Query DB
-    result = await session.exec(select(Partner).where(Partner.telegram_id == tg_id))
-    partner = result.first()
-
-    if not partner:
+    if not identity:
         return []
 
-    statement = select(Earning).where(Earning.partner_id == partner.id).order_by(Earning.id.desc()).limit(50)
+    statement = select(Earning).where(Earning.partner_id == identity.partner_id).order_by(Earning.id.desc()).limit(50)
     result = await session.exec(statement)
     earnings = result.all()
 
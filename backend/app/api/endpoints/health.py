@@ -37,6 +37,13 @@ async def health_check(
         "redis": "unknown",
         "latency_ms": 0
     }
+
+    # Not ready while this worker's critical warmups (KB, price snapshot, ...) are running
+    from app.core.boot import boot_orchestrator
+    if not boot_orchestrator.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        health_status["status"] = "starting"
+        health_status["boot"] = boot_orchestrator.report()
     
     try:
         # Check Database
@@ -84,17 +91,21 @@ async def payment_health_check(response: Response):
     start = time.time()
     
     try:
-        from app.services.payment_service import payment_service
-        # Check TON Price API (connectivity test)
+        from app.services.price_oracle_service import price_oracle
+        # #comment: Price oracle snapshot (refreshed on a schedule). Staleness means the
+        # sources are failing and new TON payment sessions are being refused.
         async with asyncio.timeout(5.0):
-            price = await payment_service.get_ton_price()
-            if price > 0:
+            if price_oracle.get_quote("TON") is None:
+                await price_oracle.ensure_fresh()
+            quote = price_oracle.get_quote("TON")
+            if quote and not quote.is_stale:
                 health["ton_api"] = "connected"
-                health["ton_price_usd"] = price
+                health["ton_price_usd"] = quote.price
             else:
-                health["ton_api"] = "error"
+                health["ton_api"] = "stale" if quote else "error"
                 health["status"] = "degraded"
                 response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            health["ton_price"] = quote.to_dict() if quote else None
                 
     except Exception as e:
         health["ton_api"] = "disconnected"
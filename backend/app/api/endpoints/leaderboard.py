@@ -108,10 +108,15 @@ async def get_my_leaderboard_stats(
     cache_key = f"leaderboard:me:{tg_id}"
 
     async def fetch_user_stats():
-        # Get partner from DB
-        statement = select(Partner).where(Partner.telegram_id == tg_id)
-        result = await session.exec(statement)
-        partner = result.first()
+        # Resolve the partner id via the identity cache, then read only the stat columns
+        from app.services.partner_identity_service import partner_identity_resolver
+        identity = await partner_identity_resolver.resolve(session, tg_id)
+        partner = None
+        if identity:
+            statement = select(Partner.id, Partner.xp, Partner.level, Partner.referral_count).where(
+                Partner.id == identity.partner_id
+            )
+            partner = (await session.exec(statement)).first()
 
         if not partner:
             return {
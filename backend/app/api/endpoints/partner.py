@@ -3,68 +3,86 @@ import json
 import secrets
 import logging
 import sentry_sdk
-from typing import List
+from typing import List, Optional
 # Added datetime for tracking task start times
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
 from app.core.security import get_current_user, get_tg_user
+from app.core.tasks import task_ids_in
 from app.middleware.rate_limit import limiter
-from app.models.partner import Partner, XPTransaction, Earning, get_session
+from app.models.partner import (
+    Earning,
+    Partner,
+    PartnerProProfile,
+    PartnerSocialCredentials,
+    XPTransaction,
+    get_session,
+    load_pro_profile,
+)
 from app.models.schemas import (
     EarningSchema,
     GrowthMetrics,
+    NetworkMemberResponse,
+    NetworkSearchResult,
     NetworkStats,
     PartnerResponse,
     PartnerTopResponse,
     TaskClaimRequest,
     ActiveTaskResponse,
 )
+from app.services.analytics_service import MEMBERS_MAX_PAGE_SIZE, MEMBERS_PAGE_SIZE
+from app.services.partner_identity_service import (
+    PartnerIdentity,
+    get_partner_identity,
+    partner_identity_resolver,
+    require_partner_identity,
+)
+from app.services.checkin_service import checkin_engine
+from app.services.feed_service import network_feed
 from app.services.redis_service import redis_service
+from app.services.task_service import task_engine
+from app.services.telegram_client import telegram_client
 from app.utils.ranking import get_level
 from bot import bot, types
 from app.core.i18n import get_msg
 from app.services.notification_service import notification_service
-from sqlalchemy import text
+from sqlalchemy import text, update
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def prepare_partner_response(partner: Partner, tg_id: str) -> dict:
+# Relations read by prepare_partner_response (load them with .options(*PARTNER_RESPONSE_LOADS))
+PARTNER_RESPONSE_LOADS = (
+    selectinload(Partner.pro_profile),
+    selectinload(Partner.social_credentials),
+)
+
+def prepare_partner_response(partner: Partner, tg_id: str, active_tasks: Optional[List[dict]] = None) -> dict:
     """
     Unified transformer to convert Partner model + Relations into PartnerResponse schema.
-    Handles JSON parsing for completed_tasks/stages and prepares active_tasks list.
+    Completed tasks come from the task bitset; active_tasks from task_engine.active_tasks().
     """
-    completed_task_ids = []
-    active_tasks = []
-    
-    # Process task records
-    for pt in partner.completed_task_records:
-        if pt.status == "COMPLETED" or not pt.status:
-            completed_task_ids.append(pt.task_id)
-        elif pt.status == "STARTED":
-            active_tasks.append({
-                "task_id": pt.task_id,
-                "status": pt.status,
-                "initial_metric_value": pt.initial_metric_value,
-                "started_at": pt.started_at.isoformat() if pt.started_at else None
-            })
+    # Split-off rows are created lazily: fall back to their defaults
+    pro_profile = partner.pro_profile or PartnerProProfile()
+    credentials = partner.social_credentials or PartnerSocialCredentials()
 
     # Base dump
-    partner_dict = partner.model_dump(mode="json")
+    partner_dict = partner.model_dump(mode="json", exclude={"task_started_mask", "task_completed_mask"})
     
     # Materialize Task Fields
-    partner_dict["completed_tasks"] = json.dumps(completed_task_ids)
-    partner_dict["active_tasks"] = active_tasks
+    partner_dict["completed_tasks"] = json.dumps(task_ids_in(partner.task_completed_mask))
+    partner_dict["active_tasks"] = active_tasks or []
     
     # Materialize Academy Fields
     try:
-        raw_stages = json.loads(partner.completed_stages or "[]")
+        raw_stages = json.loads(pro_profile.completed_stages or "[]")
         # Schema requires List[int], so specific legacy string tags like "m1" must be filtered out
         partner_dict["completed_stages"] = [s for s in raw_stages if isinstance(s, int)]
     except Exception:
@@ -73,14 +91,15 @@ def prepare_partner_response(partner: Partner, tg_id: str) -> dict:
     # Map materialized totals
     partner_dict["total_earned"] = partner.total_earned_usdt
     partner_dict["total_network_size"] = partner.referral_count
+    partner_dict["pro_tokens"] = pro_profile.pro_tokens
     
     # Permission context
     partner_dict["is_admin"] = tg_id in settings.ADMIN_USER_IDS
     
     # Social state
-    partner_dict["has_x_setup"] = bool(partner.x_api_key)
-    partner_dict["has_telegram_setup"] = bool(partner.telegram_channel_id)
-    partner_dict["has_linkedin_setup"] = bool(partner.linkedin_access_token)
+    partner_dict["has_x_setup"] = bool(credentials.x_api_key)
+    partner_dict["has_telegram_setup"] = bool(credentials.telegram_channel_id)
+    partner_dict["has_linkedin_setup"] = bool(credentials.linkedin_access_token)
     
     return partner_dict
 
@@ -100,27 +119,29 @@ async def get_network_activity(
     except Exception as e:
         logger.warning(f"Cache read failed (activity): {e}")
 
-    # Fetch latest XP transactions with partner details
-    # Fetch latest XP transactions with partner details
+    # Latest XP transactions (narrow, by the created_at index); names come from the shared
+    # card cache instead of a join against partner
     stmt = (
-        select(XPTransaction, Partner.first_name, Partner.username, Partner.photo_file_id)
-        .join(Partner, XPTransaction.partner_id == Partner.id)
+        select(XPTransaction.id, XPTransaction.partner_id, XPTransaction.type, XPTransaction.amount, XPTransaction.created_at)
         .order_by(XPTransaction.created_at.desc())
         .limit(limit)
     )
-    result = await session.exec(stmt)
-    rows = result.all()
+    rows = (await session.exec(stmt)).all()
+    cards = await network_feed.cards(session, (row.partner_id for row in rows))
 
     activity = []
-    for tx, first_name, username, photo_file_id in rows:
+    for row in rows:
+        card = cards.get(row.partner_id)
+        if not card:
+            continue
         activity.append({
-            "id": tx.id,
-            "type": tx.type,
-            "amount": tx.amount,
-            "first_name": first_name,
-            "username": username,
-            "photo_file_id": photo_file_id,
-            "timestamp": tx.created_at.isoformat()
+            "id": row.id,
+            "type": row.type,
+            "amount": row.amount,
+            "first_name": card["first_name"],
+            "username": card["username"],
+            "photo_file_id": card["photo_file_id"],
+            "timestamp": row.created_at.isoformat()
         })
 
     try:
@@ -130,6 +151,18 @@ async def get_network_activity(
 
     return activity
 
+@router.get("/activity/network")
+async def get_my_network_activity(
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    identity: PartnerIdentity = Depends(require_partner_identity),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Joins and commissions in the caller's own 9-level network, newest first.
+    """
+    return await network_feed.read(session, identity.partner_id, limit, offset)
+
 @router.get("/me", response_model=PartnerResponse)
 async def get_my_profile(
     background_tasks: BackgroundTasks,
@@ -158,9 +191,7 @@ async def get_my_profile(
 
     # Check if photo exists in DB first to avoid blocking Telegram API calls during every /me request
     # Use selectinload to prevent lazy loading error in async session
-    stmt = select(Partner).where(Partner.telegram_id == tg_id).options(
-        selectinload(Partner.completed_task_records)
-    )
+    stmt = select(Partner).where(Partner.telegram_id == tg_id).options(*PARTNER_RESPONSE_LOADS)
     result = await session.exec(stmt)
     partner = result.first()
 
@@ -169,9 +200,8 @@ async def get_my_profile(
         # Capture photo_file_id from Telegram Bot ONLY on registration or if missing
         photo_file_id = None
         try:
-            user_photos = await bot.get_user_profile_photos(tg_id, limit=1)
-            if user_photos.total_count > 0:
-                photo_file_id = user_photos.photos[0][0].file_id
+            photo_file_id = await telegram_client.get_profile_photo_file_id(tg_id)
+            if photo_file_id:
                 # Eagerly cache the photo to avoid delay when UI requests it
                 try:
                     from app.services.partner_service import ensure_photo_cached
@@ -192,9 +222,7 @@ async def get_my_profile(
             photo_file_id=photo_file_id
         )
         # Need to refresh with relations after creation
-        stmt_refresh = select(Partner).where(Partner.id == partner.id).options(
-            selectinload(Partner.completed_task_records)
-        )
+        stmt_refresh = select(Partner).where(Partner.id == partner.id).options(*PARTNER_RESPONSE_LOADS)
         partner = (await session.exec(stmt_refresh)).one()
 
     if is_new:
@@ -215,11 +243,12 @@ async def get_my_profile(
                 session.add(partner)
                 await session.commit()
                 await session.refresh(partner)
-                # Invalidate recent partners if this user might be in it
-                await redis_service.client.delete("partners:recent_v2")
+                # Invalidate recent partners if this user might be in it, and the feed card
+                await redis_service.client.delete("partners:recent_v2", network_feed.card_key(partner.id))
 
     # 3. Handle Lazy Migrations & Self-healing
     migration_needed = False
+    path_healed = False
     if partner.referral_code and partner.referral_code.isdigit():
         partner.referral_code = f"P2P-{secrets.token_hex(4).upper()}"
         migration_needed = True
@@ -231,6 +260,7 @@ async def get_my_profile(
             partner.path = f"{referrer.path or ''}.{referrer.id}".lstrip(".")
             partner.depth = referrer.depth + 1
             migration_needed = True
+            path_healed = True
 
     if partner.depth == 0 and partner.path:
         partner.depth = len(partner.path.split('.'))
@@ -245,87 +275,25 @@ async def get_my_profile(
         session.add(partner)
         await session.commit()
         await session.refresh(partner)
+        await partner_identity_resolver.invalidate(tg_id)
+        if path_healed:
+            # Descendants inherited the missing path; let the reconciler re-walk them
+            from app.services.maintenance_service import mark_network_dirty
+            await mark_network_dirty(partner.id)
+
+    # 4. Daily Check-in (Redis bitmaps; XP is persisted in batches by flush_checkin_rewards_task)
+    try:
+        reward = await checkin_engine.check_in(partner)
+    except Exception as e:
+        # Retried on the next profile load: the day is only marked together with its queued reward
+        logger.warning(f"Check-in skipped for partner {partner.id}: {e}")
+        reward = None
+    if reward:
+        # Reflect the queued reward in this response without marking the row dirty
+        set_committed_value(partner, "xp", (partner.xp or 0) + reward.xp)
+        set_committed_value(partner, "checkin_streak", reward.streak)
+        set_committed_value(partner, "last_checkin_at", reward.checked_in_at)
 
-    # 4. Daily Check-in Logic
-    now_dt = datetime.utcnow()
-    today_date = now_dt.date()
-    
-    if partner.last_checkin_at:
-        last_date = partner.last_checkin_at.date()
-        if last_date < today_date:
-            if last_date == today_date - timedelta(days=1):
-                partner.checkin_streak += 1
-            else:
-                partner.checkin_streak = 1
-            partner.last_checkin_at = now_dt
-            
-            # Award XP
-            checkin_xp = settings.DAILY_CHECKIN_XP
-            
-            # 7-Day Streak Bonus
-            is_streak_milestone = (partner.checkin_streak % 7 == 0)
-            bonus_xp = settings.STREAK_7DAY_XP_BONUS if is_streak_milestone else 0
-            
-            total_reward = checkin_xp + bonus_xp
-            if partner.is_pro:
-                total_reward *= settings.PRO_XP_MULTIPLIER
-                
-            await session.execute(
-                text("UPDATE partner SET xp = xp + :inc WHERE id = :p_id"),
-                {"inc": total_reward, "p_id": partner.id}
-            )
-            
-            # Log Base Reward
-            session.add(XPTransaction(
-                partner_id=partner.id,
-                amount=total_reward,
-                type="CHECKIN",
-                description=f"Daily Check-in Reward {'(7-Day Streak Bonus Included)' if is_streak_milestone else ''}"
-            ))
-            session.add(Earning(
-                partner_id=partner.id,
-                amount=total_reward,
-                description=f"Daily Reward {'+ Streak Bonus' if is_streak_milestone else ''}",
-                type="DAILY_REWARD",
-                currency="XP"
-            ))
-            
-            await session.commit()
-            await session.refresh(partner)
-            await redis_service.client.delete(cache_key)
-    else:
-        # First check-in
-        partner.checkin_streak = 1
-        partner.last_checkin_at = now_dt
-        
-        # Award Daily XP
-        checkin_xp = settings.DAILY_CHECKIN_XP
-        if partner.is_pro:
-            checkin_xp *= settings.PRO_XP_MULTIPLIER
-            
-        await session.execute(
-            text("UPDATE partner SET xp = xp + :inc WHERE id = :p_id"),
-            {"inc": checkin_xp, "p_id": partner.id}
-        )
-        
-        session.add(XPTransaction(
-            partner_id=partner.id,
-            amount=checkin_xp,
-            type="CHECKIN",
-            description="Daily Check-in Reward"
-        ))
-        session.add(Earning(
-            partner_id=partner.id,
-            amount=checkin_xp,
-            description="Daily Check-in Bonus",
-            type="DAILY_REWARD",
-            currency="XP"
-        ))
-        
-        await session.commit()
-        await session.refresh(partner)
-        await redis_service.client.delete(cache_key)
-        
     # 4.5. Pre-warm Referral Tree Stats (Background)
     # Why: User likely navigates to Partner tab next. Pre-calculating this 
     # saves 100-300ms of wait time on the first tab switch.
@@ -342,7 +310,7 @@ async def get_my_profile(
         logger.warning(f"Tree pre-warm failed: {e}")
 
     # 5. Prepare Response - O(1) using materialized totals
-    partner_response = prepare_partner_response(partner, tg_id)
+    partner_response = prepare_partner_response(partner, tg_id, await task_engine.active_tasks(session, partner))
 
     try:
         await redis_service.set_json(cache_key, partner_response, expire=300)
@@ -537,6 +505,7 @@ async def get_recent_partners(
 async def get_my_referral_tree(
     request: Request,
     user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
@@ -545,62 +514,79 @@ async def get_my_referral_tree(
     if not user_data:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    # Get partner
-    statement = select(Partner).where(Partner.telegram_id == tg_id).options(selectinload(Partner.referrals))
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
+    if not identity:
         return {str(i): 0 for i in range(1, 10)}
 
     from app.services.analytics_service import get_referral_tree_stats
 
     # 2. Use Intelligent Caching (600s TTL) - V2 Cache Key
-    cache_key = f"ref_tree_stats_v2:{partner.id}"
+    cache_key = f"ref_tree_stats_v2:{identity.partner_id}"
     return await redis_service.get_or_compute(
         cache_key,
-        lambda: get_referral_tree_stats(session, partner.id),
+        lambda: get_referral_tree_stats(session, identity.partner_id),
         expire=600
     )
 
-@router.get("/network/{level}", response_model=List[PartnerResponse])
+@router.get("/network/search", response_model=List[NetworkSearchResult])
+@limiter.limit("30/minute")
+async def search_network_members(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=64),
+    limit: int = Query(default=20, ge=1, le=50),
+    identity: PartnerIdentity = Depends(require_partner_identity),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Searches the caller's 9-level downline by username, first name or Telegram ID.
+    """
+    from app.services.analytics_service import search_downline
+    return await search_downline(session, identity.partner_id, q, limit=limit)
+
+@router.get("/network/{level}", response_model=List[NetworkMemberResponse])
 async def get_network_level_members(
     level: int,
-    user_data: dict = Depends(get_current_user),
+    response: Response,
+    cursor: Optional[str] = None,
+    sort: str = "xp",
+    limit: int = Query(default=MEMBERS_PAGE_SIZE, ge=1, le=MEMBERS_MAX_PAGE_SIZE),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
-    Fetches the list of members for a specific level in the 9-level matrix.
+    Fetches one page of members for a specific level in the 9-level matrix.
+    sort=xp|joined; pass the X-Next-Cursor response header back as ?cursor= for the next page.
     """
-    if not user_data:
-        raise HTTPException(status_code=401, detail="Authentication required")
-
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    # Get partner
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
+    partner_id = identity.partner_id
 
     if not (1 <= level <= 9):
          raise HTTPException(status_code=400, detail="Level must be between 1 and 9")
 
-    from app.services.analytics_service import get_referral_tree_members
+    from app.services.analytics_service import (
+        MEMBER_SORTS, decode_members_cursor, get_referral_tree_members, members_gen_key, members_page_key
+    )
 
-    # V2 Cache Key for robust data refresh
-    cache_key = f"ref_tree_members_v2:{partner.id}:{level}"
-    return await redis_service.get_or_compute(
-        cache_key,
-        lambda: get_referral_tree_members(session, partner.id, level),
+    if sort not in MEMBER_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(MEMBER_SORTS)}")
+    if cursor:
+        try:
+            decode_members_cursor(sort, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # #comment: Each page is cached on its own; the generation counter is bumped
+    # whenever the level changes, which retires all of its pages at once.
+    try:
+        gen = int(await redis_service.client.get(members_gen_key(partner_id, level)) or 0)
+    except Exception:
+        gen = 0
+    page = await redis_service.get_or_compute(
+        members_page_key(partner_id, level, gen, sort, cursor, limit),
+        lambda: get_referral_tree_members(session, partner_id, level, sort=sort, cursor=cursor, limit=limit),
         expire=600
     )
+    if page.get("next_cursor"):
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
 
 @router.get("/growth/metrics", response_model=GrowthMetrics)
 @limiter.limit("30/minute")
@@ -608,27 +594,21 @@ async def get_growth_metrics(
     request: Request,
     timeframe: str = "7D",
     user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     if not user_data:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
+    if not identity:
         return {"growth_pct": 0, "current_count": 0, "previous_count": 0}
 
     from app.services.analytics_service import get_network_growth_metrics
 
-    cache_key = f"growth_metrics:{partner.id}:{timeframe}"
+    cache_key = f"growth_metrics:{identity.partner_id}:{timeframe}"
     return await redis_service.get_or_compute(
         cache_key,
-        lambda: get_network_growth_metrics(session, partner.id, timeframe),
+        lambda: get_network_growth_metrics(session, identity.partner_id, timeframe),
         expire=300
     )
 
@@ -638,108 +618,46 @@ async def get_growth_chart(
     request: Request,
     timeframe: str = "7D",
     user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     if not user_data:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
+    if not identity:
         return []
 
     from app.services.analytics_service import get_network_time_series
 
-    cache_key = f"growth_chart:{partner.id}:{timeframe}"
+    cache_key = f"growth_chart:{identity.partner_id}:{timeframe}"
     return await redis_service.get_or_compute(
         cache_key,
-        lambda: get_network_time_series(session, partner.id, timeframe),
+        lambda: get_network_time_series(session, identity.partner_id, timeframe),
         expire=300
     )
 
 @router.post("/tasks/{task_id}/start", response_model=ActiveTaskResponse)
 async def start_task(
     task_id: str,
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    from app.core.tasks import get_task_config
-    config = get_task_config(task_id)
-    if not config:
-        raise HTTPException(status_code=404, detail="Task config not found")
-
-    task_type = config.get('type')
-    if task_type not in ['referral', 'action']:
-         raise HTTPException(status_code=400, detail="This task type cannot be started manually")
-
-    # Fetch partner with tasks
-    statement = select(Partner).where(Partner.telegram_id == tg_id).options(selectinload(Partner.completed_task_records))
-    result = await session.exec(statement)
-    partner = result.first()
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
-    # Check existing
-    existing_task = next((pt for pt in partner.completed_task_records if pt.task_id == task_id), None)
-    if existing_task:
-        if existing_task.status == "COMPLETED":
-             raise HTTPException(status_code=400, detail="Task already completed")
-        # Reuse existing started task
-        return ActiveTaskResponse(
-            task_id=existing_task.task_id,
-            status=existing_task.status,
-            initial_metric_value=existing_task.initial_metric_value,
-            started_at=existing_task.started_at or datetime.utcnow()
-        )
-
-    # Snapshot current metric
-    initial_metric = 0
-    if task_type == 'referral':
-        initial_metric = partner.referral_count
-    elif task_type == 'action':
-        initial_metric = partner.checkin_streak
-
-    from app.models.partner import PartnerTask
-    new_task = PartnerTask(
-        partner_id=partner.id,
-        task_id=task_id,
-        status="STARTED",
-        started_at=datetime.utcnow(),
-        initial_metric_value=initial_metric,
-        completed_at=None
-    )
-    session.add(new_task)
-    await session.commit()
-    await session.refresh(new_task)
+    active = await task_engine.start(session, identity.partner_id, task_id)
 
     # Invalidate cache
-    await redis_service.client.delete(f"partner:profile:{tg_id}")
+    await redis_service.client.delete(f"partner:profile:{identity.telegram_id}")
 
-    return ActiveTaskResponse(
-        task_id=new_task.task_id,
-        status=new_task.status,
-        initial_metric_value=new_task.initial_metric_value,
-        started_at=new_task.started_at
-    )
+    return ActiveTaskResponse(**active)
 
 
 @router.post("/tasks/{task_id}/claim", response_model=PartnerResponse)
 async def claim_task_reward(
     task_id: str,
     payload: TaskClaimRequest,
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
+    tg_id = identity.telegram_id
 
     sentry_sdk.add_breadcrumb(
         category="task",
@@ -747,143 +665,55 @@ async def claim_task_reward(
         level="info"
     )
 
-    # 1. SECURITY FIX: Use backend source of truth for reward and configuration
-    from app.core.tasks import get_task_config
-    config = get_task_config(task_id)
-    xp_reward = config.get('reward', 0)
-    
-    if xp_reward <= 0:
-         raise HTTPException(status_code=400, detail="Invalid or unsupported task")
+    # 1. Requirement check, completion bit and XP credit in one guarded statement
+    # (reward and requirement come from the backend TASK_CONFIG, never the client)
+    claim = await task_engine.claim(session, identity.partner_id, task_id)
+    effective_xp = claim.effective_xp
 
-    statement = select(Partner).where(Partner.telegram_id == tg_id).options(
-        selectinload(Partner.completed_task_records),
-        selectinload(Partner.referrals)
-    )
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
-    # 2. VALIDATION: Check requirements based on task type
-    task_type = config.get('type')
-    requirement = config.get('requirement', 0)
-    
-    # Check if task is started
-    partner_task_record = next((pt for pt in partner.completed_task_records if pt.task_id == task_id), None)
-    
-    if task_type in ['referral', 'action']:
-        if not partner_task_record or partner_task_record.status != "STARTED":
-             raise HTTPException(status_code=400, detail="Task must be started first")
-
-        initial_value = partner_task_record.initial_metric_value
-        current_value = 0
-        
-        if task_type == 'referral':
-            current_value = partner.referral_count
-        elif task_type == 'action':
-            current_value = partner.checkin_streak
-            
-        progress = current_value - initial_value
-        
-        # Special case for streak: if they had a streak before, we might want to count absolute streak?
-        # User said: "Start Mission -> since that momemnt you start track"
-        # So it implies relative. But for streak, if I have 0 streak, start mission, check in 3 days -> streak 3. progress = 3-0 = 3. Correct.
-        # If I have 5 streak, start mission (requires 3), check in 1 day -> streak 6. progress = 6-5 = 1.
-        # This implies user must maintain streak for 3 MORE days. That's hard but fair for "mission".
-        # OR, maybe for streak/absolute metrics, we just check absolute value?
-        # "if a user has new referral since the mission startded" -> this confirms relative tracking.
-        
-        if progress < requirement:
-             raise HTTPException(status_code=400, detail=f"Requirement not met. Progress: {progress}/{requirement}")
-
-    # 3. Check if task already completed in the new table
-    if partner_task_record and partner_task_record.status == "COMPLETED":
-         raise HTTPException(status_code=400, detail="Task already completed")
-
-    if not partner_task_record:
-        # 1. Add record to PartnerTask table (for social tasks that don't have /start)
-        from app.models.partner import PartnerTask
-        partner_task_record = PartnerTask(
-            partner_id=partner.id,
-            task_id=task_id,
-            status="COMPLETED",
-            reward_xp=xp_reward,
-            completed_at=datetime.utcnow()
-        )
-        session.add(partner_task_record)
-        # Ensure it's in the collection for response serialization
-        if partner.completed_task_records is None:
-            partner.completed_task_records = []
-        partner.completed_task_records.append(partner_task_record)
-    else:
-        # Update existing STARTED record
-        partner_task_record.status = "COMPLETED"
-        partner_task_record.reward_xp = xp_reward
-        partner_task_record.completed_at = datetime.utcnow()
-        session.add(partner_task_record)
-
-    # 1.1 Calculate effective XP (PRO members get 5x XP bonus)
-    effective_xp = xp_reward * 5 if partner.is_pro else xp_reward
-    
-    # 1.2 Add XP Transaction record
-    new_xp_tx = XPTransaction(
-        partner_id=partner.id,
+    # 1.1 Add XP Transaction record
+    session.add(XPTransaction(
+        partner_id=identity.partner_id,
         amount=effective_xp, # Log the actual XP received
         type="TASK",
         description=f"Completed Task: {task_id}",
         reference_id=task_id
-    )
-    session.add(new_xp_tx)
+    ))
 
     # 1.2 Unified Transaction: Log Task XP as an Earning
-    # 1.2 Unified Transaction: Log Task XP as an Earning
-    task_earning = Earning(
-        partner_id=partner.id,
+    session.add(Earning(
+        partner_id=identity.partner_id,
         amount=effective_xp,
         description=f"Task Reward: {task_id}",
         type="TASK_XP",
         currency="XP"
-    )
-    session.add(task_earning)
-
-    # 2. Update partner stats
-    xp_before = partner.xp
-    
-    # Atomic XP Increment
-    await session.execute(
-        text("UPDATE partner SET xp = xp + :inc WHERE id = :p_id"),
-        {"inc": effective_xp, "p_id": partner.id}
-    )
-    await session.flush()
-    await session.refresh(partner)
-    
-    partner.level = get_level(partner.xp)
+    ))
 
     # Audit logging
     from app.services.audit_service import audit_service
     await audit_service.log_task_completion(
         session=session,
-        partner_id=partner.id,
+        partner_id=identity.partner_id,
         task_id=task_id,
         xp_amount=effective_xp,
-        xp_before=xp_before,
-        xp_after=partner.xp
+        xp_before=claim.xp_before,
+        xp_after=claim.xp_after
     )
+    await session.commit()
 
-    # 2.1 Sync to Redis Leaderboard
+    # 2. Sync to Redis Leaderboard
     from app.services.leaderboard_service import leaderboard_service
     try:
-        await leaderboard_service.update_score(partner.id, partner.xp)
+        await leaderboard_service.update_score(identity.partner_id, claim.xp_after)
     except Exception as e:
         logger.error(f"Leaderboard Sync Failed: {e}", exc_info=True)
 
-    # 3. Invalidate profile cache
+    # 3. Invalidate profile cache (level may have changed)
     await redis_service.client.delete(f"partner:profile:{tg_id}")
+    await partner_identity_resolver.invalidate(tg_id)
 
     # 4. Send Notification
     try:
-        lang = partner.language_code or "en"
+        lang = claim.language_code or "en"
         # #comment: Ensure the notification reflects the ACTUAL XP awarded (including PRO multipliers) 
         # to satisfy elite users and provide immediate positive reinforcement.
         msg = get_msg(lang, "task_completed", reward=int(effective_xp))
@@ -892,18 +722,10 @@ async def claim_task_reward(
         sentry_sdk.capture_exception(e)
         logger.error(f"Failed to send task notification: {e}")
 
-    # Final commit and refresh with relationships for response
-    # Final commit for all changes
-    session.add(partner)
-    await session.commit()
-    
-    # Re-query with relations for preparation
-    stmt = select(Partner).where(Partner.id == partner.id).options(
-        selectinload(Partner.completed_task_records)
-    )
+    stmt = select(Partner).where(Partner.id == identity.partner_id).options(*PARTNER_RESPONSE_LOADS)
     partner = (await session.exec(stmt)).one()
 
-    return prepare_partner_response(partner, tg_id)
+    return prepare_partner_response(partner, tg_id, await task_engine.active_tasks(session, partner))
 
 @router.post("/academy/stages/{stage_id}/complete")
 async def complete_academy_stage(
@@ -923,15 +745,16 @@ async def complete_academy_stage(
         level="info"
     )
 
-    stmt = select(Partner).where(Partner.telegram_id == tg_id)
+    stmt = select(Partner).where(Partner.telegram_id == tg_id).options(*PARTNER_RESPONSE_LOADS)
     result = await session.exec(stmt)
     partner = result.first()
 
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
 
+    pro_profile = await load_pro_profile(session, partner)
     try:
-        completed = json.loads(partner.completed_stages or "[]")
+        completed = json.loads(pro_profile.completed_stages or "[]")
     except Exception as e:
         # #comment: Corrupt JSON in completed_stages, defaulting to empty list.
         logger.error(f"JSON parse error for partner {partner.id} completed_stages: {e}")
@@ -940,7 +763,7 @@ async def complete_academy_stage(
     effective_xp = 0
     if stage_id not in completed:
         completed.append(stage_id)
-        partner.completed_stages = json.dumps(completed)
+        pro_profile.completed_stages = json.dumps(completed)
         
         # Award XP based on stage ID
         xp_reward = 0
@@ -1004,32 +827,25 @@ async def complete_academy_stage(
         # Invalidate cache
         cache_key = f"partner:profile:{tg_id}"
         await redis_service.client.delete(cache_key)
+        await partner_identity_resolver.invalidate(tg_id)
 
-    return prepare_partner_response(partner, tg_id)
+    return prepare_partner_response(partner, tg_id, await task_engine.active_tasks(session, partner))
 
 @router.get("/earnings", response_model=List[EarningSchema])
 async def get_my_earnings(
     limit: int = 10,
-    user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Fetches the recent earnings history for the current user.
     """
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    # Get partner ID first
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
+    if not identity:
         return []
 
     from app.models.partner import Earning
     # Query Earnings table
-    stmt = select(Earning).where(Earning.partner_id == partner.id).order_by(Earning.created_at.desc()).limit(limit)
+    stmt = select(Earning).where(Earning.partner_id == identity.partner_id).order_by(Earning.created_at.desc()).limit(limit)
     result = await session.exec(stmt)
     earnings = result.all()
 
@@ -1038,56 +854,40 @@ async def get_my_earnings(
 @router.get("/xp/history")
 async def get_my_xp_history(
     limit: int = 50,
-    user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Fetches the recent XP transaction history for the current user.
     """
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    # Get partner ID first
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
+    if not identity:
         return []
 
     # Query XPTransaction table
-    stmt = select(XPTransaction).where(XPTransaction.partner_id == partner.id).order_by(XPTransaction.created_at.desc()).limit(limit)
+    stmt = select(XPTransaction).where(XPTransaction.partner_id == identity.partner_id).order_by(XPTransaction.created_at.desc()).limit(limit)
     result = await session.exec(stmt)
     xp_history = result.all()
 
     return xp_history
 @router.post("/prepared-share")
 async def get_prepared_share_id(
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Pre-generates an inline message ID for 2-tap sharing.
     This uses the Telegram Prepared Inline Messages API.
     """
-    tg_user = get_tg_user(user_data)
-    tg_id = int(tg_user.get("id"))
+    tg_id = int(identity.telegram_id)
 
-    # Need to fetch the partner to get the referral code
-    statement = select(Partner).where(Partner.telegram_id == str(tg_id))
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
-    ref_code = partner.referral_code
+    # The referral code is the only non-identity column needed
+    statement = select(Partner.referral_code).where(Partner.id == identity.partner_id)
+    ref_code = (await session.exec(statement)).first()
 
     # Cache bot username if needed or replace with hardcoded
     # We can use the same logic as in bot.py
     try:
-        bot_info = await bot.get_me()
-        bot_username = bot_info.username.replace("@", "")
+        bot_username = (await telegram_client.bot_username()).replace("@", "")
     except Exception as e:
         # #comment: Network error or bot blocked, fall back to default username.
         logger.warning(f"Failed to fetch bot_me: {e}")
@@ -1104,7 +904,7 @@ async def get_prepared_share_id(
     photo_url = f"{base_api_url}/images/2026-02-05_03.35.03.webp"
 
     # Fetch language preference
-    lang = partner.language_code or "en"
+    lang = identity.language_code or "en"
     from app.core.i18n import get_msg
     caption = get_msg(lang, "viral_share_caption")
 
@@ -1182,28 +982,15 @@ async def get_partner_photo(request: Request, file_id: str):
 
 @router.post("/notification/seen")
 async def mark_notification_seen(
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
-    if not user_data:
-        raise HTTPException(status_code=401, detail="Authentication required")
-
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
-    partner.pro_notification_seen = True
-    session.add(partner)
+    await session.execute(
+        update(Partner).where(Partner.id == identity.partner_id).values(pro_notification_seen=True)
+    )
     await session.commit()
-    await session.refresh(partner)
 
     # Invalidate cache
-    await redis_service.client.delete(f"partner:profile:{tg_id}")
+    await redis_service.client.delete(f"partner:profile:{identity.telegram_id}")
 
     return {"status": "ok"}
@@ -1,18 +1,17 @@
-import json
 import logging
 import asyncio
 
 logger = logging.getLogger(__name__)
 
 from fastapi import APIRouter, Body, Depends, HTTPException
-from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
-from app.core.security import get_current_user
 from app.models.partner import Partner, get_session
 from app.services.notification_service import notification_service
+from app.services.partner_identity_service import PartnerIdentity, require_partner_identity
 from app.services.payment_service import payment_service
+from app.services.price_oracle_service import StalePriceError
 from app.services.audit_service import audit_service
 from app.models.transaction import PartnerTransaction
 
@@ -33,31 +32,15 @@ async def create_invoice(
     amount: float = Body(..., embed=True),
     currency: str = Body(..., embed=True),
     network: str = Body(..., embed=True),
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Creates a pending transaction in the database.
     Used before the user starts the payment flow.
     """
-    try:
-        if "user" in user_data:
-            tg_id = str(json.loads(user_data["user"]).get("id"))
-        else:
-            tg_id = str(user_data.get("id"))
-    except Exception as e:
-        logger.warning(f"Invalid user data in create_invoice: {e}")
-        raise HTTPException(status_code=400, detail="Invalid user data")
-
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
     transaction = await payment_service.create_transaction(
-        session, partner.id, amount, currency, network
+        session, identity.partner_id, amount, currency, network
     )
     await session.commit()
 
@@ -68,31 +51,21 @@ async def create_payment_session(
     amount: float = Body(39.0, embed=True),
     currency: str = Body("TON", embed=True),
     network: str = Body("TON", embed=True),
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Creates a payment session (TON or Crypto).
     """
-    try:
-        if "user" in user_data:
-            tg_id = str(json.loads(user_data["user"]).get("id"))
-        else:
-            tg_id = str(user_data.get("id"))
-    except Exception as e:
-        logger.warning(f"Invalid user data in create_payment_session: {e}")
-        raise HTTPException(status_code=400, detail="Invalid user data")
-
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
+    tg_id = identity.telegram_id
 
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
-    payment_data = await payment_service.create_payment_session(
-        session, partner.id, amount, currency, network
-    )
+    try:
+        payment_data = await payment_service.create_payment_session(
+            session, identity.partner_id, amount, currency, network
+        )
+    except StalePriceError as e:
+        logger.warning(f"Payment session refused: {e}")
+        raise HTTPException(status_code=503, detail="TON price is temporarily unavailable, please retry shortly")
     
     # #comment: Log session creation so we can track conversion rates and abandoned carts.
     await audit_service.log_event(
@@ -117,28 +90,15 @@ async def create_payment_session(
 @router.post("/verify-ton")
 async def verify_ton(
     tx_hash: str = Body(..., embed=True),
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Verifies a TON transaction hash and upgrades user to PRO if valid.
     """
-    try:
-        if "user" in user_data:
-            tg_id = str(json.loads(user_data["user"]).get("id"))
-        else:
-            tg_id = str(user_data.get("id"))
-    except Exception as e:
-        logger.warning(f"Invalid user data in verify_ton: {e}")
-        raise HTTPException(status_code=400, detail="Invalid user data")
-
-    statement = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(statement)
-    partner = result.first()
-
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
+    tg_id = identity.telegram_id
 
+    partner = await session.get(Partner, identity.partner_id)
     success = await payment_service.verify_ton_transaction(session, partner, tx_hash)
 
     # #comment: Log the verification result for audit purposes.
@@ -168,27 +128,17 @@ async def submit_manual_payment(
     network: str = Body(..., embed=True),
     amount: float = Body(..., embed=True),
     tx_hash: str | None = Body(None, embed=True),
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Submits a manual payment claim for non-TON crypto.
     Requires admin review.
     """
-    try:
-        if "user" in user_data:
-            tg_id = str(json.loads(user_data["user"]).get("id"))
-        else:
-            tg_id = str(user_data.get("id"))
-    except Exception as e:
-        logger.warning(f"Invalid user data in submit_manual_payment: {e}")
-        raise HTTPException(status_code=400, detail="Invalid user data")
+    tg_id = identity.telegram_id
 
     try:
-        statement = select(Partner).where(Partner.telegram_id == tg_id)
-        result = await session.exec(statement)
-        partner = result.first()
-
+        partner = await session.get(Partner, identity.partner_id)
         if not partner:
             raise HTTPException(status_code=404, detail="Partner not found")
 
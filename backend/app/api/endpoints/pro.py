@@ -1,35 +1,44 @@
 import logging
+from typing import Union
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlmodel import select
 
 from pydantic import BaseModel
-from app.models.partner import Partner, get_session
-from app.core.security import get_current_user, get_tg_user
+from sqlalchemy.orm import selectinload
+
+from app.models.partner import Partner, get_session, load_pro_profile, load_social_credentials
+from app.services.partner_identity_service import PartnerIdentity, require_partner_identity
 from app.models.schemas import (
     PROSetupRequest, ViralGenerateRequest, ViralGenerateResponse, 
-    SocialPostRequest, PartnerResponse
+    SocialPostRequest, PartnerResponse, ViralJobResponse
+)
+from app.services.redis_service import redis_service
+from app.services.viral_service import (
+    viral_studio, generate_viral_content_task, viral_job_owner_key,
+    VIRAL_GENERATION_COST, VIRAL_JOB_OWNER_TTL
 )
-from app.services.viral_service import viral_studio
-from bot import bot
+from app.services.telegram_client import telegram_client
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 async def get_current_partner(
-    user_data: dict = Depends(get_current_user),
+    identity: PartnerIdentity = Depends(require_partner_identity),
     session: AsyncSession = Depends(get_session)
 ) -> Partner:
-    tg_user = get_tg_user(user_data)
-    tg_id = str(tg_user.get("id"))
-    
-    stmt = select(Partner).where(Partner.telegram_id == tg_id)
-    result = await session.exec(stmt)
-    partner = result.first()
-    
+    # Primary-key lookup: the telegram_id -> id hop is served by the identity cache
+    partner = await session.get(
+        Partner,
+        identity.partner_id,
+        options=[selectinload(Partner.pro_profile), selectinload(Partner.social_credentials)]
+    )
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
+    # PRO endpoints work on the split-off rows; create them on first use
+    await load_pro_profile(session, partner)
+    await load_social_credentials(session, partner)
     return partner
 
 @router.get("/status")
@@ -42,22 +51,22 @@ async def get_pro_status(
     
     return {
         "is_pro": partner.is_pro,
-        "pro_tokens": partner.pro_tokens,
-        "academy_score": partner.academy_score,
-        "completed_stages": partner.completed_stages,
-        "has_x_setup": bool(partner.x_api_key),
-        "has_telegram_setup": bool(partner.telegram_channel_id),
-        "has_linkedin_setup": bool(partner.linkedin_access_token),
+        "pro_tokens": partner.pro_profile.pro_tokens,
+        "academy_score": partner.pro_profile.academy_score,
+        "completed_stages": partner.pro_profile.completed_stages,
+        "has_x_setup": bool(partner.social_credentials.x_api_key),
+        "has_telegram_setup": bool(partner.social_credentials.telegram_channel_id),
+        "has_linkedin_setup": bool(partner.social_credentials.linkedin_access_token),
         "setup": {
-            "x_api_key": partner.x_api_key or "",
-            "x_api_secret": partner.x_api_secret or "",
-            "x_access_token": partner.x_access_token or "",
-            "x_access_token_secret": partner.x_access_token_secret or "",
-            "telegram_channel_id": partner.telegram_channel_id or "",
-            "linkedin_access_token": partner.linkedin_access_token or ""
+            "x_api_key": partner.social_credentials.x_api_key or "",
+            "x_api_secret": partner.social_credentials.x_api_secret or "",
+            "x_access_token": partner.social_credentials.x_access_token or "",
+            "x_access_token_secret": partner.social_credentials.x_access_token_secret or "",
+            "telegram_channel_id": partner.social_credentials.telegram_channel_id or "",
+            "linkedin_access_token": partner.social_credentials.linkedin_access_token or ""
         },
         "capabilities": viral_studio.get_capabilities(),
-        "bot_username": (await bot.get_me()).username
+        "bot_username": await telegram_client.bot_username()
     }
 
 @router.post("/academy/complete")
@@ -67,16 +76,16 @@ async def complete_academy_stage(
     session: AsyncSession = Depends(get_session)
 ):
     import json
-    completed = json.loads(partner.completed_stages)
+    completed = json.loads(partner.pro_profile.completed_stages)
     if stage_id not in completed:
         completed.append(stage_id)
-        partner.completed_stages = json.dumps(completed)
+        partner.pro_profile.completed_stages = json.dumps(completed)
         # Award 100 academy points per stage
-        partner.academy_score += 100
+        partner.pro_profile.academy_score += 100
         session.add(partner)
         await session.commit()
     
-    return {"status": "success", "academy_score": partner.academy_score}
+    return {"status": "success", "academy_score": partner.pro_profile.academy_score}
 
 @router.post("/setup")
 async def setup_social_api(
@@ -87,12 +96,12 @@ async def setup_social_api(
     if not partner.is_pro:
         raise HTTPException(status_code=403, detail="PRO membership required")
     
-    if payload.x_api_key: partner.x_api_key = payload.x_api_key
-    if payload.x_api_secret: partner.x_api_secret = payload.x_api_secret
-    if payload.x_access_token: partner.x_access_token = payload.x_access_token
-    if payload.x_access_token_secret: partner.x_access_token_secret = payload.x_access_token_secret
-    if payload.telegram_channel_id: partner.telegram_channel_id = payload.telegram_channel_id
-    if payload.linkedin_access_token: partner.linkedin_access_token = payload.linkedin_access_token
+    if payload.x_api_key: partner.social_credentials.x_api_key = payload.x_api_key
+    if payload.x_api_secret: partner.social_credentials.x_api_secret = payload.x_api_secret
+    if payload.x_access_token: partner.social_credentials.x_access_token = payload.x_access_token
+    if payload.x_access_token_secret: partner.social_credentials.x_access_token_secret = payload.x_access_token_secret
+    if payload.telegram_channel_id: partner.social_credentials.telegram_channel_id = payload.telegram_channel_id
+    if payload.linkedin_access_token: partner.social_credentials.linkedin_access_token = payload.linkedin_access_token
     
     session.add(partner)
     await session.commit()
@@ -100,7 +109,7 @@ async def setup_social_api(
     
     return {"status": "success"}
 
-@router.post("/generate", response_model=ViralGenerateResponse)
+@router.post("/generate", response_model=Union[ViralGenerateResponse, ViralJobResponse])
 async def generate_content(
     payload: ViralGenerateRequest,
     partner: Partner = Depends(get_current_partner),
@@ -110,12 +119,25 @@ async def generate_content(
         raise HTTPException(status_code=403, detail="PRO membership required")
     
     # Check if a month has passed since last reset
-    has_tokens = await viral_studio.check_tokens_and_reset(partner, session, min_tokens=2)
+    has_tokens = await viral_studio.check_tokens_and_reset(partner, session, min_tokens=VIRAL_GENERATION_COST)
     if not has_tokens:
         raise HTTPException(status_code=402, detail="Insufficient tokens (2 tokens required: 1 for Text, 1 for Image)")
+
+    if payload.async_mode:
+        # #comment: Hand the synthesis to the TaskIQ worker and return immediately.
+        # Tokens are charged by the job itself, only once generation succeeds.
+        job = await generate_viral_content_task.kiq(
+            partner.id,
+            payload.post_type,
+            payload.target_audience,
+            payload.language,
+            payload.referral_link
+        )
+        await redis_service.set(viral_job_owner_key(job.task_id), str(partner.id), expire=VIRAL_JOB_OWNER_TTL)
+        return {"job_id": job.task_id, "status": "queued"}
     
     # Deduct 2 tokens (1 for Text, 1 for Image)
-    partner.pro_tokens -= 2
+    partner.pro_profile.pro_tokens -= 2
     session.add(partner)
     await session.commit()
     
@@ -130,7 +152,7 @@ async def generate_content(
     
     if result.get("status") == "failed":
         # Refund tokens on error
-        partner.pro_tokens += 2
+        partner.pro_profile.pro_tokens += 2
         session.add(partner)
         await session.commit()
         
@@ -147,9 +169,62 @@ async def generate_content(
         "hashtags": result["hashtags"],
         "image_prompt": result["image_prompt"],
         "image_url": result.get("image_url"),
-        "tokens_remaining": partner.pro_tokens
+        "tokens_remaining": partner.pro_profile.pro_tokens
     }
 
+@router.get("/jobs/{job_id}", response_model=ViralJobResponse)
+async def get_generation_job(
+    job_id: str,
+    partner: Partner = Depends(get_current_partner)
+):
+    """
+    Polls an async Viral Studio job. Results are read from the TaskIQ result backend.
+    """
+    from app.worker import result_backend
+
+    owner_id = await redis_service.get(viral_job_owner_key(job_id))
+    if owner_id != str(partner.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not await result_backend.is_result_ready(job_id):
+        return {"job_id": job_id, "status": "pending"}
+
+    job_result = await result_backend.get_result(job_id)
+    if job_result.is_err:
+        logger.error(f"❌ Viral job {job_id} crashed: {job_result.error}")
+        return {"job_id": job_id, "status": "failed", "error": "Generation job crashed", "error_code": "V999"}
+
+    data = job_result.return_value or {}
+    if data.get("status") != "success":
+        return {
+            "job_id": job_id,
+            "status": "failed",
+            "error": data.get("error", "Unknown error"),
+            "error_code": data.get("error_code", "V999")
+        }
+
+    result = {k: v for k, v in data.items() if k != "status"}
+    if result.get("image_url"):
+        # The worker staged the image; this service writes it to the disk it serves from
+        from app.services.media_service import media_service
+        result["image_url"] = await media_service.adopt(result["image_url"])
+
+    return {
+        "job_id": job_id,
+        "status": "success",
+        "result": result
+    }
+
+@router.get("/media")
+async def list_generated_media(
+    limit: int = 50,
+    partner: Partner = Depends(get_current_partner)
+):
+    """Lists the partner's stored Viral Studio images (newest first) from the media index."""
+    from app.services.media_service import media_service
+    items = await media_service.list_partner_media(partner.id, limit=min(max(limit, 1), 100))
+    return {"items": items}
+
 @router.post("/post")
 async def publish_content(
     payload: SocialPostRequest,
@@ -211,12 +286,12 @@ async def fix_headline_api(
     if not has_tokens:
         raise HTTPException(status_code=402, detail="Insufficient tokens (1 required)")
     
-    partner.pro_tokens -= 1
+    partner.pro_profile.pro_tokens -= 1
     session.add(partner)
     await session.commit()
     
     new_headline = await viral_studio.fix_headline(payload.headline)
-    return {"result": new_headline, "tokens_remaining": partner.pro_tokens}
+    return {"result": new_headline, "tokens_remaining": partner.pro_profile.pro_tokens}
 
 @router.post("/tools/trends")
 async def get_trends_api(
@@ -230,12 +305,12 @@ async def get_trends_api(
     if not has_tokens:
         raise HTTPException(status_code=402, detail="Insufficient tokens (3 required)")
     
-    partner.pro_tokens -= 3
+    partner.pro_profile.pro_tokens -= 3
     session.add(partner)
     await session.commit()
     
     trends = await viral_studio.fetch_trends()
-    return {"trends": trends, "tokens_remaining": partner.pro_tokens}
+    return {"trends": trends, "tokens_remaining": partner.pro_profile.pro_tokens}
 
 @router.post("/tools/bio")
 async def generate_bio_api(
@@ -251,9 +326,9 @@ async def generate_bio_api(
     if not has_tokens:
         raise HTTPException(status_code=402, detail="Insufficient tokens (2 required)")
     
-    partner.pro_tokens -= 2
+    partner.pro_profile.pro_tokens -= 2
     session.add(partner)
     await session.commit()
     
     new_bio = await viral_studio.generate_bio(payload.bio)
-    return {"bio": new_bio, "tokens_remaining": partner.pro_tokens}
+    return {"bio": new_bio, "tokens_remaining": partner.pro_profile.pro_tokens}
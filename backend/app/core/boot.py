@@ -0,0 +1,230 @@
+"""
+Declarative worker boot: startup steps with dependencies, timeouts and leader election.
+
+Steps are registered with @boot_orchestrator.step(...) and started from the lifespan.
+Every step runs as soon as the steps listed in `after` have finished (whatever their
+outcome), so independent warmups overlap instead of queueing behind each other.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.core.startup_profiler import startup_profiler
+
+logger = logging.getLogger(__name__)
+
+StepFunc = Callable[[], Awaitable[None]]
+
+# Terminal states; "running" is only used by background steps
+FINISHED = ("ok", "skipped", "failed", "timeout")
+
+
+class BootStep:
+    """
+    One startup step.
+      after       steps that must finish first
+      timeout     seconds before the step is abandoned (status "timeout")
+      leader_ttl  run in one worker only: the first to take lock:boot:{name} (held for
+                  leader_ttl seconds, never released) runs it, the others skip it.
+                  Without Redis every worker runs it.
+      critical    /health reports not-ready until it has finished
+      blocking    the lifespan waits for it before the worker accepts requests
+      background  a long-running loop: started, tracked and cancelled at shutdown
+    """
+
+    __slots__ = (
+        "name", "func", "after", "timeout", "leader_ttl", "critical", "blocking", "background",
+        "status", "duration_ms", "error",
+    )
+
+    def __init__(
+        self, name: str, func: StepFunc, after: Sequence[str] = (), timeout: Optional[float] = None,
+        leader_ttl: Optional[int] = None, critical: bool = False, blocking: bool = False,
+        background: bool = False
+    ):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.timeout = timeout
+        self.leader_ttl = leader_ttl
+        self.critical = critical
+        self.blocking = blocking
+        self.background = background
+        self.status = "pending"
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        data = {"step": self.name, "status": self.status}
+        if self.duration_ms is not None:
+            data["ms"] = round(self.duration_ms, 1)
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class BootOrchestrator:
+    """
+    #comment: Replaces fire-and-forget asyncio.create_task() calls in the lifespan: every
+    boot task is declared, ordered, bounded and visible in the boot report, and background
+    loops are cancelled on shutdown instead of being dropped with the event loop.
+    """
+
+    LOCK_PREFIX = "lock:boot"
+
+    def __init__(self):
+        self.steps: Dict[str, BootStep] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._background: List[asyncio.Task] = []
+        self._ready_callbacks: List[Callable[[], None]] = []
+        self._announced = False
+        self.owner = f"{os.getpid()}"
+
+    def step(
+        self, name: str, *, after: Sequence[str] = (), timeout: Optional[float] = None,
+        leader_ttl: Optional[int] = None, critical: bool = False, blocking: bool = False,
+        background: bool = False
+    ):
+        """Registers the decorated coroutine function as a boot step."""
+        def register(func: StepFunc) -> StepFunc:
+            if name in self.steps:
+                raise ValueError(f"Boot step '{name}' is already registered")
+            self.steps[name] = BootStep(name, func, after, timeout, leader_ttl, critical, blocking, background)
+            return func
+        return register
+
+    def when_ready(self, callback: Callable[[], None]):
+        """Calls callback once, as soon as every critical step has finished."""
+        self._ready_callbacks.append(callback)
+
+    def _ordered(self) -> List[BootStep]:
+        """Steps in dependency order; rejects unknown dependencies and cycles."""
+        ordered, visiting, done = [], set(), set()
+
+        def visit(step: BootStep):
+            if step.name in done:
+                return
+            if step.name in visiting:
+                raise ValueError(f"Boot step dependency cycle at '{step.name}'")
+            visiting.add(step.name)
+            for dep in step.after:
+                if dep not in self.steps:
+                    raise ValueError(f"Boot step '{step.name}' depends on unknown step '{dep}'")
+                visit(self.steps[dep])
+            visiting.discard(step.name)
+            done.add(step.name)
+            ordered.append(step)
+
+        for step in self.steps.values():
+            visit(step)
+        return ordered
+
+    async def start(self):
+        """Starts every step and returns once the blocking ones have finished."""
+        self.owner = f"{os.getpid()}"
+        for step in self._ordered():
+            self._tasks[step.name] = asyncio.create_task(self._run(step), name=f"boot:{step.name}")
+        blocking = [self._tasks[step.name] for step in self.steps.values() if step.blocking]
+        if blocking:
+            await asyncio.gather(*blocking)
+        self._announce_if_ready()
+
+    async def wait_ready(self):
+        critical = [self._tasks[step.name] for step in self.steps.values() if step.critical]
+        if critical:
+            await asyncio.gather(*critical)
+
+    @property
+    def ready(self) -> bool:
+        return all(step.status in FINISHED + ("running",) for step in self.steps.values() if step.critical)
+
+    async def _elect(self, step: BootStep) -> bool:
+        from app.services.redis_service import redis_service
+        try:
+            return bool(await redis_service.client.set(
+                f"{self.LOCK_PREFIX}:{step.name}", self.owner, nx=True, ex=step.leader_ttl
+            ))
+        except Exception as e:
+            logger.warning(f"⚠️ Boot step {step.name}: leader election unavailable ({e}), running here")
+            return True
+
+    async def _run(self, step: BootStep):
+        if step.after:
+            await asyncio.gather(*(self._tasks[dep] for dep in step.after))
+
+        started = time.perf_counter()
+        try:
+            if step.leader_ttl and not await self._elect(step):
+                step.status = "skipped"
+                logger.info(f"ℹ️ Boot step {step.name}: handled by another worker")
+                return
+            step.status = "starting"
+            if step.background:
+                task = asyncio.create_task(step.func(), name=f"boot-bg:{step.name}")
+                task.add_done_callback(lambda t: self._background_done(step, t))
+                self._background.append(task)
+                step.status = "running"
+                return
+            async with asyncio.timeout(step.timeout):
+                await step.func()
+            step.status = "ok"
+        except TimeoutError:
+            step.status = "timeout"
+            step.error = f"timed out after {step.timeout}s"
+            logger.warning(f"⚠️ Boot step {step.name} timed out after {step.timeout}s")
+        except Exception as e:
+            step.status = "failed"
+            step.error = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ Boot step {step.name} failed: {step.error}")
+        finally:
+            step.duration_ms = (time.perf_counter() - started) * 1000
+            if not step.background:
+                startup_profiler.record(step.name, started)
+            if step.critical:
+                self._announce_if_ready()
+
+    def _announce_if_ready(self):
+        if self._announced or not self.ready or not self._tasks:
+            return
+        self._announced = True
+        for callback in self._ready_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Boot ready callback failed: {e}")
+
+    def _background_done(self, step: BootStep, task: asyncio.Task):
+        if task.cancelled():
+            step.status = "stopped"
+        elif task.exception():
+            step.status = "failed"
+            step.error = f"{type(task.exception()).__name__}: {task.exception()}"
+            logger.error(f"❌ Background boot step {step.name} died: {step.error}")
+        else:
+            step.status = "ok"
+
+    async def stop(self):
+        """Cancels background steps and anything still booting."""
+        pending = self._background + [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._background = []
+        self._tasks = {}
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "steps": [step.as_dict() for step in self.steps.values()],
+        }
+
+    def log_report(self):
+        for step in self.steps.values():
+            timing = f"{step.duration_ms:.1f}ms" if step.duration_ms is not None else "-"
+            flags = "".join(f" [{flag}]" for flag in ("critical", "blocking", "background") if getattr(step, flag))
+            logger.info(f"   boot {step.name:<24} {step.status:<8} {timing:>10}{flags}")
+
+
+boot_orchestrator = BootOrchestrator()
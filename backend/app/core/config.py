@@ -62,6 +62,11 @@ class Settings(BaseSettings):
     # Webhook settings
     WEBHOOK_URL: Optional[str] = None # e.g. https://p2phub-api.up.railway.app
     WEBHOOK_PATH: str = "/api/bot/webhook"
+    WEBHOOK_INTAKE_MODE: str = "queue"  # "queue": ack at once, dispatch from Redis streams; "inline": dispatch in the request
+    BOT_UPDATE_SHARDS: int = 16  # Redis streams updates are sharded into by chat (one consumer per shard at a time)
+    BOT_UPDATE_WORKERS: int = 4  # Consumers per API worker (total concurrency is capped by BOT_UPDATE_SHARDS)
+    BOT_UPDATE_DEDUPE_TTL: int = 86400  # Seconds an update_id is remembered against Telegram redeliveries
+    BOT_UPDATE_STREAM_MAXLEN: int = 100000  # Approximate cap per shard stream
 
     # AI Services
     # Why: API Key for OpenAI integration. Required for the ViralCopywriter service.
@@ -87,6 +92,21 @@ class Settings(BaseSettings):
     PAYMENT_SERVICE_MODE: str = "ton_api" # Enum: auto_approve, ton_api, manual
     PRO_PRICE_USD: float = 39.0
 
+    # Price Oracle (TON/USD)
+    PRICE_ORACLE_SOURCES: list[str] = ["tonapi", "coingecko"]  # Tried in order; "file" / "mock" for offline
+    PRICE_ORACLE_FILE: Optional[str] = None  # JSON file {"TON": 5.42} used by the "file" source
+    PRICE_ORACLE_MOCK_TON: float = 5.5  # Fixed price for the "mock" source
+    PRICE_MAX_AGE_SECONDS: int = 600  # Payment quotes are refused above this price age
+    PRICE_HISTORY_HOURS: int = 168  # Rolling history kept in Redis (7 days)
+
+    # Referral graph snapshot (admin jobs / scripts)
+    REFERRAL_GRAPH_SNAPSHOT_PATH: str = "/tmp/p2phub_referral_graph.npz"
+    REFERRAL_GRAPH_MAX_AGE: int = 900  # Seconds a snapshot may be reused before reloading from the DB
+
+    # Telegram initData verification cache
+    TELEGRAM_AUTH_CACHE_SIZE: int = 10000  # Distinct initData strings kept verified (LRU)
+    TELEGRAM_AUTH_CACHE_TTL: int = 300  # Seconds before a cached initData is re-verified
+
     # Admin settings
     ADMIN_USER_IDS: list[str] = ["12345678", "537873096", "716720099"] # uslincoln added here
     
@@ -118,6 +138,17 @@ class Settings(BaseSettings):
         "Network Builders", "Stay-at-home Parents", "Student Hustlers", "Corporate Burnouts"
     ]
 
+    # Generated Media Lifecycle (Viral Studio images in /generated_media)
+    MEDIA_TTL_DAYS: int = 30  # Evict files not accessed for this long
+    MEDIA_PARTNER_QUOTA: int = 50  # Max stored generations per partner (oldest dropped first)
+    MEDIA_STORE_MAX_MB: int = 2048  # LRU eviction kicks in above this total size
+
+    # Support Session Memory (AI support chat)
+    SUPPORT_HISTORY_WINDOW: int = 10  # Verbatim messages sent to the LLM each turn
+    SUPPORT_HISTORY_TOKEN_BUDGET: int = 1500  # Max prompt tokens for summary + window
+    SUPPORT_SUMMARY_MAX_TOKENS: int = 250  # Size of the rolling summary of older turns
+    SUPPORT_SESSION_TOKEN_BUDGET: int = 60000  # Total LLM tokens per session before escalation
+
 
 
     @property
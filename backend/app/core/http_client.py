@@ -2,6 +2,8 @@ import httpx
 import asyncio
 from typing import Optional
 
+from app.core.process import after_fork
+
 class AsyncHTTPClient:
     _instance: Optional[httpx.AsyncClient] = None
 
@@ -20,5 +22,11 @@ class AsyncHTTPClient:
             await cls._instance.aclose()
             cls._instance = None
 
+    @classmethod
+    def forget_client(cls):
+        """After a fork: leave the parent's client alone and build a fresh one on next use."""
+        cls._instance = None
+
 # Singleton-like access
 http_client = AsyncHTTPClient
+after_fork(http_client.forget_client)
@@ -74,6 +74,18 @@ MESSAGES = {
             "⛔️STOP BLEEDING MONEY TO BANKS!\n\n"
             "Join me on Pintopay and unlock $1 per minute strategy! 💎\n"
             "Lead the revolution in FinTech & Web3 payments. 🌍"
+        ),
+        "pro_expiring": (
+            "⚠️ *PRO Subscription Notice*\n\n"
+            "Your PRO membership will expire in *{days_label}*.\n\n"
+            "💰 *Price to Extend:* ${price}\n\n"
+            "Extend it now to keep all your premium benefits and affiliate bonuses!\n"
+            "👉 Use /start and click 'Open App' to go to the Subscription section."
+        ),
+        "pro_expired": (
+            "❌ *Subscription Expired*\n\n"
+            "Your PRO membership has expired. You have lost access to premium features.\n\n"
+            "👉 Use /start and click 'Open App' to re-activate your PRO status for ${price}."
         )
     },
     "ru": {
@@ -151,6 +163,18 @@ MESSAGES = {
             "⛔️STOP BLEEDING MONEY TO BANKS!\n\n"
             "Присоединяйся ко мне в Pintopay и открой заработок $1 в минуту! 💎\n"
             "Возглавь революцию в FinTech и Web3 платежах. 🌍"
+        ),
+        "pro_expiring": (
+            "⚠️ *Уведомление о PRO подписке*\n\n"
+            "Ваш PRO статус истекает через *{days_label}*.\n\n"
+            "💰 *Стоимость продления:* ${price}\n\n"
+            "Продлите сейчас, чтобы сохранить все премиум-преимущества и партнерские бонусы!\n"
+            "👉 Нажмите /start и 'Open App', чтобы перейти в раздел подписки."
+        ),
+        "pro_expired": (
+            "❌ *Подписка истекла*\n\n"
+            "Ваш PRO статус истек. Доступ к премиум-функциям закрыт.\n\n"
+            "👉 Нажмите /start и 'Open App', чтобы снова активировать PRO за ${price}."
         )
     }
 }
@@ -32,10 +32,13 @@ def get_main_menu_keyboard(url: str, referral_link: str = "", referral_code: str
     ))
     return builder.as_markup()
 
-def get_pro_payment_keyboard(address: str, amount_ton: float):
+def get_pro_payment_keyboard(address: str, amount_ton: float, comment: str = None):
     builder = InlineKeyboardBuilder()
     # Deep link to TON wallet if possible, otherwise just instructions
     ton_link = f"ton://transfer/{address}?amount={int(amount_ton * 10**9)}"
+    if comment:
+        # Prefilled transfer comment lets the chain indexer match the payment automatically
+        ton_link += f"&text={comment}"
 
     builder.row(types.InlineKeyboardButton(
         text=f"💎 Pay {amount_ton} TON",
@@ -0,0 +1,81 @@
+"""
+Process lifecycle helpers for forking servers (Gunicorn with preload_app).
+
+With preload the app is imported once in the Gunicorn master and the workers are forked
+from it, sharing its memory copy-on-write. Anything holding sockets (DB pool, Redis pools,
+httpx clients) must not be shared across that fork: modules register a reset with
+@after_fork and it runs in every child process right after os.fork().
+
+Stdlib only, so it can be imported from gunicorn.conf.py and from the lowest-level modules.
+"""
+import gc
+import logging
+import os
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+_after_fork_hooks: List[Callable[[], None]] = []
+
+
+def after_fork(func: Callable[[], None]) -> Callable[[], None]:
+    """
+    Registers func to run in the child after a fork (usable as a decorator).
+    #comment: Hooks run inside os.fork(): they may only drop or rebuild in-memory state
+    (no I/O, no event loop). Closing an inherited socket would close it for the parent too.
+    """
+    _after_fork_hooks.append(func)
+    return func
+
+
+def _run_after_fork_hooks():
+    for hook in _after_fork_hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"❌ After-fork hook {getattr(hook, '__qualname__', hook)} failed: {e}")
+
+
+os.register_at_fork(after_in_child=_run_after_fork_hooks)
+
+
+def freeze_heap() -> int:
+    """
+    Moves every object tracked so far into the GC's permanent generation, so collections in
+    the forked workers never write to (and thereby copy) the pages holding the preloaded app:
+    modules, cmo_intelligence / i18n tables, prompts. Returns the number of frozen objects.
+    """
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+def memory_usage() -> Dict[str, float]:
+    """
+    Memory of the current process in MB. On Linux (smaps_rollup):
+      rss     resident, shared pages counted in full
+      pss     proportional: shared pages divided by the number of processes sharing them
+      uss     private to this process (what a worker really adds)
+      shared  resident pages shared with other processes (e.g. the Gunicorn master)
+    Elsewhere only the peak RSS is available.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        import resource
+        return {"max_rss": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+    return {
+        "rss": round(fields.get("Rss", 0.0), 1),
+        "pss": round(fields.get("Pss", 0.0), 1),
+        "uss": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+        "shared": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+    }
+
+
+def format_memory(usage: Dict[str, float]) -> str:
+    return ", ".join(f"{name}={mb}MB" for name, mb in usage.items())
@@ -1,65 +1,151 @@
 import hashlib
 import hmac
 import json
+import logging
+import threading
+import time
 from typing import Optional
 from urllib.parse import parse_qsl
 
-from fastapi import Depends, Header, HTTPException
+from cachetools import TTLCache
+from fastapi import Depends, Header, HTTPException, Request
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
 
-def validate_telegram_data(init_data: str) -> dict:
-    try:
-        if not init_data:
-            # Not an error, just means we're in guest mode or outside TMA
-            return {}
+INIT_DATA_HEADER = "X-Telegram-Init-Data"
+# Replay attack protection: auth_date must be within 24h
+INIT_DATA_MAX_AGE = 86400
+
+
+class TelegramInitData(dict):
+    """
+    Verified initData fields (without 'hash'), plus the parsed 'user' object.
+    Instances are shared between requests through the auth cache: treat as read-only.
+    """
+
+    def __init__(self, vals: dict, raw: str):
+        super().__init__(vals)
+        self.raw = raw
+        self.auth_date = int(vals.get("auth_date", 0) or 0)
+        try:
+            self.user = json.loads(vals["user"]) if vals.get("user") else None
+        except ValueError:
+            self.user = None
+
+    @property
+    def expired(self) -> bool:
+        return time.time() - self.auth_date > INIT_DATA_MAX_AGE
+
+
+class TelegramAuthCache:
+    """
+    Verifies each distinct initData string once per TTL.
+    The HMAC secret is derived from BOT_TOKEN once; verified results sit in a bounded
+    TTL LRU keyed by the initData hash (the full string is compared on hit, so a reused
+    hash with altered fields still goes through the HMAC check).
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._secret_key: Optional[bytes] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def secret_key(self) -> bytes:
+        if self._secret_key is None:
+            self._secret_key = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode(), hashlib.sha256).digest()
+        return self._secret_key
 
+    def verify(self, init_data: str) -> TelegramInitData:
         vals = dict(parse_qsl(init_data))
         hash_str = vals.pop('hash', None)
         if not hash_str:
-            from bot import logger
             logger.warning("[AUTH] Hash missing in initData")
             raise HTTPException(status_code=401, detail="Hash missing")
 
-        data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(vals.items()))
-
-        # Proper HMAC verification using BOT_TOKEN as secret
-        secret_key = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode(), hashlib.sha256).digest()
-        hmac_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        with self._lock:
+            cached = self._cache.get(hash_str)
+        if cached is not None and cached.raw == init_data:
+            if cached.expired:
+                logger.warning(f"[AUTH] Session expired. auth_date: {cached.auth_date}")
+                raise HTTPException(status_code=401, detail="Session expired")
+            self.hits += 1
+            return cached
 
-        if hmac_hash != hash_str:
-            from bot import logger
+        self.misses += 1
+        data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(vals.items()))
+        hmac_hash = hmac.new(self.secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(hmac_hash, hash_str):
             logger.warning("[AUTH] Invalid signature check failed")
             raise HTTPException(status_code=401, detail="Invalid signature")
 
-        # Replay attack protection: auth_date must be within 24h
-        import time
-        auth_date = int(vals.get('auth_date', 0))
-        if time.time() - auth_date > 86400:
-            from bot import logger
-            logger.warning(f"[AUTH] Session expired. auth_date: {auth_date}")
+        verified = TelegramInitData(vals, init_data)
+        if verified.expired:
+            logger.warning(f"[AUTH] Session expired. auth_date: {verified.auth_date}")
             raise HTTPException(status_code=401, detail="Session expired")
 
-        return vals
+        with self._lock:
+            self._cache[hash_str] = verified
+        return verified
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        self._secret_key = None
+
+
+telegram_auth_cache = TelegramAuthCache(
+    maxsize=settings.TELEGRAM_AUTH_CACHE_SIZE,
+    ttl=settings.TELEGRAM_AUTH_CACHE_TTL
+)
+
+def validate_telegram_data(init_data: str) -> dict:
+    try:
+        if not init_data:
+            # Not an error, just means we're in guest mode or outside TMA
+            return {}
+        return telegram_auth_cache.verify(init_data)
     except HTTPException:
         raise
     except Exception as e:
-        from bot import logger
         logger.error(f"[AUTH] Unexpected authentication error: {e}")
         raise HTTPException(status_code=401, detail="Authentication failed")
 
-async def get_current_user(x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")):
+def resolve_request_auth(request: Request) -> Optional[TelegramInitData]:
+    """
+    Request-scoped auth context: verifies the initData header at most once per request
+    and stashes the result on request.state (tg_init_data / tg_user) for the limiter,
+    dependencies and endpoints. Raises 401 for invalid initData, None in guest mode.
+    """
+    if hasattr(request.state, "tg_init_data"):
+        return request.state.tg_init_data
+
+    init_data = request.headers.get(INIT_DATA_HEADER)
+    vals = validate_telegram_data(init_data) if init_data else None
+    request.state.tg_init_data = vals or None
+    request.state.tg_user = vals.user if vals else None
+    return request.state.tg_init_data
+
+async def get_current_user(
+    request: Request,
+    x_telegram_init_data: Optional[str] = Header(None, alias=INIT_DATA_HEADER)
+):
     """
     Central authentication dependency. Verified Telegram initData.
     Returns None if header is missing, allowing guest mode.
     """
     if not x_telegram_init_data:
         return None
-    return validate_telegram_data(x_telegram_init_data)
+    return resolve_request_auth(request)
 
 def get_tg_user(user_data: dict) -> dict:
     """Helper to parse the 'user' JSON field from initData."""
+    if isinstance(user_data, TelegramInitData) and user_data.user:
+        return user_data.user
     try:
         user_json = user_data.get("user")
         if not user_json:
@@ -0,0 +1,131 @@
+"""
+Startup instrumentation (STARTUP_PROFILE=1).
+
+Imported first by app.main / app.worker so it sees every import that follows. Records
+per-module import time (self and cumulative, like `python -X importtime`) and the duration
+of named boot steps, and logs a report once the process is up. With the variable unset
+only step() timing remains, at the cost of two perf_counter() calls per step.
+
+Stdlib only: it must not itself pull in the modules it is meant to measure.
+"""
+import importlib.machinery
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TIMED_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+
+
+class _ImportTimer:
+    """
+    Meta path hook: lets the regular finders locate the module, then wraps that module's
+    loader.exec_module (on the loader instance only) with a timer. Nested imports are
+    subtracted from the parent to get self time.
+    """
+
+    def __init__(self):
+        self.records: Dict[str, Tuple[float, float]] = {}  # module -> (self_ms, cumulative_ms)
+        self._stack: List[float] = []  # Children time accumulated per active import
+        self._finding = False
+
+    def find_spec(self, fullname, path=None, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+
+        loader = spec.loader
+        if isinstance(loader, _TIMED_LOADERS) and "exec_module" not in vars(loader):
+            exec_module = loader.exec_module
+
+            def timed_exec_module(module, _exec=exec_module, _name=fullname):
+                self._stack.append(0.0)
+                started = time.perf_counter()
+                try:
+                    _exec(module)
+                finally:
+                    total = (time.perf_counter() - started) * 1000
+                    children = self._stack.pop()
+                    if self._stack:
+                        self._stack[-1] += total
+                    self.records[_name] = (total - children, total)
+
+            loader.exec_module = timed_exec_module
+        return spec
+
+
+class StartupProfiler:
+    TOP_N = 25
+
+    def __init__(self):
+        self.enabled = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float]] = []
+        self._imports = None
+        if self.enabled:
+            self._imports = _ImportTimer()
+            sys.meta_path.insert(0, self._imports)
+
+    @contextmanager
+    def step(self, name: str):
+        """Times one boot step (recorded even if it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, (time.perf_counter() - started) * 1000))
+
+    def record(self, name: str, started: float):
+        """Records a step that was timed elsewhere (started = perf_counter() at its start)."""
+        self.steps.append((name, (time.perf_counter() - started) * 1000))
+
+    def import_report(self, top: int = TOP_N) -> List[dict]:
+        if not self._imports:
+            return []
+        rows = sorted(self._imports.records.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        return [
+            {"module": name, "self_ms": round(self_ms, 1), "cumulative_ms": round(cumulative_ms, 1)}
+            for name, (self_ms, cumulative_ms) in rows
+        ]
+
+    def report(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "since_start_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "steps": [{"step": name, "ms": round(ms, 1)} for name, ms in self.steps],
+            "slowest_imports": self.import_report(),
+        }
+
+    def log_report(self, label: str):
+        """Logs the boot report (always the steps; imports only when enabled)."""
+        report = self.report()
+        steps = ", ".join(f"{s['step']}={s['ms']}ms" for s in report["steps"])
+        logger.info(f"⏱️ {label} ready in {report['since_start_ms']}ms (pid {report['pid']}): {steps}")
+        if self.enabled:
+            for row in report["slowest_imports"]:
+                logger.info(
+                    f"   import {row['module']:<48} self {row['self_ms']:>8.1f}ms  cumulative {row['cumulative_ms']:>8.1f}ms"
+                )
+            sys.meta_path[:] = [finder for finder in sys.meta_path if finder is not self._imports]
+
+
+startup_profiler = StartupProfiler()
@@ -29,3 +29,24 @@ def get_task_reward(task_id: str) -> int:
 
 def get_task_config(task_id: str) -> dict:
     return TASK_CONFIG.get(task_id, {})
+
+# #comment: A task's catalog index is its bit in Partner.task_started_mask / task_completed_mask.
+# Append new tasks at the end of TASK_CONFIG; never reorder or delete entries (set reward 0 instead).
+TASK_IDS = tuple(TASK_CONFIG)
+TASK_INDEX = {task_id: i for i, task_id in enumerate(TASK_IDS)}
+MAX_TASKS = 63  # Masks are signed BIGINT columns
+assert len(TASK_IDS) <= MAX_TASKS, "Task catalog no longer fits the partner task bitsets"
+
+# Materialized Partner counter each progress task type is measured against
+TASK_METRICS = {
+    'referral': 'referral_count',
+    'action': 'checkin_streak',
+}
+
+def task_bit(task_id: str) -> int:
+    return 1 << TASK_INDEX[task_id]
+
+def task_ids_in(mask: int) -> list:
+    """Catalog task IDs whose bit is set, in catalog order."""
+    mask = mask or 0
+    return [task_id for i, task_id in enumerate(TASK_IDS) if mask >> i & 1]
@@ -1,8 +1,12 @@
+# #comment: Must stay the first import: with STARTUP_PROFILE=1 it times every import below.
+from app.core.startup_profiler import startup_profiler
+
 import asyncio
-import json
+import hmac
 import logging
 import os
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from aiogram import types
 from fastapi import FastAPI, Header, HTTPException, Request
@@ -13,9 +17,12 @@ from fastapi.staticfiles import StaticFiles
 
 logger = logging.getLogger(__name__)
 
-from app.api.endpoints import admin, earnings, leaderboard, partner, payment, tools, pro
-from app.core.config import settings
-from bot import bot, dp
+with startup_profiler.step("import_app"):
+    from app.api.endpoints import admin, earnings, leaderboard, partner, payment, tools, pro
+    from app.core.boot import boot_orchestrator
+    from app.core.config import settings
+    from app.core.process import format_memory, memory_usage
+    from bot import bot, dp
 
 # #comment: Initialize Sentry for error tracking and performance monitoring.
 # Only activates if SENTRY_DSN is set in environment variables.
@@ -67,114 +74,28 @@ else:
 
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    from app.models.partner import create_db_and_tables
-    from app.services.warmup_service import warmup_redis
-    
-    # #comment: Always ensure DB tables exist. safe to run from multiple workers.
-    await create_db_and_tables()
-
-    # #comment: Warmup already has an internal Redis lock, so it's safe to call from all 4 workers.
-    # Only one will succeed, the others will skip.
-    asyncio.create_task(warmup_redis())
-
-    # #comment: Warmup AI services in the background during boot.
-    # This ensures Google Sheets / KB caches are ready before the first user request.
-    from app.services.support_service import support_service
-    asyncio.create_task(support_service._get_cached_kb())
-    
-    # #comment: One-time restoration task for users affected by globalization script
-    # This will run once on startup, protected by leader election
-    async def restore_affected_users():
-        try:
-            from app.services.redis_service import redis_service
-            lock_key = "lock:restore_users_from_telegram"
-            # Check if already done
-            done_key = "restore:users_completed_v2"
-            if await redis_service.client.get(done_key):
-                logger.info("ℹ️ User restoration already completed. Skipping...")
-                return
-            
-            is_leader = await redis_service.client.set(lock_key, "1", ex=300, nx=True)
-            if is_leader:
-                logger.info("🔧 Leader Worker: Running user restoration from Telegram...")
-                from scripts.archive.restore_names_from_telegram import restore_names_from_telegram
-                restored_count = await restore_names_from_telegram()
-                
-                # Clear all caches to force refresh
-                logger.info("🔧 Clearing all caches...")
-                from scripts.clear_all_caches import clear_all_caches
-                await clear_all_caches()
-                
-                # Mark as done so it doesn't run again
-                await redis_service.client.set(done_key, "1", ex=86400 * 7)  # 7 days
-                logger.info(f"✅ User restoration complete: {restored_count} users restored")
-            else:
-                logger.info("ℹ️ Another worker is handling user restoration. Skipping...")
-        except Exception as e:
-            logger.error(f"⚠️ User restoration failed: {e}")
-    
-    asyncio.create_task(restore_affected_users())
-
-    # #comment: Migrated Subscription and Photo Sync tasks to TaskIQ Scheduler.
-    # We no longer run infinite loops here to save worker memory and prevent redundant DB load.
-
-    logger.info("✅ Webhook registration check starting...")
-
-    webhook_base = settings.WEBHOOK_URL
+# ---- Boot steps ----
+# #comment: Declared once and run by the boot orchestrator in every worker (see app/core/boot.py):
+# dependency order, per-step timeouts, leader election for cluster-wide one-time work, and
+# /health stays 503 until the critical steps have finished.
 
-    if webhook_base and "your-backend-url" not in webhook_base:
-        # Avoid double-appending the path
-        path = settings.WEBHOOK_PATH
-        webhook_url = webhook_base if webhook_base.endswith(path) else f"{webhook_base.rstrip('/')}{path}"
+@boot_orchestrator.step("db_probe", timeout=5.0, critical=True, blocking=True)
+async def db_probe():
+    """
+    Explicit Database Connection Check
+    Why: Catches database connection issues early in the startup process.
+    This prevents the app from starting with a broken database connection,
+    which would cause cryptic errors later during request handling.
+    """
+    from sqlalchemy import text
+    import asyncpg
 
-        try:
-            # #comment: Leader Election for Webhook. Only one worker should register the webhook.
-            # This prevents 4 workers from hammering the Telegram API simultaneously.
-            from app.services.redis_service import redis_service
-            lock_key = "lock:webhook_registration"
-            is_leader = await redis_service.client.set(lock_key, "1", ex=60, nx=True)
-
-            if is_leader:
-                logger.info(f"📡 Leader Worker: Registering Webhook with Telegram: {webhook_url}")
-                async with asyncio.timeout(15.0):
-                    await bot.set_webhook(
-                        url=webhook_url,
-                        secret_token=settings.WEBHOOK_SECRET,
-                        drop_pending_updates=True
-                    )
-                logger.info(f"🚀 Webhook successfully set to: {webhook_url}")
-            else:
-                logger.info("ℹ️ Webhook already registered by leader worker. Skipping...")
-        except Exception as e:
-            # Ignore flood control if it's already being handled by another worker
-            if "Flood control exceeded" in str(e):
-                logger.warning("⚠️ Webhook flood control: Another worker might have already set it. Continuing...")
-            else:
-                logger.error(f"❌ Failed to set webhook (URL: {webhook_url}): {e}", exc_info=True)
-    else:
-        # Fallback to polling for local development or if URL is placeholder
-        logger.info("💡 WEBHOOK_URL is not set or is a placeholder. Starting Long Polling...")
-        await bot.delete_webhook(drop_pending_updates=True)
-        polling_task = asyncio.create_task(dp.start_polling(bot))
-        app.state.polling_task = polling_task
-        logger.info("✅ Bot started with Long Polling")
-
-    # Explicit Database Connection Check
-    # Why: Catches database connection issues early in the startup process.
-    # This prevents the app from starting with a broken database connection,
-    # which would cause cryptic errors later during request handling.
+    from app.models.partner import engine
+    logger.info("🌍 Checking Database Connection (Timeout 5s)...")
     try:
-        from sqlalchemy import text
-        import asyncpg
-
-        from app.models.partner import engine
-        logger.info("🌍 Checking Database Connection (Timeout 5s)...")
-        async with asyncio.timeout(5.0):
-            async with engine.begin() as conn:
-                logger.info("   ⏳ Engine session begun, executing query...")
-                await conn.execute(text("SELECT 1"))
+        async with engine.begin() as conn:
+            logger.info("   ⏳ Engine session begun, executing query...")
+            await conn.execute(text("SELECT 1"))
         logger.info("✅ Database Connection Successful")
     except asyncpg.InvalidPasswordError as e:
         # Specific handling for authentication errors
@@ -197,12 +118,8 @@ async def lifespan(app: FastAPI):
         # Exit with error code to prevent unhealthy deployment
         import sys
         sys.exit(1)
-    except asyncio.TimeoutError:
-        logger.warning("⚠️ Database connection check timed out. Startup continues...")
-        logger.info("📋 This may indicate:")
-        logger.info("   - Slow database startup")
-        logger.info("   - Network connectivity issues")
-        logger.info("   - Database under heavy load")
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         logger.error(f"❌ Database Connection Failed: {type(e).__name__}: {e}")
         logger.warning("⚠️ Application starting, but health checks may fail.")
@@ -212,24 +129,126 @@ async def lifespan(app: FastAPI):
             logger.info("   - Verify DATABASE_URL is correct")
             logger.info("   - Check if database service is running")
             logger.info("   - Ensure network connectivity")
+        raise
+
+@boot_orchestrator.step("create_db_and_tables", after=["db_probe"], timeout=30.0, critical=True, blocking=True)
+async def ensure_tables():
+    # #comment: Migrations run before the server starts (start.sh); this is only a safety net.
+    # Not elected: it is idempotent, and every worker must see the tables before it takes traffic.
+    from app.models.partner import create_db_and_tables
+    await create_db_and_tables()
+
+@boot_orchestrator.step("warmup_redis", after=["create_db_and_tables"], timeout=120.0, leader_ttl=600, critical=True)
+async def warmup_shared_caches():
+    # Leaderboard / recent partners live in Redis: seeding them once per deploy is enough
+    from app.services.warmup_service import warmup_redis
+    await warmup_redis()
 
+@boot_orchestrator.step("support_kb", timeout=30.0, critical=True)
+async def warmup_support_kb():
+    # #comment: Google Sheets / KB caches are ready (in this worker's memory) before it takes traffic.
+    from app.services.support_service import support_service
+    await support_service._get_cached_kb()
+
+@boot_orchestrator.step("kb_listener", background=True)
+async def kb_listener():
+    # #comment: Every worker subscribes to KB invalidations so an incremental Sheets sync
+    # refreshes all in-memory KB copies at once instead of after KB_MEMORY_TTL.
+    from app.services.support_service import support_service
+    await support_service.listen_for_kb_invalidation()
+
+@boot_orchestrator.step("price_snapshot", timeout=10.0, critical=True)
+async def warmup_price_snapshot():
+    from app.services.price_oracle_service import price_oracle
+    await price_oracle.ensure_fresh()
+
+@boot_orchestrator.step("price_snapshot_loop", after=["price_snapshot"], background=True)
+async def price_snapshot_loop():
+    # #comment: Price oracle reads are served from an in-process snapshot; this loop keeps it
+    # current from Redis (and refreshes from the sources if the scheduler is down).
+    from app.services.price_oracle_service import price_oracle
+    await price_oracle.run_snapshot_loop()
+
+@boot_orchestrator.step("media_eviction", background=True)
+async def media_eviction_loop():
+    # #comment: /generated_media lives on this service's disk, so its TTL/LRU eviction runs
+    # here (one worker per hour, by lock) rather than in the TaskIQ worker container.
+    from app.services.media_service import media_service
+    await media_service.eviction_loop()
+
+# #comment: Migrated Subscription and Photo Sync tasks to TaskIQ Scheduler.
+# We no longer run infinite loops here to save worker memory and prevent redundant DB load.
+
+def webhook_url() -> Optional[str]:
+    webhook_base = settings.WEBHOOK_URL
+    if not webhook_base or "your-backend-url" in webhook_base:
+        return None
+    # Avoid double-appending the path
+    path = settings.WEBHOOK_PATH
+    return webhook_base if webhook_base.endswith(path) else f"{webhook_base.rstrip('/')}{path}"
+
+if webhook_url():
+    # #comment: Leader Election for Webhook. Only one worker should register the webhook.
+    # This prevents 4 workers from hammering the Telegram API simultaneously.
+    @boot_orchestrator.step("set_webhook", timeout=15.0, leader_ttl=60)
+    async def register_webhook():
+        url = webhook_url()
+        logger.info(f"📡 Leader Worker: Registering Webhook with Telegram: {url}")
+        try:
+            await bot.set_webhook(
+                url=url,
+                secret_token=settings.WEBHOOK_SECRET,
+                drop_pending_updates=True
+            )
+        except Exception as e:
+            # Ignore flood control if it's already being handled by another worker
+            if "Flood control exceeded" in str(e):
+                logger.warning("⚠️ Webhook flood control: Another worker might have already set it. Continuing...")
+                return
+            raise
+        logger.info(f"🚀 Webhook successfully set to: {url}")
+
+    if settings.WEBHOOK_INTAKE_MODE == "queue":
+        # #comment: Every worker runs a few consumers; shard leases keep one consumer per
+        # shard cluster-wide, so per-chat order holds however many workers are up.
+        @boot_orchestrator.step("bot_update_consumers", after=["set_webhook"])
+        async def start_update_consumers():
+            from app.services.bot_update_queue import bot_update_queue
+            bot_update_queue.start(bot, dp)
+else:
+    # Fallback to polling for local development or if URL is placeholder
+    @boot_orchestrator.step("long_polling", background=True)
+    async def long_polling():
+        logger.info("💡 WEBHOOK_URL is not set or is a placeholder. Starting Long Polling...")
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+
+def log_worker_ready():
+    logger.info(f"✅ Worker ready (pid {os.getpid()}): critical boot steps finished.")
+    boot_orchestrator.log_report()
+    startup_profiler.log_report("API worker")
+    # Per-worker footprint: compare uss/pss across GUNICORN_PRELOAD=0/1 (see gunicorn.conf.py)
+    logger.info(f"🧠 API worker memory (pid {os.getpid()}): {format_memory(memory_usage())}")
+
+boot_orchestrator.when_ready(log_worker_ready)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Blocking steps (DB probe, tables) are awaited; warmups finish in the background
+    # while /health reports "starting".
+    await boot_orchestrator.start()
     logger.info("✅ Lifespan setup complete. App is live.")
     yield
     logger.info("🛑 Shutting down Lifespan...")
 
-    # Shutdown
+    # Shutdown: background loops (KB listener, price snapshot, polling) and unfinished warmups
+    await boot_orchestrator.stop()
+    if settings.WEBHOOK_INTAKE_MODE == "queue":
+        from app.services.bot_update_queue import bot_update_queue
+        await bot_update_queue.stop()
     await bot.session.close()
 
-    if not settings.WEBHOOK_URL and hasattr(app.state, "polling_task"):
-        app.state.polling_task.cancel()
-        try:
-            await app.state.polling_task
-        except asyncio.CancelledError:
-            # #comment: Expected behavior when cancelling the polling task during shutdown.
-            logger.info("ℹ️ Polling task cancelled successfully.")
-        except Exception as e:
-            logger.error(f"❌ Error cancelling polling task: {e}")
-
 
 app = FastAPI(title="Pintopay Partner Hub API", lifespan=lifespan)
 
@@ -238,7 +257,10 @@ async def health_check():
     """
     Rapid health check for system monitoring.
     Verify Redis connectivity and general availability.
+    Readiness: 503 "starting" until this worker's critical boot steps have finished.
     """
+    if not boot_orchestrator.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "boot": boot_orchestrator.report()})
     try:
         from app.services.redis_service import redis_service
         from datetime import datetime
@@ -250,7 +272,6 @@ async def health_check():
         }
     except Exception as e:
         logger.error(f"💥 Health check failed: {e}")
-        from fastapi.responses import JSONResponse
         return JSONResponse(
             status_code=503,
             content={"status": "unhealthy", "error": str(e)}
@@ -272,16 +293,30 @@ async def bot_webhook(request: Request, x_telegram_bot_api_secret_token: str = H
     if settings.DEBUG:
         logger.debug(f"📥 Received Webhook POST at {settings.WEBHOOK_PATH}")
 
-    if x_telegram_bot_api_secret_token != settings.WEBHOOK_SECRET:
+    if not hmac.compare_digest(x_telegram_bot_api_secret_token or "", settings.WEBHOOK_SECRET):
         logger.warning(f"⚠️ Webhook Secret Mismatch! (Token masked: {x_telegram_bot_api_secret_token[:4] if x_telegram_bot_api_secret_token else 'null'}...)")
         raise HTTPException(status_code=401, detail="Invalid secret token")
 
-    try:
-        body = await request.json()
-        if settings.DEBUG:
-            logger.debug(f"📦 Webhook Body: {json.dumps(body, indent=2)}")
+    body = await request.body()
+    if settings.DEBUG:
+        logger.debug(f"📦 Webhook Body: {body[:2000]!r}")
 
-        update = types.Update.model_validate(body, context={"bot": bot})
+    # #comment: Fast-ack intake. Handlers such as the support LLM chat or TX verification
+    # take seconds; Telegram slows delivery when webhook replies lag, so the update is only
+    # deduped and queued here and the consumer pool (see bot_update_queue) dispatches it.
+    if settings.WEBHOOK_INTAKE_MODE == "queue":
+        from app.services.bot_update_queue import bot_update_queue
+        try:
+            queued = await bot_update_queue.enqueue(body)
+            return {"status": "ok" if queued else "duplicate"}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"❌ Webhook Error: malformed update: {e}")
+            return {"status": "error", "message": "Malformed update"}
+        except Exception as e:
+            logger.warning(f"⚠️ Update queue unavailable, dispatching inline: {e}")
+
+    try:
+        update = types.Update.model_validate_json(body, context={"bot": bot})
         
         # Log the update type and ID
         update_type = "unknown"
@@ -373,6 +408,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # #comment: Enable GZip compression for all responses > 500 bytes.
@@ -405,6 +441,17 @@ class CachedStaticFiles(StaticFiles):
         response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
         return response
 
+# #comment: Generated media is evicted by MediaService (TTL/LRU), so it must not be cached
+# "forever" and every hit refreshes the file's last-access score in the media index.
+class GeneratedMediaFiles(StaticFiles):
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            from app.services.media_service import media_service
+            await media_service.touch(os.path.basename(path))
+            response.headers["Cache-Control"] = f"public, max-age={settings.MEDIA_TTL_DAYS * 86400}"
+        return response
+
 # Serve promo images
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Serve generated media (Fix for viral studio permissions)
@@ -417,7 +464,7 @@ generated_media_dir = os.path.join(base_dir, "generated_media")
 try:
     os.makedirs(generated_media_dir, exist_ok=True)
     logger.info(f"✅ Generated media directory ready: {generated_media_dir}")
-    app.mount("/generated_media", CachedStaticFiles(directory=generated_media_dir), name="generated_media")
+    app.mount("/generated_media", GeneratedMediaFiles(directory=generated_media_dir), name="generated_media")
 except (OSError, PermissionError) as e:
     logger.warning(f"⚠️ Cannot create {generated_media_dir} ({e}). Viral Studio will use /tmp fallback for image generation.")
     # Don't mount the directory if it doesn't exist - requests will gracefully 404
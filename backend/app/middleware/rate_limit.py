@@ -6,31 +6,26 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
 from app.core.config import settings
+from app.core.process import after_fork
+from app.core.security import resolve_request_auth
 
 
 # Initialize Redis-backed limiter for production, in-memory for local
 def get_user_key(request: Request) -> str:
     """
-    Returns the user's Telegram ID as the rate limit key if available,
+    Returns the user's verified Telegram ID as the rate limit key if available,
     falling back to the remote IP address.
     """
-    # 1. Try to get Telegram ID from header
-    init_data = request.headers.get("X-Telegram-Init-Data")
-    if init_data:
-        try:
-            import json
-            from urllib.parse import parse_qsl
-            vals = dict(parse_qsl(init_data))
-            user_json = vals.get("user")
-            if user_json:
-                user_data = json.loads(user_json)
-                tg_id = user_data.get("id")
-                if tg_id:
-                    return f"user:{tg_id}"
-        except Exception:
-            # #comment: Failed to parse Telegram Init Data, falling back to IP.
-            # This is expected for standard HTTP requests or invalid headers.
-            pass
+    # 1. Reuse the request's auth context (verified once, cached across requests)
+    try:
+        resolve_request_auth(request)
+        tg_user = request.state.tg_user
+        if tg_user and tg_user.get("id"):
+            return f"user:{tg_user['id']}"
+    except Exception:
+        # #comment: Missing or invalid Telegram Init Data, falling back to IP.
+        # This is expected for standard HTTP requests; forged headers can't pick another user's bucket.
+        pass
 
     # 2. Fallback to IP address
     return get_remote_address(request)
@@ -38,6 +33,7 @@ def get_user_key(request: Request) -> str:
 # Initialize Redis-backed limiter for production, in-memory for local
 try:
     redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    after_fork(redis_client.connection_pool.reset)
     limiter = Limiter(
         key_func=get_user_key,
         storage_uri=settings.REDIS_URL,
@@ -1,7 +1,7 @@
 from .partner import Partner
-from .transaction import PartnerTransaction
+from .transaction import IncomingPayment, PartnerTransaction
 from .audit_log import AuditLog
 from .blog import BlogPostEngagement, PartnerBlogLike
 from .knowledge_base_item import KnowledgeBaseItem
 
-__all__ = ["Partner", "PartnerTransaction", "AuditLog", "BlogPostEngagement", "PartnerBlogLike", "KnowledgeBaseItem"]
+__all__ = ["Partner", "PartnerTransaction", "IncomingPayment", "AuditLog", "BlogPostEngagement", "PartnerBlogLike", "KnowledgeBaseItem"]
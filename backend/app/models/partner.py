@@ -1,12 +1,32 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import BigInteger, Column, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 from app.core.config import settings
 
 
+# Narrow projection served by /partner/network/{level} (covered by ix_partner_depth_path_members)
+NETWORK_MEMBER_COLUMNS = [
+    "telegram_id", "username", "first_name", "last_name", "photo_url", "photo_file_id",
+    "xp", "level", "is_pro", "created_at"
+]
+
 class Partner(SQLModel, table=True):
+    __table_args__ = (
+        # #comment: Keyset pagination of downline levels. Direct partners are read straight
+        # off (referrer_id, sort key, id); deeper levels scan the path prefix of one depth
+        # index-only (PostgreSQL INCLUDE), sorting just the matching rows.
+        Index("ix_partner_referrer_xp", "referrer_id", "xp", "id"),
+        Index("ix_partner_referrer_created", "referrer_id", "created_at", "id"),
+        Index(
+            "ix_partner_depth_path_members",
+            "depth", "path", "id",
+            postgresql_ops={"path": "varchar_pattern_ops"},
+            postgresql_include=NETWORK_MEMBER_COLUMNS
+        ),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     telegram_id: str = Field(index=True, unique=True)
     username: Optional[str] = None
@@ -24,29 +44,11 @@ class Partner(SQLModel, table=True):
     depth: int = Field(default=0, index=True) # Cached depth level for faster hierarchy queries
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True) # Optimized for sorting
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow}, index=True)
-    completed_tasks: str = Field(default="[]") # Store task IDs as JSON string
-    completed_stages: str = Field(default="[]") # Store Academy stage IDs as JSON string
-    academy_score: float = Field(default=0.0) # Track Academy points
 
-    # PRO Subscription Status
+    # PRO Subscription Status (details live in partner_pro_profile)
     is_pro: bool = Field(default=False, index=True)
     pro_expires_at: Optional[datetime] = Field(default=None)
-    pro_purchased_at: Optional[datetime] = Field(default=None)
-    pro_started_at: Optional[datetime] = Field(default=None)
     pro_notification_seen: bool = Field(default=False)  # Track if user saw the "You are PRO" card
-    subscription_plan: Optional[str] = Field(default=None) # e.g. "PRO_LIFETIME", "PRO_YEARLY"
-    
-    # PRO Content Generation Tokens
-    pro_tokens: int = Field(default=500)
-    pro_tokens_last_reset: datetime = Field(default_factory=datetime.utcnow)
-
-    # Viral Marketing API Setup
-    x_api_key: Optional[str] = Field(default=None)
-    x_api_secret: Optional[str] = Field(default=None)
-    x_access_token: Optional[str] = Field(default=None)
-    x_access_token_secret: Optional[str] = Field(default=None)
-    telegram_channel_id: Optional[str] = Field(default=None)
-    linkedin_access_token: Optional[str] = Field(default=None)
 
     # Daily Check-in Tracking
     last_checkin_at: Optional[datetime] = Field(default=None, index=True)
@@ -56,9 +58,12 @@ class Partner(SQLModel, table=True):
     total_earned_usdt: float = Field(default=0.0, index=True)
     referral_count: int = Field(default=0, index=True)
 
+    # Task progress bitsets (bit = app.core.tasks.TASK_INDEX), written by task_service only
+    task_started_mask: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+    task_completed_mask: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default="0"))
+
     # Verification & Payment Details
     last_transaction_id: Optional[int] = Field(default=None, foreign_key="partnertransaction.id")
-    payment_details: Optional[str] = Field(default=None) # Store JSON of extra details if needed
 
     # Relationships
     referrals: list["Partner"] = Relationship(
@@ -81,6 +86,50 @@ class Partner(SQLModel, table=True):
     last_transaction: Optional["PartnerTransaction"] = Relationship(
         sa_relationship_kwargs={"foreign_keys": "Partner.last_transaction_id"}
     )
+    # #comment: Cold 1:1 columns split off the hot row. Not loaded unless asked for
+    # (selectinload / load_pro_profile / load_social_credentials); rows are created lazily.
+    pro_profile: Optional["PartnerProProfile"] = Relationship(
+        back_populates="partner",
+        sa_relationship_kwargs={"uselist": False}
+    )
+    social_credentials: Optional["PartnerSocialCredentials"] = Relationship(
+        back_populates="partner",
+        sa_relationship_kwargs={"uselist": False}
+    )
+
+class PartnerProProfile(SQLModel, table=True):
+    """PRO subscription details, Viral Studio tokens and Academy progress (rarely written)."""
+    __tablename__ = "partner_pro_profile"
+    partner_id: int = Field(foreign_key="partner.id", primary_key=True)
+    pro_purchased_at: Optional[datetime] = Field(default=None)
+    pro_started_at: Optional[datetime] = Field(default=None)
+    subscription_plan: Optional[str] = Field(default=None) # e.g. "PRO_LIFETIME", "PRO_YEARLY"
+    payment_details: Optional[str] = Field(default=None) # Store JSON of extra details if needed
+
+    # PRO Content Generation Tokens
+    pro_tokens: int = Field(default=500)
+    pro_tokens_last_reset: datetime = Field(default_factory=datetime.utcnow)
+
+    # Academy / legacy task progress
+    completed_tasks: str = Field(default="[]") # Store task IDs as JSON string
+    completed_stages: str = Field(default="[]") # Store Academy stage IDs as JSON string
+    academy_score: float = Field(default=0.0) # Track Academy points
+
+    partner: Partner = Relationship(back_populates="pro_profile")
+
+class PartnerSocialCredentials(SQLModel, table=True):
+    """Viral Marketing API setup. Secrets stay out of every Partner load."""
+    __tablename__ = "partner_social_credentials"
+    partner_id: int = Field(foreign_key="partner.id", primary_key=True)
+    x_api_key: Optional[str] = Field(default=None)
+    x_api_secret: Optional[str] = Field(default=None)
+    x_access_token: Optional[str] = Field(default=None)
+    x_access_token_secret: Optional[str] = Field(default=None)
+    telegram_channel_id: Optional[str] = Field(default=None)
+    linkedin_access_token: Optional[str] = Field(default=None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
+
+    partner: Partner = Relationship(back_populates="social_credentials")
 
 class XPTransaction(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
@@ -124,11 +173,17 @@ class SystemSetting(SQLModel, table=True):
     value: str # JSON encoded string
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow}, index=True)
 
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel.ext.asyncio.session import AsyncSession
 import sys
 
+from app.core.process import after_fork
+
 # Standardized async database URL from settings
 database_url = settings.async_database_url
 
@@ -182,6 +237,12 @@ except Exception as e:
     print("   3. Incorrect connection parameters", file=sys.stderr)
     sys.exit(1)
 
+# #comment: Pool connections belong to one process. A worker forked from a preloaded Gunicorn
+# master starts with an empty pool rather than reusing sockets it shares with its siblings.
+@after_fork
+def _reset_engine_pool():
+    engine.sync_engine.dispose(close=False)
+
 async def create_db_and_tables():
     # #comment: DB creation is now guarded in main.py lifespan, but the logic remains here.
     async with engine.begin() as conn:
@@ -193,6 +254,31 @@ async_session_maker = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+async def _load_one_to_one(session: AsyncSession, partner: Partner, attr: str, model):
+    if attr not in inspect(partner).unloaded:
+        row = getattr(partner, attr)
+        if row is not None:
+            return row
+    row = await session.get(model, partner.id)
+    if row is None:
+        # #comment: Two requests for the same partner can both miss the row. Inserting with
+        # ON CONFLICT DO NOTHING and re-selecting lets the loser adopt the winner's row
+        # instead of failing its whole commit with an IntegrityError.
+        insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+        values = model(partner_id=partner.id).model_dump()
+        await session.execute(insert(model).values(**values).on_conflict_do_nothing(index_elements=["partner_id"]))
+        row = await session.get(model, partner.id)
+    set_committed_value(partner, attr, row)
+    return row
+
+async def load_pro_profile(session: AsyncSession, partner: Partner) -> PartnerProProfile:
+    """The partner's PRO/Academy row, inserted on first use (changes are saved with the next commit)."""
+    return await _load_one_to_one(session, partner, "pro_profile", PartnerProProfile)
+
+async def load_social_credentials(session: AsyncSession, partner: Partner) -> PartnerSocialCredentials:
+    """The partner's social API credentials row, inserted on first use (changes are saved with the next commit)."""
+    return await _load_one_to_one(session, partner, "social_credentials", PartnerSocialCredentials)
+
 async def get_session():
     async with async_session_maker() as session:
         yield session
@@ -60,6 +60,7 @@ class ViralGenerateRequest(BaseModel):
     target_audience: str
     language: str
     referral_link: Optional[str] = None
+    async_mode: bool = False # Enqueue as a background job and poll /api/pro/jobs/{job_id}
 
 class ViralGenerateResponse(BaseModel):
     title: str
@@ -70,6 +71,13 @@ class ViralGenerateResponse(BaseModel):
     tokens_remaining: int
     error_code: Optional[str] = None
 
+class ViralJobResponse(BaseModel):
+    job_id: str
+    status: str # queued, pending, success, failed
+    result: Optional[ViralGenerateResponse] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
 class SocialPostRequest(BaseModel):
     platform: str # 'x', 'telegram', 'linkedin'
     content: str
@@ -89,6 +97,19 @@ class NetworkStats(BaseModel):
     level_8: int = 0
     level_9: int = 0
 
+class NetworkMemberResponse(PartnerBase):
+    """Narrow projection for downline browsing (no balances or referral codes)."""
+    xp: float
+    level: int
+    is_pro: bool
+    created_at: datetime
+
+class NetworkSearchResult(PartnerBase):
+    xp: float
+    is_pro: bool
+    network_level: int  # 1-9, relative to the searching partner
+    match: str  # exact | prefix | contains
+
 class GrowthMetrics(BaseModel):
     growth_pct: float
     current_count: int
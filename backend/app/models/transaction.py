@@ -1,13 +1,24 @@
 from datetime import datetime
 from typing import Optional, TYPE_CHECKING
 
+from sqlalchemy import BigInteger, Column, Index, text
 from sqlmodel import Field, Relationship, SQLModel
 
 if TYPE_CHECKING:
     from app.models.partner import Partner
 
 class PartnerTransaction(SQLModel, table=True):
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # #comment: Partial index: only open payment sessions are ever looked up by partner/currency,
+        # completed/expired history doesn't bloat it.
+        Index(
+            "ix_partnertransaction_pending",
+            "partner_id", "currency", "created_at",
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'")
+        ),
+        {"extend_existing": True}
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     partner_id: int = Field(foreign_key="partner.id", index=True)
     amount: float
@@ -15,7 +26,7 @@ class PartnerTransaction(SQLModel, table=True):
     currency: str # TON, USDT, BTC, etc.
     network: str # TON, TRC20, ERC20, etc.
     tx_hash: Optional[str] = Field(default=None, index=True)
-    status: str = Field(default="pending") # pending, completed, failed, manual_review
+    status: str = Field(default="pending") # pending, completed, failed, manual_review, expired
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
 
@@ -24,3 +35,21 @@ class PartnerTransaction(SQLModel, table=True):
         back_populates="transactions",
         sa_relationship_kwargs={"foreign_keys": "PartnerTransaction.partner_id"}
     )
+
+
+class IncomingPayment(SQLModel, table=True):
+    """
+    Local index of incoming transfers to the admin TON wallet, filled by the chain indexer.
+    Hash lookups and session matching run against this table instead of the TON APIs.
+    """
+    __tablename__ = "incoming_payment"
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tx_hash: str = Field(unique=True, index=True) # Lowercase hex
+    lt: int = Field(sa_column=Column(BigInteger, nullable=False, index=True)) # Logical time (indexer cursor)
+    amount_nano: int = Field(sa_column=Column(BigInteger, nullable=False))
+    source: Optional[str] = None
+    comment: Optional[str] = None
+    utime: datetime
+    matched_transaction_id: Optional[int] = Field(default=None, foreign_key="partnertransaction.id", index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -9,6 +9,7 @@ from sqlmodel import func, select, text
 from app.models.partner import Earning, Partner, PartnerTask, get_session
 from app.models.transaction import PartnerTransaction
 from app.services.notification_service import notification_service
+from app.services.price_oracle_service import price_oracle
 
 
 class AdminService:
@@ -107,10 +108,11 @@ class AdminService:
             total_revenue_ton = (await session.exec(revenue_stmt_ton)).one() or 0.0
             total_revenue_usdt = (await session.exec(revenue_stmt_usdt)).one() or 0.0
             
-            # Simple conversion for display (Mock rate or just total)
-            total_revenue = total_revenue_usdt + (total_revenue_ton * 5.0) # Mock conversion: 1 TON = 5 USDT if needed, or just keep separate
-            # Actually, let's keep it clean as separate fields but return a combined total in USDT-equivalent if possible.
-            # For now, let's just return both.
+            # #comment: USDT-equivalent total at the oracle's current TON price (in-process snapshot,
+            # no network call). Falls back to the separate per-currency fields if no price yet.
+            ton_quote = price_oracle.get_quote("TON")
+            ton_usd = ton_quote.price if ton_quote else 0.0
+            total_revenue = total_revenue_usdt + (total_revenue_ton * ton_usd)
 
             # 2. Commissions by Level (1-9)
             commissions_by_level = []
@@ -194,6 +196,14 @@ class AdminService:
             )
             active_24h = (await session.exec(active_24h_stmt)).one()
 
+            # Check-in DAU / WAU / MAU from the Redis day bitmaps (BITCOUNT / BITOP OR)
+            try:
+                from app.services.checkin_service import checkin_engine
+                checkin_activity = await checkin_engine.active_counts()
+            except Exception as e:
+                logger.warning(f"Check-in activity counts unavailable: {e}")
+                checkin_activity = {}
+
             # Task Completion Trends (Last 7 days)
             task_stats_stmt = select(PartnerTask.task_id, func.count(PartnerTask.id)).group_by(PartnerTask.task_id)
             task_counts_res = await session.exec(task_stats_stmt)
@@ -208,7 +218,10 @@ class AdminService:
                     "total_partners": total_partners,
                     "total_pro": total_pro,
                     "total_tasks": total_tasks,
-                    "active_24h": active_24h
+                    "active_24h": active_24h,
+                    "checkin_dau": checkin_activity.get("dau"),
+                    "checkin_wau": checkin_activity.get("wau"),
+                    "checkin_mau": checkin_activity.get("mau")
                 },
                 "kpis": {
                     "conversion_rate": round(conversion_rate, 2),
@@ -219,6 +232,7 @@ class AdminService:
                     "total_revenue": round(total_revenue, 2),
                     "total_revenue_ton": round(total_revenue_ton, 2),
                     "total_revenue_usdt": round(total_revenue_usdt, 2),
+                    "ton_price": ton_quote.to_dict() if ton_quote else None,
                     "total_commissions": round(total_commissions, 2),
                     "net_profit": round(net_profit, 2),
                     "commissions_breakdown": commissions_by_level
@@ -1,7 +1,11 @@
+import base64
+import binascii
+import json
 import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlalchemy import and_, case, func, or_, tuple_
 from sqlmodel import select, text
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -46,62 +50,179 @@ async def get_referral_tree_stats(session: AsyncSession, partner_id: int) -> dic
 
         return stats
 
-async def get_referral_tree_members(session: AsyncSession, partner_id: int, target_level: int) -> List[dict]:
+MEMBERS_PAGE_SIZE = 50
+MEMBERS_MAX_PAGE_SIZE = 100
+MEMBERS_CACHE_TTL = 600
+MEMBER_SORTS = ("xp", "joined")
+
+def members_gen_key(partner_id: int, level: int) -> str:
+    return f"ref_tree_members_gen:{partner_id}:{level}"
+
+def members_page_key(partner_id: int, level: int, gen: int, sort: str, cursor: Optional[str], limit: int) -> str:
+    return f"ref_tree_members_v3:{partner_id}:{level}:{gen}:{sort}:{limit}:{cursor or 'first'}"
+
+def invalidate_tree_members(pipe, partner_id: int, level: int):
+    """
+    Queues invalidation of every cached page of a level on a Redis pipeline.
+    #comment: Pages are keyed by a generation counter, so one INCR drops them all
+    (old pages just expire) instead of tracking every cursor ever served.
+    """
+    key = members_gen_key(partner_id, level)
+    pipe.incr(key)
+    pipe.expire(key, 86400)
+
+def encode_members_cursor(sort: str, row: Dict[str, Any]) -> str:
+    value = row["xp"] if sort == "xp" else row["created_at"]
+    raw = json.dumps([value, row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_members_cursor(sort: str, cursor: str) -> Tuple[Any, int]:
+    """Inverse of encode_members_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+        if sort == "xp":
+            return float(value), int(last_id)
+        return datetime.fromisoformat(value), int(last_id)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+async def get_referral_tree_members(
+    session: AsyncSession,
+    partner_id: int,
+    target_level: int,
+    sort: str = "xp",
+    cursor: Optional[str] = None,
+    limit: int = MEMBERS_PAGE_SIZE
+) -> Dict[str, Any]:
     """
-    Fetches details of partners at a specific level using Materialized Path.
+    One keyset page of partners at a specific level (Materialized Path).
+    Ordered by (xp, id) or (created_at, id), newest/highest first; the cursor is the
+    last row's sort key, so deep pages cost the same as the first one.
+    Returns {"items": [...], "next_cursor": str | None}.
     """
     import sentry_sdk
     with sentry_sdk.start_span(op="db.query", description="get_referral_tree_members"):
-        if not (1 <= target_level <= 9):
-            return []
-
-        partner = await session.get(Partner, partner_id)
-        if not partner: return []
-
-        search_path = f"{partner.path or ''}.{partner.id}".lstrip(".")
-        base_depth = len(search_path.split('.'))
-        target_depth = base_depth + target_level - 1
-
-        query = text("""
-            SELECT telegram_id, username, first_name, last_name, xp, photo_url, created_at,
-                   balance, level as partner_level, referral_code, is_pro, updated_at, id, photo_file_id
-            FROM partner
-            WHERE (path = :search_path OR path LIKE :search_wildcard)
-            AND depth = :target_depth
-            ORDER BY xp DESC
-            LIMIT 100;
-        """)
+        if not (1 <= target_level <= 9) or sort not in MEMBER_SORTS:
+            return {"items": [], "next_cursor": None}
+        after = decode_members_cursor(sort, cursor) if cursor else None
+
+        if target_level == 1:
+            # Direct partners: served by ix_partner_referrer_xp
+            scope = Partner.referrer_id == partner_id
+        else:
+            path = (await session.exec(select(Partner.path).where(Partner.id == partner_id))).first()
+            search_path = f"{path or ''}.{partner_id}".lstrip(".")
+            base_depth = len(search_path.split('.'))
+            scope = and_(
+                or_(Partner.path == search_path, Partner.path.like(f"{search_path}.%")),
+                Partner.depth == base_depth + target_level - 1
+            )
+
+        sort_col = Partner.xp if sort == "xp" else Partner.created_at
+        stmt = select(
+            Partner.id, Partner.telegram_id, Partner.username, Partner.first_name, Partner.last_name,
+            Partner.photo_url, Partner.photo_file_id, Partner.xp, Partner.level, Partner.is_pro,
+            Partner.created_at
+        ).where(scope)
+        if after:
+            stmt = stmt.where(tuple_(sort_col, Partner.id) < tuple_(*after))
+        stmt = stmt.order_by(sort_col.desc(), Partner.id.desc()).limit(limit + 1)
 
         try:
-            result = await session.execute(query, {
-                "search_path": search_path,
-                "search_wildcard": f"{search_path}.%",
-                "target_depth": target_depth
-            })
-            members = []
-            rows = result.all()
-            for row in rows:
-                members.append({
-                    "telegram_id": row[0],
-                    "username": row[1],
-                    "first_name": row[2],
-                    "last_name": row[3],
-                    "xp": row[4],
-                    "photo_url": row[5],
-                    "created_at": row[6].isoformat() if row[6] else None,
-                    "balance": row[7],
-                    "level": row[8],
-                    "referral_code": row[9],
-                    "is_pro": bool(row[10]),
-                    "updated_at": row[11].isoformat() if row[11] else None,
-                    "id": row[12],
-                    "photo_file_id": row[13]
-                })
-
-            return members
+            rows = (await session.exec(stmt)).all()
         except Exception as e:
             logger.error(f"Error fetching tree members: {e}")
-            return []
+            return {"items": [], "next_cursor": None}
+
+        items = [
+            {
+                "id": row.id,
+                "telegram_id": row.telegram_id,
+                "username": row.username,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "photo_url": row.photo_url,
+                "photo_file_id": row.photo_file_id,
+                "xp": row.xp,
+                "level": row.level,
+                "is_pro": bool(row.is_pro),
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = encode_members_cursor(sort, items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+SEARCH_MIN_QUERY = 2
+SEARCH_MAX_RESULTS = 50
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def search_downline(session: AsyncSession, partner_id: int, query: str, limit: int = 20) -> List[dict]:
+    """
+    Finds members of the partner's 9-level downline by username / first name
+    (or exact telegram_id). Ranked: exact match, then prefix, then substring;
+    closer levels and higher XP first within a class.
+
+    #comment: The ancestry filter (path prefix + depth window) narrows to the caller's
+    network via ix_partner_depth_path_members, and the substring LIKE on lower(...) is
+    served by the pg_trgm GIN indexes, so PostgreSQL BitmapAnds both instead of an
+    ILIKE over the whole table.
+    """
+    q = (query or "").strip().lstrip("@").lower()
+    if len(q) < SEARCH_MIN_QUERY:
+        return []
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+
+    path = (await session.exec(select(Partner.path).where(Partner.id == partner_id))).first()
+    search_path = f"{path or ''}.{partner_id}".lstrip(".")
+    base_depth = len(search_path.split('.'))
+
+    username = func.lower(Partner.username)
+    first_name = func.lower(Partner.first_name)
+    escaped = _escape_like(q)
+    contains = f"%{escaped}%"
+    prefix = f"{escaped}%"
+
+    text_match = or_(username.like(contains, escape="\\"), first_name.like(contains, escape="\\"))
+    if q.isdigit():
+        text_match = or_(text_match, Partner.telegram_id == q)
+
+    match_class = case(
+        (or_(username == q, first_name == q, Partner.telegram_id == q), 0),
+        (or_(username.like(prefix, escape="\\"), first_name.like(prefix, escape="\\")), 1),
+        else_=2
+    )
+
+    stmt = select(
+        Partner.id, Partner.telegram_id, Partner.username, Partner.first_name, Partner.last_name,
+        Partner.photo_url, Partner.photo_file_id, Partner.xp, Partner.is_pro, Partner.depth,
+        match_class.label("match_class")
+    ).where(
+        or_(Partner.path == search_path, Partner.path.like(f"{_escape_like(search_path)}.%", escape="\\")),
+        Partner.depth.between(base_depth, base_depth + 8),
+        text_match
+    ).order_by(match_class, Partner.depth, Partner.xp.desc(), Partner.id).limit(limit)
+
+    rows = (await session.exec(stmt)).all()
+    return [
+        {
+            "id": row.id,
+            "telegram_id": row.telegram_id,
+            "username": row.username,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "photo_url": row.photo_url,
+            "photo_file_id": row.photo_file_id,
+            "xp": row.xp,
+            "is_pro": bool(row.is_pro),
+            "network_level": row.depth - base_depth + 1,
+            "match": ("exact", "prefix", "contains")[row.match_class],
+        }
+        for row in rows
+    ]
 
 async def get_network_growth_metrics(session: AsyncSession, partner_id: int, timeframe: str = '7D') -> dict:
     """
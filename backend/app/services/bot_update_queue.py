@@ -0,0 +1,356 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+import zlib
+from typing import Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.process import after_fork
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+# Update fields that carry a chat (in Telegram's order); callback queries nest it in "message"
+CHAT_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "business_message", "edited_business_message", "message_reaction", "chat_member",
+    "my_chat_member", "chat_join_request", "chat_boost", "removed_chat_boost",
+)
+
+
+def update_chat_key(update: dict) -> int:
+    """
+    Ordering key of a raw update: the chat ID where there is one, else the sender's ID,
+    else the update_id (no ordering needed).
+    """
+    for field in CHAT_FIELDS:
+        payload = update.get(field)
+        if payload:
+            chat = payload.get("chat") or {}
+            if "id" in chat:
+                return int(chat["id"])
+    for payload in update.values():
+        if isinstance(payload, dict):
+            chat = (payload.get("message") or {}).get("chat") or {}
+            if "id" in chat:
+                return int(chat["id"])
+            sender = payload.get("from") or payload.get("user") or {}
+            if "id" in sender:
+                return int(sender["id"])
+    return int(update.get("update_id", 0))
+
+
+class BotUpdateQueue:
+    """
+    Fast-ack webhook intake: the HTTP handler only dedupes by update_id and appends the raw
+    update bytes to one of SHARDS Redis streams (bot:updates:{shard}, sharded by chat), then
+    answers Telegram. A bounded pool of consumers feeds the dispatcher.
+
+    #comment: Per-chat ordering: every shard is leased (SET NX EX) by exactly one consumer
+    across all workers, which processes its entries one at a time and XACKs them afterwards.
+    Consumers register in a cluster-wide heartbeat set, and each one leases up to
+    ceil(SHARDS / live consumers) shards, so the shards spread over every worker's consumers.
+    A consumer reads its shards with one multi-stream XREADGROUP but dispatches each shard
+    in its own task: a slow handler only holds up the chats of its own shard. Leases are
+    given back after LEASE_SLICE seconds, so every shard is served however many workers are
+    running. A new holder XAUTOCLAIMs the entries a crashed one left pending and processes
+    them before anything newer.
+    """
+
+    STREAM_PREFIX = "bot:updates"
+    GROUP = "dispatcher"
+    SEEN_PREFIX = "bot:update:seen"
+    LEASE_PREFIX = "lock:bot:updates"
+    CONSUMERS_KEY = "bot:updates:consumers"  # ZSET consumer -> last heartbeat (unix time)
+    LEASE_TTL = 30
+    LEASE_SLICE = 20  # Seconds a consumer serves its leased shards before re-leasing
+    BLOCK_MS = 2000  # Below the Redis socket timeout
+    READ_COUNT = 10  # Entries read per shard while its backlog is below this
+    BUSY_WAIT = 0.05  # Seconds to wait when every leased shard still has a full backlog
+    IDLE_RETRY = 5  # Seconds between attempts to lease a shard when all are taken
+
+    def __init__(self):
+        self.shards = settings.BOT_UPDATE_SHARDS
+        self._next_shard = random.randrange(self.shards)
+        self.owner = self._new_owner()
+        self._tasks: List[asyncio.Task] = []
+        self._groups_ready = False
+        self.enqueued = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failed = 0
+
+    @staticmethod
+    def _new_owner() -> str:
+        return f"{os.getpid()}:{random.getrandbits(32):08x}"
+
+    def reset_after_fork(self):
+        """Each forked worker leases shards under its own identity and starts its own consumers."""
+        self.owner = self._new_owner()
+        self._next_shard = random.randrange(self.shards)
+        self._tasks = []
+
+    def stream_key(self, shard: int) -> str:
+        return f"{self.STREAM_PREFIX}:{shard}"
+
+    def shard_for(self, chat_key: int) -> int:
+        return zlib.crc32(str(chat_key).encode()) % self.shards
+
+    # ---- Intake (webhook) ----
+
+    async def enqueue(self, raw: bytes) -> bool:
+        """
+        Queues a raw update. False for a duplicate update_id (Telegram redelivery).
+        Raises on malformed JSON or when Redis is unavailable (caller falls back to inline).
+        """
+        update = json.loads(raw)
+        update_id = int(update["update_id"])
+        client = redis_service.raw_client
+
+        if not await client.set(f"{self.SEEN_PREFIX}:{update_id}", b"1", nx=True, ex=settings.BOT_UPDATE_DEDUPE_TTL):
+            self.duplicates += 1
+            return False
+        try:
+            await client.xadd(
+                self.stream_key(self.shard_for(update_chat_key(update))),
+                {"u": raw},
+                maxlen=settings.BOT_UPDATE_STREAM_MAXLEN,
+                approximate=True
+            )
+        except Exception:
+            # Not queued: let a retry (or the inline fallback) through the dedupe
+            await client.delete(f"{self.SEEN_PREFIX}:{update_id}")
+            raise
+        self.enqueued += 1
+        return True
+
+    # ---- Consumer pool ----
+
+    def start(self, bot, dp, workers: Optional[int] = None):
+        workers = min(workers or settings.BOT_UPDATE_WORKERS, self.shards)
+        self._tasks = [asyncio.create_task(self._consumer(bot, dp, i)) for i in range(workers)]
+        logger.info(f"📨 Bot update consumers started: {workers} (shards: {self.shards})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _ensure_groups(self):
+        if self._groups_ready:
+            return
+        client = redis_service.raw_client
+        for shard in range(self.shards):
+            try:
+                await client.xgroup_create(self.stream_key(shard), self.GROUP, id="0", mkstream=True)
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._groups_ready = True
+
+    async def _register(self, consumer: str) -> int:
+        """Heartbeats the consumer in the cluster-wide registry; returns the live consumer count."""
+        now = time.time()
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.CONSUMERS_KEY, {consumer: now})
+            pipe.zremrangebyscore(self.CONSUMERS_KEY, "-inf", now - self.LEASE_TTL)
+            pipe.zcard(self.CONSUMERS_KEY)
+            live = (await pipe.execute())[-1]
+        return max(1, int(live))
+
+    async def _unregister(self, consumer: str):
+        try:
+            await redis_service.client.zrem(self.CONSUMERS_KEY, consumer)
+        except Exception as e:
+            logger.debug(f"Consumer unregister skipped ({consumer}): {e}")
+
+    async def _lease(self, consumer: str, limit: int) -> List[int]:
+        """
+        Leases up to limit free shards, scanning on from where the previous lease stopped
+        (random first start so workers spread out), so rotating consumers reach every shard.
+        """
+        leased = []
+        for i in range(self.shards):
+            shard = (self._next_shard + i) % self.shards
+            if await redis_service.client.set(f"{self.LEASE_PREFIX}:{shard}", consumer, nx=True, ex=self.LEASE_TTL):
+                leased.append(shard)
+                if len(leased) >= limit:
+                    break
+        if leased:
+            self._next_shard = (leased[-1] + 1) % self.shards
+        return leased
+
+    async def _renew(self, shard: int, consumer: str) -> bool:
+        key = f"{self.LEASE_PREFIX}:{shard}"
+        if await redis_service.client.get(key) != consumer:
+            return False
+        await redis_service.client.expire(key, self.LEASE_TTL)
+        return True
+
+    async def _release(self, shards: List[int], consumer: str):
+        for shard in shards:
+            key = f"{self.LEASE_PREFIX}:{shard}"
+            try:
+                if await redis_service.client.get(key) == consumer:
+                    await redis_service.client.delete(key)
+            except Exception as e:
+                logger.debug(f"Shard lease release skipped ({shard}): {e}")
+
+    async def _consumer(self, bot, dp, index: int):
+        consumer = f"{self.owner}:{index}"
+        try:
+            while True:
+                shards: List[int] = []
+                try:
+                    await self._ensure_groups()
+                    live = await self._register(consumer)
+                    shards = await self._lease(consumer, math.ceil(self.shards / live))
+                    if not shards:
+                        await asyncio.sleep(self.IDLE_RETRY)
+                        continue
+                    await self._consume(bot, dp, shards, consumer)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Bot update consumer error: {e}")
+                    # e.g. NOGROUP after a flush: recreate the groups on the next round
+                    self._groups_ready = False
+                    await asyncio.sleep(self.IDLE_RETRY)
+                finally:
+                    await self._release(shards, consumer)
+        finally:
+            await self._unregister(consumer)
+
+    async def _claim_pending(self, shard: int, consumer: str):
+        """Takes over entries another consumer read but never acked (it died holding the lease)."""
+        client = redis_service.raw_client
+        cursor = "0-0"
+        while True:
+            cursor = (await client.xautoclaim(
+                self.stream_key(shard), self.GROUP, consumer, min_idle_time=0, start_id=cursor, count=100
+            ))[0]
+            if cursor in (b"0-0", "0-0"):
+                return
+
+    async def _consume(self, bot, dp, shards: List[int], consumer: str):
+        """
+        Serves the leased shards for one LEASE_SLICE, then returns so they are released and
+        re-leased: leases rotate between consumers instead of sticking to the first holder.
+        One reader feeds a local backlog per shard; each backlog is drained by its own task.
+        """
+        client = redis_service.raw_client
+        for shard in shards:
+            await self._claim_pending(shard, consumer)
+
+        held = set(shards)
+        backlogs: Dict[int, asyncio.Queue] = {shard: asyncio.Queue() for shard in shards}
+        streams = {self.stream_key(shard): shard for shard in shards}
+        # Per-stream cursor: our pending entries first (claimed above, read from after the
+        # last one seen), then ">" for new ones once a shard has none left
+        cursors: Dict[int, str] = {shard: "0" for shard in shards}
+        drains = [
+            asyncio.create_task(self._drain(bot, dp, shard, backlogs[shard], held, consumer))
+            for shard in shards
+        ]
+        # The leases are kept alive independently of handler duration (LLM / chain calls)
+        heartbeat = asyncio.create_task(self._heartbeat(held, consumer))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.LEASE_SLICE
+        try:
+            while held and loop.time() < deadline:
+                ready = [shard for shard in shards if shard in held and backlogs[shard].qsize() < self.READ_COUNT]
+                if not ready:
+                    await asyncio.sleep(self.BUSY_WAIT)
+                    continue
+                history = any(cursors[shard] != ">" for shard in ready)
+                response = await client.xreadgroup(
+                    self.GROUP, consumer, {self.stream_key(shard): cursors[shard] for shard in ready},
+                    count=self.READ_COUNT, block=None if history else self.BLOCK_MS
+                )
+                got = set()
+                for stream, items in response or []:
+                    shard = streams[stream.decode() if isinstance(stream, bytes) else stream]
+                    for entry in items:
+                        backlogs[shard].put_nowait(entry)
+                    if items and cursors[shard] != ">":
+                        last_id = items[-1][0]
+                        cursors[shard] = last_id.decode() if isinstance(last_id, bytes) else last_id
+                        got.add(shard)
+                for shard in ready:
+                    if shard not in got:
+                        cursors[shard] = ">"
+        except asyncio.CancelledError:
+            for task in drains:
+                task.cancel()
+            raise
+        finally:
+            # Each shard is released as soon as its own backlog is done
+            for backlog in backlogs.values():
+                backlog.put_nowait(None)
+            await asyncio.gather(*drains, return_exceptions=True)
+            heartbeat.cancel()
+
+    async def _drain(self, bot, dp, shard: int, backlog: asyncio.Queue, held: Set[int], consumer: str):
+        """Dispatches one shard's entries in order and XACKs each; stops if the lease is lost."""
+        client = redis_service.raw_client
+        stream = self.stream_key(shard)
+        while True:
+            entry = await backlog.get()
+            # Entries left unacked after a lost lease are claimed by the next holder
+            if entry is None or shard not in held:
+                break
+            entry_id, fields = entry
+            # Pending entries trimmed from the stream come back without fields
+            await self._dispatch(bot, dp, (fields or {}).get(b"u"))
+            await client.xack(stream, self.GROUP, entry_id)
+        if shard in held:
+            held.discard(shard)
+            await self._release([shard], consumer)
+
+    async def _heartbeat(self, held: Set[int], consumer: str):
+        """Renews the consumer registration and shard leases every LEASE_TTL / 3; drops lost leases."""
+        while held:
+            await asyncio.sleep(self.LEASE_TTL / 3)
+            try:
+                await self._register(consumer)
+            except Exception as e:
+                logger.warning(f"Consumer registration failed ({consumer}): {e}")
+            for shard in list(held):
+                try:
+                    if not await self._renew(shard, consumer):
+                        logger.warning(f"⚠️ Lost bot update shard lease {shard}")
+                        held.discard(shard)
+                except Exception as e:
+                    logger.warning(f"Shard lease renewal failed ({shard}): {e}")
+
+    async def _dispatch(self, bot, dp, raw: Optional[bytes]):
+        from aiogram import types
+        if not raw:
+            return
+        try:
+            update = types.Update.model_validate_json(raw, context={"bot": bot})
+            await dp.feed_update(bot, update)
+            self.processed += 1
+        except Exception as e:
+            # Same policy as the inline webhook: a failing handler is not redelivered
+            self.failed += 1
+            logger.error(f"❌ Queued update failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "failed": self.failed,
+            "consumers": len(self._tasks),
+        }
+
+
+bot_update_queue = BotUpdateQueue()
+after_fork(bot_update_queue.reset_after_fork)
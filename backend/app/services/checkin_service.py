@@ -0,0 +1,271 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from sqlmodel import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models.partner import Earning, Partner, XPTransaction
+from app.services.redis_service import redis_service
+from app.worker import broker
+
+logger = logging.getLogger(__name__)
+
+# Day 0 of the per-partner bitmaps (bit n = EPOCH + n days, UTC)
+EPOCH = date(2024, 1, 1)
+
+
+def day_index(day: date) -> int:
+    return (day - EPOCH).days
+
+
+def trailing_ones(value: int) -> int:
+    """Number of consecutive 1 bits from the least significant end."""
+    return (value ^ (value + 1)).bit_length() - 1
+
+
+class CheckinReward(BaseModel):
+    """A check-in that earned XP (persisted later by flush_checkin_rewards_task)."""
+    partner_id: int
+    day: int
+    streak: int
+    xp: float
+    milestone: bool
+    checked_in_at: datetime
+
+
+# KEYS: partner bitmap, day bitmap, reward queue. ARGV: day index, partner_id, day TTL, reward.
+# Queues the reward, then sets both bits (a failed LPUSH leaves nothing marked); 0 if the
+# day was already checked in.
+CHECKIN_SCRIPT = """
+if redis.call('GETBIT', KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+redis.call('LPUSH', KEYS[3], ARGV[4])
+redis.call('SETBIT', KEYS[1], ARGV[1], 1)
+redis.call('SETBIT', KEYS[2], ARGV[2], 1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+
+class CheckinEngine:
+    """
+    Daily check-ins on Redis bitmaps:
+      checkin:p:{partner_id}   bit per day since EPOCH (~46 bytes per partner per year)
+      checkin:day:{YYYYMMDD}   bit per partner_id, kept ACTIVE_DAYS for DAU/WAU/MAU
+    A check-in reads today's bit and the last WINDOW days (streak) in one round trip, then
+    one script sets both bits and queues the reward atomically: a day is never marked
+    without its reward, and the previous bit makes it idempotent per day.
+
+    #comment: XP is not written on the request path. Rewards are queued (LPUSH) and persisted
+    in batches to partner / XPTransaction / Earning every minute. The batch UPDATE is guarded
+    by last_checkin_at, so a day is paid at most once even if a batch is replayed.
+    partner.checkin_streak / last_checkin_at stay the durable copy (task requirements read
+    them) and re-seed a partner's bitmap if Redis loses it.
+    """
+
+    PARTNER_PREFIX = "checkin:p"
+    DAY_PREFIX = "checkin:day"
+    REWARD_QUEUE = "checkin:rewards"
+    FLUSH_LOCK = "lock:checkin:flush"
+    WINDOW = 63  # Widest unsigned BITFIELD read
+    ACTIVE_DAYS = 35  # Day bitmaps outlive the 30-day MAU window
+    ACTIVE_CACHE_TTL = 300
+    FLUSH_BATCH = 500
+
+    def partner_key(self, partner_id: int) -> str:
+        return f"{self.PARTNER_PREFIX}:{partner_id}"
+
+    def day_key(self, day: date) -> str:
+        return f"{self.DAY_PREFIX}:{day.strftime('%Y%m%d')}"
+
+    # ---- Check-in ----
+
+    async def check_in(self, partner: Partner, now: Optional[datetime] = None) -> Optional[CheckinReward]:
+        """Records today's check-in. None if the partner already checked in today."""
+        now = now or datetime.utcnow()
+        today = day_index(now.date())
+        key = self.partner_key(partner.id)
+
+        # Paid today by the row-based check-in this engine replaced
+        if partner.last_checkin_at and partner.last_checkin_at.date() >= now.date():
+            return None
+
+        # Streak up to yesterday: the last WINDOW days before today in one read
+        start = max(0, today - self.WINDOW)
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            pipe.getbit(key, today)
+            pipe.execute_command("BITFIELD", key, "GET", f"u{today - start}", start)
+            checked_in, window = await pipe.execute()
+        if checked_in:
+            return None
+
+        before = trailing_ones(window[0])
+        if before == today - start and start > 0:
+            before += await self._streak_before(key, start)
+        elif before == 0:
+            before = await self._reseed(key, partner, now.date())
+
+        streak = before + 1
+        milestone = streak % 7 == 0
+        xp = settings.DAILY_CHECKIN_XP + (settings.STREAK_7DAY_XP_BONUS if milestone else 0)
+        if partner.is_pro:
+            xp *= settings.PRO_XP_MULTIPLIER
+
+        reward = CheckinReward(
+            partner_id=partner.id, day=today, streak=streak, xp=xp, milestone=milestone, checked_in_at=now
+        )
+        # Day bits and reward queue change together or not at all; a concurrent request
+        # that set the bit first wins
+        queued = await redis_service.client.eval(
+            CHECKIN_SCRIPT, 3, key, self.day_key(now.date()), self.REWARD_QUEUE,
+            today, partner.id, self.ACTIVE_DAYS * 86400, reward.model_dump_json()
+        )
+        return reward if queued else None
+
+    async def _streak_before(self, key: str, end: int) -> int:
+        """Consecutive days ending at end - 1, read WINDOW bits at a time."""
+        streak = 0
+        while end > 0:
+            start = max(0, end - self.WINDOW)
+            width = end - start
+            value = (await redis_service.client.execute_command("BITFIELD", key, "GET", f"u{width}", start))[0]
+            ones = trailing_ones(value)
+            streak += ones
+            if ones < width:
+                break
+            end = start
+        return streak
+
+    async def _reseed(self, key: str, partner: Partner, today: date) -> int:
+        """
+        The bitmap has no yesterday bit but the partner row says yesterday continued a streak
+        (first check-in since this engine shipped, or Redis lost the key): writes those days
+        back. Returns the restored streak length.
+        """
+        if not partner.last_checkin_at or partner.last_checkin_at.date() != today - timedelta(days=1):
+            return 0
+        days = min(partner.checkin_streak or 0, day_index(today))
+        if days <= 0:
+            return 0
+        args: List = []
+        offset = day_index(today) - days
+        remaining = days
+        while remaining:
+            width = min(self.WINDOW, remaining)
+            args += ["SET", f"u{width}", offset, (1 << width) - 1]
+            offset += width
+            remaining -= width
+        await redis_service.client.execute_command("BITFIELD", key, *args)
+        return days
+
+    async def streak(self, partner_id: int, today: Optional[date] = None) -> int:
+        """Current streak (today or yesterday must be set), without checking in."""
+        today_index = day_index(today or datetime.utcnow().date())
+        key = self.partner_key(partner_id)
+        current = await self._streak_before(key, today_index + 1)
+        return current or await self._streak_before(key, today_index)
+
+    # ---- Analytics ----
+
+    async def active_counts(self, today: Optional[date] = None) -> Dict[str, int]:
+        """DAU / WAU / MAU: BITCOUNT of today's bitmap and of the BITOP OR of the last 7 / 30."""
+        today = today or datetime.utcnow().date()
+        counts = {"dau": await redis_service.client.bitcount(self.day_key(today))}
+        for label, days in (("wau", 7), ("mau", 30)):
+            dest = f"{self.DAY_PREFIX}:{label}:{today.strftime('%Y%m%d')}"
+            cached = await redis_service.client.get(f"{dest}:count")
+            if cached is not None:
+                counts[label] = int(cached)
+                continue
+            keys = [self.day_key(today - timedelta(days=i)) for i in range(days)]
+            async with redis_service.client.pipeline(transaction=True) as pipe:
+                pipe.bitop("OR", dest, *keys)
+                pipe.bitcount(dest)
+                pipe.delete(dest)
+                _, count, _ = await pipe.execute()
+            await redis_service.client.set(f"{dest}:count", count, ex=self.ACTIVE_CACHE_TTL)
+            counts[label] = count
+        return counts
+
+    # ---- Persistence ----
+
+    async def flush(self, session: AsyncSession) -> Dict[str, int]:
+        """
+        Persists queued rewards, oldest first, one batch per transaction. Entries leave the
+        queue (LTRIM) only after their batch is committed.
+        """
+        stats = {"persisted": 0, "duplicates": 0}
+        if not await redis_service.client.set(self.FLUSH_LOCK, "1", nx=True, ex=55):
+            return stats
+        try:
+            while True:
+                raw = await redis_service.client.lrange(self.REWARD_QUEUE, -self.FLUSH_BATCH, -1)
+                if not raw:
+                    break
+                rewards = [CheckinReward.model_validate_json(item) for item in reversed(raw)]
+                persisted = await self._persist(session, rewards)
+                await session.commit()
+                await redis_service.client.ltrim(self.REWARD_QUEUE, 0, -len(raw) - 1)
+                stats["persisted"] += persisted
+                stats["duplicates"] += len(rewards) - persisted
+                if len(raw) < self.FLUSH_BATCH:
+                    break
+        finally:
+            await redis_service.client.delete(self.FLUSH_LOCK)
+        return stats
+
+    async def _persist(self, session: AsyncSession, rewards: List[CheckinReward]) -> int:
+        persisted = 0
+        for reward in rewards:
+            day_start = datetime.combine(EPOCH + timedelta(days=reward.day), datetime.min.time())
+            row = (await session.execute(
+                text(
+                    "UPDATE partner SET xp = xp + :xp, checkin_streak = :streak, last_checkin_at = :ts "
+                    "WHERE id = :p_id AND (last_checkin_at IS NULL OR last_checkin_at < :day_start) "
+                    "RETURNING id"
+                ),
+                {"xp": reward.xp, "streak": reward.streak, "ts": reward.checked_in_at,
+                 "p_id": reward.partner_id, "day_start": day_start}
+            )).first()
+            if row is None:
+                continue  # Already paid (replayed batch) or partner deleted
+            persisted += 1
+            session.add(XPTransaction(
+                partner_id=reward.partner_id,
+                amount=reward.xp,
+                type="CHECKIN",
+                description=f"Daily Check-in Reward {'(7-Day Streak Bonus Included)' if reward.milestone else ''}".strip(),
+                created_at=reward.checked_in_at
+            ))
+            session.add(Earning(
+                partner_id=reward.partner_id,
+                amount=reward.xp,
+                description=f"Daily Reward {'+ Streak Bonus' if reward.milestone else ''}".strip(),
+                type="DAILY_REWARD",
+                currency="XP",
+                created_at=reward.checked_in_at
+            ))
+        return persisted
+
+
+checkin_engine = CheckinEngine()
+
+@broker.task(task_name="flush_checkin_rewards_task", schedule=[{"cron": "* * * * *"}])
+async def flush_checkin_rewards_task():
+    """
+    Writes queued check-in XP to partner / XPTransaction / Earning in batches.
+    """
+    from app.models.partner import engine
+    try:
+        async with AsyncSession(engine) as session:
+            stats = await checkin_engine.flush(session)
+        if stats["persisted"] or stats["duplicates"]:
+            logger.info(f"📅 Check-in rewards persisted: {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"❌ Check-in reward flush failed: {e}")
+        return None
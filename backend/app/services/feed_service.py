@@ -0,0 +1,152 @@
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.partner import Partner
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+
+class FeedEvent(BaseModel):
+    """
+    One network feed entry, stored as compact JSON. Names are not copied into the event:
+    they are hydrated from the card cache on read, so renames show up everywhere.
+    """
+    t: str  # join | commission
+    a: int  # Actor partner_id (new joiner, buyer)
+    lv: int  # Depth of the actor below the feed owner (1 = direct referral)
+    v: float  # Amount credited to the owner
+    c: str = "XP"  # XP | USDT
+    ts: int  # Unix seconds
+
+    @classmethod
+    def now(cls, kind: str, actor_id: int, level: int, amount: float, currency: str = "XP") -> "FeedEvent":
+        return cls(t=kind, a=actor_id, lv=level, v=round(amount, 6), c=currency, ts=int(time.time()))
+
+
+class Card(BaseModel):
+    """What a feed needs to display a partner (cached per partner, shared by all feeds)."""
+    id: int
+    first_name: Optional[str] = None
+    username: Optional[str] = None
+    photo_file_id: Optional[str] = None
+
+
+class NetworkFeed:
+    """
+    Fan-out-on-write "what happened in my network" feed.
+
+    #comment: The referral and commission paths already walk the (at most 9) ancestors of
+    the acting partner, so they append one event to each ancestor's capped list
+    (LPUSH + LTRIM on the caller's pipeline, after the DB commit). Reading a feed is a single
+    LRANGE plus one MGET of partner cards: O(page) regardless of network size, no joins.
+    """
+
+    FEED_PREFIX = "feed:p"
+    CARD_PREFIX = "card"
+    FEED_MAX = 200  # Events kept per partner
+    FEED_TTL = 86400 * 30  # Feeds of partners whose network went quiet expire
+    CARD_TTL = 3600
+    CARD_FIELDS = (Partner.id, Partner.first_name, Partner.username, Partner.photo_file_id)
+
+    def feed_key(self, partner_id: int) -> str:
+        return f"{self.FEED_PREFIX}:{partner_id}"
+
+    def card_key(self, partner_id: int) -> str:
+        return f"{self.CARD_PREFIX}:{partner_id}"
+
+    # ---- Write ----
+
+    def append_in(self, pipe, owner_id: int, event: FeedEvent):
+        """Queues the append on a caller's pipeline (executed after its DB commit)."""
+        key = self.feed_key(owner_id)
+        pipe.lpush(key, event.model_dump_json())
+        pipe.ltrim(key, 0, self.FEED_MAX - 1)
+        pipe.expire(key, self.FEED_TTL)
+
+    async def publish(self, entries: Iterable[Tuple[int, FeedEvent]]):
+        """Appends (owner_id, event) pairs in one round trip. Best effort: the ledger is the record."""
+        entries = list(entries)
+        if not entries:
+            return
+        try:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                for owner_id, event in entries:
+                    self.append_in(pipe, owner_id, event)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Network feed publish failed ({len(entries)} events): {e}")
+
+    def forget_card_in(self, pipe, partner_id: int):
+        pipe.delete(self.card_key(partner_id))
+
+    # ---- Read ----
+
+    async def read(self, session: AsyncSession, partner_id: int, limit: int = 20, offset: int = 0) -> List[dict]:
+        raw = await redis_service.client.lrange(self.feed_key(partner_id), offset, offset + limit - 1)
+        events = []
+        for item in raw:
+            try:
+                events.append(FeedEvent.model_validate_json(item))
+            except ValueError:
+                continue
+        cards = await self.cards(session, {event.a for event in events})
+
+        feed = []
+        for event in events:
+            card = cards.get(event.a) or {}
+            feed.append({
+                "type": event.t,
+                "level": event.lv,
+                "amount": event.v,
+                "currency": event.c,
+                "partner_id": event.a,
+                "first_name": card.get("first_name"),
+                "username": card.get("username"),
+                "photo_file_id": card.get("photo_file_id"),
+                "timestamp": event.ts,
+            })
+        return feed
+
+    async def cards(self, session: AsyncSession, partner_ids: Iterable[int]) -> Dict[int, dict]:
+        """
+        Display cards (name, username, photo) shared by every feed: one MGET, and one narrow
+        IN query for the misses, which are written back for CARD_TTL.
+        """
+        ids = sorted(set(partner_ids))
+        if not ids:
+            return {}
+        cards: Dict[int, dict] = {}
+        try:
+            cached = await redis_service.client.mget([self.card_key(i) for i in ids])
+        except Exception as e:
+            logger.warning(f"Card cache read failed: {e}")
+            cached = [None] * len(ids)
+
+        missing = []
+        for partner_id, raw in zip(ids, cached):
+            if raw:
+                cards[partner_id] = Card.model_validate_json(raw).model_dump()
+            else:
+                missing.append(partner_id)
+
+        if missing:
+            rows = (await session.exec(select(*self.CARD_FIELDS).where(Partner.id.in_(missing)))).all()
+            fresh = {row.id: Card(id=row.id, first_name=row.first_name, username=row.username, photo_file_id=row.photo_file_id) for row in rows}
+            cards.update({partner_id: card.model_dump() for partner_id, card in fresh.items()})
+            try:
+                async with redis_service.client.pipeline(transaction=False) as pipe:
+                    for partner_id, card in fresh.items():
+                        pipe.set(self.card_key(partner_id), card.model_dump_json(), ex=self.CARD_TTL)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Card cache write failed: {e}")
+        return cards
+
+
+network_feed = NetworkFeed()
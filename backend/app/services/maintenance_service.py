@@ -1,114 +1,259 @@
-
-import logging
 import asyncio
-from typing import Dict, Any, List
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
+
+import numpy as np
 from sqlmodel import select, text
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
+from app.core.config import settings
 from app.models.partner import Partner, engine
+from app.services.redis_service import redis_service
+from app.utils.referral_graph import ReferralGraph
+from app.worker import broker
 
 logger = logging.getLogger(__name__)
 
-async def reconcile_network_stats(session_override: AsyncSession = None) -> Dict[str, Any]:
+# Business Rule: only ancestors within 9 levels see a user in their referral_count
+COUNT_DEPTH = ReferralGraph.MAX_LEVEL
+# Partner IDs whose referrer changed since the last incremental run
+DIRTY_KEY = "network:reconcile:dirty"
+LOCK_KEY = "lock:network_reconcile"
+APPLY_CHUNK = 5000
+FETCH_CHUNK = 5000
+
+async def mark_network_dirty(*partner_ids: int):
+    """
+    Queues partners whose referrer/path was changed outside the normal signup flow.
+    The next incremental reconciliation re-walks their subtrees only.
+    """
+    ids = [int(pid) for pid in partner_ids if pid]
+    if not ids:
+        return
+    try:
+        await redis_service.client.sadd(DIRTY_KEY, *ids)
+    except Exception as e:
+        # The nightly full run still repairs it
+        logger.warning(f"Failed to mark network dirty for {ids}: {e}")
+
+async def reconcile_network_stats(
+    session_override: AsyncSession = None,
+    incremental: bool = False,
+    graph: Optional[ReferralGraph] = None
+) -> Dict[str, Any]:
     """
     Unified high-performance network reconciliation.
     Fixes path, depth, and referral_count across the entire platform.
-    
-    #comment: This replaces slow per-row queries with optimized memory-batch processing.
-    Scale: 1M users in < 5 seconds.
+
+    #comment: Paths come from one topological BFS over the array-backed ReferralGraph
+    and all fixes are applied with a single UPDATE ... FROM a temp table.
+    With incremental=True only the subtrees queued in the Redis dirty-set are re-walked.
+    Callers that already hold a graph freshly loaded from the DB (not a snapshot)
+    pass it in instead of paying for a second load.
     """
     if session_override:
-        return await _do_reconcile(session_override)
-    
+        return await _do_reconcile(session_override, incremental, graph)
+
     async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
     async with async_session() as session:
-        return await _do_reconcile(session)
+        return await _do_reconcile(session, incremental, graph)
+
+async def load_referral_graph(session: AsyncSession = None, max_age: Optional[int] = None) -> ReferralGraph:
+    """
+    Shared ReferralGraph for admin jobs and scripts.
+    With max_age, a snapshot on disk younger than that is reused (instant start);
+    otherwise the graph is loaded from five narrow columns and the snapshot refreshed.
+    """
+    snapshot_path = settings.REFERRAL_GRAPH_SNAPSHOT_PATH
+    if max_age is not None:
+        graph = await asyncio.to_thread(ReferralGraph.load, snapshot_path, max_age)
+        if graph is not None:
+            return graph
+
+    stmt = select(Partner.id, Partner.referrer_id, Partner.created_at, Partner.is_pro, Partner.xp)
+    if session is None:
+        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with async_session() as own_session:
+            rows = (await own_session.exec(stmt)).all()
+    else:
+        rows = (await session.exec(stmt)).all()
+
+    graph = ReferralGraph.from_rows(rows)
+    try:
+        await asyncio.to_thread(graph.save, snapshot_path)
+    except OSError as e:
+        logger.warning(f"Referral graph snapshot not written: {e}")
+    return graph
+
+async def _apply_updates(session: AsyncSession, updates: List[Dict[str, Any]]) -> int:
+    """
+    Stages all fixes in a temp table and applies them with one UPDATE ... FROM
+    (works on PostgreSQL and SQLite >= 3.33). Single transaction.
+    """
+    if not updates:
+        return 0
+    await session.execute(text("DROP TABLE IF EXISTS partner_reconcile"))
+    await session.execute(text(
+        "CREATE TEMPORARY TABLE partner_reconcile "
+        "(id INTEGER PRIMARY KEY, path VARCHAR, depth INTEGER, referral_count INTEGER)"
+    ))
+    for i in range(0, len(updates), APPLY_CHUNK):
+        await session.execute(
+            text("INSERT INTO partner_reconcile (id, path, depth, referral_count) VALUES (:id, :path, :depth, :count)"),
+            updates[i:i + APPLY_CHUNK]
+        )
+    result = await session.execute(text(
+        "UPDATE partner SET path = t.path, depth = t.depth, referral_count = t.referral_count "
+        "FROM partner_reconcile AS t WHERE partner.id = t.id"
+    ))
+    await session.execute(text("DROP TABLE partner_reconcile"))
+    await session.commit()
+    return result.rowcount or 0
+
+def _diff(
+    current: Iterable[Any],
+    graph: ReferralGraph,
+    paths: List[Optional[str]],
+    walked: np.ndarray,
+    counts: Dict[int, int]
+) -> Tuple[List[Dict[str, Any]], int, int]:
+    """Compares stored (id, path, depth, referral_count) rows with the computed values."""
+    depth = graph.depth
+    updates: List[Dict[str, Any]] = []
+    structural = count_fixes = 0
+    for row in current:
+        i = graph.index_of(row.id)
+        if walked[i]:
+            path, node_depth = paths[i], int(depth[i])
+        else:
+            path, node_depth = row.path, row.depth
+        count = counts.get(i, row.referral_count)
+        path_changed = row.path != path or row.depth != node_depth
+        count_changed = row.referral_count != count
+        if path_changed or count_changed:
+            structural += path_changed
+            count_fixes += count_changed
+            updates.append({"id": row.id, "path": path, "depth": node_depth, "count": count})
+    return updates, structural, count_fixes
 
-async def _do_reconcile(session: AsyncSession) -> Dict[str, Any]:
-    logger.info("🔧 Starting High-Performance Network Reconciliation...")
+async def _do_reconcile(
+    session: AsyncSession, incremental: bool = False, graph: Optional[ReferralGraph] = None
+) -> Dict[str, Any]:
+    logger.info(f"🔧 Starting {'Incremental' if incremental else 'Full'} Network Reconciliation...")
     start_time = datetime.utcnow()
-    
-    # 1. Fetch minimum required data for all partners
-    result = await session.exec(select(Partner.id, Partner.referrer_id, Partner.path, Partner.depth, Partner.referral_count, Partner.username))
-    partners = result.all()
-    partner_map = {p.id: {"obj": p, "ref": p.referrer_id, "path": p.path, "depth": p.depth, "count": p.referral_count} for p in partners}
-    
-    path_updates = []
-    count_map = {p.id: 0 for p in partners}
-    
-    # 2. Structural Reconciliation (Path & Depth)
-    for p_id, data in partner_map.items():
-        correct_path = []
-        curr_id = data["ref"]
-        visited = set()
-        
-        while curr_id and curr_id not in visited:
-            visited.add(curr_id)
-            parent = partner_map.get(curr_id)
-            if not parent: break
-            correct_path.insert(0, str(curr_id))
-            curr_id = parent["ref"]
-            
-        final_path = ".".join(correct_path) if correct_path else None
-        final_depth = len(correct_path)
-        
-        if data["path"] != final_path or data["depth"] != final_depth:
-            path_updates.append({"id": p_id, "path": final_path, "depth": final_depth})
-            # Update local map for count calculation
-            data["path"] = final_path
-            data["depth"] = final_depth
-
-        # 3. Accumulate Referral Counts (Memory Optimized)
-        if final_path:
-            anc_ids = [int(x) for x in final_path.split('.') if x.isdigit()]
-            # Business Rule: only ancestors within 9 levels see this user in their count
-            for anc_id in anc_ids[-9:]:
-                if anc_id in count_map:
-                    count_map[anc_id] += 1
-
-    # 4. Batch Commit Structural Changes
-    if path_updates:
-        logger.info(f"💾 Committing {len(path_updates)} structural fixes...")
-        for i in range(0, len(path_updates), 100):
-            batch = path_updates[i:i+100]
-            for upd in batch:
-                await session.execute(
-                    text("UPDATE partner SET path = :p, depth = :d WHERE id = :i"),
-                    {"p": upd["path"], "d": upd["depth"], "i": upd["id"]}
-                )
-            await session.commit()
-
-    # 5. Batch Commit Count Changes
-    diff_counts = []
-    for p_id, real_count in count_map.items():
-        if partner_map[p_id]["count"] != real_count:
-            diff_counts.append({"id": p_id, "count": real_count})
-
-    if diff_counts:
-        logger.info(f"💾 Committing {len(diff_counts)} count reconciliations...")
-        for i in range(0, len(diff_counts), 500):
-            batch = diff_counts[i:i+500]
-            for upd in batch:
-                await session.execute(
-                    text("UPDATE partner SET referral_count = :c WHERE id = :i"),
-                    {"c": upd["count"], "i": upd["id"]}
-                )
-            await session.commit()
+
+    dirty_ids: List[int] = []
+    if incremental:
+        dirty_ids = [int(x) for x in await redis_service.client.smembers(DIRTY_KEY)]
+        if not dirty_ids:
+            return {"status": "noop", "mode": "incremental", "dirty": 0}
+
+    # 1. Array-backed graph (parent vector + CSR children), always fresh from the DB here
+    if graph is None:
+        graph = await load_referral_graph(session)
+    depth = graph.depth
+
+    if not incremental:
+        # 2a. Full: one BFS over the whole tree, counts for every reachable node
+        order = graph.topological_order()
+        unreachable = graph.n - len(order)
+        reachable_counts = graph.descendant_counts(COUNT_DEPTH)
+        counts = {int(i): int(reachable_counts[i]) for i in order}
+        touched = None
+    else:
+        # 2b. Incremental: re-walk only the dirty subtrees, recount only their ancestors
+        old_paths = {
+            row.id: row.path for row in (await session.exec(
+                select(Partner.id, Partner.path).where(Partner.id.in_(dirty_ids))
+            )).all()
+        }
+        roots: List[int] = []
+        count_targets = set()
+        unreachable = 0
+        for pid in dirty_ids:
+            i = graph.index_of(pid)
+            if i is None:
+                continue
+            if depth[i] < 0:
+                unreachable += 1
+                continue
+            roots.append(i)
+            count_targets.update(graph.ancestors(i, limit=COUNT_DEPTH))
+            # Former ancestors lose this subtree from their counts
+            for anc in (old_paths.get(pid) or "").split(".")[-COUNT_DEPTH:]:
+                j = graph.index_of(int(anc)) if anc.isdigit() else None
+                if j is not None:
+                    count_targets.add(j)
+
+        order = graph.subtree(roots)
+        counts = {i: sum(graph.level_counts(i, COUNT_DEPTH)) for i in count_targets}
+        touched = [int(graph.ids[i]) for i in set(order.tolist()) | count_targets]
+
+    paths = graph.build_paths(order)
+    walked = np.zeros(graph.n, dtype=bool)
+    walked[order] = True
+
+    # 3. Diff against stored values (full scan or just the touched rows)
+    cols = (Partner.id, Partner.path, Partner.depth, Partner.referral_count)
+    if touched is None:
+        current = (await session.exec(select(*cols))).all()
+    else:
+        current = []
+        for i in range(0, len(touched), FETCH_CHUNK):
+            current.extend((await session.exec(
+                select(*cols).where(Partner.id.in_(touched[i:i + FETCH_CHUNK]))
+            )).all())
+    updates, structural_fixes, count_fixes = _diff(current, graph, paths, walked, counts)
+
+    # 4. One UPDATE ... FROM temp table
+    if updates:
+        logger.info(f"💾 Applying {len(updates)} reconciliation fixes...")
+    await _apply_updates(session, updates)
+
+    try:
+        if incremental:
+            # Only the processed IDs: anything marked during the run stays queued
+            await redis_service.client.srem(DIRTY_KEY, *dirty_ids)
+        else:
+            await redis_service.client.delete(DIRTY_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to clear network dirty-set: {e}")
 
     duration = (datetime.utcnow() - start_time).total_seconds()
-    
+
     result_data = {
         "status": "success",
+        "mode": "incremental" if incremental else "full",
         "duration_sec": round(duration, 2),
-        "total_partners": len(partners),
-        "structural_fixes": len(path_updates),
-        "count_fixes": len(diff_counts)
+        "total_partners": graph.n,
+        "walked": len(order),
+        "unreachable": unreachable,
+        "structural_fixes": structural_fixes,
+        "count_fixes": count_fixes
     }
+    if unreachable:
+        logger.warning(f"⚠️ {unreachable} partners sit on referrer cycles and were left untouched.")
     logger.info(f"✨ Reconciliation Complete: {result_data}")
     return result_data
 
+@broker.task(task_name="reconcile_network_task", schedule=[{"cron": "*/10 * * * *"}])
+async def reconcile_network_task():
+    """
+    Incremental reconciliation of subtrees touched since the last run.
+    """
+    try:
+        if not await redis_service.client.set(LOCK_KEY, "1", nx=True, ex=600):
+            return None
+        try:
+            return await reconcile_network_stats(incremental=True)
+        finally:
+            await redis_service.client.delete(LOCK_KEY)
+    except Exception as e:
+        logger.error(f"❌ Network reconciliation failed: {e}")
+        return None
+
 async def check_database_health() -> dict:
     """Rapid health check for database performance."""
     async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -116,10 +261,10 @@ async def check_database_health() -> dict:
         start = datetime.utcnow()
         await session.execute(text("SELECT 1"))
         latency_ms = (datetime.utcnow() - start).total_seconds() * 1000
-        
+
         res_orphaned = await session.execute(text("SELECT count(*) FROM partner WHERE referrer_id IS NOT NULL AND path IS NULL"))
         orphaned_count = res_orphaned.scalar() or 0
-        
+
         return {
             "status": "healthy" if orphaned_count == 0 else "degraded",
             "latency_ms": round(latency_ms, 2),
@@ -0,0 +1,330 @@
+import asyncio
+import io
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+# Production path: /app/generated_media (created with proper permissions in Dockerfile)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MEDIA_DIR = os.path.join(BACKEND_DIR, "generated_media")
+MEDIA_URL_PREFIX = "/generated_media"
+
+
+class MediaService:
+    """
+    Lifecycle manager for AI generated media (Viral Studio images).
+    Files live on disk, the index lives in Redis:
+      - media:index            HASH  filename -> "partner_id|size_bytes|created_ts"
+      - media:last_access      ZSET  filename -> last access ts (LRU order)
+      - media:partner:{id}     ZSET  filename -> created ts (per-partner listing & quota)
+      - media:total_bytes      INT   running size of the store
+      - media:staged:{file}    BYTES WebP made by the TaskIQ worker, waiting for the web service
+
+    #comment: Only the web service has the disk /generated_media is served from. Images
+    generated in the TaskIQ worker (async Viral Studio jobs) are staged in Redis and written
+    to disk by the web service when the job result is polled (adopt). Eviction runs in the
+    web service too (eviction_loop), so the index and the served files stay in agreement.
+    """
+
+    INDEX_KEY = "media:index"
+    ACCESS_KEY = "media:last_access"
+    TOTAL_BYTES_KEY = "media:total_bytes"
+    WEBP_QUALITY = 85
+    ACCESS_TOUCH_INTERVAL = 300  # Don't rewrite last-access more than once per 5 min per file
+    STAGE_PREFIX = "media:staged"
+    STAGE_TTL = 86400  # As long as a job's owner key: unpolled results are dropped with it
+    EVICT_LOCK = "lock:media:evict"
+    EVICT_INTERVAL = 3600
+
+    def __init__(self, media_dir: str = MEDIA_DIR):
+        self.media_dir = media_dir
+        # #comment: Per-process throttle for access tracking. Static hits are frequent,
+        # LRU precision of a few minutes is more than enough for eviction.
+        self._last_touch: Dict[str, float] = {}
+
+    @staticmethod
+    def partner_key(partner_id: int) -> str:
+        return f"media:partner:{partner_id}"
+
+    @staticmethod
+    def url_for(filename: str) -> str:
+        return f"{MEDIA_URL_PREFIX}/{filename}"
+
+    def stage_key(self, filename: str) -> str:
+        return f"{self.STAGE_PREFIX}:{filename}"
+
+    @staticmethod
+    def _new_filename(partner_id: int) -> str:
+        return f"viral_{partner_id}_{secrets.token_hex(4)}.webp"
+
+    @staticmethod
+    def _pack(partner_id: int, size: int, created_ts: int) -> str:
+        return f"{partner_id}|{size}|{created_ts}"
+
+    @staticmethod
+    def _unpack(value: str) -> Dict[str, int]:
+        partner_id, size, created_ts = value.split("|")
+        return {"partner_id": int(partner_id), "size": int(size), "created_ts": int(created_ts)}
+
+    @staticmethod
+    def _encode_webp(image: Any, quality: int) -> bytes:
+        """CPU bound: converts a PIL image to WebP bytes."""
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+        return buffer.getvalue()
+
+    async def ingest(self, partner_id: int, image: Any) -> Optional[str]:
+        """
+        Stores a generated PIL image as WebP, registers it in the index and enforces
+        the partner quota. Returns the public URL or None if saving failed.
+        Web service only: see stage() for the TaskIQ worker.
+        """
+        filename = self._new_filename(partner_id)
+        try:
+            # Heavy CPU work (encode) goes to a thread to keep the loop free
+            data = await asyncio.to_thread(self._encode_webp, image, self.WEBP_QUALITY)
+        except Exception as e:
+            logger.error(f"❌ Media ingest failed for partner {partner_id}: {e}")
+            return None
+        return await self._store(partner_id, filename, data)
+
+    async def stage(self, partner_id: int, image: Any) -> Optional[str]:
+        """
+        TaskIQ worker side of ingest(): encodes the image and parks the bytes in Redis for
+        the web service. Returns the URL the file will be served under once adopted.
+        """
+        filename = self._new_filename(partner_id)
+        try:
+            data = await asyncio.to_thread(self._encode_webp, image, self.WEBP_QUALITY)
+            await redis_service.raw_client.set(self.stage_key(filename), data, ex=self.STAGE_TTL)
+        except Exception as e:
+            logger.error(f"❌ Media staging failed for partner {partner_id}: {e}")
+            return None
+        logger.info(f"✅ Media: Staged {filename} ({len(data) // 1024} KB WebP)")
+        return self.url_for(filename)
+
+    async def adopt(self, url: str) -> Optional[str]:
+        """
+        Web service side of stage(): writes a staged image to this service's disk and indexes
+        it. Idempotent (job results are polled repeatedly). None if the image is gone.
+        """
+        filename = os.path.basename(url)
+        path = os.path.join(self.media_dir, filename)
+        try:
+            partner_id = int(filename.split("_")[1])
+        except (IndexError, ValueError):
+            return None
+
+        data = await redis_service.raw_client.get(self.stage_key(filename))
+        if data is None:
+            # Already adopted (or expired unpolled)
+            return self.url_for(filename) if await asyncio.to_thread(os.path.exists, path) else None
+        url = await self._store(partner_id, filename, data)
+        if url:
+            await redis_service.raw_client.delete(self.stage_key(filename))
+        return url
+
+    async def _store(self, partner_id: int, filename: str, data: bytes) -> Optional[str]:
+        path = os.path.join(self.media_dir, filename)
+
+        def write_file():
+            os.makedirs(self.media_dir, exist_ok=True)
+            # Written aside and renamed: the static handler never serves a partial file
+            tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        try:
+            # Disk IO goes to a thread to keep the loop free
+            await asyncio.to_thread(write_file)
+        except Exception as e:
+            logger.error(f"❌ Media ingest failed for partner {partner_id}: {e}")
+            return None
+
+        try:
+            await self._register(partner_id, filename, len(data), int(time.time()))
+            await self.enforce_partner_quota(partner_id)
+        except Exception as e:
+            # The file is on disk, the next rebuild_index() will pick it up
+            logger.warning(f"⚠️ Media index update failed for {filename}: {e}")
+
+        logger.info(f"✅ Media: Stored {filename} ({len(data) // 1024} KB WebP)")
+        return self.url_for(filename)
+
+    async def _register(self, partner_id: int, filename: str, size: int, created_ts: int):
+        # Concurrent adopt() of the same file must not count its bytes twice
+        if not await redis_service.client.hsetnx(self.INDEX_KEY, filename, self._pack(partner_id, size, created_ts)):
+            return
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.ACCESS_KEY, {filename: created_ts})
+            pipe.zadd(self.partner_key(partner_id), {filename: created_ts})
+            pipe.incrby(self.TOTAL_BYTES_KEY, size)
+            await pipe.execute()
+
+    async def list_partner_media(self, partner_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest-first listing of a partner's generations, served from the index only."""
+        entries = await redis_service.client.zrevrange(self.partner_key(partner_id), 0, limit - 1, withscores=True)
+        return [
+            {"url": self.url_for(filename), "filename": filename, "created_at": int(created_ts)}
+            for filename, created_ts in entries
+        ]
+
+    async def touch(self, filename: str):
+        """Records a read of the file for LRU eviction (throttled per process)."""
+        now = time.time()
+        if now - self._last_touch.get(filename, 0) < self.ACCESS_TOUCH_INTERVAL:
+            return
+        self._last_touch[filename] = now
+        if len(self._last_touch) > 10000:
+            self._last_touch.clear()
+        try:
+            # xx=True: never resurrect entries for files that were already evicted
+            await redis_service.client.zadd(self.ACCESS_KEY, {filename: int(now)}, xx=True)
+        except Exception as e:
+            logger.debug(f"Media touch failed for {filename}: {e}")
+
+    async def delete(self, filenames: List[str]) -> int:
+        """Removes files from disk and from every index structure. Returns bytes freed."""
+        if not filenames:
+            return 0
+
+        packed = await redis_service.client.hmget(self.INDEX_KEY, filenames)
+        freed = 0
+
+        def unlink_all():
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(self.media_dir, filename))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not delete media file {filename}: {e}")
+
+        await asyncio.to_thread(unlink_all)
+
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.hdel(self.INDEX_KEY, *filenames)
+            pipe.zrem(self.ACCESS_KEY, *filenames)
+            for filename, value in zip(filenames, packed):
+                if not value:
+                    continue
+                meta = self._unpack(value)
+                freed += meta["size"]
+                pipe.zrem(self.partner_key(meta["partner_id"]), filename)
+            if freed:
+                pipe.decrby(self.TOTAL_BYTES_KEY, freed)
+            await pipe.execute()
+
+        return freed
+
+    async def enforce_partner_quota(self, partner_id: int):
+        """Keeps only the newest MEDIA_PARTNER_QUOTA files of a partner."""
+        quota = settings.MEDIA_PARTNER_QUOTA
+        overflow = await redis_service.client.zrange(self.partner_key(partner_id), 0, -(quota + 1))
+        if overflow:
+            await self.delete(list(overflow))
+            logger.info(f"🧹 Media: Partner {partner_id} over quota, removed {len(overflow)} old files.")
+
+    async def rebuild_index(self) -> int:
+        """
+        Recreates the index from a directory scan. Only needed for files written
+        before the index existed (legacy PNGs) or after a Redis flush.
+        """
+        def scan():
+            found = []
+            if not os.path.isdir(self.media_dir):
+                return found
+            with os.scandir(self.media_dir) as it:
+                for entry in it:
+                    if not entry.is_file() or not entry.name.startswith("viral_"):
+                        continue
+                    try:
+                        partner_id = int(entry.name.split("_")[1])
+                    except (IndexError, ValueError):
+                        continue
+                    stat = entry.stat()
+                    found.append((entry.name, partner_id, stat.st_size, int(stat.st_mtime)))
+            return found
+
+        files = await asyncio.to_thread(scan)
+
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.INDEX_KEY, self.ACCESS_KEY, self.TOTAL_BYTES_KEY)
+            for partner_id in {f[1] for f in files}:
+                pipe.delete(self.partner_key(partner_id))
+            for filename, partner_id, size, created_ts in files:
+                pipe.hset(self.INDEX_KEY, filename, self._pack(partner_id, size, created_ts))
+                pipe.zadd(self.ACCESS_KEY, {filename: created_ts})
+                pipe.zadd(self.partner_key(partner_id), {filename: created_ts})
+            pipe.set(self.TOTAL_BYTES_KEY, sum(f[2] for f in files))
+            await pipe.execute()
+
+        logger.info(f"✅ Media index rebuilt from disk: {len(files)} files.")
+        return len(files)
+
+    async def evict(self) -> Dict[str, int]:
+        """
+        TTL pass: drops files not accessed for MEDIA_TTL_DAYS.
+        LRU pass: if the store is still above MEDIA_STORE_MAX_MB, drops least recently
+        accessed files until it fits.
+        """
+        if not await redis_service.client.exists(self.INDEX_KEY):
+            await self.rebuild_index()
+
+        stats = {"ttl_evicted": 0, "lru_evicted": 0, "bytes_freed": 0}
+        batch_size = 500
+
+        cutoff = int(time.time()) - settings.MEDIA_TTL_DAYS * 86400
+        while True:
+            expired = await redis_service.client.zrangebyscore(self.ACCESS_KEY, "-inf", cutoff, start=0, num=batch_size)
+            if not expired:
+                break
+            stats["bytes_freed"] += await self.delete(list(expired))
+            stats["ttl_evicted"] += len(expired)
+
+        max_bytes = settings.MEDIA_STORE_MAX_MB * 1024 * 1024
+        total = int(await redis_service.client.get(self.TOTAL_BYTES_KEY) or 0)
+        while total > max_bytes:
+            oldest = await redis_service.client.zrange(self.ACCESS_KEY, 0, batch_size - 1)
+            if not oldest:
+                break
+            # Only as many of the least recently used files as it takes to fit
+            victims, excess = [], total - max_bytes
+            for filename, value in zip(oldest, await redis_service.client.hmget(self.INDEX_KEY, list(oldest))):
+                victims.append(filename)
+                excess -= self._unpack(value)["size"] if value else 0
+                if excess <= 0:
+                    break
+            freed = await self.delete(victims)
+            stats["bytes_freed"] += freed
+            stats["lru_evicted"] += len(victims)
+            total -= freed
+
+        return stats
+
+    async def eviction_loop(self):
+        """
+        Hourly TTL/LRU eviction, run by whichever web worker takes the lock: the files live on
+        the web service's disk, so a TaskIQ cron (another container) could not delete them.
+        """
+        while True:
+            try:
+                if await redis_service.client.set(self.EVICT_LOCK, os.getpid(), nx=True, ex=self.EVICT_INTERVAL - 60):
+                    stats = await self.evict()
+                    logger.info(f"🧹 Media eviction complete: {stats}")
+            except Exception as e:
+                logger.error(f"❌ Media eviction failed: {e}")
+            await asyncio.sleep(self.EVICT_INTERVAL)
+
+
+media_service = MediaService()
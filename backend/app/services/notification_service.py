@@ -44,7 +44,23 @@ async def send_telegram_task(chat_id: str | int, text: str, parse_mode: str = "M
         logger.error(f"Worker failed to send notification to {chat_id}: {e}")
         return False
 
+@broker.task(task_name="send_telegram_batch_task")
+async def send_telegram_batch_task(messages: list, parse_mode: str = "Markdown"):
+    """
+    Sends a batch of {"chat_id", "text"} messages from one worker task.
+    Paced below Telegram's ~30 msg/s bot limit so large batches don't get 429s.
+    """
+    sent = 0
+    for i, message in enumerate(messages):
+        if await send_telegram_task(message["chat_id"], message["text"], parse_mode, message.get("buttons")):
+            sent += 1
+        if i % NotificationService.BATCH_RATE == NotificationService.BATCH_RATE - 1:
+            await asyncio.sleep(1)
+    return sent
+
 class NotificationService:
+    BATCH_RATE = 25  # Messages per second for batched sends
+
     async def enqueue_notification(self, chat_id: str | int, text: str, parse_mode: str = "Markdown", buttons: list = None):
         """
         Enqueues a notification with optional inline buttons.
@@ -102,6 +118,24 @@ class NotificationService:
 
 
 
+    async def enqueue_notifications(self, messages: list, parse_mode: str = "Markdown"):
+        """
+        Enqueues many notifications as a single worker task (one broker round-trip).
+        messages: list of {"chat_id", "text", "buttons"?} dicts.
+        """
+        messages = [m for m in messages if m.get("chat_id")]
+        if not messages:
+            return
+
+        try:
+            await send_telegram_batch_task.kiq(messages, parse_mode)
+            logger.info(f"📤 Enqueued notification batch of {len(messages)}")
+        except Exception as e:
+            # #comment: Broker unavailable: fall back to direct per-message dispatch from this process.
+            logger.error(f"Failed to enqueue notification batch ({len(messages)}): {e}")
+            for m in messages:
+                await self.enqueue_notification(m["chat_id"], m["text"], parse_mode, m.get("buttons"))
+
     async def send_level_up_notification(self, chat_id: int, old_level: int, new_level: int, lang: str = "en"):
         """Sends notifications for each level gained."""
         if new_level > old_level:
@@ -0,0 +1,170 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, Request
+from pydantic import BaseModel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.security import get_current_user, get_tg_user
+from app.models.partner import Partner, get_session
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+
+class PartnerIdentity(BaseModel):
+    """
+    The handful of Partner columns most endpoints need to serve a request.
+    is_pro / level are display hints: anything that gates money or PRO features
+    still reads the row itself.
+    """
+    partner_id: int
+    telegram_id: str
+    is_pro: bool = False
+    level: int = 1
+    language_code: Optional[str] = "en"
+    path: Optional[str] = None
+    depth: int = 0
+
+    def to_redis(self) -> Dict[str, str]:
+        return {
+            "partner_id": str(self.partner_id),
+            "is_pro": "1" if self.is_pro else "0",
+            "level": str(self.level),
+            "language_code": self.language_code or "",
+            "path": self.path or "",
+            "depth": str(self.depth),
+        }
+
+    @classmethod
+    def from_redis(cls, telegram_id: str, data: Dict[str, str]) -> "PartnerIdentity":
+        return cls(
+            partner_id=int(data["partner_id"]),
+            telegram_id=telegram_id,
+            is_pro=data.get("is_pro") == "1",
+            level=int(data.get("level") or 1),
+            language_code=data.get("language_code") or None,
+            path=data.get("path") or None,
+            depth=int(data.get("depth") or 0),
+        )
+
+
+class PartnerIdentityResolver:
+    """
+    telegram_id -> PartnerIdentity, resolved in three tiers:
+      1. in-process TTL LRU (LOCAL_TTL, bounded; other workers' copies age out on their own)
+      2. Redis hash partner:identity:{tg_id} (REDIS_TTL, deleted on PRO/level/path changes)
+      3. one narrow select of COLUMNS (never the full ~50-column row)
+    Unknown Telegram IDs are not cached: the partner may register a moment later.
+    """
+
+    LOCAL_SIZE = 20000
+    LOCAL_TTL = 30
+    REDIS_TTL = 600
+    COLUMNS = (
+        Partner.id, Partner.is_pro, Partner.level, Partner.language_code, Partner.path, Partner.depth
+    )
+
+    def __init__(self):
+        self._local: TTLCache = TTLCache(maxsize=self.LOCAL_SIZE, ttl=self.LOCAL_TTL)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(telegram_id: str) -> str:
+        return f"partner:identity:{telegram_id}"
+
+    async def resolve(self, session: AsyncSession, telegram_id: str) -> Optional[PartnerIdentity]:
+        telegram_id = str(telegram_id)
+        with self._lock:
+            identity = self._local.get(telegram_id)
+        if identity is not None:
+            return identity
+
+        try:
+            data = await redis_service.client.hgetall(self.key(telegram_id))
+            if data:
+                identity = PartnerIdentity.from_redis(telegram_id, data)
+        except Exception as e:
+            logger.debug(f"Identity cache read skip for {telegram_id}: {e}")
+
+        if identity is None:
+            row = (await session.exec(
+                select(*self.COLUMNS).where(Partner.telegram_id == telegram_id)
+            )).first()
+            if row is None:
+                return None
+            identity = PartnerIdentity(
+                partner_id=row.id,
+                telegram_id=telegram_id,
+                is_pro=bool(row.is_pro),
+                level=row.level or 1,
+                language_code=row.language_code,
+                path=row.path,
+                depth=row.depth or 0,
+            )
+            try:
+                async with redis_service.client.pipeline(transaction=False) as pipe:
+                    pipe.hset(self.key(telegram_id), mapping=identity.to_redis())
+                    pipe.expire(self.key(telegram_id), self.REDIS_TTL)
+                    await pipe.execute()
+            except Exception as e:
+                logger.debug(f"Identity cache write skip for {telegram_id}: {e}")
+
+        with self._lock:
+            self._local[telegram_id] = identity
+        return identity
+
+    def forget_local(self, *telegram_ids: str):
+        with self._lock:
+            for telegram_id in telegram_ids:
+                self._local.pop(str(telegram_id), None)
+
+    def invalidate_in(self, pipe, *telegram_ids: str):
+        """Queues the Redis deletes on a caller's pipeline (and drops local copies)."""
+        self.forget_local(*telegram_ids)
+        for telegram_id in telegram_ids:
+            pipe.delete(self.key(str(telegram_id)))
+
+    async def invalidate(self, *telegram_ids: str):
+        self.forget_local(*telegram_ids)
+        if not telegram_ids:
+            return
+        try:
+            await redis_service.client.delete(*(self.key(str(t)) for t in telegram_ids))
+        except Exception as e:
+            logger.warning(f"Failed to invalidate partner identity for {telegram_ids}: {e}")
+
+
+partner_identity_resolver = PartnerIdentityResolver()
+
+async def get_partner_identity(
+    request: Request,
+    user_data: dict = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+) -> Optional[PartnerIdentity]:
+    """
+    Request-scoped dependency: resolves the caller once and shares it via request.state
+    (FastAPI also reuses the result for every dependency of the same request).
+    None for guests and for users who have not registered yet.
+    """
+    if hasattr(request.state, "partner_identity"):
+        return request.state.partner_identity
+    identity = None
+    if user_data:
+        tg_id = str(get_tg_user(user_data).get("id"))
+        identity = await partner_identity_resolver.resolve(session, tg_id)
+    request.state.partner_identity = identity
+    return identity
+
+async def require_partner_identity(
+    user_data: dict = Depends(get_current_user),
+    identity: Optional[PartnerIdentity] = Depends(get_partner_identity)
+) -> PartnerIdentity:
+    if not user_data:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if identity is None:
+        raise HTTPException(status_code=404, detail="Partner not found")
+    return identity
@@ -8,21 +8,35 @@ from sqlmodel import select, text
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
+from app.core.process import after_fork
 from app.models.partner import Partner
+from app.services.analytics_service import invalidate_tree_members
 from app.services.leaderboard_service import leaderboard_service
 from app.services.redis_service import redis_service
 from app.worker import broker
 
 import io
-import httpx
-from PIL import Image
+from app.services.telegram_client import telegram_client
 from bot import bot
 
 logger = logging.getLogger(__name__)
 
-# #comment: Global HTTPX client to reuse connections across requests.
+# #comment: Shared HTTPX client to reuse connections across requests.
 # This significantly reduces latency and overhead compared to creating a client per request.
-http_client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_keepalive_connections=50, max_connections=100))
+# Built on first use (get_http_client): not at import, and so inside the worker process that uses it.
+_http_client = None
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_keepalive_connections=50, max_connections=100))
+    return _http_client
+
+@after_fork
+def _forget_http_client():
+    global _http_client
+    _http_client = None
 
 # #comment: In-memory lock map to prevent "dog-pile" effect.
 # When multiple requests come for the SAME file_id that isn't cached yet,
@@ -60,17 +74,19 @@ async def ensure_photo_cached(file_id: str) -> Optional[bytes]:
             # Check secondary cache for URL
             photo_url = await redis_service.get(cache_key_url)
             if not photo_url or photo_url == "EMPTY":
-                # This is a network call to Telegram
-                file = await bot.get_file(file_id)
-                photo_url = f"https://api.telegram.org/file/bot{settings.BOT_TOKEN}/{file.file_path}"
+                # Telegram lookup (cached, negative answers included, by telegram_client)
+                photo_url = await telegram_client.file_url(file_id)
+                if not photo_url:
+                    return None
                 await redis_service.set(cache_key_url, photo_url, expire=7200) # Increased to 2h
 
             # Fetch image content
-            response = await http_client.get(photo_url)
+            response = await get_http_client().get(photo_url)
             if response.status_code == 200:
                 # Heavy CPU blocking task: Resize and Convert
                 # We do this in a threadpool to avoid blocking the event loop
                 def process_image():
+                    from PIL import Image
                     img = Image.open(io.BytesIO(response.content))
                     # Only resize if larger than target
                     if img.width > 128 or img.height > 128:
@@ -157,6 +173,9 @@ async def create_partner(
         session.add(partner)
         await session.commit()
         await session.refresh(partner)
+        # Partners this user invited before being attached now have stale paths
+        from app.services.maintenance_service import mark_network_dirty
+        await mark_network_dirty(partner.id)
         return partner, True # Treat as new for the purpose of referral notifications
 
     path = None
@@ -211,7 +230,7 @@ async def create_partner(
                 for anc_id in anc_ids[-9:]:
                     pipe.delete(f"ref_tree_stats_v2:{anc_id}")
                     if anc_id == referrer.id:
-                        pipe.delete(f"ref_tree_members_v2:{anc_id}:1")
+                        invalidate_tree_members(pipe, anc_id, 1)
                 await pipe.execute()
         except Exception as e:
             logger.error(f"Failed to invalidate referral stats cache: {e}")
@@ -275,9 +294,8 @@ async def sync_profile_photos(bot, session: AsyncSession):
 async def sync_single_photo(bot, session, partner: Partner) -> bool:
     """Helper for parallel photo sync with error handling."""
     try:
-        user_photos = await bot.get_user_profile_photos(partner.telegram_id, limit=1)
-        if user_photos.total_count > 0:
-            new_file_id = user_photos.photos[0][0].file_id
+        new_file_id = await telegram_client.get_profile_photo_file_id(partner.telegram_id)
+        if new_file_id:
             if partner.photo_file_id != new_file_id:
                 partner.photo_file_id = new_file_id
                 session.add(partner)
@@ -290,52 +308,14 @@ async def sync_single_photo(bot, session, partner: Partner) -> bool:
 
 async def migrate_paths(session: AsyncSession):
     """
-    Iterative Queue-based path migration (Non-recursive).
-    Handles large trees efficiently without hitting recursion limits.
+    Rebuilds path/depth (and referral_count) for the whole tree.
+    #comment: Delegates to the network reconciler: one load of the array-backed
+    ReferralGraph and one bulk UPDATE instead of a SELECT per parent.
     """
-    logger.info("🛠 Starting path migration (Iterative BFS)...")
-    
-    # Use a queue for BFS: (parent_id, parent_path, parent_depth)
-    queue = []
-    
-    # Find all root users (no referrer)
-    root_stmt = select(Partner).where(Partner.referrer_id.is_(None))
-    root_res = await session.exec(root_stmt)
-    for root in root_res.all():
-        if root.path is not None or root.depth != 0:
-            root.path = None
-            root.depth = 0
-            session.add(root)
-        queue.append((root.id, "", 0))
-        
-    processed_count = 0
-    while queue:
-        # Process in chunks of 100 for memory efficiency
-        current_batch = queue[:100]
-        queue = queue[100:]
-        
-        for parent_id, parent_path, parent_depth in current_batch:
-            # Find children
-            child_stmt = select(Partner).where(Partner.referrer_id == parent_id)
-            child_res = await session.exec(child_stmt)
-            
-            for child in child_res.all():
-                new_path = f"{parent_path}.{parent_id}".lstrip(".")
-                new_depth = parent_depth + 1
-                
-                if child.path != new_path or child.depth != new_depth:
-                    child.path = new_path
-                    child.depth = new_depth
-                    session.add(child)
-                
-                queue.append((child.id, child.path, child.depth))
-                processed_count += 1
+    from app.services.maintenance_service import reconcile_network_stats
 
-        # Commit periodically
-        if processed_count % 500 == 0:
-            await session.commit()
-            logger.info(f"🛠 Migration progress: {processed_count} partners processed...")
-
-    await session.commit()
-    logger.info(f"✅ Migration complete. Processed {processed_count} partners.")
+    logger.info("🛠 Starting path migration (ReferralGraph BFS)...")
+    result = await reconcile_network_stats(session)
+    logger.info(f"✅ Migration complete. Processed {result['walked']} partners.")
+    return result
 
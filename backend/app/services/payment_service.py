@@ -8,17 +8,16 @@ from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
-from app.models.partner import Partner
+from app.models.partner import Partner, load_pro_profile
 from app.models.transaction import PartnerTransaction
-from app.services.ton_verification_service import ton_verification_service
-from app.services.redis_service import redis_service
-from app.core.http_client import http_client
+from app.services.payment_session_service import payment_session_engine
+from app.services.price_oracle_service import price_oracle
+from app.services.ton_indexer_service import ton_payment_indexer
 import sentry_sdk
 
 logger = logging.getLogger(__name__)
 
 # Constants for Subscription
-TON_API_BASE = "https://tonapi.io/v2"
 NANO_TON = 10**9
 
 class PaymentService:
@@ -57,9 +56,11 @@ class PaymentService:
         TON: 10 minutes.
         USDT/Crypto: 30 minutes.
         """
-        expires_in_minutes = 30 if currency == "USDT" else 10
+        expires_in_minutes = payment_session_engine.ttl_minutes(currency)
         
         if currency == "TON":
+            # #comment: Refuses to quote from an outdated price (StalePriceError) instead of
+            # silently falling back to a hardcoded rate.
             ton_price = await self.get_ton_price()
             # Add 2% buffer for spread/volatility to ensure they pay enough
             amount_crypto = (amount_usd / ton_price) * 1.02
@@ -78,43 +79,35 @@ class PaymentService:
         await session.flush()
         await session.refresh(transaction)
 
+        # #comment: Register the open session in Redis. TON amounts are made unique per
+        # open session so the chain indexer can match a transfer by amount in O(1).
+        reserved = await payment_session_engine.open(transaction, unique_amount=(currency == "TON"))
+        if reserved is not None and currency == "TON":
+            transaction.amount_crypto = reserved
+            amount_crypto = reserved
+            session.add(transaction)
+            await session.flush()
+
         return {
             "transaction_id": transaction.id,
             "amount": round(amount_crypto, 4),
             "currency": currency,
             "network": network,
             "address": settings.ADMIN_TON_ADDRESS if currency == "TON" else settings.ADMIN_USDT_ADDRESS,
+            # #comment: Transfer comment lets the chain indexer match the payment without a hash
+            "comment": ton_payment_indexer.session_comment(transaction.id) if currency == "TON" else None,
             "expires_at": (transaction.created_at + timedelta(minutes=expires_in_minutes)).isoformat()
         }
 
     async def get_ton_price(self) -> float:
-        """Fetches current TON/USD price with caching (1 minute)."""
-        cache_key = "ton_price_usd"
-        try:
-            cached_price = await redis_service.get(cache_key)
-            if cached_price:
-                return float(cached_price)
-        except Exception:
-            pass
-
-        try:
-            client = await http_client.get_client()
-            # #comment: Using TonAPI.io for reliable, high-precision price data.
-            response = await client.get(f"{TON_API_BASE}/rates?tokens=ton&currencies=usd")
-            data = response.json()
-            # Extract price from standardized TonAPI response format
-            price = float(data['rates']['TON']['prices']['USD'])
-            
-            # Cache for 60 seconds
-            try:
-                await redis_service.set(cache_key, str(price), expire=60)
-            except Exception:
-                pass
-                
-            return price
-        except Exception as e:
-            logger.error(f"Error fetching TON price: {e}")
-            return 5.5 # Fallback conservative price if API fails
+        """
+        Current TON/USD price from the price oracle's in-process snapshot.
+        Raises StalePriceError if the price is missing or older than PRICE_MAX_AGE_SECONDS.
+        """
+        if price_oracle.get_quote("TON") is None:
+            # Cold process (snapshot loop hasn't run yet): one-time load
+            await price_oracle.ensure_fresh()
+        return price_oracle.require_fresh_quote("TON").price
             
     async def verify_ton_transaction(
         self,
@@ -139,18 +132,8 @@ class PaymentService:
             logger.info(f"Transaction {tx_hash} already completed.")
             return True
 
-        # 2. Find the most recent pending TON transaction for this partner
-        # A "session" is valid if created within last 10 minutes
-        ten_mins_ago = datetime.utcnow() - timedelta(minutes=10)
-        stmt_session = select(PartnerTransaction).where(
-            PartnerTransaction.partner_id == partner.id,
-            PartnerTransaction.status == "pending",
-            PartnerTransaction.currency == "TON",
-            PartnerTransaction.created_at >= ten_mins_ago
-        ).order_by(PartnerTransaction.created_at.desc())
-
-        res_session = await session.exec(stmt_session)
-        active_session = res_session.first()
+        # 2. Find the open TON session for this partner (valid for 10 minutes)
+        active_session = await payment_session_engine.get_open_session(session, partner.id, "TON")
 
         if not active_session:
             logger.warning(f"No active TON session found for partner {partner.id} in the last 10 minutes.")
@@ -158,39 +141,34 @@ class PaymentService:
 
         # 3. Use the fixed crypto amount stored at session creation
         # This prevents verification failures due to price fluctuations between payment and verification.
-        expected_ton = active_session.amount_crypto or ((active_session.amount / 5.5) * 1.02)
-
-        # 4. Call dedicated verification service with robust validation parameters
-        is_valid = await ton_verification_service.verify_transaction(
-            tx_hash=tx_hash,
-            expected_amount_ton=expected_ton * 0.98, # Allow 2% slippage margin for gas fees/precision
-            expected_address=settings.ADMIN_TON_ADDRESS
+        expected_ton = active_session.amount_crypto
+        if not expected_ton:
+            # Legacy sessions created before amount_crypto existed
+            expected_ton = (active_session.amount / await self.get_ton_price()) * 1.02
+
+        # 4. Local index lookup (filled by the chain indexer). On a miss we run one
+        # incremental indexing pass, which only fetches transactions newer than the cursor.
+        payment = await ton_payment_indexer.find_payment(session, tx_hash)
+        if not payment:
+            try:
+                await ton_payment_indexer.sync()
+            except Exception as e:
+                logger.error(f"TON indexer on-demand sync failed: {e}")
+            payment = await ton_payment_indexer.find_payment(session, tx_hash)
+
+        is_valid = (
+            payment is not None
+            and payment.matched_transaction_id in (None, active_session.id)
+            and ton_payment_indexer.amount_matches(payment.amount_nano, expected_ton)
         )
 
         if is_valid:
-            # Upgrade user to PRO
-            await self.upgrade_to_pro(
-                session=session,
-                partner=partner,
-                amount=active_session.amount,
-                currency="TON",
-                network="TON",
-                tx_hash=tx_hash,
-                transaction_id=active_session.id
-            )
-            
-            # #comment: Service-level audit log (covers Bot & API)
-            from app.services.audit_service import audit_service
-            await audit_service.log_event(
-                session=session,
-                entity_type="transaction",
-                entity_id=tx_hash,
-                action="ton_verification_success",
-                actor_id=str(partner.telegram_id),
-                details={"amount": active_session.amount}
-            )
-            
-            return True
+            # #comment: settle() claims the payment atomically, writes the audit log
+            # and upgrades the partner in one commit (covers Bot & API)
+            if payment.matched_transaction_id == active_session.id:
+                return True
+            if await ton_payment_indexer.settle(session, payment, active_session, actor_id=str(partner.telegram_id)):
+                return True
 
         # If it failed but session is still valid, we keep it pending.
         # If we wanted to cancel it explicitly on failure, we could,
@@ -235,12 +213,13 @@ class PaymentService:
                 partner.pro_expires_at = now + timedelta(days=30)
                 
             partner.is_pro = True
-            if not partner.pro_started_at:
-                partner.pro_started_at = now
-            if not partner.pro_purchased_at:
-                partner.pro_purchased_at = now
+            pro_profile = await load_pro_profile(session, partner)
+            if not pro_profile.pro_started_at:
+                pro_profile.pro_started_at = now
+            if not pro_profile.pro_purchased_at:
+                pro_profile.pro_purchased_at = now
 
-            partner.subscription_plan = "PRO_MONTHLY"
+            pro_profile.subscription_plan = "PRO_MONTHLY"
             session.add(partner)
 
             # 2. Update or Create Transaction
@@ -272,7 +251,7 @@ class PaymentService:
 
             # Update Partner with verification details
             partner.last_transaction_id = transaction.id
-            partner.payment_details = json.dumps({
+            pro_profile.payment_details = json.dumps({
                 "currency": currency,
                 "network": network,
                 "tx_hash": transaction.tx_hash or "MANUAL_CONFIRMATION",
@@ -281,17 +260,30 @@ class PaymentService:
             })
 
             session.add(partner)
+            session.add(pro_profile)
 
             # 3. Distribute Commissions to Ancestors (BEFORE commit for transaction atomicity)
             # #comment: CRITICAL - Commission distribution must happen in the same transaction as the upgrade.
             # If we commit first, then commissions fail, the user gets upgraded but referrers don't get paid.
             # By doing this before commit, we ensure both succeed or both rollback on error.
             from app.services.referral_service import distribute_pro_commissions
-            await distribute_pro_commissions(session, partner.id, amount)
+            feed_events = await distribute_pro_commissions(session, partner.id, amount)
             
             # Commit everything atomically
             await session.commit()
 
+            # Network feed entries only for commissions that were actually committed
+            from app.services.feed_service import network_feed
+            await network_feed.publish(feed_events)
+
+            from app.services.partner_identity_service import partner_identity_resolver
+            from app.services.redis_service import redis_service
+            try:
+                await redis_service.client.delete(f"partner:profile:{partner.telegram_id}")
+            except Exception as e:
+                logger.warning(f"Profile cache invalidation failed for {partner.telegram_id}: {e}")
+            await partner_identity_resolver.invalidate(partner.telegram_id)
+
 
             # 4. Send Visionary & Viral Messages
             from app.core.i18n import get_msg
@@ -0,0 +1,214 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.partner import async_session_maker
+from app.models.transaction import PartnerTransaction
+from app.services.redis_service import redis_service
+from app.worker import broker
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentSessionEngine:
+    """
+    Lifecycle of PRO payment sessions (pending PartnerTransaction rows).
+    Redis keeps the open sessions so matching never scans the table:
+      - payment:open:amounts:{currency}        HASH  amount key -> transaction_id (unique per open session)
+      - payment:open:partner:{pid}:{currency}  STR   transaction_id (expires with the session)
+      - payment:open:expiry                    ZSET  "{currency}|{amount key}|{tid}" -> expires ts
+      - payment:metrics                        HASH  opened / matched / expired counters
+    The DB stays the source of truth; a sweeper bulk-expires stale pending rows.
+    """
+
+    SESSION_TTL_MINUTES = {"TON": 10}
+    DEFAULT_TTL_MINUTES = 30
+    # #comment: Grace period so a transfer sent in the last second of the session
+    # is still indexed and matched before the row expires.
+    EXPIRY_GRACE_MINUTES = 5
+    AMOUNT_STEP = 0.0001  # Smallest amount nudge shown to the user (4 decimals)
+    MAX_AMOUNT_NUDGES = 50
+
+    EXPIRY_KEY = "payment:open:expiry"
+    METRICS_KEY = "payment:metrics"
+
+    @staticmethod
+    def amounts_key(currency: str) -> str:
+        return f"payment:open:amounts:{currency}"
+
+    @staticmethod
+    def partner_key(partner_id: int, currency: str) -> str:
+        return f"payment:open:partner:{partner_id}:{currency}"
+
+    @staticmethod
+    def amount_key(amount: float) -> str:
+        return f"{amount:.4f}"
+
+    @classmethod
+    def ttl_minutes(cls, currency: str) -> int:
+        return cls.SESSION_TTL_MINUTES.get(currency, cls.DEFAULT_TTL_MINUTES)
+
+    async def open(self, transaction: PartnerTransaction, unique_amount: bool = False) -> Optional[float]:
+        """
+        Registers a freshly created session. With unique_amount the expected amount is
+        nudged up by AMOUNT_STEP until no other open session uses it, which makes amount-only
+        matching unambiguous. Returns the reserved amount (or None if Redis is unavailable).
+        """
+        currency = transaction.currency
+        ttl = self.ttl_minutes(currency) * 60
+        expires_ts = int(time.time()) + ttl + self.EXPIRY_GRACE_MINUTES * 60
+        reserved = round(transaction.amount_crypto or transaction.amount, 4)
+
+        try:
+            if unique_amount:
+                for i in range(self.MAX_AMOUNT_NUDGES):
+                    candidate = round(reserved + i * self.AMOUNT_STEP, 4)
+                    if await redis_service.client.hsetnx(self.amounts_key(currency), self.amount_key(candidate), transaction.id):
+                        reserved = candidate
+                        break
+                else:
+                    logger.warning(f"⚠️ No free unique amount near {reserved} {currency}, using it as is.")
+
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                pipe.set(self.partner_key(transaction.partner_id, currency), transaction.id, ex=ttl)
+                pipe.zadd(self.EXPIRY_KEY, {f"{currency}|{self.amount_key(reserved)}|{transaction.id}": expires_ts})
+                pipe.hincrby(self.METRICS_KEY, "opened", 1)
+                await pipe.execute()
+            return reserved
+        except Exception as e:
+            logger.warning(f"⚠️ Payment session {transaction.id} not registered in Redis: {e}")
+            return None
+
+    async def close(self, transaction: PartnerTransaction, outcome: str = "matched"):
+        """Releases the Redis entries of a session that was settled."""
+        currency = transaction.currency
+        amount_key = self.amount_key(round(transaction.amount_crypto or transaction.amount, 4))
+        try:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                pipe.delete(self.partner_key(transaction.partner_id, currency))
+                pipe.zrem(self.EXPIRY_KEY, f"{currency}|{amount_key}|{transaction.id}")
+                pipe.hincrby(self.METRICS_KEY, outcome, 1)
+                await pipe.execute()
+            await self._release_amount(currency, amount_key, transaction.id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release payment session {transaction.id}: {e}")
+
+    async def _release_amount(self, currency: str, amount_key: str, transaction_id: int):
+        # Only drop the amount if it still belongs to this session
+        owner = await redis_service.client.hget(self.amounts_key(currency), amount_key)
+        if owner is not None and int(owner) == int(transaction_id):
+            await redis_service.client.hdel(self.amounts_key(currency), amount_key)
+
+    async def find_by_amount(self, currency: str, amount: float) -> Optional[int]:
+        """O(1) lookup of the open session expecting exactly this amount."""
+        owner = await redis_service.client.hget(self.amounts_key(currency), self.amount_key(amount))
+        return int(owner) if owner is not None else None
+
+    async def get_open_session(
+        self,
+        session: AsyncSession,
+        partner_id: int,
+        currency: str
+    ) -> Optional[PartnerTransaction]:
+        """
+        The partner's currently open session. Redis pointer first; the DB fallback
+        (after a Redis flush) hits the partial index on pending rows.
+        """
+        window_start = datetime.utcnow() - timedelta(minutes=self.ttl_minutes(currency))
+        try:
+            transaction_id = await redis_service.client.get(self.partner_key(partner_id, currency))
+            if transaction_id:
+                transaction = await session.get(PartnerTransaction, int(transaction_id))
+                if transaction and transaction.status == "pending" and transaction.created_at >= window_start:
+                    return transaction
+        except Exception as e:
+            logger.debug(f"Open session pointer skip: {e}")
+
+        stmt = select(PartnerTransaction).where(
+            PartnerTransaction.partner_id == partner_id,
+            PartnerTransaction.status == "pending",
+            PartnerTransaction.currency == currency,
+            PartnerTransaction.created_at >= window_start
+        ).order_by(PartnerTransaction.created_at.desc())
+        return (await session.exec(stmt)).first()
+
+    async def expire_stale(self) -> Dict[str, int]:
+        """
+        Bulk-expires pending rows past TTL + grace (one UPDATE per TTL class)
+        and drops their Redis entries.
+        """
+        now = datetime.utcnow()
+        expired_rows = 0
+
+        async with async_session_maker() as session:
+            for currency, ttl in self.SESSION_TTL_MINUTES.items():
+                result = await session.execute(
+                    update(PartnerTransaction)
+                    .where(
+                        PartnerTransaction.status == "pending",
+                        PartnerTransaction.currency == currency,
+                        PartnerTransaction.created_at < now - timedelta(minutes=ttl + self.EXPIRY_GRACE_MINUTES)
+                    )
+                    .values(status="expired", updated_at=now)
+                )
+                expired_rows += result.rowcount or 0
+
+            result = await session.execute(
+                update(PartnerTransaction)
+                .where(
+                    PartnerTransaction.status == "pending",
+                    PartnerTransaction.currency.not_in(list(self.SESSION_TTL_MINUTES)),
+                    PartnerTransaction.created_at < now - timedelta(minutes=self.DEFAULT_TTL_MINUTES + self.EXPIRY_GRACE_MINUTES)
+                )
+                .values(status="expired", updated_at=now)
+            )
+            expired_rows += result.rowcount or 0
+            await session.commit()
+
+        # Redis side: entries whose expiry passed (settled ones were already removed)
+        released = 0
+        entries = await redis_service.client.zrangebyscore(self.EXPIRY_KEY, "-inf", int(time.time()))
+        for entry in entries:
+            currency, amount_key, transaction_id = entry.split("|")
+            await self._release_amount(currency, amount_key, int(transaction_id))
+            released += 1
+        if entries:
+            await redis_service.client.zrem(self.EXPIRY_KEY, *entries)
+        if expired_rows:
+            await redis_service.client.hincrby(self.METRICS_KEY, "expired", expired_rows)
+
+        return {"expired": expired_rows, "released": released}
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self.METRICS_KEY)
+            pipe.zcard(self.EXPIRY_KEY)
+            counters, open_count = await pipe.execute()
+        return {
+            "open": int(open_count),
+            "opened": int(counters.get("opened", 0)),
+            "matched": int(counters.get("matched", 0)),
+            "expired": int(counters.get("expired", 0)),
+        }
+
+
+payment_session_engine = PaymentSessionEngine()
+
+@broker.task(task_name="expire_payment_sessions_task", schedule=[{"cron": "*/2 * * * *"}])
+async def expire_payment_sessions_task():
+    """
+    Bulk-expires stale PRO payment sessions and releases their reserved amounts.
+    """
+    try:
+        stats = await payment_session_engine.expire_stale()
+        if stats["expired"] or stats["released"]:
+            logger.info(f"🧹 Payment sessions expired: {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"❌ Payment session sweep failed: {e}")
+        return None
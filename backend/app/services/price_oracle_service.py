@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.http_client import http_client
+from app.services.redis_service import redis_service
+from app.worker import broker
+
+logger = logging.getLogger(__name__)
+
+
+class StalePriceError(Exception):
+    """Raised when a quote is requested but the latest price is missing or too old."""
+
+
+class PriceQuote(BaseModel):
+    symbol: str
+    price: float
+    ts: float
+    source: str
+
+    @property
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.ts)
+
+    @property
+    def is_stale(self) -> bool:
+        return self.age_seconds > settings.PRICE_MAX_AGE_SECONDS
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "symbol": self.symbol,
+            "price": self.price,
+            "ts": int(self.ts),
+            "source": self.source,
+            "age_seconds": int(self.age_seconds),
+            "is_stale": self.is_stale,
+        }
+
+
+class PriceSource:
+    """A single upstream for USD prices. Subclasses implement fetch()."""
+
+    name = "base"
+
+    async def fetch(self, symbol: str) -> float:
+        raise NotImplementedError
+
+
+class TonApiSource(PriceSource):
+    name = "tonapi"
+
+    async def fetch(self, symbol: str) -> float:
+        client = await http_client.get_client()
+        response = await client.get(
+            "https://tonapi.io/v2/rates", params={"tokens": symbol.lower(), "currencies": "usd"}, timeout=10.0
+        )
+        response.raise_for_status()
+        return float(response.json()["rates"][symbol.upper()]["prices"]["USD"])
+
+
+class CoinGeckoSource(PriceSource):
+    name = "coingecko"
+    IDS = {"TON": "the-open-network"}
+
+    async def fetch(self, symbol: str) -> float:
+        client = await http_client.get_client()
+        coin_id = self.IDS[symbol.upper()]
+        response = await client.get(
+            "https://api.coingecko.com/api/v3/simple/price",
+            params={"ids": coin_id, "vs_currencies": "usd"},
+            timeout=10.0
+        )
+        response.raise_for_status()
+        return float(response.json()[coin_id]["usd"])
+
+
+class FilePriceSource(PriceSource):
+    """Reads {"TON": 5.42} from a local JSON file (offline development / tests)."""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def fetch(self, symbol: str) -> float:
+        def read():
+            with open(self.path, "r") as f:
+                return json.load(f)
+
+        data = await asyncio.to_thread(read)
+        return float(data[symbol.upper()])
+
+
+class MockPriceSource(PriceSource):
+    name = "mock"
+
+    def __init__(self, prices: Dict[str, float]):
+        self.prices = {k.upper(): float(v) for k, v in prices.items()}
+
+    async def fetch(self, symbol: str) -> float:
+        return self.prices[symbol.upper()]
+
+
+def build_sources() -> List[PriceSource]:
+    """Source chain from PRICE_ORACLE_SOURCES, tried in order until one answers."""
+    sources: List[PriceSource] = []
+    for name in settings.PRICE_ORACLE_SOURCES:
+        if name == "tonapi":
+            sources.append(TonApiSource())
+        elif name == "coingecko":
+            sources.append(CoinGeckoSource())
+        elif name == "file" and settings.PRICE_ORACLE_FILE:
+            sources.append(FilePriceSource(settings.PRICE_ORACLE_FILE))
+        elif name == "mock":
+            sources.append(MockPriceSource({"TON": settings.PRICE_ORACLE_MOCK_TON}))
+        else:
+            logger.warning(f"⚠️ PriceOracle: unknown or unconfigured source '{name}' skipped.")
+    return sources
+
+
+class PriceOracle:
+    """
+    Resilient USD price feed.
+    - Writer (scheduled task): pulls the source chain, stores the latest quote and a rolling history:
+        price:latest             HASH  symbol -> {"price", "ts", "source"}
+        price:history:{symbol}   ZSET  "ts:price" scored by ts (PRICE_HISTORY_HOURS window)
+    - Readers: get_quote() serves an in-process snapshot (no I/O on the request path),
+      kept current by a per-process background loop.
+    """
+
+    LATEST_KEY = "price:latest"
+    LOCK_KEY = "lock:price_oracle_refresh"
+    SYMBOLS = ("TON",)
+    SNAPSHOT_INTERVAL = 15  # Seconds between in-process snapshot reloads from Redis
+
+    def __init__(self, sources: Optional[List[PriceSource]] = None):
+        self._sources = sources
+        self._snapshot: Dict[str, PriceQuote] = {}
+
+    @property
+    def sources(self) -> List[PriceSource]:
+        if self._sources is None:
+            self._sources = build_sources()
+        return self._sources
+
+    @staticmethod
+    def history_key(symbol: str) -> str:
+        return f"price:history:{symbol}"
+
+    async def fetch_price(self, symbol: str) -> Optional[PriceQuote]:
+        """Tries every source in order; first valid (positive) price wins."""
+        for source in self.sources:
+            try:
+                price = await source.fetch(symbol)
+                if price > 0:
+                    return PriceQuote(symbol=symbol, price=price, ts=time.time(), source=source.name)
+                logger.warning(f"⚠️ PriceOracle: {source.name} returned non-positive {symbol} price.")
+            except Exception as e:
+                logger.warning(f"⚠️ PriceOracle: {source.name} failed for {symbol}: {e}")
+        return None
+
+    async def refresh(self) -> Dict[str, Optional[float]]:
+        """Writer side: fetch all symbols, publish latest + append history."""
+        results: Dict[str, Optional[float]] = {}
+        cutoff = time.time() - settings.PRICE_HISTORY_HOURS * 3600
+
+        for symbol in self.SYMBOLS:
+            quote = await self.fetch_price(symbol)
+            results[symbol] = quote.price if quote else None
+            if not quote:
+                logger.error(f"❌ PriceOracle: all sources failed for {symbol}, keeping last known price.")
+                continue
+
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                pipe.hset(self.LATEST_KEY, symbol, json.dumps({"price": quote.price, "ts": quote.ts, "source": quote.source}))
+                pipe.zadd(self.history_key(symbol), {f"{int(quote.ts)}:{quote.price}": quote.ts})
+                pipe.zremrangebyscore(self.history_key(symbol), "-inf", cutoff)
+                await pipe.execute()
+            self._snapshot[symbol] = quote
+
+        return results
+
+    async def load_snapshot(self):
+        """Reader side: copies the latest quotes from Redis into process memory."""
+        raw = await redis_service.client.hgetall(self.LATEST_KEY)
+        for symbol, value in raw.items():
+            data = json.loads(value)
+            current = self._snapshot.get(symbol)
+            if current is None or data["ts"] >= current.ts:
+                self._snapshot[symbol] = PriceQuote(symbol=symbol, price=float(data["price"]), ts=float(data["ts"]), source=data["source"])
+
+    async def ensure_fresh(self):
+        """
+        Refreshes from Redis, and from the sources if Redis is stale too (scheduler down,
+        cold deploy). The Redis lock keeps all workers from hitting the upstream at once.
+        """
+        try:
+            await self.load_snapshot()
+        except Exception as e:
+            logger.warning(f"⚠️ PriceOracle: snapshot load failed: {e}")
+
+        quote = self._snapshot.get("TON")
+        if quote and quote.age_seconds < settings.PRICE_MAX_AGE_SECONDS / 2:
+            return
+        try:
+            if await redis_service.client.set(self.LOCK_KEY, "1", nx=True, ex=30):
+                await self.refresh()
+        except Exception as e:
+            logger.warning(f"⚠️ PriceOracle: fallback refresh failed: {e}")
+
+    async def run_snapshot_loop(self):
+        """Per-process background loop keeping the in-memory snapshot current."""
+        while True:
+            await self.ensure_fresh()
+            await asyncio.sleep(self.SNAPSHOT_INTERVAL)
+
+    def get_quote(self, symbol: str = "TON") -> Optional[PriceQuote]:
+        """Zero-I/O read of the in-process snapshot (may be stale, check is_stale)."""
+        return self._snapshot.get(symbol)
+
+    def require_fresh_quote(self, symbol: str = "TON") -> PriceQuote:
+        """Quote for pricing a payment; refuses missing or outdated prices."""
+        quote = self.get_quote(symbol)
+        if quote is None:
+            raise StalePriceError(f"No {symbol} price available yet")
+        if quote.is_stale:
+            raise StalePriceError(f"{symbol} price is {int(quote.age_seconds)}s old (max {settings.PRICE_MAX_AGE_SECONDS}s)")
+        return quote
+
+    async def get_history(self, symbol: str = "TON", hours: int = 24) -> List[Dict[str, float]]:
+        since = time.time() - hours * 3600
+        entries = await redis_service.client.zrangebyscore(self.history_key(symbol), since, "+inf")
+        history = []
+        for entry in entries:
+            ts, price = entry.split(":", 1)
+            history.append({"ts": int(ts), "price": float(price)})
+        return history
+
+
+price_oracle = PriceOracle()
+
+@broker.task(task_name="refresh_prices_task", schedule=[{"cron": "* * * * *"}])
+async def refresh_prices_task():
+    """
+    Scheduled price refresh from the configured source chain.
+    """
+    try:
+        return await price_oracle.refresh()
+    except Exception as e:
+        logger.error(f"❌ Price refresh failed: {e}")
+        return None
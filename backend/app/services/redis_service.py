@@ -3,6 +3,7 @@ import json
 import redis.asyncio as redis
 
 from app.core.config import settings
+from app.core.process import after_fork
 
 
 import logging
@@ -28,6 +29,11 @@ class RedisService:
         raw_pool_args["decode_responses"] = False
         self.raw_client = redis.from_url(settings.REDIS_URL, **raw_pool_args)
 
+    def reset_pools(self):
+        """Drops inherited connections after a fork; the clients reconnect on first use."""
+        self.client.connection_pool.reset()
+        self.raw_client.connection_pool.reset()
+
     async def get(self, key: str):
         return await self.client.get(key)
 
@@ -116,3 +122,4 @@ class RedisService:
         return data
 
 redis_service = RedisService()
+after_fork(redis_service.reset_pools)
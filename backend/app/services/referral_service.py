@@ -1,7 +1,7 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from sqlmodel import select, text
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -10,8 +10,11 @@ from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from app.core.i18n import get_msg
 from app.models.partner import Partner, XPTransaction, Earning, engine
+from app.services.analytics_service import invalidate_tree_members
+from app.services.feed_service import FeedEvent, network_feed
 from app.services.leaderboard_service import leaderboard_service
 from app.services.notification_service import notification_service
+from app.services.partner_identity_service import partner_identity_resolver
 from app.services.redis_service import redis_service
 from app.services.audit_service import audit_service
 from app.utils.ranking import get_level
@@ -104,8 +107,8 @@ async def process_referral_logic(partner_id: int):
 
             # #comment: Fetch bot info once to avoid repeated network calls inside the loop.
             # This is a critical performance optimization to avoid rate-limiting.
-            from bot import bot
-            bot_info = await bot.get_me()
+            from app.services.telegram_client import telegram_client
+            bot_info = await telegram_client.get_me()
             bot_username = bot_info.username.replace("@", "")
             app_link = f"https://t.me/{bot_username}/app"
 
@@ -184,10 +187,13 @@ async def process_referral_logic(partner_id: int):
                     redis_pipe.delete(f"partner:profile:{referrer.telegram_id}")
                     redis_pipe.delete(f"partner:earnings:{referrer.telegram_id}")
                     redis_pipe.delete(f"ref_tree_stats_v2:{referrer.id}")
-                    # Clear member lists for the affected level
-                    redis_pipe.delete(f"ref_tree_members_v2:{referrer.id}:{level}")
+                    partner_identity_resolver.invalidate_in(redis_pipe, referrer.telegram_id)
+                    # Clear member pages for the affected level
+                    invalidate_tree_members(redis_pipe, referrer.id, level)
                     for tf in ["24H", "7D", "1M", "3M", "6M", "1Y"]:
                         redis_pipe.delete(f"growth_metrics:{referrer.id}:{tf}")
+                    # Network feed: the ancestor sees the join (appended after the commit)
+                    network_feed.append_in(redis_pipe, referrer.id, FeedEvent.now("join", partner.id, level, xp_gain))
 
                     # 5. Build Referral Chain for deeper levels
                     # Chain: You ← Ref A ← Ref B ... ← New User
@@ -239,13 +245,15 @@ async def process_referral_logic(partner_id: int):
         sentry_sdk.capture_exception(e)
         logger.error(f"Error in process_referral_logic: {e}", exc_info=True)
 
-async def distribute_pro_commissions(session: AsyncSession, partner_id: int, total_amount: float):
+async def distribute_pro_commissions(session: AsyncSession, partner_id: int, total_amount: float) -> List[Tuple[int, FeedEvent]]:
     """
     Distributes commissions for PRO subscription purchase across 9 levels.
+    Returns the network feed events for the caller to publish once it has committed.
     """
+    feed_events: List[Tuple[int, FeedEvent]] = []
     partner = await session.get(Partner, partner_id)
     if not partner or not partner.referrer_id:
-        return
+        return feed_events
 
     # Path already includes ancestors, just deduplicate and fetch
     lineage_ids = list(dict.fromkeys([int(x) for x in partner.path.split('.')] if partner.path else []))[-9:]
@@ -261,8 +269,8 @@ async def distribute_pro_commissions(session: AsyncSession, partner_id: int, tot
     )
 
     # #comment: Fetch bot info once to avoid repeated network calls inside the loop.
-    from bot import bot
-    bot_info = await bot.get_me()
+    from app.services.telegram_client import telegram_client
+    bot_info = await telegram_client.get_me()
     bot_username = bot_info.username.replace("@", "")
     app_link = f"https://t.me/{bot_username}/app"
     
@@ -311,6 +319,8 @@ async def distribute_pro_commissions(session: AsyncSession, partner_id: int, tot
                 balance_after=referrer.balance,
             )
 
+            feed_events.append((referrer.id, FeedEvent.now("commission", partner.id, level, commission, "USDT")))
+
             # Batch Redis Invalidation
             async with redis_service.client.pipeline(transaction=True) as pipe:
                 pipe.delete(f"partner:profile:{referrer.telegram_id}")
@@ -340,3 +350,5 @@ async def distribute_pro_commissions(session: AsyncSession, partner_id: int, tot
                 logger.error(f"Failed to notify {referrer.id} about commission: {e}")
 
         current_referrer_id = referrer.referrer_id
+
+    return feed_events
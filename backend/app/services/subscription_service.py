@@ -1,7 +1,9 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlalchemy import update
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -9,10 +11,33 @@ from app.models.partner import Partner
 from app.services.notification_service import notification_service
 from app.worker import broker
 from app.core.config import settings
+from app.core.i18n import get_msg
 
 logger = logging.getLogger(__name__)
 
 class SubscriptionService:
+    """
+    Hourly PRO expiry job, fully set-based:
+      - warning windows (3d / 1d) read only (telegram_id, language_code, pro_expires_at)
+      - expiries are flipped with one UPDATE ... RETURNING
+      - cache invalidation and idempotency markers go through single Redis pipelines
+      - all notifications leave as one batched enqueue
+    """
+
+    WARNING_DAYS = (3, 1)
+    WINDOW = timedelta(hours=1)
+
+    @staticmethod
+    def warning_marker_key(days_left: int, telegram_id: str, expires_at: datetime) -> str:
+        # Keyed by the expiry itself, so a renewal (new expiry date) warns again
+        return f"sub:warned:{days_left}:{telegram_id}:{int(expires_at.timestamp())}"
+
+    @staticmethod
+    def days_label(days_left: int, lang: str) -> str:
+        if lang == "ru":
+            return f"{days_left} {'день' if days_left == 1 else 'дня'}"
+        return f"{days_left} day{'s' if days_left > 1 else ''}"
+
     @broker.task(task_name="check_expiring_subscriptions_task", schedule=[{"cron": "0 * * * *"}])
     async def check_expiring_subscriptions_task(self):
         """
@@ -24,79 +49,103 @@ class SubscriptionService:
         async with AsyncSession(engine) as session:
             await self.check_expiring_subscriptions(session)
 
-    async def check_expiring_subscriptions(self, session: AsyncSession):
+    async def check_expiring_subscriptions(self, session: AsyncSession) -> Dict[str, int]:
         """
-        Finds users whose subscription expires in exactly 3 days or 1 day.
+        Warns users whose subscription expires in 3 days or 1 day and deactivates expired ones.
+        Safe to rerun: warnings are deduplicated by Redis markers, expiries by the UPDATE predicate.
         """
         now = datetime.utcnow()
-
-        # 1. Check for 3-day warning
-        three_days_start = now + timedelta(days=3)
-        three_days_end = three_days_start + timedelta(hours=1)
-
-        stmt_3d = select(Partner).where(
-            Partner.is_pro,
-            Partner.pro_expires_at >= three_days_start,
-            Partner.pro_expires_at < three_days_end
+        messages: List[Dict[str, Any]] = []
+
+        # 1. Warning windows (narrow projection, no ORM rows)
+        candidates: List[Tuple[int, Any]] = []
+        for days_left in self.WARNING_DAYS:
+            window_start = now + timedelta(days=days_left)
+            result = await session.execute(
+                select(Partner.telegram_id, Partner.language_code, Partner.pro_expires_at).where(
+                    Partner.is_pro,
+                    Partner.pro_expires_at >= window_start,
+                    Partner.pro_expires_at < window_start + self.WINDOW
+                )
+            )
+            candidates.extend((days_left, row) for row in result.all())
+
+        if candidates:
+            fresh = await self._claim_warning_markers(candidates)
+            for (days_left, row), is_new in zip(candidates, fresh):
+                if is_new:
+                    messages.append({
+                        "chat_id": int(row.telegram_id),
+                        "text": self.expiration_warning_text(days_left, row.language_code)
+                    })
+
+        # 2. Expiries: one UPDATE, the rows it flipped come back for notification
+        result = await session.execute(
+            update(Partner)
+            .where(Partner.is_pro, Partner.pro_expires_at < now)
+            .values(is_pro=False, updated_at=now)
+            .returning(Partner.telegram_id, Partner.language_code)
         )
-        res_3d = await session.exec(stmt_3d)
-        for partner in res_3d.all():
-            await self.send_expiration_warning(partner, 3)
-
-        # 2. Check for 1-day warning
-        one_day_start = now + timedelta(days=1)
-        one_day_end = one_day_start + timedelta(hours=1)
-
-        stmt_1d = select(Partner).where(
-            Partner.is_pro,
-            Partner.pro_expires_at >= one_day_start,
-            Partner.pro_expires_at < one_day_end
-        )
-        res_1d = await session.exec(stmt_1d)
-        for partner in res_1d.all():
-            await self.send_expiration_warning(partner, 1)
-
-        # 3. Handle actually expired
-        stmt_expired = select(Partner).where(
-            Partner.is_pro,
-            Partner.pro_expires_at < now
-        )
-        res_expired = await session.exec(stmt_expired)
-        for partner in res_expired.all():
-            partner.is_pro = False
-            session.add(partner)
-            
-            # Invalidate Redis Cache to ensure UI reflects the change immediately
-            from app.services.redis_service import redis_service
-            try:
-                await redis_service.client.delete(f"partner:profile:{partner.telegram_id}")
-            except Exception as e:
-                # Log warning as cache invalidation failure might show stale data for a short while
-                logger.warning(f"Failed to invalidate cache for expired user {partner.telegram_id}: {e}")
-            
-            await self.send_expired_notification(partner)
-
+        expired = result.all()
         await session.commit()
 
+        if expired:
+            await self._invalidate_profiles([row.telegram_id for row in expired])
+            messages.extend(
+                {"chat_id": int(row.telegram_id), "text": self.expired_text(row.language_code)}
+                for row in expired
+            )
+
+        # 3. One batched enqueue for everything
+        await notification_service.enqueue_notifications(messages)
+
+        stats = {"warned": len(messages) - len(expired), "expired": len(expired)}
+        if messages:
+            logger.info(f"🕒 Subscription check: {stats}")
+        return stats
+
+    async def _claim_warning_markers(self, candidates: List[Tuple[int, Any]]) -> List[bool]:
+        """SET NX per (window, user, expiry) in one pipeline; True means not warned yet."""
+        from app.services.redis_service import redis_service
+        try:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                for days_left, row in candidates:
+                    pipe.set(
+                        self.warning_marker_key(days_left, row.telegram_id, row.pro_expires_at),
+                        "1", nx=True, ex=days_left * 86400 + 3600
+                    )
+                return [bool(r) for r in await pipe.execute()]
+        except Exception as e:
+            # Without markers a rerun could double-warn, but skipping warnings is worse
+            logger.warning(f"Subscription warning markers unavailable: {e}")
+            return [True] * len(candidates)
+
+    async def _invalidate_profiles(self, telegram_ids: List[str]):
+        from app.services.partner_identity_service import partner_identity_resolver
+        from app.services.redis_service import redis_service
+        try:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                for tg_id in telegram_ids:
+                    pipe.delete(f"partner:profile:{tg_id}")
+                partner_identity_resolver.invalidate_in(pipe, *telegram_ids)
+                await pipe.execute()
+        except Exception as e:
+            # Log warning as cache invalidation failure might show stale data for a short while
+            logger.warning(f"Failed to invalidate cache for {len(telegram_ids)} expired users: {e}")
+
+    def expiration_warning_text(self, days_left: int, lang: Optional[str] = "en") -> str:
+        lang = lang or "en"
+        return get_msg(lang, "pro_expiring", days_label=self.days_label(days_left, lang), price=settings.PRO_PRICE_USD)
+
+    def expired_text(self, lang: Optional[str] = "en") -> str:
+        return get_msg(lang or "en", "pro_expired", price=settings.PRO_PRICE_USD)
+
     async def send_expiration_warning(self, partner: Partner, days_left: int):
-        text = (
-            f"⚠️ *PRO Subscription Notice*\n\n"
-            f"Your PRO membership will expire in *{days_left} day{'s' if days_left > 1 else ''}*.\n\n"
-            f"💰 *Price to Extend:* ${settings.PRO_PRICE_USD}\n\n"
-            f"Extend it now to keep all your premium benefits and affiliate bonuses!\n"
-            f"👉 Use /start and click 'Open App' to go to the Subscription section."
-        )
-        # In a real bot, we'd add an Inline Keyboard with an "Extend" button
-        # For now, we use the notification service which supports Markdown
+        text = self.expiration_warning_text(days_left, partner.language_code)
         await notification_service.enqueue_notification(int(partner.telegram_id), text)
 
     async def send_expired_notification(self, partner: Partner):
-        text = (
-            "❌ *Subscription Expired*\n\n"
-            "Your PRO membership has expired. You have lost access to premium features.\n\n"
-            f"👉 Use /start and click 'Open App' to re-activate your PRO status for ${settings.PRO_PRICE_USD}."
-        )
-        await notification_service.enqueue_notification(int(partner.telegram_id), text)
+        await notification_service.enqueue_notification(int(partner.telegram_id), self.expired_text(partner.language_code))
 
     async def run_checker_task(self):
         """
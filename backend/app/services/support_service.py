@@ -1,18 +1,17 @@
 import os
 import json
+import hashlib
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-
-import gspread
-from google.oauth2.service_account import Credentials
-from openai import AsyncOpenAI
+from typing import List, Dict, Any, AsyncIterator, Optional
 
 from app.core.config import settings
 
 # #comment: Import redis service for caching KB responses
 from app.services.redis_service import redis_service
+from app.services.support_session_store import support_session_store
+from app.utils.kb_search import KBSearchIndex, diff_rows
 from app.worker import broker
 
 logger = logging.getLogger(__name__)
@@ -88,6 +87,8 @@ class SupportAgentService:
     ]
     
     KB_CACHE_KEY = "knowledge_base_cache"
+    KB_INDEX_CACHE_KEY = "knowledge_base_index_v1"  # Serialized BM25 index shared by all workers
+    KB_INVALIDATION_CHANNEL = "knowledge_base:invalidate"  # Pub/Sub: new KB version published
     KB_TTL = 3600  # 1 hour cache
     
     # #comment: Cost tracking constants (Optimized for GPT-4o-Mini)
@@ -95,13 +96,17 @@ class SupportAgentService:
     COST_INPUT_1M = 0.15
     COST_OUTPUT_1M = 0.60
 
+    BUDGET_EXCEEDED_REPLY = (
+        "I want to make sure you get the absolute best handling for this case. "
+        "I'm handing it over to our Care+ Supervisor: https://t.me/pintopayhelp"
+    )
+    ERROR_REPLY = "I apologize, but I'm processing multiple requests. One moment, please."
+
     # #comment: Local Memory Cache for Knowledge Base (Scale bypass for Redis)
     _kb_memory_cache: Optional[Dict[str, Any]] = None
-    _kb_index: Dict[str, List[int]] = {} # Word-to-Record Index
+    _kb_index: Optional[KBSearchIndex] = None # BM25 index over Question + Answer
     _kb_last_refresh: datetime = datetime.min
     KB_MEMORY_TTL = 300  # 5 minutes in-memory TTL
-
-    KB_MEMORY_TTL = 300  # 5 minutes in-memory TTL
     
     # #comment: Fallback Instruction Library (Ensures 5-star service if Sheet is offline)
     FALLBACK_INSTRUCTIONS = {
@@ -159,17 +164,25 @@ class SupportAgentService:
     }
 
     def __init__(self):
-        openai_key = settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
-        if openai_key:
-            self.openai_client = AsyncOpenAI(api_key=openai_key)
-        else:
-            self.openai_client = None
+        # #comment: openai / gspread are imported when first needed (openai_client property,
+        # _get_gs_client), not when the API worker boots.
+        self._openai_client = None
+        if not (settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")):
             logger.warning("SupportService: OpenAI API Key missing.")
 
         self.gs_client = None
         # Initialize Google Sheets (synchronous part)
         self._init_google_sheets_client()
 
+    @property
+    def openai_client(self):
+        if self._openai_client is None:
+            openai_key = settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
+            if openai_key:
+                from openai import AsyncOpenAI
+                self._openai_client = AsyncOpenAI(api_key=openai_key)
+        return self._openai_client
+
     def _init_google_sheets_client(self):
         """Lazy initialization to prevent blocking the event loop at startup."""
         creds_json = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
@@ -185,6 +198,8 @@ class SupportAgentService:
         if creds_json:
             try:
                 # #comment: Synchronous authorize is wrapped in a thread to keep the loop free
+                import gspread
+                from google.oauth2.service_account import Credentials
                 creds_dict = json.loads(creds_json)
                 scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
                 credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
@@ -210,8 +225,8 @@ class SupportAgentService:
             cached_kb = await redis_service.get_json(self.KB_CACHE_KEY)
             
             if cached_kb:
-                # Update memory cache and rebuild index
-                self._build_kb_index(cached_kb)
+                # Update memory cache and reuse the shared index (rebuilt only if missing/stale)
+                await self._load_kb_index(cached_kb)
                 return cached_kb
             
             # 2. Fetch from Google Sheets
@@ -222,39 +237,17 @@ class SupportAgentService:
                 if sheet_id:
                     logger.info("🔄 Refreshing Knowledge Base Cache from Google Sheets...")
                     spreadsheet = await asyncio.to_thread(gs_client.open_by_key, sheet_id)
-                    
-                    # TOV
-                    tov_info = ""
-                    try:
-                        tov_gid = os.getenv("TOV_GID", "0")
-                        tov_sheet = await asyncio.to_thread(spreadsheet.get_worksheet_by_id, int(tov_gid))
-                        if tov_sheet:
-                            tov_records = await asyncio.to_thread(tov_sheet.get_all_records)
-                            tov_info = "\n".join([f"{r.get('Rule', '')}: {r.get('Value', '')}" for r in tov_records])
-                    except Exception as e:
-                        logger.warning(f"Could not load TOV tab: {e}")
-
-                    # KB
-                    kb_records = []
-                    try:
-                        kb_gid = os.getenv("KB_GID", "0")
-                        kb_sheet = await asyncio.to_thread(spreadsheet.get_worksheet_by_id, int(kb_gid))
-                        if kb_sheet:
-                            kb_records = await asyncio.to_thread(kb_sheet.get_all_records)
-                    except Exception as e:
-                        logger.warning(f"Could not load KB tab: {e}")
+                    revision = await self._get_sheet_revision(spreadsheet)
+                    tov_info, kb_records = await self._fetch_kb_sheets(spreadsheet)
                     
                     # Construct Cache Object
-                    kb_data = {
-                        "tov": tov_info,
-                        "qa": kb_records
-                    }
+                    kb_data = self._make_kb_data(tov_info, kb_records, revision)
                     
                     # Save to Cache
                     await redis_service.set_json(self.KB_CACHE_KEY, kb_data, expire=self.KB_TTL)
                     
-                    # #comment: Build In-memory Index for sub-millisecond lookups
-                    self._build_kb_index(kb_data)
+                    # #comment: Build the BM25 index once and publish it for the other workers
+                    await self._load_kb_index(kb_data, force_rebuild=True)
                     
                     logger.info("✅ Knowledge Base Cached and Indexed Successfully.")
                     return kb_data
@@ -263,67 +256,330 @@ class SupportAgentService:
             
         return None
 
-    def _build_kb_index(self, kb_data: Dict[str, Any]):
-        """Builds an inverted index of words to record indices for O(1) keyword lookups."""
-        index = {}
+    async def _fetch_kb_sheets(self, spreadsheet) -> tuple[str, List[Dict[str, Any]]]:
+        """Reads the TOV and KB tabs. Returns (tov_info, kb_records)."""
+        # TOV
+        tov_info = ""
+        try:
+            tov_gid = os.getenv("TOV_GID", "0")
+            tov_sheet = await asyncio.to_thread(spreadsheet.get_worksheet_by_id, int(tov_gid))
+            if tov_sheet:
+                tov_records = await asyncio.to_thread(tov_sheet.get_all_records)
+                tov_info = "\n".join([f"{r.get('Rule', '')}: {r.get('Value', '')}" for r in tov_records])
+        except Exception as e:
+            logger.warning(f"Could not load TOV tab: {e}")
+
+        # KB
+        kb_records = []
+        try:
+            kb_gid = os.getenv("KB_GID", "0")
+            kb_sheet = await asyncio.to_thread(spreadsheet.get_worksheet_by_id, int(kb_gid))
+            if kb_sheet:
+                kb_records = await asyncio.to_thread(kb_sheet.get_all_records)
+        except Exception as e:
+            logger.warning(f"Could not load KB tab: {e}")
+
+        return tov_info, kb_records
+
+    async def _get_sheet_revision(self, spreadsheet) -> Optional[str]:
+        """Drive modifiedTime of the spreadsheet; one cheap metadata call instead of a full read."""
+        try:
+            return await asyncio.to_thread(spreadsheet.get_lastUpdateTime)
+        except Exception as e:
+            logger.warning(f"Could not read KB sheet revision: {e}")
+            return None
+
+    @staticmethod
+    def _row_hash(record: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+    @classmethod
+    def _kb_version(cls, records: List[Dict[str, Any]], row_hashes: Optional[List[str]] = None) -> str:
+        """Content fingerprint used to tell whether a shared index matches the KB."""
+        hashes = row_hashes if row_hashes is not None else [cls._row_hash(r) for r in records]
+        return hashlib.sha1("".join(hashes).encode()).hexdigest()[:16]
+
+    def _make_kb_data(self, tov_info: str, kb_records: List[Dict[str, Any]], revision: Optional[str]) -> Dict[str, Any]:
+        row_hashes = [self._row_hash(r) for r in kb_records]
+        return {
+            "tov": tov_info,
+            "qa": kb_records,
+            "row_hashes": row_hashes,
+            "version": self._kb_version(kb_records, row_hashes),
+            "revision": revision
+        }
+
+    def _build_kb_index(self, kb_data: Dict[str, Any]) -> KBSearchIndex:
+        """Builds the BM25 index locally and swaps it into the memory tier."""
         records = kb_data.get("qa", [])
-        for i, r in enumerate(records):
-            # Focus indexing on Questions for maximum relevance
-            text = str(r.get('Question', '')).lower()
-            words = set(text.split())
-            for word in words:
-                if len(word) > 2: # Skip stop-chars
-                    if word not in index:
-                        index[word] = []
-                    index[word].append(i)
+        version = kb_data.get("version") or self._kb_version(records)
+        index = KBSearchIndex.build(records, kb_version=version)
         self._kb_index = index
         self._kb_memory_cache = kb_data
         self._kb_last_refresh = datetime.utcnow()
+        return index
+
+    async def _load_kb_index(self, kb_data: Dict[str, Any], force_rebuild: bool = False):
+        """
+        Loads the serialized index from Redis when it matches the KB version.
+        #comment: Only the worker that finds it missing/stale builds it; everyone else
+        just deserializes the postings instead of re-tokenizing the whole sheet.
+        """
+        version = kb_data.get("version") or self._kb_version(kb_data.get("qa", []))
+        kb_data["version"] = version
+
+        if not force_rebuild:
+            try:
+                shared = KBSearchIndex.from_dict(await redis_service.get_json(self.KB_INDEX_CACHE_KEY))
+                if shared and shared.kb_version == version:
+                    self._kb_index = shared
+                    self._kb_memory_cache = kb_data
+                    self._kb_last_refresh = datetime.utcnow()
+                    return
+            except Exception as e:
+                logger.warning(f"⚠️ Shared KB index unavailable, rebuilding locally: {e}")
+
+        index = await asyncio.to_thread(self._build_kb_index, kb_data)
+        try:
+            await redis_service.set_json(self.KB_INDEX_CACHE_KEY, index.to_dict(), expire=self.KB_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to publish KB index: {e}")
+
+    async def sync_knowledge_base(self) -> Dict[str, Any]:
+        """
+        Incremental KB refresh from Google Sheets.
+        1. Compares the spreadsheet revision (Drive modifiedTime) with the cached one;
+           unchanged sheets cost a single metadata call and just extend the cache TTL.
+        2. On change, matches rows by stable identity (ID column or Question) and
+           re-indexes only edited, added or removed rows.
+        3. Publishes an invalidation so every worker drops its memory tier at once.
+        """
+        gs_client = await self._get_gs_client()
+        sheet_id = os.getenv("SUPPORT_SPREADSHEET_ID")
+        if not gs_client or not sheet_id:
+            return {"status": "skipped"}
+
+        spreadsheet = await asyncio.to_thread(gs_client.open_by_key, sheet_id)
+        revision = await self._get_sheet_revision(spreadsheet)
+        cached_kb = await redis_service.get_json(self.KB_CACHE_KEY)
+
+        if cached_kb and revision and cached_kb.get("revision") == revision:
+            async with redis_service.client.pipeline(transaction=False) as pipe:
+                pipe.expire(self.KB_CACHE_KEY, self.KB_TTL)
+                pipe.expire(self.KB_INDEX_CACHE_KEY, self.KB_TTL)
+                await pipe.execute()
+            return {"status": "unchanged", "revision": revision}
+
+        tov_info, kb_records = await self._fetch_kb_sheets(spreadsheet)
+        kb_data = self._make_kb_data(tov_info, kb_records, revision)
+
+        if not cached_kb:
+            index = await asyncio.to_thread(KBSearchIndex.build, kb_records, kb_data["version"])
+            removed, added = [], list(range(len(kb_records)))
+        else:
+            old_records = cached_kb.get("qa", [])
+            old_hashes = cached_kb.get("row_hashes") or [self._row_hash(r) for r in old_records]
+            new_hashes = kb_data["row_hashes"]
+            kept, removed, added = diff_rows(old_records, kb_records, old_hashes, new_hashes)
+            reordered = any(old_id != new_id for old_id, new_id in kept.items())
+
+            if not removed and not added and not reordered and cached_kb.get("tov") == tov_info:
+                # Sheet was touched without content changes (formatting, other tabs)
+                cached_kb["revision"] = revision
+                await redis_service.set_json(self.KB_CACHE_KEY, cached_kb, expire=self.KB_TTL)
+                return {"status": "unchanged", "revision": revision}
+
+            index = None
+            try:
+                index = KBSearchIndex.from_dict(await redis_service.get_json(self.KB_INDEX_CACHE_KEY))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load shared KB index for patching: {e}")
+            old_version = cached_kb.get("version") or self._kb_version(old_records, old_hashes)
+            if index is None or index.kb_version != old_version:
+                index = await asyncio.to_thread(KBSearchIndex.build, old_records, old_version)
+            index.apply_changes(old_records, kb_records, kept, removed, added, kb_version=kb_data["version"])
+
+        await redis_service.set_json(self.KB_CACHE_KEY, kb_data, expire=self.KB_TTL)
+        await redis_service.set_json(self.KB_INDEX_CACHE_KEY, index.to_dict(), expire=self.KB_TTL)
+        await redis_service.client.publish(self.KB_INVALIDATION_CHANNEL, kb_data["version"])
 
+        logger.info(f"✅ Knowledge Base synced: {len(added)} rows indexed, {len(removed)} dropped (revision {revision}).")
+        return {"status": "updated", "added_rows": len(added), "removed_rows": len(removed), "version": kb_data["version"]}
+
+    async def listen_for_kb_invalidation(self):
+        """
+        Long-running subscriber (one per process) that refreshes the memory tier as soon
+        as the sync job publishes a new KB version, instead of waiting for KB_MEMORY_TTL.
+        """
+        while True:
+            pubsub = redis_service.client.pubsub()
+            try:
+                await pubsub.subscribe(self.KB_INVALIDATION_CHANNEL)
+                while True:
+                    # #comment: Short polling timeout keeps us under the pool's socket_timeout
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if not message:
+                        continue
+                    version = message.get("data")
+                    if self._kb_index is not None and self._kb_index.kb_version == version:
+                        continue
+                    self._kb_last_refresh = datetime.min
+                    await self._get_cached_kb()
+                    logger.info(f"🔄 KB memory tier refreshed (version {version}).")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ KB invalidation listener error: {e}. Reconnecting in 5s...")
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
 
     async def get_session(self, user_id: str) -> Dict[str, Any]:
-        """Retrieves or creates a support session for a user."""
-        session_key = f"support_session:{user_id}"
-        
+        """Retrieves or creates a support session (metadata, summary and recent window)."""
         try:
-            session = await redis_service.get_json(session_key)
-            if not session:
-                session = {
-                    "user_id": user_id,
-                    "history": [],
-                    "created_at": datetime.utcnow().isoformat(),
-                    "last_activity": datetime.utcnow().isoformat(),
-                    "last_ping": datetime.utcnow().isoformat(),
-                    "status": "active",
-                    "category": None,
-                    "ping_count": 0
-                }
-                await redis_service.set_json(session_key, session, expire=3600)
-            return session
+            return await support_session_store.get_session(user_id)
         except Exception as e:
             logger.error(f"❌ Redis Session Error (get_session): {e}")
             # Fallback to ephemeral session so the user can still chat
-            return {
-                "user_id": user_id,
-                "history": [],
-                "created_at": datetime.utcnow().isoformat(),
-                "last_activity": datetime.utcnow().isoformat(),
-                "last_ping": datetime.utcnow().isoformat(),
-                "status": "active",
-                "category": None,
-                "ping_count": 0
-            }
+            return support_session_store.new_session(user_id)
 
     async def update_session(self, user_id: str, session: Dict[str, Any]):
-        """Updates the session in Redis and refreshes activity timestamp."""
+        """Updates session metadata in Redis and refreshes activity timestamp."""
         try:
-            session_key = f"support_session:{user_id}"
             session["last_activity"] = datetime.utcnow().isoformat()
             session["ping_count"] = 0 # Reset pings on activity
-            await redis_service.set_json(session_key, session, expire=3600)
+            await support_session_store.save_meta(user_id, session)
         except Exception as e:
             logger.error(f"❌ Redis Update Error (update_session): {e}")
 
+    async def _summarize_history(self, previous_summary: str, messages: List[Dict[str, Any]]) -> Optional[tuple[str, float, int]]:
+        """Folds older turns into the rolling session summary. Returns (summary, cost, tokens)."""
+        if not self.openai_client:
+            return None
+
+        transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+        response = await self.openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You maintain a running summary of a customer support chat. Merge the new messages "
+                        "into the existing summary. Keep facts the agent needs later: the user's problem, "
+                        "details they provided (amounts, networks, card type, language), what was already "
+                        "suggested and what is still unresolved. Be concise, no greetings."
+                    )
+                },
+                {"role": "user", "content": f"EXISTING SUMMARY:\n{previous_summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}"}
+            ],
+            temperature=0.2,
+            max_tokens=settings.SUPPORT_SUMMARY_MAX_TOKENS
+        )
+
+        usage = response.usage
+        tokens = usage.total_tokens if usage else 0
+        return response.choices[0].message.content.strip(), self._turn_cost(usage), tokens
+
+    async def _build_turn_messages(
+        self, session: Dict[str, Any], message: str, user_metadata: Dict[str, Any] = None
+    ) -> List[Dict[str, str]]:
+        """Builds the LLM prompt for one turn (KB context, user profile, bounded memory)."""
+        # #comment: Update session with latest user metadata (if provided)
+        if user_metadata:
+            session["user_metadata"] = user_metadata
+        
+        # 1. Search Knowledge Base (FAQ + Google Sheet)
+        kb_context, detected_category = await self._search_knowledge_base(message)
+        
+        # #comment: Update session category if a specific one was found (and not just General)
+        if detected_category and detected_category != "General":
+            session["category"] = detected_category
+        
+        # 2. Build messages for LLM
+        # #comment: Inject Rich User Context into System Prompt
+        user_context_str = "Unknown User"
+        if user_metadata:
+            user_context_str = (
+                f"User: {user_metadata.get('first_name', '')} {user_metadata.get('last_name', '')} "
+                f"(@{user_metadata.get('username', 'N/A')})\n"
+                f"Level: {user_metadata.get('level', 1)}\n"
+                f"Balance: {user_metadata.get('balance', 0.0)} USDT"
+            )
+        
+        # #comment: Add Tactical Recommendation based on user stats
+        tactical_advice = ""
+        if user_metadata:
+            level = user_metadata.get("level", 1)
+            balance = user_metadata.get("balance", 0.0)
+            if level < 5:
+                tactical_advice = f"\n💡 **TACTICAL RECOMMENDATION**: Current level is {level}. Advise the user to invite 5 more partners to unlock Level 5 benefits, which include 2x transaction rewards and priority support."
+            elif balance < 10:
+                tactical_advice = f"\n💡 **TACTICAL RECOMMENDATION**: Liquidity is low ({balance} USDT). Suggest a TRC20 top-up to ensure their Virtual Card remains active for global transactions."
+
+        # #comment: Add Intelligence context for PRO members
+        pro_context = ""
+        if user_metadata and user_metadata.get("is_pro"):
+            pro_context = "--- ELITE USER STATUS ---\nYou are talking to a PRO MEMBER. Focus on high-level strategy, multi-tier growth, and maximize their perceived status. Be even more deferential and helpful."
+
+        system_msg = (
+            f"{self.SYSTEM_PROMPT}\n\n"
+            f"{pro_context}\n"
+            f"--- USER PROFILE ---\n{user_context_str}\n{tactical_advice}\n\n"
+            f"--- KNOWLEDGE BASE ---\n{kb_context}"
+        )
+        
+        # #comment: Bounded memory: rolling summary of older turns + recent window,
+        # both capped by SUPPORT_HISTORY_TOKEN_BUDGET, so prompt size is constant per turn.
+        summary, relevant_history = support_session_store.build_prompt_history(session)
+        if summary:
+            system_msg += f"\n\n--- EARLIER IN THIS CONVERSATION ---\n{summary}"
+
+        messages = [{"role": "system", "content": system_msg}]
+        messages.extend(relevant_history)
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def _turn_cost(self, usage) -> float:
+        if not usage:
+            return 0.0
+        return (usage.prompt_tokens / 1_000_000 * self.COST_INPUT_1M) + \
+               (usage.completion_tokens / 1_000_000 * self.COST_OUTPUT_1M)
+
+    async def _commit_turn(self, user_id: str, session: Dict[str, Any], message: str, answer: str, usage):
+        """Appends the finished turn to the session store and schedules compaction if needed."""
+        cost = self._turn_cost(usage)
+
+        # Append the turn with cost tracking (O(1), history is never rewritten)
+        turn = [
+            {"role": "user", "content": message, "timestamp": datetime.utcnow().isoformat()},
+            {
+                "role": "assistant",
+                "content": answer,
+                "timestamp": datetime.utcnow().isoformat(),
+                "cost": cost
+            }
+        ]
+        meta_updates = {"category": session.get("category"), "user_metadata": session.get("user_metadata")}
+        try:
+            window_len = await support_session_store.append_turn(
+                user_id, turn, cost, usage.total_tokens if usage else 0, meta_updates
+            )
+            if support_session_store.needs_compaction(window_len):
+                asyncio.create_task(support_session_store.compact(user_id, self._summarize_history))
+        except Exception as e:
+            logger.error(f"❌ Redis Update Error (append_turn): {e}")
+
+        import sentry_sdk
+        sentry_sdk.add_breadcrumb(
+            category='support',
+            message="AI response generated successfully",
+            level='info',
+            data={"cost": cost, "tokens": usage.total_tokens if usage else 0}
+        )
+
     async def generate_response(self, user_id: str, message: str, user_metadata: Dict[str, Any] = None) -> str:
         """Generates an AI response based on KB and history."""
         import sentry_sdk
@@ -341,60 +597,12 @@ class SupportAgentService:
 
         try:
             session = await self.get_session(user_id)
-            
-            # #comment: Update session with latest user metadata (if provided)
-            if user_metadata:
-                session["user_metadata"] = user_metadata
-            
-            # 1. Search Knowledge Base (FAQ + Google Sheet)
-            kb_context, detected_category = await self._search_knowledge_base(message)
-            
-            # #comment: Update session category if a specific one was found (and not just General)
-            if detected_category and detected_category != "General":
-                session["category"] = detected_category
-            
-            # 2. Build messages for LLM
-            # #comment: Inject Rich User Context into System Prompt
-            user_context_str = "Unknown User"
-            if user_metadata:
-                user_context_str = (
-                    f"User: {user_metadata.get('first_name', '')} {user_metadata.get('last_name', '')} "
-                    f"(@{user_metadata.get('username', 'N/A')})\n"
-                    f"Level: {user_metadata.get('level', 1)}\n"
-                    f"Balance: {user_metadata.get('balance', 0.0)} USDT"
-                )
-            
-            # #comment: Add Tactical Recommendation based on user stats
-            tactical_advice = ""
-            if user_metadata:
-                level = user_metadata.get("level", 1)
-                balance = user_metadata.get("balance", 0.0)
-                if level < 5:
-                    tactical_advice = f"\n💡 **TACTICAL RECOMMENDATION**: Current level is {level}. Advise the user to invite 5 more partners to unlock Level 5 benefits, which include 2x transaction rewards and priority support."
-                elif balance < 10:
-                    tactical_advice = f"\n💡 **TACTICAL RECOMMENDATION**: Liquidity is low ({balance} USDT). Suggest a TRC20 top-up to ensure their Virtual Card remains active for global transactions."
-
-            # #comment: Add Intelligence context for PRO members
-            pro_context = ""
-            if user_metadata and user_metadata.get("is_pro"):
-                pro_context = "--- ELITE USER STATUS ---\nYou are talking to a PRO MEMBER. Focus on high-level strategy, multi-tier growth, and maximize their perceived status. Be even more deferential and helpful."
-
-            system_msg = (
-                f"{self.SYSTEM_PROMPT}\n\n"
-                f"{pro_context}\n"
-                f"--- USER PROFILE ---\n{user_context_str}\n{tactical_advice}\n\n"
-                f"--- KNOWLEDGE BASE ---\n{kb_context}"
-            )
-            
-            messages = [{"role": "system", "content": system_msg}]
-            
-            # History window (last 10 messages)
-            relevant_history = session.get("history", [])[-10:]
-            for m in relevant_history:
-                # Filter out metadata from history messages for LLM
-                messages.append({"role": m["role"], "content": m["content"]})
-                
-            messages.append({"role": "user", "content": message})
+
+            # #comment: Per-session token budget. Runaway chats go to a human instead of burning tokens.
+            if session.get("tokens_used", 0) >= settings.SUPPORT_SESSION_TOKEN_BUDGET:
+                return self.BUDGET_EXCEEDED_REPLY
+
+            messages = await self._build_turn_messages(session, message, user_metadata)
 
             response = await self.openai_client.chat.completions.create(
                 # #comment: Switched to gpt-4o-mini for hyper-speed and efficiency
@@ -404,44 +612,73 @@ class SupportAgentService:
                 max_tokens=500
             )
             answer = response.choices[0].message.content
-            
-            # #comment: Calculate cost for this turn
-            usage = response.usage
-            cost = 0.0
-            if usage:
-                cost = (usage.prompt_tokens / 1_000_000 * self.COST_INPUT_1M) + \
-                       (usage.completion_tokens / 1_000_000 * self.COST_OUTPUT_1M)
-
-            # Update local history with cost tracking
-            session["history"].append({"role": "user", "content": message, "timestamp": datetime.utcnow().isoformat()})
-            session["history"].append({
-                "role": "assistant", 
-                "content": answer, 
-                "timestamp": datetime.utcnow().isoformat(),
-                "cost": cost
-            })
-            
-            # Accumulate total session cost
-            session["total_cost"] = session.get("total_cost", 0.0) + cost
-            
-            # Trim history to prevent memory bloat (keep last 50 messages = 25 turns)
-            if len(session["history"]) > 50:
-                session["history"] = session["history"][-50:]
-                
-            await self.update_session(user_id, session)
-
-            sentry_sdk.add_breadcrumb(
-                category='support',
-                message="AI response generated successfully",
-                level='info',
-                data={"cost": cost, "tokens": usage.total_tokens if usage else 0}
-            )
 
+            await self._commit_turn(user_id, session, message, answer, response.usage)
             return answer
         except Exception as e:
             sentry_sdk.capture_exception(e)
             logger.error(f"❌ Error generating AI response: {e}")
-            return "I apologize, but I'm processing multiple requests. One moment, please."
+            return self.ERROR_REPLY
+
+    async def stream_response(
+        self, user_id: str, message: str, user_metadata: Dict[str, Any] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_response. Yields the accumulated answer text as tokens
+        arrive; the turn is committed to the session store once the stream completes.
+        """
+        import sentry_sdk
+
+        if not self.openai_client:
+            yield "Support service is currently unavailable. Please try again later."
+            return
+
+        sentry_sdk.add_breadcrumb(
+            category='support',
+            message=f"Streaming response for user {user_id}",
+            level='info',
+            data={"user_message": message, "metadata": user_metadata}
+        )
+
+        answer = ""
+        try:
+            session = await self.get_session(user_id)
+
+            if session.get("tokens_used", 0) >= settings.SUPPORT_SESSION_TOKEN_BUDGET:
+                yield self.BUDGET_EXCEEDED_REPLY
+                return
+
+            messages = await self._build_turn_messages(session, message, user_metadata)
+
+            stream = await self.openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.6,
+                max_tokens=500,
+                stream=True,
+                # #comment: Usage arrives in the final chunk, keeps cost tracking exact
+                stream_options={"include_usage": True}
+            )
+
+            usage = None
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    answer += delta
+                    yield answer
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            logger.error(f"❌ Error streaming AI response: {e}")
+            if not answer:
+                yield self.ERROR_REPLY
+            return
+
+        if answer:
+            await self._commit_turn(user_id, session, message, answer, usage)
 
 
     async def _search_knowledge_base(self, query: str) -> tuple[str, str]:
@@ -479,32 +716,16 @@ class SupportAgentService:
             records = kb_data.get("qa", [])
             
             if records:
-                # #comment: Advanced Inverted Index Search.
-                # Instead of scanning ALL records, we only look at records containing our query words.
-                # This makes the search complexity O(query_words) instead of O(total_records).
-                query_words = [w for w in query.lower().split() if len(w) > 2]
-                
+                # #comment: BM25F search over Question + Answer with en/ru stemming.
+                # Scores weigh rare terms higher and only touch postings of the query terms.
                 # If index is missing (e.g. cold start), build it
-                if not self._kb_index:
+                if self._kb_index is None or self._kb_index.n_docs != len(records):
                     self._build_kb_index(kb_data)
 
-                candidate_indices = set()
-                for word in query_words:
-                    if word in self._kb_index:
-                        candidate_indices.update(self._kb_index[word])
-                
-                scored_matches = []
-                # Only score the candidate records (massive speedup for large KB)
-                for idx in candidate_indices:
+                top_matches = []
+                for score, idx in self._kb_index.search(query, top_k=3):
                     r = records[idx]
-                    q_text_set = set(str(r.get('Question', '')).lower().split())
-                    overlap = len(set(query_words).intersection(q_text_set))
-                    if overlap > 0:
-                        scored_matches.append((overlap, f"Q: {r.get('Question')}\nA: {r.get('Answer')}", r.get('Category', 'General')))
-                
-                # Sort and take top 3
-                scored_matches.sort(key=lambda x: x[0], reverse=True)
-                top_matches = scored_matches[:3]
+                    top_matches.append((score, f"Q: {r.get('Question')}\nA: {r.get('Answer')}", r.get('Category', 'General')))
                 matches = [m[1] for m in top_matches]
                 
                 if top_matches:
@@ -539,9 +760,11 @@ class SupportAgentService:
         
 
 
-    async def save_conversation_to_sheets(self, user_id: str):
+    async def save_conversation_to_sheets(self, user_id: str, session: Optional[Dict[str, Any]] = None):
         """Saves the entire session history to the specific History tab (GID) in a structured block format."""
-        session = await self.get_session(user_id)
+        if session is None:
+            session = await self.get_session(user_id)
+            session["history"] = await support_session_store.get_transcript(user_id)
         if not session.get("history"):
             return
 
@@ -613,12 +836,16 @@ class SupportAgentService:
 
     async def close_session(self, user_id: str):
         """Finalizes and removes session."""
-        # #comment: Non-blocking Background Archiving.
+        # #comment: Snapshot the transcript before deleting, then archive in the background.
         # User session closes instantly; Google Sheets work happens in parallel.
-        asyncio.create_task(self.save_conversation_to_sheets(user_id))
-        
-        session_key = f"support_session:{user_id}"
-        await redis_service.delete(session_key)
+        try:
+            session = await support_session_store.get_session(user_id)
+            session["history"] = await support_session_store.get_transcript(user_id)
+            asyncio.create_task(self.save_conversation_to_sheets(user_id, session))
+        except Exception as e:
+            logger.error(f"❌ Could not snapshot support session {user_id}: {e}")
+
+        await support_session_store.delete(user_id)
         logger.info(f"🏁 Support session for {user_id} salvaged to background tasks.")
 
     @broker.task(task_name="cleanup_stale_support_sessions", schedule=[{"cron": "*/5 * * * *"}])
@@ -629,34 +856,16 @@ class SupportAgentService:
         """
         logger.info("🧹 Starting cleanup of stale support sessions...")
         try:
-            # 1. Find all session keys
-            keys = await redis_service.client.keys("support_session:*")
-            if not keys:
-                return
-
-            now = datetime.utcnow()
+            # #comment: Activity ZSET lookup instead of KEYS support_session:* (O(log N + M))
+            stale_ids = await support_session_store.stale_sessions(idle_seconds=300)
             closed_count = 0
-            
-            for key in keys:
+
+            for user_id in stale_ids:
                 try:
-                    session = await redis_service.get_json(key)
-                    if not session:
-                        continue
-                    
-                    last_activity_str = session.get("last_activity")
-                    if not last_activity_str:
-                        continue
-                    
-                    last_activity = datetime.fromisoformat(last_activity_str)
-                    
-                    # If inactive for more than 5 minutes
-                    if (now - last_activity).total_seconds() > 300:
-                        user_id = session.get("user_id")
-                        if user_id:
-                            await self.close_session(user_id)
-                            closed_count += 1
+                    await self.close_session(user_id)
+                    closed_count += 1
                 except Exception as e:
-                    logger.error(f"Error processing key {key} during cleanup: {e}")
+                    logger.error(f"Error closing session {user_id} during cleanup: {e}")
             
             if closed_count > 0:
                 logger.info(f"✅ Cleanup complete. Closed {closed_count} stale sessions.")
@@ -665,3 +874,14 @@ class SupportAgentService:
 
 # Singleton Instance
 support_service = SupportAgentService()
+
+@broker.task(task_name="sync_knowledge_base_task", schedule=[{"cron": "*/5 * * * *"}])
+async def sync_knowledge_base_task():
+    """
+    Incremental KB refresh from Google Sheets (no-op when the sheet revision is unchanged).
+    """
+    try:
+        return await support_service.sync_knowledge_base()
+    except Exception as e:
+        logger.error(f"❌ Knowledge Base sync failed: {e}")
+        return {"status": "failed"}
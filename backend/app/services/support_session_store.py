@@ -0,0 +1,248 @@
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 chars per token + per-message overhead).
+    Good enough for budgeting without shipping a tokenizer to every worker.
+    """
+    return len(text or "") // 4 + 4
+
+
+class SupportSessionStore:
+    """
+    Redis-backed memory for AI support sessions. Per-turn cost stays constant
+    however long the chat runs:
+      - support_session:{id}             HASH  metadata, rolling summary, cost & token counters
+      - support_session:{id}:window      LIST  recent messages sent verbatim to the LLM
+      - support_session:{id}:transcript  LIST  capped full log, only read when archiving to Sheets
+      - support_sessions:activity        ZSET  user_id -> last activity ts (stale session sweep)
+    Once the window grows past SUPPORT_HISTORY_WINDOW + COMPACT_BATCH messages, the oldest
+    ones are folded into the summary by a background compaction.
+    """
+
+    ACTIVITY_KEY = "support_sessions:activity"
+    SESSION_TTL = 3600
+    COMPACT_BATCH = 6  # Fold 3 turns at a time instead of summarizing on every message
+    WINDOW_HARD_CAP = 40  # Safety net if compaction keeps failing (e.g. LLM outage)
+    TRANSCRIPT_MAX = 200
+    JSON_FIELDS = ("user_metadata",)
+    INT_FIELDS = ("ping_count", "tokens_used", "summarized_count")
+    FLOAT_FIELDS = ("total_cost",)
+
+    @staticmethod
+    def meta_key(user_id: str) -> str:
+        return f"support_session:{user_id}"
+
+    @staticmethod
+    def window_key(user_id: str) -> str:
+        return f"support_session:{user_id}:window"
+
+    @staticmethod
+    def transcript_key(user_id: str) -> str:
+        return f"support_session:{user_id}:transcript"
+
+    @staticmethod
+    def lock_key(user_id: str) -> str:
+        return f"support_session:{user_id}:compacting"
+
+    @classmethod
+    def new_session(cls, user_id: str) -> Dict[str, Any]:
+        now = datetime.utcnow().isoformat()
+        return {
+            "user_id": user_id,
+            "created_at": now,
+            "last_activity": now,
+            "last_ping": now,
+            "status": "active",
+            "category": None,
+            "ping_count": 0,
+            "total_cost": 0.0,
+            "tokens_used": 0,
+            "summary": "",
+            "summarized_count": 0,
+            "history": []
+        }
+
+    @classmethod
+    def _encode_meta(cls, session: Dict[str, Any]) -> Dict[str, str]:
+        encoded = {}
+        for field, value in session.items():
+            if field == "history" or value is None:
+                continue
+            encoded[field] = json.dumps(value) if field in cls.JSON_FIELDS else str(value)
+        return encoded
+
+    @classmethod
+    def _decode_meta(cls, raw: Dict[str, str]) -> Dict[str, Any]:
+        session: Dict[str, Any] = {"category": None, "summary": ""}
+        for field, value in raw.items():
+            if field in cls.JSON_FIELDS:
+                session[field] = json.loads(value)
+            elif field in cls.INT_FIELDS:
+                session[field] = int(value)
+            elif field in cls.FLOAT_FIELDS:
+                session[field] = float(value)
+            else:
+                session[field] = value
+        return session
+
+    async def exists(self, user_id: str) -> bool:
+        return bool(await redis_service.client.exists(self.meta_key(user_id)))
+
+    async def get_session(self, user_id: str) -> Dict[str, Any]:
+        """Metadata + summary + current window. Creates the session if missing."""
+        async with redis_service.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self.meta_key(user_id))
+            pipe.lrange(self.window_key(user_id), 0, -1)
+            raw_meta, raw_window = await pipe.execute()
+
+        if not raw_meta:
+            session = self.new_session(user_id)
+            await self.save_meta(user_id, session)
+            return session
+
+        session = self._decode_meta(raw_meta)
+        session["history"] = [json.loads(m) for m in raw_window]
+        return session
+
+    async def save_meta(self, user_id: str, session: Dict[str, Any]):
+        """Writes metadata fields only; messages are never rewritten."""
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.meta_key(user_id), mapping=self._encode_meta(session))
+            pipe.expire(self.meta_key(user_id), self.SESSION_TTL)
+            pipe.expire(self.window_key(user_id), self.SESSION_TTL)
+            pipe.expire(self.transcript_key(user_id), self.SESSION_TTL)
+            pipe.zadd(self.ACTIVITY_KEY, {user_id: int(time.time())})
+            await pipe.execute()
+
+    async def append_turn(
+        self,
+        user_id: str,
+        messages: List[Dict[str, Any]],
+        cost: float,
+        tokens: int,
+        meta_updates: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Appends one turn (O(1) regardless of session length) and bumps the counters.
+        Returns the window length so the caller can decide to compact.
+        """
+        encoded = [json.dumps(m) for m in messages]
+        updates = dict(meta_updates or {})
+        updates["last_activity"] = datetime.utcnow().isoformat()
+        updates["ping_count"] = 0
+
+        meta_key = self.meta_key(user_id)
+        window_key = self.window_key(user_id)
+        transcript_key = self.transcript_key(user_id)
+
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(window_key, *encoded)
+            pipe.ltrim(window_key, -self.WINDOW_HARD_CAP, -1)
+            pipe.rpush(transcript_key, *encoded)
+            pipe.ltrim(transcript_key, -self.TRANSCRIPT_MAX, -1)
+            pipe.hset(meta_key, mapping=self._encode_meta(updates))
+            pipe.hincrbyfloat(meta_key, "total_cost", cost)
+            pipe.hincrby(meta_key, "tokens_used", tokens)
+            for key in (meta_key, window_key, transcript_key):
+                pipe.expire(key, self.SESSION_TTL)
+            pipe.zadd(self.ACTIVITY_KEY, {user_id: int(time.time())})
+            pipe.llen(window_key)
+            results = await pipe.execute()
+
+        return int(results[-1])
+
+    def build_prompt_history(self, session: Dict[str, Any]) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Returns (summary, messages) for the LLM within SUPPORT_HISTORY_TOKEN_BUDGET.
+        Newest messages win; older ones that don't fit are already (or soon) in the summary.
+        """
+        summary = session.get("summary") or ""
+        budget = settings.SUPPORT_HISTORY_TOKEN_BUDGET - (estimate_tokens(summary) if summary else 0)
+
+        selected: List[Dict[str, str]] = []
+        for m in reversed(session.get("history", [])[-(settings.SUPPORT_HISTORY_WINDOW + self.COMPACT_BATCH):]):
+            cost = estimate_tokens(m["content"])
+            if cost > budget and selected:
+                break
+            budget -= cost
+            selected.append({"role": m["role"], "content": m["content"]})
+        selected.reverse()
+        return summary, selected
+
+    def needs_compaction(self, window_len: int) -> bool:
+        return window_len >= settings.SUPPORT_HISTORY_WINDOW + self.COMPACT_BATCH
+
+    async def compact(
+        self,
+        user_id: str,
+        summarize: Callable[[str, List[Dict[str, Any]]], Awaitable[Optional[Tuple[str, float, int]]]]
+    ) -> bool:
+        """
+        Folds the oldest messages (beyond SUPPORT_HISTORY_WINDOW) into the rolling summary.
+        `summarize(previous_summary, messages)` returns (new_summary, cost, tokens) or None.
+        Only the head of the list is trimmed, so turns appended meanwhile are never lost.
+        """
+        lock_key = self.lock_key(user_id)
+        if not await redis_service.client.set(lock_key, "1", nx=True, ex=60):
+            return False
+
+        try:
+            window_key = self.window_key(user_id)
+            overflow = await redis_service.client.llen(window_key) - settings.SUPPORT_HISTORY_WINDOW
+            if overflow <= 0:
+                return False
+
+            raw = await redis_service.client.lrange(window_key, 0, overflow - 1)
+            old_messages = [json.loads(m) for m in raw]
+            previous_summary = await redis_service.client.hget(self.meta_key(user_id), "summary") or ""
+
+            result = await summarize(previous_summary, old_messages)
+            if not result:
+                return False
+            summary, cost, tokens = result
+
+            meta_key = self.meta_key(user_id)
+            async with redis_service.client.pipeline(transaction=True) as pipe:
+                pipe.ltrim(window_key, len(old_messages), -1)
+                pipe.hset(meta_key, "summary", summary)
+                pipe.hincrby(meta_key, "summarized_count", len(old_messages))
+                pipe.hincrbyfloat(meta_key, "total_cost", cost)
+                pipe.hincrby(meta_key, "tokens_used", tokens)
+                await pipe.execute()
+
+            logger.info(f"🗜️ Support session {user_id}: folded {len(old_messages)} messages into summary.")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Support session compaction failed for {user_id}: {e}")
+            return False
+        finally:
+            await redis_service.client.delete(lock_key)
+
+    async def get_transcript(self, user_id: str) -> List[Dict[str, Any]]:
+        raw = await redis_service.client.lrange(self.transcript_key(user_id), 0, -1)
+        return [json.loads(m) for m in raw]
+
+    async def delete(self, user_id: str):
+        async with redis_service.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.meta_key(user_id), self.window_key(user_id), self.transcript_key(user_id))
+            pipe.zrem(self.ACTIVITY_KEY, user_id)
+            await pipe.execute()
+
+    async def stale_sessions(self, idle_seconds: int) -> List[str]:
+        """User IDs with no activity for idle_seconds (index lookup, no KEYS scan)."""
+        cutoff = int(time.time()) - idle_seconds
+        return list(await redis_service.client.zrangebyscore(self.ACTIVITY_KEY, "-inf", cutoff))
+
+
+support_session_store = SupportSessionStore()
@@ -0,0 +1,227 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlmodel import select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.tasks import TASK_METRICS, get_task_config, task_bit, task_ids_in
+from app.models.partner import Partner, PartnerTask
+
+logger = logging.getLogger(__name__)
+
+
+class TaskClaim(BaseModel):
+    """Outcome of a successful claim (the partner row is already updated)."""
+    task_id: str
+    reward_xp: float
+    effective_xp: float
+    xp_before: float
+    xp_after: float
+    level: int
+    language_code: Optional[str] = "en"
+
+
+class TaskEngine:
+    """
+    Task progress on two BIGINT bitsets on the partner row (bit = catalog index, see
+    app.core.tasks): task_started_mask and task_completed_mask.
+
+    #comment: Start and claim are each one guarded UPDATE ... RETURNING on the partner row,
+    so double taps and parallel requests cannot start or pay a task twice. Referral and
+    streak requirements are checked inside that statement against the materialized
+    referral_count / checkin_streak. partnertask rows remain the history (start baseline,
+    reward, timestamps) and are only read for tasks that are started but not completed.
+    """
+
+    START_SQL = (
+        "UPDATE partner SET task_started_mask = task_started_mask | :bit "
+        "WHERE id = :p_id AND ((task_started_mask | task_completed_mask) & :bit) = 0 "
+        "RETURNING {metric}"
+    )
+    CLAIM_SQL = (
+        "UPDATE partner SET task_completed_mask = task_completed_mask | :bit, "
+        "xp = xp + CASE WHEN is_pro THEN :reward * :multiplier ELSE :reward END "
+        "WHERE id = :p_id AND (task_completed_mask & :bit) = 0{guard} "
+        "RETURNING xp, is_pro, level, language_code"
+    )
+    PROGRESS_GUARD = (
+        " AND (task_started_mask & :bit) != 0"
+        " AND {metric} - (SELECT MIN(initial_metric_value) FROM partnertask"
+        " WHERE partner_id = :p_id AND task_id = :task_id AND status = 'STARTED') >= :requirement"
+    )
+
+    @staticmethod
+    def _config(task_id: str) -> dict:
+        config = get_task_config(task_id)
+        if not config:
+            raise HTTPException(status_code=404, detail="Task config not found")
+        return config
+
+    async def start(self, session: AsyncSession, partner_id: int, task_id: str) -> dict:
+        """Starts a referral/action task, snapshotting its metric. Idempotent while started."""
+        config = self._config(task_id)
+        metric = TASK_METRICS.get(config.get('type'))
+        if not metric:
+            raise HTTPException(status_code=400, detail="This task type cannot be started manually")
+
+        row = (await session.execute(
+            text(self.START_SQL.format(metric=metric)),
+            {"bit": task_bit(task_id), "p_id": partner_id}
+        )).first()
+
+        if row is None:
+            state = await self._state(session, partner_id)
+            if state.task_completed_mask & task_bit(task_id):
+                raise HTTPException(status_code=400, detail="Task already completed")
+            # Already started: hand back the existing baseline
+            existing = (await session.exec(
+                select(PartnerTask).where(
+                    PartnerTask.partner_id == partner_id,
+                    PartnerTask.task_id == task_id,
+                    PartnerTask.status == "STARTED"
+                )
+            )).first()
+            if existing:
+                return self._active(existing.task_id, existing.initial_metric_value, existing.started_at)
+            # Bit without a baseline row (e.g. written by a crashed request): restart from now
+            row = (await session.execute(
+                text(f"SELECT {metric} FROM partner WHERE id = :p_id"), {"p_id": partner_id}
+            )).first()
+
+        record = PartnerTask(
+            partner_id=partner_id,
+            task_id=task_id,
+            status="STARTED",
+            started_at=datetime.utcnow(),
+            initial_metric_value=int(row[0] or 0),
+            completed_at=None
+        )
+        session.add(record)
+        await session.commit()
+        return self._active(record.task_id, record.initial_metric_value, record.started_at)
+
+    async def claim(self, session: AsyncSession, partner_id: int, task_id: str) -> TaskClaim:
+        """
+        Marks the task completed and credits XP (PRO multiplier applied) in one statement,
+        then writes the history rows. The caller commits.
+        """
+        config = self._config(task_id)
+        reward = config.get('reward', 0)
+        if reward <= 0:
+            raise HTTPException(status_code=400, detail="Invalid or unsupported task")
+
+        metric = TASK_METRICS.get(config.get('type'))
+        params = {
+            "bit": task_bit(task_id),
+            "p_id": partner_id,
+            "reward": reward,
+            "multiplier": settings.PRO_XP_MULTIPLIER,
+        }
+        guard = ""
+        if metric:
+            guard = self.PROGRESS_GUARD.format(metric=metric)
+            params.update(task_id=task_id, requirement=config.get('requirement', 0))
+
+        row = (await session.execute(text(self.CLAIM_SQL.format(guard=guard)), params)).first()
+        if row is None:
+            await self._raise_claim_error(session, partner_id, task_id, metric, config)
+
+        effective_xp = reward * settings.PRO_XP_MULTIPLIER if row.is_pro else reward
+        now = datetime.utcnow()
+        if metric:
+            await session.execute(
+                text(
+                    "UPDATE partnertask SET status = 'COMPLETED', reward_xp = :reward, completed_at = :now "
+                    "WHERE partner_id = :p_id AND task_id = :task_id AND status = 'STARTED'"
+                ),
+                {"reward": reward, "now": now, "p_id": partner_id, "task_id": task_id}
+            )
+        else:
+            session.add(PartnerTask(
+                partner_id=partner_id,
+                task_id=task_id,
+                status="COMPLETED",
+                reward_xp=reward,
+                completed_at=now
+            ))
+
+        from app.utils.ranking import get_level
+        level = get_level(row.xp)
+        if level != row.level:
+            await session.execute(
+                text("UPDATE partner SET level = :level WHERE id = :p_id"),
+                {"level": level, "p_id": partner_id}
+            )
+
+        return TaskClaim(
+            task_id=task_id,
+            reward_xp=reward,
+            effective_xp=effective_xp,
+            xp_before=row.xp - effective_xp,
+            xp_after=row.xp,
+            level=level,
+            language_code=row.language_code
+        )
+
+    async def active_tasks(self, session: AsyncSession, partner: Partner) -> List[dict]:
+        """Started-but-unclaimed tasks with their baselines (no query when there are none)."""
+        pending = task_ids_in((partner.task_started_mask or 0) & ~(partner.task_completed_mask or 0))
+        if not pending:
+            return []
+        rows = (await session.exec(
+            select(PartnerTask.task_id, PartnerTask.initial_metric_value, PartnerTask.started_at).where(
+                PartnerTask.partner_id == partner.id,
+                PartnerTask.task_id.in_(pending),
+                PartnerTask.status == "STARTED"
+            )
+        )).all()
+        return [self._active(r.task_id, r.initial_metric_value, r.started_at) for r in rows]
+
+    @staticmethod
+    def _active(task_id: str, initial_metric_value: int, started_at: Optional[datetime]) -> dict:
+        return {
+            "task_id": task_id,
+            "status": "STARTED",
+            "initial_metric_value": initial_metric_value,
+            "started_at": started_at.isoformat() if started_at else None
+        }
+
+    @staticmethod
+    async def _state(session: AsyncSession, partner_id: int):
+        state = (await session.exec(
+            select(Partner.task_started_mask, Partner.task_completed_mask, Partner.referral_count, Partner.checkin_streak)
+            .where(Partner.id == partner_id)
+        )).first()
+        if state is None:
+            raise HTTPException(status_code=404, detail="Partner not found")
+        return state
+
+    async def _raise_claim_error(self, session: AsyncSession, partner_id: int, task_id: str, metric: Optional[str], config: dict):
+        """The guarded UPDATE matched nothing: work out why (read-only)."""
+        state = await self._state(session, partner_id)
+        bit = task_bit(task_id)
+        if state.task_completed_mask & bit:
+            raise HTTPException(status_code=400, detail="Task already completed")
+        if metric:
+            baseline = (await session.exec(
+                select(PartnerTask.initial_metric_value).where(
+                    PartnerTask.partner_id == partner_id,
+                    PartnerTask.task_id == task_id,
+                    PartnerTask.status == "STARTED"
+                )
+            )).first()
+            if not state.task_started_mask & bit or baseline is None:
+                raise HTTPException(status_code=400, detail="Task must be started first")
+            progress = getattr(state, metric) - baseline
+            raise HTTPException(
+                status_code=400,
+                detail=f"Requirement not met. Progress: {progress}/{config.get('requirement', 0)}"
+            )
+        raise HTTPException(status_code=409, detail="Task claim conflict, please retry")
+
+
+task_engine = TaskEngine()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Cached "Telegram said no" (unknown file, user never started the bot, ...)
+_MISSING = object()
+
+
+class MethodStats:
+    __slots__ = ("calls", "hits", "coalesced", "errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = self.hits = self.coalesced = self.errors = 0
+        self.total_ms = self.max_ms = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class TelegramClient:
+    """
+    Read-side facade over the aiogram bot for lookups that are repeated for the same keys.
+      get_me                      memoized for the process lifetime (the bot's identity is fixed)
+      get_file / file_url         FILE_TTL (Telegram keeps file_path valid for >= 1h)
+      get_profile_photo_file_id   PHOTO_TTL
+    Telegram's "not found" style answers (bad request / forbidden) are cached for NEGATIVE_TTL and
+    returned as None; transient errors (network, flood control) propagate and are not cached.
+    Concurrent calls for the same key share one in-flight request.
+
+    #comment: The bot is imported lazily: bot.py itself goes through this facade.
+    """
+
+    FILE_TTL = 3000
+    PHOTO_TTL = 600
+    NEGATIVE_TTL = 300
+    CACHE_SIZE = 10000
+
+    def __init__(self):
+        self._me = None
+        self._files: TTLCache = TTLCache(maxsize=self.CACHE_SIZE, ttl=self.FILE_TTL)
+        self._photos: TTLCache = TTLCache(maxsize=self.CACHE_SIZE, ttl=self.PHOTO_TTL)
+        self._missing: TTLCache = TTLCache(maxsize=self.CACHE_SIZE, ttl=self.NEGATIVE_TTL)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, MethodStats] = {}
+
+    @property
+    def bot(self):
+        from bot import bot
+        return bot
+
+    def _stat(self, method: str) -> MethodStats:
+        stat = self._stats.get(method)
+        if stat is None:
+            stat = self._stats[method] = MethodStats()
+        return stat
+
+    async def _coalesced(self, key: Hashable, method: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs fetch() once per key at a time; concurrent callers await the same task.
+        The task is shielded, so a caller that gets cancelled does not cancel the others.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stat(method).coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._timed(method, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller went away
+
+    async def _timed(self, method: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        stat = self._stat(method)
+        started = time.perf_counter()
+        try:
+            return await fetch()
+        except Exception:
+            stat.errors += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            stat.calls += 1
+            stat.total_ms += elapsed
+            stat.max_ms = max(stat.max_ms, elapsed)
+
+    async def _cached(self, cache: TTLCache, method: str, arg: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+        key = (method, arg)
+        if key in self._missing:
+            self._stat(method).hits += 1
+            return None
+        if arg in cache:
+            self._stat(method).hits += 1
+            return cache[arg]
+
+        async def fetch_and_store():
+            try:
+                value = await fetch()
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                logger.debug(f"Telegram {method}({arg}) negative: {e}")
+                self._missing[key] = _MISSING
+                return None
+            cache[arg] = value
+            return value
+
+        return await self._coalesced(key, method, fetch_and_store)
+
+    async def get_me(self):
+        if self._me is not None:
+            self._stat("get_me").hits += 1
+            return self._me
+        me = await self._coalesced(("get_me",), "get_me", self.bot.get_me)
+        self._me = me
+        return me
+
+    async def bot_username(self) -> str:
+        return (await self.get_me()).username
+
+    async def get_file(self, file_id: str):
+        """aiogram File, or None if Telegram does not know the file_id."""
+        return await self._cached(self._files, "get_file", file_id, lambda: self.bot.get_file(file_id))
+
+    async def file_url(self, file_id: str) -> Optional[str]:
+        file = await self.get_file(file_id)
+        if file is None or not file.file_path:
+            return None
+        return f"https://api.telegram.org/file/bot{settings.BOT_TOKEN}/{file.file_path}"
+
+    async def get_profile_photo_file_id(self, user_id: int | str) -> Optional[str]:
+        """file_id of the user's current (smallest size) profile photo, None if there is none."""
+        async def fetch():
+            photos = await self.bot.get_user_profile_photos(int(user_id), limit=1)
+            return photos.photos[0][0].file_id if photos.total_count > 0 and photos.photos else ""
+
+        file_id = await self._cached(self._photos, "get_user_profile_photos", str(user_id), fetch)
+        return file_id or None
+
+    def forget_profile_photo(self, user_id: int | str):
+        self._photos.pop(str(user_id), None)
+        self._missing.pop(("get_user_profile_photos", str(user_id)), None)
+
+    def stats(self) -> dict:
+        return {method: stat.as_dict() for method, stat in sorted(self._stats.items())}
+
+
+telegram_client = TelegramClient()
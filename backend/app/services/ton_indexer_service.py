@@ -0,0 +1,343 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import sentry_sdk
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models.partner import Partner, SystemSetting, async_session_maker
+from app.models.transaction import IncomingPayment, PartnerTransaction
+from app.services.payment_session_service import payment_session_engine
+from app.services.redis_service import redis_service
+from app.services.ton_verification_service import normalize_ton_hash, ton_verification_service
+from app.worker import broker
+
+logger = logging.getLogger(__name__)
+
+NANO_TON = 10**9
+
+
+class TonPaymentIndexer:
+    """
+    Chain-watching indexer for the admin TON wallet.
+    Polls getTransactions incrementally from a logical-time cursor (stored in SystemSetting;
+    a catch-up longer than MAX_PAGES resumes where it stopped on the next run),
+    persists incoming transfers to `incoming_payment` and auto-matches them against pending
+    PRO payment sessions by comment ("PRO-<transaction_id>") or by unique amount.
+    """
+
+    CURSOR_KEY = "ton_indexer_cursor"
+    LOCK_KEY = "lock:ton_indexer"
+    PAGE_SIZE = 100
+    MAX_PAGES = 20  # Pages per run; a longer catch-up (first run, downtime) continues next run
+    SESSION_WINDOW_MINUTES = 10
+    # #comment: Explicit hash claims keep the old margin (2% gas/precision + 2% rate drift).
+    # Amount-only auto-matching also needs an upper bound to stay unambiguous.
+    MIN_AMOUNT_RATIO = 0.96
+    MAX_AMOUNT_RATIO = 1.04
+
+    @staticmethod
+    def session_comment(transaction_id: int) -> str:
+        return f"PRO-{transaction_id}"
+
+    @staticmethod
+    def parse_transaction(tx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Extracts an incoming payment from a TONCenter v2 transaction.
+        Returns None for external messages, zero-value and bounced transfers.
+        """
+        in_msg = tx.get("in_msg") or {}
+        source = in_msg.get("source")
+        try:
+            value = int(in_msg.get("value") or 0)
+        except (TypeError, ValueError):
+            return None
+        if not source or value <= 0:
+            return None
+
+        # Bounced: the value went straight back to the sender
+        for out_msg in tx.get("out_msgs") or []:
+            if out_msg.get("destination") == source and int(out_msg.get("value") or 0) >= value * 0.9:
+                return None
+
+        tx_id = tx.get("transaction_id") or {}
+        return {
+            "tx_hash": normalize_ton_hash(tx_id.get("hash", "")),
+            "lt": int(tx_id.get("lt", 0)),
+            "amount_nano": value,
+            "source": source,
+            "comment": (in_msg.get("message") or "").strip() or None,
+            "utime": datetime.utcfromtimestamp(int(tx.get("utime") or 0)),
+        }
+
+    @classmethod
+    def amount_matches(cls, amount_nano: int, expected_ton: float, upper_bound: bool = False) -> bool:
+        expected_nano = expected_ton * NANO_TON
+        if amount_nano < expected_nano * cls.MIN_AMOUNT_RATIO:
+            return False
+        return not upper_bound or amount_nano <= expected_nano * cls.MAX_AMOUNT_RATIO
+
+    @classmethod
+    def match_session(
+        cls,
+        payment: IncomingPayment,
+        pending: List[PartnerTransaction]
+    ) -> Optional[PartnerTransaction]:
+        """
+        Picks the pending session a payment belongs to.
+        1. Comment "PRO-<id>" is authoritative (amount still has to cover the price).
+        2. Otherwise the amount must match exactly one session opened shortly before the payment.
+        """
+        if payment.comment:
+            comment = payment.comment.strip().upper()
+            for pt in pending:
+                if comment == cls.session_comment(pt.id) and pt.amount_crypto \
+                        and cls.amount_matches(payment.amount_nano, pt.amount_crypto):
+                    return pt
+
+        window_start = payment.utime - timedelta(minutes=cls.SESSION_WINDOW_MINUTES)
+        window_end = payment.utime + timedelta(minutes=1)  # Clock skew between chain and DB
+        candidates = [
+            pt for pt in pending
+            if pt.amount_crypto
+            and window_start <= pt.created_at <= window_end
+            and cls.amount_matches(payment.amount_nano, pt.amount_crypto, upper_bound=True)
+        ]
+        return candidates[0] if len(candidates) == 1 else None
+
+    async def _load_cursor(self, session: AsyncSession) -> Optional[Dict[str, Any]]:
+        setting = await session.get(SystemSetting, self.CURSOR_KEY)
+        return json.loads(setting.value) if setting else None
+
+    async def _save_cursor(self, session: AsyncSession, cursor: Dict[str, Any]):
+        value = json.dumps(cursor)
+        setting = await session.get(SystemSetting, self.CURSOR_KEY)
+        if setting:
+            setting.value = value
+        else:
+            setting = SystemSetting(key=self.CURSOR_KEY, value=value)
+        session.add(setting)
+
+    @staticmethod
+    def _tx_ref(tx: Dict[str, Any]) -> Dict[str, Any]:
+        tx_id = tx.get("transaction_id") or {}
+        return {"lt": int(tx_id.get("lt", 0)), "hash": tx_id.get("hash", "")}
+
+    async def _fetch_since(
+        self,
+        cursor_lt: Optional[int],
+        start_lt: Optional[int] = None,
+        start_hash: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Transactions newer than cursor_lt, newest first (paginates backwards from the latest
+        tx, or from start_lt/start_hash to resume a catch-up).
+        Returns (transactions, complete); complete is False when MAX_PAGES ran out first.
+        """
+        collected: List[Dict[str, Any]] = []
+
+        for _ in range(self.MAX_PAGES):
+            page = await ton_verification_service.get_transactions(
+                settings.ADMIN_TON_ADDRESS,
+                limit=self.PAGE_SIZE,
+                lt=start_lt,
+                tx_hash=start_hash,
+                to_lt=cursor_lt
+            )
+            if start_lt is not None and page:
+                page = page[1:]  # Page start is inclusive, skip the tx we already have
+            if not page:
+                return collected, True
+            collected.extend(page)
+            if len(page) < self.PAGE_SIZE - 1:
+                return collected, True
+            oldest = self._tx_ref(page[-1])
+            start_lt, start_hash = oldest["lt"], oldest["hash"]
+
+        return collected, False
+
+    async def _catch_up(self, cursor: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Fetches everything since the cursor that fits in this run. Returns (transactions, next cursor).
+
+        #comment: getTransactions only pages backwards (newest first). When MAX_PAGES runs out
+        before the cursor is reached, the cursor keeps its lt and records a "gap": the oldest
+        fetched tx to resume paging from, and the newest one ("head") to move to once the
+        older part is indexed. Nothing between the cursor and the fetched range is skipped.
+        """
+        txs: List[Dict[str, Any]] = []
+        gap = cursor.get("gap")
+        if gap:
+            older, complete = await self._fetch_since(cursor.get("lt"), gap["lt"], gap["hash"])
+            txs.extend(older)
+            if not complete:
+                return txs, {**cursor, "gap": {**gap, **self._tx_ref(older[-1])}}
+            cursor = {"lt": gap["head_lt"], "hash": gap["head_hash"]}
+
+        newer, complete = await self._fetch_since(cursor.get("lt"))
+        txs.extend(newer)
+        if not newer:
+            return txs, cursor
+        head = self._tx_ref(newer[0])
+        if complete:
+            return txs, head
+        gap = {**self._tx_ref(newer[-1]), "head_lt": head["lt"], "head_hash": head["hash"]}
+        return txs, {"lt": cursor.get("lt"), "hash": cursor.get("hash"), "gap": gap}
+
+    async def sync(self) -> Dict[str, int]:
+        """
+        One incremental indexing pass. Safe to call from the scheduler and on demand:
+        concurrent callers are coalesced by a Redis lock.
+        """
+        stats = {"fetched": 0, "indexed": 0, "matched": 0}
+        if not await redis_service.client.set(self.LOCK_KEY, "1", nx=True, ex=60):
+            return stats
+
+        try:
+            async with async_session_maker() as session:
+                cursor = await self._load_cursor(session) or {}
+                txs, next_cursor = await self._catch_up(cursor)
+                stats["fetched"] = len(txs)
+                if not txs and next_cursor == cursor:
+                    return stats
+
+                parsed = [p for p in (self.parse_transaction(tx) for tx in txs) if p and p["tx_hash"]]
+                new_payments: List[IncomingPayment] = []
+                if parsed:
+                    hashes = [p["tx_hash"] for p in parsed]
+                    existing = set((await session.exec(
+                        select(IncomingPayment.tx_hash).where(IncomingPayment.tx_hash.in_(hashes))
+                    )).all())
+                    for p in sorted(parsed, key=lambda item: item["lt"]):
+                        if p["tx_hash"] in existing:
+                            continue
+                        payment = IncomingPayment(**p)
+                        session.add(payment)
+                        new_payments.append(payment)
+
+                await self._save_cursor(session, next_cursor)
+                await session.commit()
+                stats["indexed"] = len(new_payments)
+
+                # #comment: Also retries recent payments that stayed unmatched (e.g. the session
+                # was created a moment after the transfer landed, or a settle failed last run).
+                recent_cutoff = datetime.utcnow() - timedelta(minutes=self.SESSION_WINDOW_MINUTES)
+                unmatched = list((await session.exec(
+                    select(IncomingPayment).where(
+                        IncomingPayment.matched_transaction_id.is_(None),
+                        IncomingPayment.utime >= recent_cutoff
+                    ).order_by(IncomingPayment.lt)
+                )).all())
+                if unmatched:
+                    stats["matched"] = await self.match_pending(session, unmatched)
+
+            if stats["indexed"]:
+                logger.info(f"⛓️ TON indexer: {stats}")
+            return stats
+        finally:
+            await redis_service.client.delete(self.LOCK_KEY)
+
+    async def match_pending(self, session: AsyncSession, payments: List[IncomingPayment]) -> int:
+        """Auto-settles pending TON sessions that the new payments belong to."""
+        window_start = min(p.utime for p in payments) - timedelta(minutes=self.SESSION_WINDOW_MINUTES)
+        pending = list((await session.exec(
+            select(PartnerTransaction).where(
+                PartnerTransaction.status == "pending",
+                PartnerTransaction.currency == "TON",
+                PartnerTransaction.created_at >= window_start
+            )
+        )).all())
+
+        pending_by_id = {pt.id: pt for pt in pending}
+        matched = 0
+        for payment in payments:
+            # Fast path: open sessions have unique amounts, exact transfers resolve in O(1)
+            owner_id = await payment_session_engine.find_by_amount("TON", payment.amount_nano / NANO_TON)
+            pt = pending_by_id.get(owner_id) if owner_id else None
+            if pt is None:
+                pt = self.match_session(payment, pending)
+            if not pt:
+                continue
+            tx_hash, pt_id = payment.tx_hash, pt.id
+            try:
+                if await self.settle(session, payment, pt, actor_id="ton_indexer"):
+                    pending.remove(pt)
+                    pending_by_id.pop(pt_id, None)
+                    matched += 1
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                logger.error(f"❌ TON indexer: failed to settle {tx_hash} -> session {pt_id}: {e}")
+                await session.rollback()
+                # Rolled back objects are expired; the rest is retried on the next run
+                break
+        return matched
+
+    async def find_payment(self, session: AsyncSession, tx_hash: str) -> Optional[IncomingPayment]:
+        result = await session.exec(
+            select(IncomingPayment).where(IncomingPayment.tx_hash == normalize_ton_hash(tx_hash))
+        )
+        return result.first()
+
+    async def settle(
+        self,
+        session: AsyncSession,
+        payment: IncomingPayment,
+        pt: PartnerTransaction,
+        actor_id: str
+    ) -> bool:
+        """
+        Binds a payment to a session and upgrades the partner (single commit).
+        The conditional UPDATE makes sure a payment can only ever be claimed once.
+        """
+        from app.services.audit_service import audit_service
+        from app.services.payment_service import payment_service
+
+        partner = await session.get(Partner, pt.partner_id)
+        if not partner:
+            return False
+
+        result = await session.execute(
+            update(IncomingPayment)
+            .where(IncomingPayment.id == payment.id, IncomingPayment.matched_transaction_id.is_(None))
+            .values(matched_transaction_id=pt.id)
+        )
+        if result.rowcount != 1:
+            return False  # Already claimed by another session
+
+        await audit_service.log_event(
+            session=session,
+            entity_type="transaction",
+            entity_id=payment.tx_hash,
+            action="ton_verification_success",
+            actor_id=actor_id,
+            details={"amount": pt.amount, "amount_nano": payment.amount_nano, "transaction_id": pt.id}
+        )
+        await payment_service.upgrade_to_pro(
+            session=session,
+            partner=partner,
+            amount=pt.amount,
+            currency="TON",
+            network="TON",
+            tx_hash=payment.tx_hash,
+            transaction_id=pt.id
+        )
+        await payment_session_engine.close(pt, outcome="matched")
+        return True
+
+
+ton_payment_indexer = TonPaymentIndexer()
+
+@broker.task(task_name="index_ton_payments_task", schedule=[{"cron": "* * * * *"}])
+async def index_ton_payments_task():
+    """
+    Incremental TON wallet indexing + auto-matching of pending PRO sessions.
+    """
+    try:
+        return await ton_payment_indexer.sync()
+    except Exception as e:
+        logger.error(f"❌ TON indexer run failed: {e}")
+        return None
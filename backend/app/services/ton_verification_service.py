@@ -1,4 +1,6 @@
+import base64
 import logging
+from typing import List, Optional
 
 import httpx
 
@@ -7,6 +9,18 @@ from app.core.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
+def normalize_ton_hash(tx_hash: str) -> str:
+    """Converts Base64 (std or url-safe) hash to lowercase Hex if necessary."""
+    tx_hash = tx_hash.strip()
+
+    # If it looks like base64 (not all hex, length ~44)
+    if len(tx_hash) <= 44 and not all(c in "0123456789abcdefABCDEF" for c in tx_hash):
+        try:
+            return base64.b64decode(tx_hash, altchars=b"-_" if ("-" in tx_hash or "_" in tx_hash) else None).hex()
+        except Exception:
+            pass
+    return tx_hash.lower()
+
 class TonVerificationService:
     def __init__(self):
         # We use toncenter.com as requested by the user's setup
@@ -34,18 +48,36 @@ class TonVerificationService:
         return await self._verify_via_tonapi(normalized_hash, expected_amount_ton, expected_address)
 
     def _normalize_hash(self, tx_hash: str) -> str:
-        """Converts Base64 hash to Hex if necessary."""
-        import base64
-        tx_hash = tx_hash.strip()
-        
-        # If it looks like base64 (not all hex, length ~44)
-        if len(tx_hash) <= 44 and not all(c in "0123456789abcdefABCDEF" for c in tx_hash):
-            try:
-                decoded = base64.b64decode(tx_hash)
-                return decoded.hex()
-            except Exception:
-                pass
-        return tx_hash.lower()
+        return normalize_ton_hash(tx_hash)
+
+    async def get_transactions(
+        self,
+        address: str,
+        limit: int = 100,
+        lt: Optional[int] = None,
+        tx_hash: Optional[str] = None,
+        to_lt: Optional[int] = None
+    ) -> List[dict]:
+        """
+        One page of account transactions from TONCenter, newest first.
+        (lt, tx_hash) set the starting point (inclusive), to_lt is the exclusive lower bound.
+        """
+        params = {"address": address, "limit": limit, "archival": "true"}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        if lt is not None and tx_hash:
+            params["lt"] = lt
+            params["hash"] = tx_hash
+        if to_lt:
+            params["to_lt"] = to_lt
+
+        client = await http_client.get_client()
+        response = await client.get(f"{self.base_url}/getTransactions", params=params, timeout=15.0)
+        response.raise_for_status()
+        data = response.json()
+        if not data.get("ok"):
+            raise RuntimeError(f"TONCenter error: {data.get('error')}")
+        return data.get("result", [])
 
     async def _verify_via_toncenter(self, tx_hash: str, expected_amount_ton: float, expected_address: str) -> bool:
         try:
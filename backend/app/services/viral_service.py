@@ -6,18 +6,13 @@ import asyncio
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
-
-from google import genai as google_genai
-from google.genai import types as genai_types
-from google.oauth2.service_account import Credentials
-import gspread
-from openai import AsyncOpenAI
-from sqlmodel import select
+from sqlmodel import select, text
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
-from app.models.partner import Partner
+from app.models.partner import Partner, PartnerSocialCredentials, load_pro_profile
 from app.core.errors import ViralStudioErrorCode, get_error_msg
+from app.worker import broker
 from app.core.cmo_intelligence import (
     AudienceProfile, ContentCategory, NativeLanguageOptimization,
     ViralFormulas, KnowledgeInsights, CopywritingTechnique
@@ -25,6 +20,9 @@ from app.core.cmo_intelligence import (
 
 logger = logging.getLogger(__name__)
 
+# Client not built yet (None means "built and unavailable")
+_UNSET = object()
+
 class ViralMarketingStudio:
     """
     PRO Component: Viral Marketing Studio
@@ -164,33 +162,56 @@ Use FRESH, audience-specific language that feels authentic.
     """
 
     def __init__(self):
-        # 1. Initialize OpenAI with fallback to os.getenv
-        openai_key = settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
-        if openai_key:
-            self.openai_client = AsyncOpenAI(api_key=openai_key)
-            logger.info("✅ ViralMarketingStudio: OpenAI client initialized.")
-        else:
-            self.openai_client = None
+        # #comment: The SDK clients (openai, google-genai, gspread) are built on first use by the
+        # properties below. API workers that never generate content never import those SDKs.
+        self._openai_client = _UNSET
+        self._genai_client = _UNSET
+        self._gs_client = _UNSET
+        self._gs_sheet_cache = {} 
+        self._last_working_imagen_model = 'imagen-4.0-generate-001' # Memory for optimization
+
+        if not self._openai_key():
             logger.warning("⚠️ ViralMarketingStudio: OpenAI API Key missing.")
-        
-        # 2. Initialize Google GenAI with fallback to os.getenv
-        google_key = os.getenv("GOOGLE_API_KEY")
-        self.genai_client = None
-        if google_key:
-            try:
-                # Initialize Gemini GenAI Client for Imagen 3
-                self.genai_client = google_genai.Client(api_key=google_key)
-                logger.info("✅ ViralMarketingStudio: Google GenAI client initialized.")
-            except Exception as e:
-                logger.error(f"⚠️ Failed to initialize Google GenAI Client: {e}")
-        else:
+        if not os.getenv("GOOGLE_API_KEY"):
             logger.warning("⚠️ ViralMarketingStudio: Google API Key missing.")
 
-        # 3. Google Sheets for Logging
-        self.gs_client = None
-        self._gs_sheet_cache = {} 
-        self._init_google_sheets_client()
-        self._last_working_imagen_model = 'imagen-4.0-generate-001' # Memory for optimization
+    @staticmethod
+    def _openai_key() -> Optional[str]:
+        return settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
+
+    @property
+    def openai_client(self):
+        if self._openai_client is _UNSET:
+            self._openai_client = None
+            openai_key = self._openai_key()
+            if openai_key:
+                from openai import AsyncOpenAI
+                self._openai_client = AsyncOpenAI(api_key=openai_key)
+                logger.info("✅ ViralMarketingStudio: OpenAI client initialized.")
+        return self._openai_client
+
+    @property
+    def genai_client(self):
+        if self._genai_client is _UNSET:
+            self._genai_client = None
+            google_key = os.getenv("GOOGLE_API_KEY")
+            if google_key:
+                try:
+                    # Initialize Gemini GenAI Client for Imagen 3
+                    from google import genai as google_genai
+                    self._genai_client = google_genai.Client(api_key=google_key)
+                    logger.info("✅ ViralMarketingStudio: Google GenAI client initialized.")
+                except Exception as e:
+                    logger.error(f"⚠️ Failed to initialize Google GenAI Client: {e}")
+        return self._genai_client
+
+    @property
+    def gs_client(self):
+        """Google Sheets client for audit logging."""
+        if self._gs_client is _UNSET:
+            self._gs_client = None
+            self._init_google_sheets_client()
+        return self._gs_client
 
     def _init_google_sheets_client(self):
         """Initializes Google Sheets client for audit logging."""
@@ -226,9 +247,11 @@ Use FRESH, audience-specific language that feels authentic.
                 )
                 return
             
+            import gspread
+            from google.oauth2.service_account import Credentials
             scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
             credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-            self.gs_client = gspread.authorize(credentials)
+            self._gs_client = gspread.authorize(credentials)
             logger.info("✅ ViralMarketingStudio: Google Sheets logging initialized.")
         except json.JSONDecodeError as e:
             logger.error(
@@ -245,9 +268,10 @@ Use FRESH, audience-specific language that feels authentic.
         """
         Returns the operational status of the studio's AI dependencies.
         """
+        # Keys only: reporting capabilities must not build the SDK clients
         return {
-            "text_generation": bool(self.openai_client),
-            "image_generation": bool(self.genai_client)
+            "text_generation": bool(self._openai_key()),
+            "image_generation": bool(os.getenv("GOOGLE_API_KEY")) and self._genai_client is not None
         }
 
     async def check_tokens_and_reset(self, partner: Partner, session: AsyncSession, min_tokens: int = 1) -> bool:
@@ -258,18 +282,22 @@ Use FRESH, audience-specific language that feels authentic.
         if not partner.is_pro:
             return False
 
+        profile = await load_pro_profile(session, partner)
         now = datetime.utcnow()
-        last_reset = partner.pro_tokens_last_reset or partner.created_at
+        last_reset = profile.pro_tokens_last_reset or partner.created_at
         
         # Check if a month has passed since last reset
         if (now - last_reset).days >= 30:
-            partner.pro_tokens = 500
-            partner.pro_tokens_last_reset = now
-            session.add(partner)
+            profile.pro_tokens = 500
+            profile.pro_tokens_last_reset = now
+            session.add(profile)
+            await session.commit()
+            await session.refresh(profile)
+        elif profile in session.new:
+            # First use: persist the row so atomic token UPDATEs can find it
             await session.commit()
-            await session.refresh(partner)
 
-        return partner.pro_tokens >= min_tokens
+        return profile.pro_tokens >= min_tokens
 
     async def generate_viral_content(
         self, 
@@ -278,10 +306,13 @@ Use FRESH, audience-specific language that feels authentic.
         target_audience: str, 
         language: str,
         referral_link: Optional[str] = None,
-        session: Optional[AsyncSession] = None
+        session: Optional[AsyncSession] = None,
+        stage_media: bool = False
     ) -> Dict[str, Any]:
         """
         Generates text (OpenAI) and Image Suggestion/Prompt (Gemini).
+        stage_media: called from the TaskIQ worker, which has no access to the web service's
+        /generated_media; the image is staged in Redis and adopted when the job is polled.
         """
         if not self.openai_client:
             return {
@@ -462,6 +493,7 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
                 # Fallback to Gemini if OpenAI fails
                 if self.genai_client:
                     try:
+                        from google.genai import types as genai_types
                         logger.info(f"🔄 Switching to Gemini 1.5 Flash for text generation (OpenAI failed with {error_code})...")
                         gemini_response = self.genai_client.models.generate_content(
                             model='gemini-1.5-flash',
@@ -536,37 +568,28 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
                     
                     if img_response and getattr(img_response, 'generated_images', None):
                         image = img_response.generated_images[0]
-                        filename = f"viral_{partner.id}_{secrets.token_hex(4)}.png"
-                        
-                        # Production path: /app/generated_media (created with proper permissions in Dockerfile)
-                        backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-                        save_dir = os.path.join(backend_dir, "generated_media")
-                        save_path = os.path.join(save_dir, filename)
-                        
-                        # Save image to production directory
-                        try:
-                            from io import BytesIO
-                            
-                            # Get the actual PIL Image object (Gemini wraps it)
-                            pil_image = getattr(image.image, '_pil_image', image.image)
-                            
-                            # Save to BytesIO buffer then write to disk
-                            buffer = BytesIO()
-                            pil_image.save(buffer, format='PNG')
-                            
-                            with open(save_path, 'wb') as f:
-                                f.write(buffer.getvalue())
-                            
-                            logger.info(f"✅ Imagen: Saved {model_name} image to {save_path}")
-                        except Exception as save_err:
-                            logger.error(f"❌ Failed to save image: {save_err}")
+
+                        # Get the actual PIL Image object (Gemini wraps it)
+                        pil_image = getattr(image.image, '_pil_image', image.image)
+
+                        # #comment: MediaService converts to WebP, writes to /generated_media
+                        # and indexes the file for quota tracking and TTL/LRU eviction.
+                        from app.services.media_service import media_service
+                        if stage_media:
+                            image_url = await media_service.stage(partner.id, pil_image)
+                        else:
+                            image_url = await media_service.ingest(partner.id, pil_image)
+                        if not image_url:
+                            logger.error(f"❌ Failed to save {model_name} image for partner {partner.id}")
                             return None
-                        
+
+                        logger.info(f"✅ Imagen: Saved {model_name} image as {image_url}")
+
                         # Remember working model for optimization
                         self._last_working_imagen_model = model_name
-                        
+
                         # Return production URL served by FastAPI
-                        return f"/generated_media/{filename}"
+                        return image_url
                 except Exception as e:
                     logger.warning(f"⚠️ Imagen {model_name} failed/timed out: {e}")
                     continue
@@ -721,17 +744,19 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
         """
         Autoposts to X, Telegram, or LinkedIn using partner's API keys.
         """
+        # Loaded by the caller (selectinload(Partner.social_credentials)); no row means nothing is set up
+        credentials = partner.social_credentials or PartnerSocialCredentials()
         if platform == "x":
-            return await self._post_to_x(partner, content, image_path)
+            return await self._post_to_x(credentials, content, image_path)
         elif platform == "telegram":
-            return await self._post_to_telegram(partner, content, image_path)
+            return await self._post_to_telegram(credentials, content, image_path)
         elif platform == "linkedin":
-            return await self._post_to_linkedin(partner, content, image_path)
+            return await self._post_to_linkedin(credentials, content, image_path)
         else:
             return {"error": "Unsupported platform"}
 
-    async def _post_to_x(self, partner: Partner, content: str, image_path: Optional[str]) -> Dict[str, Any]:
-        if not (partner.x_api_key and partner.x_api_secret and partner.x_access_token and partner.x_access_token_secret):
+    async def _post_to_x(self, credentials: PartnerSocialCredentials, content: str, image_path: Optional[str]) -> Dict[str, Any]:
+        if not (credentials.x_api_key and credentials.x_api_secret and credentials.x_access_token and credentials.x_access_token_secret):
             return {"error": "X (Twitter) API not fully configured. Please sync all 4 keys in API Setup."}
         
         try:
@@ -739,10 +764,10 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
             
             # 1. Initialize Async Client for v2 API (Post Tweet)
             client = tweepy.AsyncClient(
-                consumer_key=partner.x_api_key,
-                consumer_secret=partner.x_api_secret,
-                access_token=partner.x_access_token,
-                access_token_secret=partner.x_access_token_secret
+                consumer_key=credentials.x_api_key,
+                consumer_secret=credentials.x_api_secret,
+                access_token=credentials.x_access_token,
+                access_token_secret=credentials.x_access_token_secret
             )
             
             media_ids = []
@@ -761,8 +786,8 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
                 if os.path.exists(full_image_path):
                     # Use synchronous API for media upload as Tweepy's media upload is primarily v1.1 sync
                     auth = tweepy.OAuth1UserHandler(
-                        partner.x_api_key, partner.x_api_secret,
-                        partner.x_access_token, partner.x_access_token_secret
+                        credentials.x_api_key, credentials.x_api_secret,
+                        credentials.x_access_token, credentials.x_access_token_secret
                     )
                     api_v1 = tweepy.API(auth)
                     
@@ -798,8 +823,8 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
             logger.error(f"❌ X Posting failed: {e}")
             return {"error": f"X API error: {str(e)}"}
 
-    async def _post_to_telegram(self, partner: Partner, content: str, image_path: Optional[str]) -> Dict[str, Any]:
-        if not partner.telegram_channel_id:
+    async def _post_to_telegram(self, credentials: PartnerSocialCredentials, content: str, image_path: Optional[str]) -> Dict[str, Any]:
+        if not credentials.telegram_channel_id:
             return {"error": "Telegram Channel ID missing. Please configure it in API Setup."}
         
         try:
@@ -823,7 +848,7 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
                     from aiogram.types import FSInputFile
                     photo = FSInputFile(full_image_path)
                     await bot.send_photo(
-                        chat_id=partner.telegram_channel_id,
+                        chat_id=credentials.telegram_channel_id,
                         photo=photo,
                         caption=content[:1024], # Telegram caption limit
                         parse_mode="Markdown"
@@ -831,24 +856,24 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
                 else:
                     logger.warning(f"⚠️ Image not found at {full_image_path}, sending text only.")
                     await bot.send_message(
-                        chat_id=partner.telegram_channel_id,
+                        chat_id=credentials.telegram_channel_id,
                         text=content,
                         parse_mode="Markdown"
                     )
             else:
                 await bot.send_message(
-                    chat_id=partner.telegram_channel_id,
+                    chat_id=credentials.telegram_channel_id,
                     text=content,
                     parse_mode="Markdown"
                 )
             
-            return {"status": "success", "platform": "telegram", "msg": f"Successfully posted to {partner.telegram_channel_id}"}
+            return {"status": "success", "platform": "telegram", "msg": f"Successfully posted to {credentials.telegram_channel_id}"}
         except Exception as e:
             logger.error(f"❌ Telegram posting failed: {e}")
             return {"error": f"Telegram API Error: {str(e)}"}
 
-    async def _post_to_linkedin(self, partner: Partner, content: str, image_path: Optional[str]) -> Dict[str, Any]:
-        if not partner.linkedin_access_token:
+    async def _post_to_linkedin(self, credentials: PartnerSocialCredentials, content: str, image_path: Optional[str]) -> Dict[str, Any]:
+        if not credentials.linkedin_access_token:
             return {"error": "LinkedIn API not configured. Upgrade to ELITE integration required."}
         # Simulation for now as LinkedIn requires formal App approval and OAuth flow
         return {"status": "success", "platform": "linkedin", "msg": "Syndicated to LinkedIn Network (PRO Simulation)"}
@@ -965,3 +990,83 @@ RETURN ONLY VALID JSON. NO EXPLANATIONS OUTSIDE JSON.
 
 # Singleton
 viral_studio = ViralMarketingStudio()
+
+# Tokens charged per generation (1 for Text, 1 for Image)
+VIRAL_GENERATION_COST = 2
+VIRAL_JOB_OWNER_TTL = 86400
+
+def viral_job_owner_key(job_id: str) -> str:
+    return f"viral_job:{job_id}:owner"
+
+@broker.task(task_name="generate_viral_content_task")
+async def generate_viral_content_task(
+    partner_id: int,
+    post_type: str,
+    target_audience: str,
+    language: str,
+    referral_link: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Background variant of POST /api/pro/generate.
+    #comment: Imagen attempts can take 25s each, so running them inside the HTTP request
+    pins a Gunicorn worker for the whole synthesis. Here the worker does the heavy lifting,
+    the result lands in RedisAsyncResultBackend and the client polls /api/pro/jobs/{id}.
+    Tokens are deducted only after a successful generation, so failures need no refund.
+    """
+    from app.models.partner import engine
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        partner = await session.get(Partner, partner_id)
+        if not partner:
+            return {"status": "failed", "error": "Partner not found", "error_code": ViralStudioErrorCode.GENERIC_GENERATION_FAILED}
+
+        has_tokens = await viral_studio.check_tokens_and_reset(partner, session, min_tokens=VIRAL_GENERATION_COST)
+        if not has_tokens:
+            return {
+                "status": "failed",
+                "error": get_error_msg(ViralStudioErrorCode.TOKEN_INSUFFICIENT),
+                "error_code": ViralStudioErrorCode.TOKEN_INSUFFICIENT
+            }
+
+        result = await viral_studio.generate_viral_content(
+            partner=partner,
+            post_type=post_type,
+            target_audience=target_audience,
+            language=language,
+            referral_link=referral_link,
+            session=session,
+            stage_media=True
+        )
+
+        if result.get("status") != "success":
+            return {
+                "status": "failed",
+                "error": result.get("error", "Unknown error"),
+                "error_code": result.get("error_code", ViralStudioErrorCode.GENERIC_GENERATION_FAILED)
+            }
+
+        # #comment: Atomic conditional deduction. Another request may have spent tokens
+        # while this job was running, so we never let the balance go negative.
+        charged = await session.execute(
+            text("UPDATE partner_pro_profile SET pro_tokens = pro_tokens - :cost WHERE partner_id = :p_id AND pro_tokens >= :cost RETURNING pro_tokens"),
+            {"cost": VIRAL_GENERATION_COST, "p_id": partner_id}
+        )
+        row = charged.first()
+        await session.commit()
+
+        if row is None:
+            return {
+                "status": "failed",
+                "error": get_error_msg(ViralStudioErrorCode.TOKEN_INSUFFICIENT),
+                "error_code": ViralStudioErrorCode.TOKEN_INSUFFICIENT
+            }
+
+        return {
+            "status": "success",
+            "title": result["title"],
+            "body": result["text"],
+            "hashtags": result["hashtags"],
+            "image_prompt": result["image_prompt"],
+            "image_url": result.get("image_url"),
+            "tokens_remaining": row[0]
+        }
@@ -13,16 +13,9 @@ async def warmup_redis():
     """
     Seeds Redis with critical production data from PostgreSQL.
     Ensures leaderboards and frequent caches are ready on startup.
+    #comment: Runs in one worker per deploy: the "warmup_redis" boot step is leader-elected
+    # (lock:boot:warmup_redis, 10 minutes).
     """
-    # #comment: Implementing a distributed lock to prevent 4 workers from running warmup simultaneously.
-    # We set a 10-minute timeout for the lock to ensure it cleans up if a worker crashes.
-    lock_key = "lock:warmup"
-    is_locked = await redis_service.client.set(lock_key, "1", ex=600, nx=True)
-    
-    if not is_locked:
-        logger.info("ℹ️ Redis Warmup already in progress by another worker. Skipping...")
-        return
-
     logger.info("🔥 Starting Redis Warmup...")
 
     async for session in get_session():
@@ -0,0 +1,290 @@
+import hashlib
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Tokens are runs of letters/digits (latin + cyrillic); everything else is a separator.
+TOKEN_RE = re.compile(r"[0-9a-zа-яё]+", re.IGNORECASE)
+
+STOPWORDS = frozenset({
+    # English
+    "the", "and", "for", "are", "but", "not", "you", "your", "with", "can", "how", "what",
+    "why", "when", "where", "who", "this", "that", "from", "have", "has", "was", "were",
+    "does", "did", "will", "would", "should", "could", "about", "into", "there", "their",
+    "they", "them", "then", "than", "its", "our", "out", "all", "any", "get", "is", "it",
+    "to", "of", "in", "on", "at", "by", "or", "an", "be", "do", "if", "my", "me", "we", "so",
+    # Russian
+    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а", "то", "все", "она",
+    "так", "его", "но", "да", "ты", "к", "у", "же", "вы", "за", "бы", "по", "только", "ее",
+    "мне", "было", "вот", "от", "меня", "еще", "нет", "о", "из", "ему", "теперь", "когда",
+    "ли", "если", "уже", "или", "ни", "быть", "был", "до", "вас", "нибудь", "опять", "уж",
+    "вам", "ведь", "там", "потом", "себя", "ничего", "ей", "может", "они", "тут", "где",
+    "есть", "надо", "ней", "для", "мы", "тебя", "их", "чем", "была", "сам", "чтоб", "без",
+    "будто", "чего", "раз", "тоже", "себе", "под", "будет", "ж", "тогда", "кто", "этот",
+    "мой", "моя", "мою", "мои", "можно", "какой", "какая", "почему", "зачем",
+})
+
+# Light suffix stemmers: good enough to fold plural/tense/case forms of FAQ vocabulary
+# without pulling a full Snowball dependency into every worker.
+EN_SUFFIXES = (
+    "ational", "ization", "fulness", "ousness", "iveness", "ements", "ations",
+    "ement", "ation", "ness", "ment", "able", "ible", "ings", "edly", "ing",
+    "ies", "ied", "ers", "est", "ful", "ous", "ive", "ize", "ed", "er", "ly", "es", "s",
+)
+
+RU_SUFFIXES = (
+    "иями", "ями", "ами", "ией", "иях", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ость", "ости", "ение", "ения", "ений", "ать", "ять", "ить", "еть", "ешь", "ете",
+    "ует", "уют", "ают", "яют", "ает", "яет", "ила", "ило", "или", "ала", "али", "ыла",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ом", "ем", "ам", "ям",
+    "ах", "ях", "ую", "юю", "ов", "ев", "ия", "ию", "ии", "ть", "ал", "ил",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+)
+
+
+def _strip_suffix(word: str, suffixes: Tuple[str, ...], min_stem: int) -> str:
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[: -len(suffix)]
+    return word
+
+
+def stem(word: str) -> str:
+    """Stems a lowercase token with the en or ru rules depending on its script."""
+    if not word or word.isdigit():
+        return word
+    if "а" <= word[0] <= "я" or word[0] == "ё":
+        return _strip_suffix(word.replace("ё", "е"), RU_SUFFIXES, 3)
+    word = _strip_suffix(word, EN_SUFFIXES, 3)
+    # Fold silent "e" so issue/issues and phone/phones share a stem
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases, splits, drops stopwords/1-char tokens and stems."""
+    tokens = []
+    for raw in TOKEN_RE.findall(str(text or "").lower()):
+        if len(raw) < 2 or raw in STOPWORDS:
+            continue
+        tokens.append(stem(raw))
+    return tokens
+
+
+def row_key(record: Dict[str, Any]) -> str:
+    """Stable row identity: the sheet's ID column when present, else the normalised Question."""
+    row_id = str(record.get("ID", "")).strip()
+    if row_id:
+        return f"id:{row_id}"
+    question = " ".join(str(record.get("Question", "")).lower().split())
+    return "q:" + hashlib.sha1(question.encode()).hexdigest()[:12]
+
+
+def diff_rows(
+    old_records: List[Dict[str, Any]],
+    new_records: List[Dict[str, Any]],
+    old_hashes: List[str],
+    new_hashes: List[str],
+) -> Tuple[Dict[int, int], List[int], List[int]]:
+    """
+    Matches rows by row_key instead of position, so inserting or deleting a row
+    does not mark every row below it as changed.
+    Returns (kept old->new positions, removed old positions, added new positions);
+    an edited row is removed at its old position and added at its new one.
+    """
+    old_by_key: Dict[str, List[int]] = {}
+    for pos, record in enumerate(old_records):
+        old_by_key.setdefault(row_key(record), []).append(pos)
+
+    kept: Dict[int, int] = {}
+    added: List[int] = []
+    for pos, record in enumerate(new_records):
+        # #comment: Duplicate keys pair up in sheet order
+        candidates = old_by_key.get(row_key(record))
+        old_pos = candidates.pop(0) if candidates else None
+        if old_pos is not None and old_hashes[old_pos] == new_hashes[pos]:
+            kept[old_pos] = pos
+            continue
+        added.append(pos)
+
+    removed = sorted(pos for pos in range(len(old_records)) if pos not in kept)
+    return kept, removed, added
+
+
+class KBSearchIndex:
+    """
+    In-memory BM25F retrieval engine for the support Knowledge Base.
+    Indexes both the Question and Answer fields of each record; question matches
+    weigh more. Postings are stored as parallel arrays per term:
+        term -> [doc_ids, question_tfs, answer_tfs]
+    Per-document length normalisers are precomputed at build time, so a query only
+    touches the postings of its own terms.
+    """
+
+    VERSION = 1
+    K1 = 1.2
+    B = 0.75
+    FIELD_WEIGHTS = {"question": 2.0, "answer": 1.0}
+
+    def __init__(
+        self,
+        postings: Dict[str, List[List[int]]],
+        question_lens: List[int],
+        answer_lens: List[int],
+        kb_version: Optional[str] = None,
+    ):
+        self.postings = postings
+        self.question_lens = question_lens
+        self.answer_lens = answer_lens
+        self.kb_version = kb_version
+        self.n_docs = len(question_lens)
+        self._prepare()
+
+    def _prepare(self):
+        """Derives IDF and length normalisers (not serialized, cheap to recompute)."""
+        n = self.n_docs
+        avg_q = (sum(self.question_lens) / n) if n else 0.0
+        avg_a = (sum(self.answer_lens) / n) if n else 0.0
+        self._norm_q = [
+            (1 - self.B + self.B * (length / avg_q)) if avg_q else 1.0 for length in self.question_lens
+        ]
+        self._norm_a = [
+            (1 - self.B + self.B * (length / avg_a)) if avg_a else 1.0 for length in self.answer_lens
+        ]
+        self._idf = {
+            term: math.log(1 + (n - len(p[0]) + 0.5) / (len(p[0]) + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    @classmethod
+    def build(cls, records: List[Dict[str, Any]], kb_version: Optional[str] = None) -> "KBSearchIndex":
+        postings: Dict[str, List[List[int]]] = {}
+        question_lens: List[int] = []
+        answer_lens: List[int] = []
+
+        for doc_id, record in enumerate(records):
+            q_len, a_len, counts = cls._count_terms(record)
+            question_lens.append(q_len)
+            answer_lens.append(a_len)
+            cls._add_postings(postings, doc_id, counts)
+
+        return cls(postings, question_lens, answer_lens, kb_version=kb_version)
+
+    @staticmethod
+    def _count_terms(record: Dict[str, Any]) -> Tuple[int, int, Dict[str, List[int]]]:
+        """Returns (question_len, answer_len, term -> [question_tf, answer_tf])."""
+        q_tokens = tokenize(record.get("Question", ""))
+        a_tokens = tokenize(record.get("Answer", ""))
+        counts: Dict[str, List[int]] = {}
+        for t in q_tokens:
+            counts.setdefault(t, [0, 0])[0] += 1
+        for t in a_tokens:
+            counts.setdefault(t, [0, 0])[1] += 1
+        return len(q_tokens), len(a_tokens), counts
+
+    @staticmethod
+    def _add_postings(postings: Dict[str, List[List[int]]], doc_id: int, counts: Dict[str, List[int]]):
+        for term, (q_tf, a_tf) in counts.items():
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = [[], [], []]
+            entry[0].append(doc_id)
+            entry[1].append(q_tf)
+            entry[2].append(a_tf)
+
+    def _remove_postings(self, doc_id: int, record: Dict[str, Any]):
+        _, _, counts = self._count_terms(record)
+        for term in counts:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            try:
+                pos = entry[0].index(doc_id)
+            except ValueError:
+                continue
+            for column in entry:
+                column.pop(pos)
+            if not entry[0]:
+                del self.postings[term]
+
+    def apply_changes(
+        self,
+        old_records: List[Dict[str, Any]],
+        new_records: List[Dict[str, Any]],
+        kept: Dict[int, int],
+        removed: List[int],
+        added: List[int],
+        kb_version: Optional[str] = None,
+    ):
+        """
+        Incrementally re-indexes a keyed row diff (see diff_rows).
+        Only removed/added rows are re-tokenized; kept rows that merely shifted
+        position are renumbered in place.
+        """
+        for doc_id in removed:
+            self._remove_postings(doc_id, old_records[doc_id])
+
+        n = len(new_records)
+        question_lens = [0] * n
+        answer_lens = [0] * n
+        for old_id, new_id in kept.items():
+            question_lens[new_id] = self.question_lens[old_id]
+            answer_lens[new_id] = self.answer_lens[old_id]
+
+        if any(old_id != new_id for old_id, new_id in kept.items()):
+            for entry in self.postings.values():
+                entry[0] = [kept[doc_id] for doc_id in entry[0]]
+
+        for doc_id in added:
+            q_len, a_len, counts = self._count_terms(new_records[doc_id])
+            question_lens[doc_id] = q_len
+            answer_lens[doc_id] = a_len
+            self._add_postings(self.postings, doc_id, counts)
+
+        self.question_lens = question_lens
+        self.answer_lens = answer_lens
+        self.n_docs = n
+        if kb_version is not None:
+            self.kb_version = kb_version
+        self._prepare()
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, int]]:
+        """Returns up to top_k (score, record_index) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.n_docs:
+            return []
+
+        w_q = self.FIELD_WEIGHTS["question"]
+        w_a = self.FIELD_WEIGHTS["answer"]
+        k1 = self.K1
+        scores: Dict[int, float] = {}
+
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            idf = self._idf[term]
+            doc_ids, q_tfs, a_tfs = entry
+            for doc_id, q_tf, a_tf in zip(doc_ids, q_tfs, a_tfs):
+                tf = w_q * q_tf / self._norm_q[doc_id] + w_a * a_tf / self._norm_a[doc_id]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf / (k1 + tf)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [(score, doc_id) for doc_id, score in ranked]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form for sharing one built index across workers via Redis."""
+        return {
+            "v": self.VERSION,
+            "kb_version": self.kb_version,
+            "postings": self.postings,
+            "qlen": self.question_lens,
+            "alen": self.answer_lens,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional["KBSearchIndex"]:
+        if not data or data.get("v") != cls.VERSION:
+            return None
+        return cls(data["postings"], data["qlen"], data["alen"], kb_version=data.get("kb_version"))
@@ -0,0 +1,248 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class ReferralGraph:
+    """
+    Compact in-memory snapshot of the referral tree for analytics and admin jobs.
+    One row per partner, ordered by id, stored column-wise:
+        ids         int64    partner id (sorted, so id -> index is a binary search)
+        parent      int32    index of the referrer, -1 for roots / unknown referrers
+        created_at  int64    unix seconds
+        is_pro      bool
+        xp          float64
+    Children are kept in CSR form: children of i are children[offsets[i]:offsets[i + 1]].
+    Partners sitting on a referrer cycle are unreachable from any root (depth == -1).
+    """
+
+    VERSION = 1
+    MAX_LEVEL = 9  # Referral levels that count toward a partner's network
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        parent: np.ndarray,
+        created_at: np.ndarray,
+        is_pro: np.ndarray,
+        xp: np.ndarray,
+        offsets: Optional[np.ndarray] = None,
+        children: Optional[np.ndarray] = None,
+        built_at: Optional[float] = None,
+    ):
+        self.ids = ids
+        self.parent = parent
+        self.created_at = created_at
+        self.is_pro = is_pro
+        self.xp = xp
+        self.n = len(ids)
+        self.built_at = built_at or time.time()
+        if offsets is None or children is None:
+            offsets, children = self._build_children(parent)
+        self.offsets = offsets
+        self.children = children
+        self._depth: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _build_children(parent: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        has_parent = parent >= 0
+        counts = np.bincount(parent[has_parent], minlength=len(parent))
+        offsets = np.zeros(len(parent) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Stable sort keeps siblings in id (= signup) order
+        children = np.flatnonzero(has_parent)[np.argsort(parent[has_parent], kind="stable")].astype(np.int32)
+        return offsets, children
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]]) -> "ReferralGraph":
+        """Builds from (id, referrer_id, created_at, is_pro, xp) rows (any order)."""
+        rows = sorted(rows, key=lambda r: r[0])
+        n = len(rows)
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        referrers = np.fromiter((r[1] if r[1] is not None else -1 for r in rows), dtype=np.int64, count=n)
+        parent = np.full(n, -1, dtype=np.int32)
+        if n:
+            pos = np.searchsorted(ids, referrers).clip(0, n - 1)
+            known = (referrers >= 0) & (ids[pos] == referrers)
+            parent[known] = pos[known]
+        created_at = np.array(
+            [r[2] or datetime(1970, 1, 1) for r in rows], dtype="datetime64[s]"
+        ).astype(np.int64)
+        is_pro = np.fromiter((bool(r[3]) for r in rows), dtype=bool, count=n)
+        xp = np.fromiter((float(r[4] or 0) for r in rows), dtype=np.float64, count=n)
+        return cls(ids, parent, created_at, is_pro, xp)
+
+    # --- Lookups -------------------------------------------------------------
+
+    def index_of(self, partner_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, partner_id))
+        return i if i < self.n and self.ids[i] == partner_id else None
+
+    def children_of(self, i: int) -> np.ndarray:
+        return self.children[self.offsets[i]:self.offsets[i + 1]]
+
+    def _expand(self, frontier: np.ndarray) -> np.ndarray:
+        """All children of a set of nodes in one vectorized CSR gather."""
+        starts = self.offsets[frontier]
+        lens = self.offsets[frontier + 1] - starts
+        total = int(lens.sum())
+        if not total:
+            return np.empty(0, dtype=np.int32)
+        shift = np.repeat(starts - np.cumsum(lens) + lens, lens)
+        return self.children[shift + np.arange(total)]
+
+    def ancestors(self, i: int, limit: Optional[int] = None) -> Optional[List[int]]:
+        """Ancestor indexes nearest-first (up to limit), or None if i sits on a cycle."""
+        chain: List[int] = []
+        seen = {i}
+        p = int(self.parent[i])
+        while p >= 0 and (limit is None or len(chain) < limit):
+            if p in seen:
+                return None
+            seen.add(p)
+            chain.append(p)
+            p = int(self.parent[p])
+        return chain
+
+    def path_of(self, i: int) -> Optional[str]:
+        """Materialized Partner.path for i (root-first ancestor ids), None for roots."""
+        chain = self.ancestors(i)
+        if not chain:
+            return None
+        return ".".join(str(self.ids[a]) for a in reversed(chain))
+
+    # --- Whole-tree metrics ----------------------------------------------------
+
+    @property
+    def depth(self) -> np.ndarray:
+        """Depth per node via level-by-level BFS from the roots; -1 for unreachable."""
+        if self._depth is None:
+            depth = np.full(self.n, -1, dtype=np.int32)
+            frontier = np.flatnonzero(self.parent < 0).astype(np.int32)
+            level = 0
+            while len(frontier):
+                depth[frontier] = level
+                frontier = self._expand(frontier)
+                frontier = frontier[depth[frontier] < 0]  # Cycle guard
+                level += 1
+            self._depth = depth
+        return self._depth
+
+    def topological_order(self) -> np.ndarray:
+        """Reachable nodes, parents always before their children (BFS order)."""
+        depth = self.depth
+        reachable = np.flatnonzero(depth >= 0)
+        return reachable[np.argsort(depth[reachable], kind="stable")]
+
+    def descendant_counts(self, max_depth: int = MAX_LEVEL) -> np.ndarray:
+        """
+        Per node: descendants within max_depth levels (the referral_count rule).
+        Every node pushes one unit up its ancestor chain, all nodes at once per step.
+        """
+        counts = np.zeros(self.n, dtype=np.int64)
+        anc = np.where(self.depth >= 0, self.parent, -1)
+        for _ in range(max_depth):
+            mask = anc >= 0
+            if not mask.any():
+                break
+            counts += np.bincount(anc[mask], minlength=self.n)
+            anc[mask] = self.parent[anc[mask]]
+        return counts
+
+    def subtree_sizes(self) -> np.ndarray:
+        """Per node: size of its whole subtree including itself (0 for unreachable)."""
+        depth = self.depth
+        sizes = (depth >= 0).astype(np.int64)
+        if not self.n or depth.max() <= 0:
+            return sizes
+        order = self.topological_order()
+        boundaries = np.searchsorted(depth[order], np.arange(depth.max() + 2))
+        for level in range(depth.max(), 0, -1):
+            nodes = order[boundaries[level]:boundaries[level + 1]]
+            np.add.at(sizes, self.parent[nodes], sizes[nodes])
+        return sizes
+
+    # --- Per-node walks ---------------------------------------------------------
+
+    def level_counts(self, i: int, max_depth: int = MAX_LEVEL) -> List[int]:
+        """Number of partners on each level 1..max_depth below i."""
+        counts: List[int] = []
+        frontier = np.array([i], dtype=np.int32)
+        for _ in range(max_depth):
+            frontier = self._expand(frontier)
+            counts.append(len(frontier))
+            if not len(frontier):
+                break
+        counts.extend([0] * (max_depth - len(counts)))
+        return counts
+
+    def subtree(self, roots: Sequence[int]) -> np.ndarray:
+        """All nodes under (and including) the given roots, BFS order, cycle-safe."""
+        seen = np.zeros(self.n, dtype=bool)
+        frontier = np.unique(np.asarray(roots, dtype=np.int32))
+        parts = []
+        while len(frontier):
+            seen[frontier] = True
+            parts.append(frontier)
+            frontier = self._expand(frontier)
+            frontier = frontier[~seen[frontier]]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+    def build_paths(self, order: np.ndarray) -> List[Optional[str]]:
+        """
+        Partner.path for every node in a topological order. Each path is derived once from
+        the parent's; nodes whose parent isn't in `order` get their path from an ancestor walk.
+        """
+        paths: List[Optional[str]] = [None] * self.n
+        done = np.zeros(self.n, dtype=bool)
+        ids = self.ids.tolist()
+        parent = self.parent.tolist()
+        for i in order.tolist():
+            p = parent[i]
+            if p < 0:
+                paths[i] = None
+            elif done[p]:
+                paths[i] = f"{paths[p]}.{ids[p]}" if paths[p] else str(ids[p])
+            else:
+                paths[i] = self.path_of(i)
+            done[i] = True
+        return paths
+
+    # --- Snapshot cache ----------------------------------------------------------
+
+    def save(self, path: str):
+        """Writes an uncompressed .npz snapshot atomically (tmp file + rename)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                meta=np.array([self.VERSION, self.built_at], dtype=np.float64),
+                ids=self.ids,
+                parent=self.parent,
+                created_at=self.created_at,
+                is_pro=self.is_pro,
+                xp=self.xp,
+                offsets=self.offsets,
+                children=self.children,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, max_age: Optional[float] = None) -> Optional["ReferralGraph"]:
+        """Loads a snapshot; None if missing, from another format version or older than max_age."""
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+                return None
+            with np.load(path, allow_pickle=False) as data:
+                version, built_at = data["meta"]
+                if int(version) != cls.VERSION:
+                    return None
+                return cls(
+                    data["ids"], data["parent"], data["created_at"], data["is_pro"], data["xp"],
+                    offsets=data["offsets"], children=data["children"], built_at=float(built_at),
+                )
+        except (OSError, KeyError, ValueError):
+            return None
@@ -1,11 +1,15 @@
+# #comment: Must stay the first import: with STARTUP_PROFILE=1 it times every import below.
+from app.core.startup_profiler import startup_profiler
+
 from typing import List
 
 import taskiq_fastapi
-from taskiq import TaskiqScheduler
+from taskiq import TaskiqEvents, TaskiqScheduler
 from taskiq.schedule_sources import LabelScheduleSource
 from taskiq_redis import ListQueueBroker, RedisAsyncResultBackend
 
 from app.core.config import settings
+from app.core.process import after_fork
 
 # 1. Init Broker (Redis)
 broker = ListQueueBroker(
@@ -13,11 +17,17 @@ broker = ListQueueBroker(
 )
 
 # 2. Init Result Backend (for checking task status if needed)
+# Results expire after a day so polled job payloads (e.g. Viral Studio) don't pile up.
 result_backend = RedisAsyncResultBackend(
     redis_url=settings.REDIS_URL,
+    result_ex_time=86400,
 )
 broker.with_result_backend(result_backend)
 
+# Forked web workers (Gunicorn preload) open their own connections to enqueue tasks
+after_fork(broker.connection_pool.reset)
+after_fork(result_backend.redis_pool.reset)
+
 # 3. Validation Middleware
 # This ensures that tasks are validated against their type hints
 # broker.add_middleware(TaskiqValidationMiddleware())
@@ -35,6 +45,12 @@ taskiq_fastapi.init(
     "app.main:app",
 )
 
+# Boot report (steps always, per-module import times with STARTUP_PROFILE=1)
+async def log_worker_boot(state):
+    startup_profiler.log_report("TaskIQ worker")
+
+broker.add_event_handler(TaskiqEvents.WORKER_STARTUP, log_worker_boot)
+
 # 6. Define Tasks to be imported
 # (This ensures the worker knows about them on startup)
 TASKS_TO_IMPORT: List[str] = [
@@ -44,4 +60,10 @@ TASKS_TO_IMPORT: List[str] = [
     "app.services.referral_service",
     "app.services.analytics_service",
     "app.services.support_service",
+    "app.services.viral_service",
+    "app.services.ton_indexer_service",
+    "app.services.payment_session_service",
+    "app.services.price_oracle_service",
+    "app.services.maintenance_service",
+    "app.services.checkin_service",
 ]
@@ -6,12 +6,14 @@ import urllib.parse
 import sentry_sdk
 
 from aiogram import Bot, Dispatcher, F, types
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
 from aiogram.filters import Command, CommandStart
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app.core.config import settings
 from app.core.i18n import get_msg
 from app.models.partner import get_session
+from app.services.telegram_client import telegram_client
 
 # #comment: Centralizing bot initialization and configurations. 
 # We use a deferred import pattern for services in handlers to avoid circular dependencies.
@@ -62,10 +64,9 @@ async def cmd_start(message: types.Message):
     # Fetch user profile photo file_id
     photo_file_id = None
     try:
-        user_photos = await bot.get_user_profile_photos(message.from_user.id, limit=1)
-        if user_photos.total_count > 0:
-            # Store the file_id which we can use to fetch the photo anytime
-            photo_file_id = user_photos.photos[0][0].file_id
+        # Store the file_id which we can use to fetch the photo anytime
+        photo_file_id = await telegram_client.get_profile_photo_file_id(message.from_user.id)
+        if photo_file_id:
             logging.info(f"✅ Captured photo file_id for user {message.from_user.id}")
     except Exception as e:
         logging.error(f"❌ Error fetching profile photo: {e}")
@@ -87,7 +88,7 @@ async def cmd_start(message: types.Message):
             await process_referral_notifications(bot, session, partner, is_new)
 
             # Personal referral link
-            bot_info = await bot.get_me()
+            bot_info = await telegram_client.get_me()
             referral_link = f"https://t.me/{bot_info.username}?start={partner.referral_code}"
             
             # Localized messaging
@@ -156,20 +157,15 @@ async def cmd_my_network(message: types.Message):
         await message.answer(f"⚠️ Error fetching stats: {str(e)}")
 
 
-# Cache bot username to avoid repeated API calls
-BOT_USERNAME = None
-
 @dp.inline_query()
 async def inline_handler(inline_query: types.InlineQuery):
-    global BOT_USERNAME
     try:
-        if not BOT_USERNAME:
-            bot_info = await bot.get_me()
-            BOT_USERNAME = bot_info.username.replace("@", "")
+        # Memoized by telegram_client
+        bot_username = (await telegram_client.bot_username()).replace("@", "")
 
         ref_code = inline_query.query or ""
         query_code = ref_code if ref_code else "start"
-        ref_link = f"https://t.me/{BOT_USERNAME}?start={query_code}"
+        ref_link = f"https://t.me/{bot_username}?start={query_code}"
 
         # Base URL for assets
         if settings.WEBHOOK_URL and settings.WEBHOOK_PATH in settings.WEBHOOK_URL:
@@ -308,6 +304,7 @@ async def handle_buy_pro(message: types.Message):
 
             # Create payment session
             payment_data = await payment_service.create_payment_session(session, partner.id)
+            await session.commit()  # The chain indexer matches against persisted sessions
 
             text = (
                 "👑 *UPGRADE TO PRO*\n\n"
@@ -316,18 +313,21 @@ async def handle_buy_pro(message: types.Message):
                 "• X5 XP Multiplier\n"
                 "• Priority Payouts\n"
                 "• VIP Support\n\n"
-                f"💰 *Price:* {payment_data['amount_ton']} TON (~$39)\n"
+                f"💰 *Price:* {payment_data['amount']} TON (~$39)\n"
                 f"⏳ *Valid for:* 10 minutes\n\n"
                 "Please send the exact amount to the address below:"
             )
 
             # Send the address as a separate message for easy copying, or just include in code block
             text += f"\n\n`{payment_data['address']}`"
+            text += f"\n\n📝 *Comment:* `{payment_data['comment']}`"
 
             await message.answer(
                 text,
                 parse_mode="Markdown",
-                reply_markup=get_pro_payment_keyboard(payment_data['address'], payment_data['amount_ton'])
+                reply_markup=get_pro_payment_keyboard(
+                    payment_data['address'], payment_data['amount'], comment=payment_data['comment']
+                )
             )
             break
     except Exception as e:
@@ -370,7 +370,7 @@ async def handle_tx_hash(message: types.Message):
                     parse_mode="Markdown"
                 )
                 # Show main menu again with new status
-                bot_info = await bot.get_me()
+                bot_info = await telegram_client.get_me()
                 referral_link = f"https://t.me/{bot_info.username}?start={partner.referral_code}"
                 share_text = get_msg(partner.language_code or "en", "share_text")
                 share_url = f"https://t.me/share/url?url={urllib.parse.quote(referral_link)}&text={urllib.parse.quote(share_text)}"
@@ -401,6 +401,88 @@ async def callback_cancel_payment(callback: types.CallbackQuery):
     await callback.message.edit_text("❌ Payment cancelled. You can upgrade to PRO anytime by typing /pro.")
     await callback.answer()
 
+SUPPORT_STREAM_EDIT_INTERVAL = 1.2  # Seconds between edits (Telegram allows ~1 edit/sec per chat)
+SUPPORT_STREAM_MIN_DELTA = 30  # Don't spend an edit on a few characters
+TELEGRAM_TEXT_LIMIT = 4000  # Hard limit is 4096, keep headroom for Markdown
+
+async def _send_markdown_safe(send, text: str):
+    """Tries Markdown first; unbalanced model output falls back to plain text."""
+    try:
+        return await send(text, parse_mode="Markdown")
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            return None
+        return await send(text)
+
+async def _stream_support_reply(message: types.Message, stream):
+    """
+    Progressively edits one placeholder message while the answer streams in.
+    Intermediate edits are plain text (partial Markdown does not parse) and throttled;
+    the final edit applies Markdown and overflow goes to follow-up messages.
+    """
+    placeholder = None
+    shown = ""
+    text = ""
+    last_edit = 0.0
+    loop = asyncio.get_running_loop()
+
+    async for text in stream:
+        if placeholder is None:
+            placeholder = await message.answer(text[:TELEGRAM_TEXT_LIMIT] + " ▌")
+            shown = text
+            last_edit = loop.time()
+            continue
+
+        now = loop.time()
+        if now - last_edit < SUPPORT_STREAM_EDIT_INTERVAL or len(text) - len(shown) < SUPPORT_STREAM_MIN_DELTA:
+            continue
+        if len(shown) >= TELEGRAM_TEXT_LIMIT:
+            continue  # First message is full, the rest is sent after the stream completes
+        try:
+            await placeholder.edit_text(text[:TELEGRAM_TEXT_LIMIT] + " ▌")
+            shown = text
+        except TelegramRetryAfter as e:
+            # #comment: Flood control: skip edits until the window reopens, never block the stream
+            last_edit = now + e.retry_after
+            continue
+        except (TelegramBadRequest, TelegramNetworkError):
+            pass
+        last_edit = now
+
+    if not text:
+        return
+
+    chunks = [text[i:i + TELEGRAM_TEXT_LIMIT] for i in range(0, len(text), TELEGRAM_TEXT_LIMIT)]
+    if placeholder is None:
+        await _send_markdown_safe(message.answer, chunks[0])
+    else:
+        await _finish_placeholder(message, placeholder, chunks[0])
+    for chunk in chunks[1:]:
+        await _send_markdown_safe(message.answer, chunk)
+
+async def _finish_placeholder(message: types.Message, placeholder: types.Message, text: str):
+    """
+    Final edit of the streamed placeholder (drops the ▌ cursor). Flood control is waited out
+    and the edit retried once; if it still fails the answer is sent as a new message.
+    """
+    for attempt in range(2):
+        try:
+            await _send_markdown_safe(placeholder.edit_text, text)
+            return
+        except TelegramRetryAfter as e:
+            if attempt:
+                break
+            await asyncio.sleep(e.retry_after)
+        except TelegramAPIError as e:
+            logging.warning(f"⚠️ Final support reply edit failed: {e}")
+            break
+
+    try:
+        await placeholder.delete()
+    except TelegramAPIError:
+        pass  # The partial text stays above the full answer
+    await _send_markdown_safe(message.answer, text)
+
 @dp.message(F.text & ~F.text.startswith('/'))
 async def handle_support_chat(message: types.Message):
     """
@@ -434,19 +516,14 @@ async def handle_support_chat(message: types.Message):
                 "balance": float(partner.balance) if partner else 0.0
             }
             
-            response = await support_service.generate_response(
+            # #comment: Streaming mode: the user sees text from the first token instead of
+            # waiting for the full completion. The session turn is committed by the service.
+            stream = support_service.stream_response(
                 user_id=user_id,
                 message=message.text,
                 user_metadata=user_metadata
             )
-            
-            # Splitting response if it's too long for Telegram (limit 4096)
-            if len(response) > 4000:
-                chunks = [response[i:i+4000] for i in range(0, len(response), 4000)]
-                for chunk in chunks:
-                    await message.answer(chunk, parse_mode="Markdown")
-            else:
-                await message.answer(response, parse_mode="Markdown")
+            await _stream_support_reply(message, stream)
             break
     except Exception as e:
         logging.error(f"❌ Error in support chat handler: {e}")
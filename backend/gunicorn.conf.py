@@ -0,0 +1,46 @@
+"""
+Gunicorn settings, read automatically from the working directory (start.sh).
+
+#comment: With GUNICORN_PRELOAD=1 (default) the app is imported once in the master and the
+workers are forked from it, so module code, the cmo_intelligence / i18n tables and the
+support prompts live in pages shared copy-on-write instead of once per worker.
+Following the gc.freeze() recipe: no collections in the master while it imports the app
+(freed objects would leave holes in those pages), freeze right before each fork, collections
+back on in the child. DB / Redis / httpx pools are reset in the child by app.core.process
+hooks; the lifespan (webhook, consumers, warmups) still runs per worker, after the fork.
+Set GUNICORN_PRELOAD=0 to get the previous import-per-worker behaviour.
+"""
+import gc
+import logging
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+# #comment: 4 workers are ideal for a 2-core machine. Check the per-worker "uss" in the boot
+# log before raising it in a memory-constrained container.
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("gunicorn.error")
+
+if preload_app:
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        from app.core.process import format_memory, memory_usage
+        logger.info(f"🧠 Master after preload (pid {os.getpid()}): {format_memory(memory_usage())}")
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from app.core.process import freeze_heap
+        frozen = freeze_heap()
+        logger.debug(f"gc.freeze(): {frozen} objects in the permanent generation")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
@@ -6,7 +6,7 @@ from sqlalchemy import pool
 from sqlmodel import SQLModel
 from app.models.audit_log import AuditLog
 from app.models.partner import Partner
-from app.models.transaction import PartnerTransaction
+from app.models.transaction import IncomingPayment, PartnerTransaction
 
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,58 @@
+"""add incoming_payment table for the TON chain indexer
+
+Revision ID: 20261019_1200
+Revises: 7f650437f795
+Create Date: 2026-10-19 12:00:00.000000
+
+#comment: Local index of transfers to the admin TON wallet. Payment verification
+becomes a lookup by hash here instead of scanning getTransactions per attempt.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_1200'
+down_revision: Union[str, Sequence[str], None] = '7f650437f795'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+
+    # #comment: create_all() in the lifespan may have created the table already
+    if 'incoming_payment' in inspector.get_table_names():
+        print("✅ Table incoming_payment already exists.")
+        return
+
+    op.create_table(
+        'incoming_payment',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tx_hash', sa.String(), nullable=False),
+        sa.Column('lt', sa.BigInteger(), nullable=False),
+        sa.Column('amount_nano', sa.BigInteger(), nullable=False),
+        sa.Column('source', sa.String(), nullable=True),
+        sa.Column('comment', sa.String(), nullable=True),
+        sa.Column('utime', sa.DateTime(), nullable=False),
+        sa.Column('matched_transaction_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['matched_transaction_id'], ['partnertransaction.id'], ),
+    )
+    op.create_index(op.f('ix_incoming_payment_tx_hash'), 'incoming_payment', ['tx_hash'], unique=True)
+    op.create_index(op.f('ix_incoming_payment_lt'), 'incoming_payment', ['lt'], unique=False)
+    op.create_index(op.f('ix_incoming_payment_matched_transaction_id'), 'incoming_payment', ['matched_transaction_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_incoming_payment_matched_transaction_id'), table_name='incoming_payment')
+    op.drop_index(op.f('ix_incoming_payment_lt'), table_name='incoming_payment')
+    op.drop_index(op.f('ix_incoming_payment_tx_hash'), table_name='incoming_payment')
+    op.drop_table('incoming_payment')
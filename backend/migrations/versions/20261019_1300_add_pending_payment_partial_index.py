@@ -0,0 +1,54 @@
+"""add partial index on pending payment sessions
+
+Revision ID: 20261019_1300
+Revises: 20261019_1200
+Create Date: 2026-10-19 13:00:00.000000
+
+#comment: Open-session lookups only ever touch status = 'pending'. The partial index
+stays small because the sweeper moves stale rows to 'expired'.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_1300'
+down_revision: Union[str, Sequence[str], None] = '20261019_1200'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+
+    index_names = [idx['name'] for idx in inspector.get_indexes('partnertransaction')]
+    if 'ix_partnertransaction_pending' in index_names:
+        print("✅ Index ix_partnertransaction_pending already exists.")
+    else:
+        op.create_index(
+            'ix_partnertransaction_pending',
+            'partnertransaction',
+            ['partner_id', 'currency', 'created_at'],
+            unique=False,
+            postgresql_where=sa.text("status = 'pending'"),
+            sqlite_where=sa.text("status = 'pending'")
+        )
+
+    # #comment: One-off cleanup of sessions that were never expired before the sweeper existed
+    op.execute(
+        "UPDATE partnertransaction SET status = 'expired' "
+        "WHERE status = 'pending' AND created_at < CURRENT_TIMESTAMP - INTERVAL '1 day'"
+        if conn.dialect.name == 'postgresql' else
+        "UPDATE partnertransaction SET status = 'expired' "
+        "WHERE status = 'pending' AND created_at < datetime('now', '-1 day')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_partnertransaction_pending', table_name='partnertransaction')
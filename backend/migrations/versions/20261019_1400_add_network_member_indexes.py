@@ -0,0 +1,69 @@
+"""add indexes for keyset-paginated network members
+
+Revision ID: 20261019_1400
+Revises: 20261019_1300
+Create Date: 2026-10-19 14:00:00.000000
+
+#comment: /partner/network/{level} pages by (xp, id) or (created_at, id).
+Level 1 is served by (referrer_id, key, id); deeper levels by a path-prefix index per
+depth that covers the narrow member projection (index-only scans on PostgreSQL).
+Indexes are built CONCURRENTLY outside the migration transaction, so the partner
+table keeps taking writes while they build.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_1400'
+down_revision: Union[str, Sequence[str], None] = '20261019_1300'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MEMBER_COLUMNS = [
+    "telegram_id", "username", "first_name", "last_name", "photo_url", "photo_file_id",
+    "xp", "level", "is_pro", "created_at"
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+    index_names = [idx['name'] for idx in inspector.get_indexes('partner')]
+
+    # #comment: CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        if 'ix_partner_referrer_xp' not in index_names:
+            op.create_index(
+                'ix_partner_referrer_xp', 'partner', ['referrer_id', 'xp', 'id'],
+                unique=False, postgresql_concurrently=True
+            )
+        if 'ix_partner_referrer_created' not in index_names:
+            op.create_index(
+                'ix_partner_referrer_created', 'partner', ['referrer_id', 'created_at', 'id'],
+                unique=False, postgresql_concurrently=True
+            )
+        if 'ix_partner_depth_path_members' in index_names:
+            print("✅ Index ix_partner_depth_path_members already exists.")
+        else:
+            op.create_index(
+                'ix_partner_depth_path_members',
+                'partner',
+                ['depth', 'path', 'id'],
+                unique=False,
+                postgresql_ops={'path': 'varchar_pattern_ops'},
+                postgresql_include=MEMBER_COLUMNS,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_partner_depth_path_members', table_name='partner', postgresql_concurrently=True)
+        op.drop_index('ix_partner_referrer_created', table_name='partner', postgresql_concurrently=True)
+        op.drop_index('ix_partner_referrer_xp', table_name='partner', postgresql_concurrently=True)
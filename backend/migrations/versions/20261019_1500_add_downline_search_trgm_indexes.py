@@ -0,0 +1,52 @@
+"""add pg_trgm indexes for downline search
+
+Revision ID: 20261019_1500
+Revises: 20261019_1400
+Create Date: 2026-10-19 15:00:00.000000
+
+#comment: Downline search filters lower(username) / lower(first_name) with substring LIKE.
+GIN trigram indexes make that indexable; PostgreSQL combines them with the path/depth
+ancestry index. PostgreSQL only (SQLite dev databases fall back to a scan).
+The indexes are built CONCURRENTLY outside the migration transaction, so the partner
+table keeps taking writes while they build.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_1500'
+down_revision: Union[str, Sequence[str], None] = '20261019_1400'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_INDEXES = {
+    'ix_partner_username_trgm': 'lower(username)',
+    'ix_partner_first_name_trgm': 'lower(first_name)',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        print("ℹ️ Skipping pg_trgm indexes (not PostgreSQL).")
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # #comment: CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for name, expression in TRGM_INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON partner USING gin ({expression} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name in TRGM_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
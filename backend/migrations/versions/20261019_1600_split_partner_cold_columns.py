@@ -0,0 +1,125 @@
+"""split cold partner columns into partner_pro_profile / partner_social_credentials
+
+Revision ID: 20261019_1600
+Revises: 20261019_1500
+Create Date: 2026-10-19 16:00:00.000000
+
+#comment: xp/balance/check-in updates rewrite the whole partner tuple. Moving the social
+API secrets, payment_details, the Academy JSON text and the PRO metadata into 1:1 side
+tables keeps the hot row narrow. partner also gets fillfactor 90 so updates of
+non-indexed columns (balance, check-in, pro flags) can stay HOT on the same page.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_1600'
+down_revision: Union[str, Sequence[str], None] = '20261019_1500'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PRO_PROFILE_COLUMNS = [
+    "pro_purchased_at", "pro_started_at", "subscription_plan", "payment_details",
+    "pro_tokens", "pro_tokens_last_reset", "completed_tasks", "completed_stages", "academy_score"
+]
+SOCIAL_COLUMNS = [
+    "x_api_key", "x_api_secret", "x_access_token", "x_access_token_secret",
+    "telegram_channel_id", "linkedin_access_token"
+]
+
+
+def _pro_defaults():
+    defaults = {
+        "pro_tokens": "500",
+        "pro_tokens_last_reset": "CURRENT_TIMESTAMP",
+        "completed_tasks": "'[]'",
+        "completed_stages": "'[]'",
+        "academy_score": "0",
+    }
+    return [(c, defaults.get(c, "NULL")) for c in PRO_PROFILE_COLUMNS]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+    tables = inspector.get_table_names()
+    partner_columns = {col['name'] for col in inspector.get_columns('partner')}
+
+    if 'partner_pro_profile' not in tables:
+        op.create_table(
+            'partner_pro_profile',
+            sa.Column('partner_id', sa.Integer(), sa.ForeignKey('partner.id'), primary_key=True),
+            sa.Column('pro_purchased_at', sa.DateTime(), nullable=True),
+            sa.Column('pro_started_at', sa.DateTime(), nullable=True),
+            sa.Column('subscription_plan', sa.String(), nullable=True),
+            sa.Column('payment_details', sa.String(), nullable=True),
+            sa.Column('pro_tokens', sa.Integer(), nullable=False, server_default='500'),
+            sa.Column('pro_tokens_last_reset', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column('completed_tasks', sa.String(), nullable=False, server_default='[]'),
+            sa.Column('completed_stages', sa.String(), nullable=False, server_default='[]'),
+            sa.Column('academy_score', sa.Float(), nullable=False, server_default='0'),
+        )
+    if 'partner_social_credentials' not in tables:
+        op.create_table(
+            'partner_social_credentials',
+            sa.Column('partner_id', sa.Integer(), sa.ForeignKey('partner.id'), primary_key=True),
+            *[sa.Column(name, sa.String(), nullable=True) for name in SOCIAL_COLUMNS],
+            sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+    # Copy existing values (only if the old columns are still there)
+    if set(PRO_PROFILE_COLUMNS) <= partner_columns:
+        cols = ", ".join(PRO_PROFILE_COLUMNS)
+        op.execute(
+            f"INSERT INTO partner_pro_profile (partner_id, {cols}) "
+            f"SELECT id, {', '.join(f'COALESCE({c}, {d})' for c, d in _pro_defaults())} FROM partner "
+            "WHERE id NOT IN (SELECT partner_id FROM partner_pro_profile)"
+        )
+    if set(SOCIAL_COLUMNS) <= partner_columns:
+        cols = ", ".join(SOCIAL_COLUMNS)
+        op.execute(
+            f"INSERT INTO partner_social_credentials (partner_id, {cols}) "
+            f"SELECT id, {cols} FROM partner "
+            f"WHERE ({' OR '.join(f'{c} IS NOT NULL' for c in SOCIAL_COLUMNS)}) "
+            "AND id NOT IN (SELECT partner_id FROM partner_social_credentials)"
+        )
+
+    with op.batch_alter_table('partner') as batch_op:
+        for name in PRO_PROFILE_COLUMNS + SOCIAL_COLUMNS:
+            if name in partner_columns:
+                batch_op.drop_column(name)
+
+    if conn.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE partner SET (fillfactor = 90)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE partner RESET (fillfactor)")
+
+    with op.batch_alter_table('partner') as batch_op:
+        batch_op.add_column(sa.Column('pro_purchased_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('pro_started_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('subscription_plan', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('payment_details', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('pro_tokens', sa.Integer(), nullable=False, server_default='500'))
+        batch_op.add_column(sa.Column('pro_tokens_last_reset', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.add_column(sa.Column('completed_tasks', sa.String(), nullable=False, server_default='[]'))
+        batch_op.add_column(sa.Column('completed_stages', sa.String(), nullable=False, server_default='[]'))
+        batch_op.add_column(sa.Column('academy_score', sa.Float(), nullable=False, server_default='0'))
+        for name in SOCIAL_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.String(), nullable=True))
+
+    for table, columns in (('partner_pro_profile', PRO_PROFILE_COLUMNS), ('partner_social_credentials', SOCIAL_COLUMNS)):
+        assignments = ", ".join(f"{c} = t.{c}" for c in columns)
+        op.execute(f"UPDATE partner SET {assignments} FROM {table} AS t WHERE partner.id = t.partner_id")
+
+    op.drop_table('partner_social_credentials')
+    op.drop_table('partner_pro_profile')
@@ -0,0 +1,64 @@
+"""add partner task bitsets
+
+Revision ID: 20261019_1700
+Revises: 20261019_1600
+Create Date: 2026-10-19 17:00:00.000000
+
+#comment: Task progress moves onto two BIGINT bitsets on the partner row (bit = position in
+app.core.tasks.TASK_CONFIG). They are backfilled from the partnertask history, which stays
+as the record of start baselines and rewards.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_1700'
+down_revision: Union[str, Sequence[str], None] = '20261019_1600'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Catalog order of app.core.tasks.TASK_CONFIG at this revision (bit = position)
+TASK_IDS = [
+    'telegram_bot', 'banking_app', 'community_chat', 'ambassador_hub',
+    'daily_checkin_5',
+    'invite_1_friend', 'invite_3_friends', 'invite_5_friends', 'invite_10_friends', 'invite_25_friends',
+    'invite_50_friends', 'invite_100_friends', 'invite_250_friends', 'invite_500_friends',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+    columns = {col['name'] for col in inspector.get_columns('partner')}
+
+    with op.batch_alter_table('partner') as batch_op:
+        if 'task_started_mask' not in columns:
+            batch_op.add_column(sa.Column('task_started_mask', sa.BigInteger(), nullable=False, server_default='0'))
+        if 'task_completed_mask' not in columns:
+            batch_op.add_column(sa.Column('task_completed_mask', sa.BigInteger(), nullable=False, server_default='0'))
+
+    # One pass per catalog task: started bit for every record, completed bit for finished ones
+    for index, task_id in enumerate(TASK_IDS):
+        conn.execute(
+            sa.text(
+                "UPDATE partner SET task_started_mask = task_started_mask | :bit, "
+                "task_completed_mask = task_completed_mask | CASE WHEN EXISTS ("
+                "  SELECT 1 FROM partnertask WHERE partnertask.partner_id = partner.id "
+                "  AND partnertask.task_id = :task_id AND COALESCE(partnertask.status, 'COMPLETED') = 'COMPLETED'"
+                ") THEN :bit ELSE 0 END "
+                "WHERE id IN (SELECT partner_id FROM partnertask WHERE task_id = :task_id)"
+            ),
+            {"bit": 1 << index, "task_id": task_id}
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('partner') as batch_op:
+        batch_op.drop_column('task_completed_mask')
+        batch_op.drop_column('task_started_mask')
@@ -0,0 +1,133 @@
+
+"""
+Benchmarks downline search (analytics_service.search_downline) on a synthetic tree.
+
+Builds N partners (default 1M) in a SCRATCH database, reconciles paths, then times
+searches from leaders of different network sizes. On PostgreSQL it runs with and without
+the pg_trgm indexes so the gain is visible.
+
+Usage (never point this at production, it creates and fills the partner table):
+    BENCH_DATABASE_URL=postgresql+asyncpg://.../p2phub_bench python3 scripts/benchmark_downline_search.py [N]
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_URL = os.getenv("BENCH_DATABASE_URL")
+if not BENCH_URL:
+    print("❌ Set BENCH_DATABASE_URL to a scratch database.")
+    sys.exit(1)
+os.environ["DATABASE_URL"] = BENCH_URL
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.partner import Partner
+from app.services.analytics_service import search_downline
+from app.services.maintenance_service import reconcile_network_stats
+
+TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_partner_username_trgm ON partner USING gin (lower(username) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_partner_first_name_trgm ON partner USING gin (lower(first_name) gin_trgm_ops)",
+]
+TRGM_DROP = [
+    "DROP INDEX IF EXISTS ix_partner_username_trgm",
+    "DROP INDEX IF EXISTS ix_partner_first_name_trgm",
+]
+QUERIES = ["ale", "max", "ivan", "ser", "an", "crypto", "zz"]
+BATCH = 20000
+
+
+def _name(rng: random.Random) -> str:
+    stems = ["alex", "max", "ivan", "sergey", "anna", "maria", "crypto", "dmitry", "olga", "john"]
+    return rng.choice(stems) + "".join(rng.choices(string.ascii_lowercase + string.digits, k=4))
+
+
+async def build_tree(engine, n: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    rng = random.Random(42)
+    # Core insert applies the model's column defaults for everything not listed
+    insert = Partner.__table__.insert()
+    t0 = time.perf_counter()
+    async with engine.begin() as conn:
+        for start in range(1, n + 1, BATCH):
+            rows = []
+            for pid in range(start, min(start + BATCH, n + 1)):
+                # Preferential attachment towards early partners gives a few very large networks
+                ref = None if pid == 1 else int(rng.paretovariate(1.2)) % (pid - 1) + 1
+                rows.append({
+                    "id": pid, "telegram_id": str(10_000_000 + pid), "username": _name(rng),
+                    "first_name": _name(rng).capitalize(), "referral_code": f"B{pid}",
+                    "referrer_id": ref, "xp": float(rng.randint(0, 5000)),
+                })
+            await conn.execute(insert, rows)
+    print(f"📦 Inserted {n} partners in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    async with AsyncSession(engine) as session:
+        result = await reconcile_network_stats(session)
+    print(f"🔧 Paths/depths built in {time.perf_counter() - t0:.1f}s ({result['structural_fixes']} rows)")
+
+
+async def time_searches(engine, leaders, label: str):
+    async with AsyncSession(engine) as session:
+        for leader_id, size in leaders:
+            timings = []
+            hits = 0
+            for q in QUERIES:
+                t0 = time.perf_counter()
+                found = await search_downline(session, leader_id, q, limit=20)
+                timings.append((time.perf_counter() - t0) * 1000)
+                hits += len(found)
+            print(f"   [{label}] leader {leader_id} ({size} in 9 levels): "
+                  f"p50 {statistics.median(timings):.1f}ms, max {max(timings):.1f}ms, {hits} hits")
+
+
+async def main(n: int):
+    engine = create_async_engine(BENCH_URL, echo=False)
+    await build_tree(engine, n)
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT id, referral_count FROM partner ORDER BY referral_count DESC LIMIT 3"
+        ))).all()
+        mid = (await conn.execute(text(
+            "SELECT id, referral_count FROM partner WHERE referral_count BETWEEN 100 AND 1000 LIMIT 1"
+        ))).all()
+    leaders = [(r[0], r[1]) for r in rows + mid]
+
+    if engine.dialect.name == "postgresql":
+        async with engine.begin() as conn:
+            for ddl in TRGM_DROP:
+                await conn.execute(text(ddl))
+            await conn.execute(text("ANALYZE partner"))
+        print("⏱️ Without trigram indexes:")
+        await time_searches(engine, leaders, "no trgm")
+
+        async with engine.begin() as conn:
+            for ddl in TRGM_DDL:
+                await conn.execute(text(ddl))
+            await conn.execute(text("ANALYZE partner"))
+        print("⏱️ With trigram indexes:")
+    else:
+        print("⏱️ SQLite (no trigram support, ancestry filter only):")
+    await time_searches(engine, leaders, "trgm" if engine.dialect.name == "postgresql" else "sqlite")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,216 @@
+"""
+Benchmarks the partner vertical split (partner + partner_pro_profile + partner_social_credentials)
+against the legacy wide partner row on a synthetic dataset.
+
+Reports, for both layouts: average row width, heap size, update throughput and the share of
+HOT (heap-only tuple) updates for the hot-path statements:
+    balance    UPDATE ... SET balance = balance + x      (no indexed column touched)
+    xp         UPDATE ... SET xp = xp + x                (indexed: never HOT, narrower tuple only)
+
+PostgreSQL only (HOT counters come from pg_stat_user_tables).
+
+Usage (never point this at production, it drops and refills the partner tables):
+    BENCH_DATABASE_URL=postgresql+asyncpg://.../p2phub_bench python3 scripts/benchmark_partner_split.py [N] [UPDATES]
+"""
+
+import asyncio
+import json
+import os
+import random
+import secrets
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_URL = os.getenv("BENCH_DATABASE_URL")
+if not BENCH_URL or "postgresql" not in BENCH_URL:
+    print("❌ Set BENCH_DATABASE_URL to a scratch PostgreSQL database.")
+    sys.exit(1)
+os.environ["DATABASE_URL"] = BENCH_URL
+
+from sqlalchemy import MetaData, Table, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from app.models.partner import Partner, PartnerProProfile, PartnerSocialCredentials
+
+BATCH = 10000
+WIDE_TABLE = "partner_wide"
+# Legacy layout: the split-off columns back on the partner row
+WIDE_DDL = [
+    f"DROP TABLE IF EXISTS {WIDE_TABLE}",
+    f"CREATE TABLE {WIDE_TABLE} (LIKE partner INCLUDING ALL)",
+    f"ALTER TABLE {WIDE_TABLE} "
+    "ADD COLUMN pro_purchased_at TIMESTAMP, ADD COLUMN pro_started_at TIMESTAMP, "
+    "ADD COLUMN subscription_plan VARCHAR, ADD COLUMN payment_details VARCHAR, "
+    "ADD COLUMN pro_tokens INTEGER NOT NULL DEFAULT 500, ADD COLUMN pro_tokens_last_reset TIMESTAMP, "
+    "ADD COLUMN completed_tasks VARCHAR NOT NULL DEFAULT '[]', ADD COLUMN completed_stages VARCHAR NOT NULL DEFAULT '[]', "
+    "ADD COLUMN academy_score FLOAT NOT NULL DEFAULT 0, "
+    "ADD COLUMN x_api_key VARCHAR, ADD COLUMN x_api_secret VARCHAR, ADD COLUMN x_access_token VARCHAR, "
+    "ADD COLUMN x_access_token_secret VARCHAR, ADD COLUMN telegram_channel_id VARCHAR, ADD COLUMN linkedin_access_token VARCHAR",
+    f"ALTER TABLE {WIDE_TABLE} SET (fillfactor = 100)",
+    "ALTER TABLE partner SET (fillfactor = 90)",
+]
+SOCIAL_COLUMNS = [
+    "x_api_key", "x_api_secret", "x_access_token", "x_access_token_secret",
+    "telegram_channel_id", "linkedin_access_token"
+]
+
+
+def synthetic_rows(n: int, rng: random.Random):
+    """(partner, pro_profile, social_credentials) dicts; ~5% PRO with full social setup."""
+    for pid in range(1, n + 1):
+        is_pro = rng.random() < 0.05
+        partner = {
+            "id": pid,
+            "telegram_id": str(10_000_000 + pid),
+            "username": f"user{pid}",
+            "first_name": rng.choice(["Alex", "Maria", "Ivan", "Olga"]),
+            "referral_code": f"P2P-{pid:08X}",
+            "referrer_id": rng.randint(1, pid - 1) if pid > 1 else None,
+            "xp": float(rng.randint(0, 5000)),
+            "balance": round(rng.random() * 100, 2),
+            "is_pro": is_pro,
+        }
+        stages = sorted(rng.sample(range(1, 40), rng.randint(0, 25)))
+        profile = {
+            "partner_id": pid,
+            "subscription_plan": "PRO_MONTHLY" if is_pro else None,
+            "payment_details": json.dumps({
+                "currency": "TON", "network": "TON", "tx_hash": secrets.token_hex(32),
+                "amount": 39.0, "verified_at": "2026-10-19T12:00:00"
+            }) if is_pro else None,
+            "completed_tasks": json.dumps([f"task_{i}" for i in range(rng.randint(0, 12))]),
+            "completed_stages": json.dumps(stages),
+            "academy_score": float(len(stages) * 100),
+        }
+        social = {
+            "partner_id": pid,
+            "x_api_key": secrets.token_urlsafe(18),
+            "x_api_secret": secrets.token_urlsafe(36),
+            "x_access_token": secrets.token_urlsafe(36),
+            "x_access_token_secret": secrets.token_urlsafe(33),
+            "telegram_channel_id": f"@channel{pid}",
+            "linkedin_access_token": secrets.token_urlsafe(150),
+        } if is_pro else None
+        yield partner, profile, social
+
+
+async def build(engine, n: int):
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {WIDE_TABLE}"))
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+        for ddl in WIDE_DDL:
+            await conn.execute(text(ddl))
+
+    async with engine.connect() as conn:
+        wide_table = await conn.run_sync(lambda sync_conn: Table(WIDE_TABLE, MetaData(), autoload_with=sync_conn))
+
+    rows = list(synthetic_rows(n, random.Random(42)))
+    for i in range(0, n, BATCH):
+        chunk = rows[i:i + BATCH]
+        partners = [p for p, _, _ in chunk]
+        socials = [s for _, _, s in chunk if s]
+        async with engine.begin() as conn:
+            await conn.execute(Partner.__table__.insert(), partners)
+            await conn.execute(PartnerProProfile.__table__.insert(), [pp for _, pp, _ in chunk])
+            if socials:
+                await conn.execute(PartnerSocialCredentials.__table__.insert(), socials)
+            await _insert_wide(conn, wide_table, chunk)
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in ("partner", "partner_pro_profile", "partner_social_credentials", WIDE_TABLE):
+            await conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+async def _insert_wide(conn, wide_table: Table, chunk):
+    """Inserts the same rows into the legacy layout: the stored partner row (model defaults
+    included) plus the cold columns, in one pass so the heap starts without dead tuples."""
+    by_id = {p["id"]: (pp, social) for p, pp, social in chunk}
+    stored = (await conn.execute(
+        select(Partner.__table__).where(Partner.__table__.c.id.in_(list(by_id)))
+    )).mappings().all()
+    rows = []
+    for row in stored:
+        pp, social = by_id[row["id"]]
+        wide = dict(row)
+        wide.update({c: v for c, v in pp.items() if c != "partner_id"})
+        wide.update({c: (social or {}).get(c) for c in SOCIAL_COLUMNS})
+        rows.append(wide)
+    await conn.execute(wide_table.insert(), rows)
+
+
+async def table_stats(conn, table: str) -> dict:
+    width = (await conn.execute(text(f"SELECT avg(pg_column_size(t.*)) FROM {table} t"))).scalar()
+    size = (await conn.execute(text(f"SELECT pg_relation_size('{table}')"))).scalar()
+    return {"avg_row_bytes": round(float(width or 0), 1), "heap_mb": round(size / 1024 / 1024, 1)}
+
+
+async def hot_counters(conn, table: str):
+    try:
+        await conn.execute(text("SELECT pg_stat_force_next_flush()"))  # PostgreSQL 15+
+    except Exception:
+        await asyncio.sleep(1)  # Older servers flush stats every 500ms
+    row = (await conn.execute(text(
+        "SELECT n_tup_upd, n_tup_hot_upd FROM pg_stat_user_tables WHERE relname = :t"
+    ), {"t": table})).first()
+    return int(row[0]), int(row[1])
+
+
+async def run_updates(engine, table: str, statement: str, n: int, updates: int) -> dict:
+    rng = random.Random(7)
+    ids = [rng.randint(1, n) for _ in range(updates)]
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        upd_before, hot_before = await hot_counters(conn, table)
+        start = time.perf_counter()
+        for i in range(0, updates, 500):
+            await conn.execute(
+                text(f"UPDATE {table} SET {statement} WHERE id = :id"),
+                [{"id": pid, "inc": 1.0} for pid in ids[i:i + 500]]
+            )
+        elapsed = time.perf_counter() - start
+        upd_after, hot_after = await hot_counters(conn, table)
+    total = max(upd_after - upd_before, 1)
+    return {
+        "updates_per_sec": round(updates / elapsed),
+        "hot_ratio": round((hot_after - hot_before) / total, 3),
+    }
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    engine = create_async_engine(BENCH_URL)
+
+    print(f"🏗️ Building {n} partners in both layouts...")
+    t0 = time.perf_counter()
+    await build(engine, n)
+    print(f"   built in {time.perf_counter() - t0:.1f}s")
+
+    async with engine.connect() as conn:
+        print("\n📏 Row width")
+        for table in (WIDE_TABLE, "partner", "partner_pro_profile", "partner_social_credentials"):
+            print(f"   {table:28s} {await table_stats(conn, table)}")
+
+    print(f"\n🔥 {updates} single-row updates per statement (HOT ratio = n_tup_hot_upd / n_tup_upd)")
+    for label, statement in (("balance", "balance = balance + :inc"), ("xp", "xp = xp + :inc")):
+        for table in (WIDE_TABLE, "partner"):
+            result = await run_updates(engine, table, statement, n, updates)
+            print(f"   {label:8s} {table:14s} {result}")
+
+    async with engine.connect() as conn:
+        print("\n📏 Heap after updates (bloat from non-HOT updates)")
+        for table in (WIDE_TABLE, "partner"):
+            print(f"   {table:14s} {await table_stats(conn, table)}")
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {WIDE_TABLE}"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
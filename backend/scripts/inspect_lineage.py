@@ -1,59 +1,59 @@
 
 import asyncio
 import os
+import sys
 
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine
 
-os.environ["DATABASE_URL"] = os.getenv("DATABASE_URL", "REMOVED_FOR_SECURITY")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-async def check():
-    db_url = os.environ["DATABASE_URL"]
-    engine = create_async_engine(db_url, echo=False, future=True)
+from app.core.config import settings
+from app.models.partner import engine
+from app.services.maintenance_service import load_referral_graph
 
+async def check(username_pattern: str = "sim_user_9%"):
     async with engine.connect() as conn:
-        print("🔍 Debugging User 9 Lineage...")
-        res = await conn.execute(text("SELECT id, username, path, referrer_id FROM partner WHERE username LIKE 'sim_user_9%' ORDER BY created_at DESC LIMIT 1"))
-        user9 = res.first()
-        if not user9:
-            print("❌ User 9 not found!")
+        print(f"🔍 Debugging lineage of '{username_pattern}'...")
+        res = await conn.execute(
+            text("SELECT id, username, path, referrer_id FROM partner WHERE username LIKE :u ORDER BY created_at DESC LIMIT 1"),
+            {"u": username_pattern}
+        )
+        user = res.first()
+        if not user:
+            print("❌ User not found!")
             return
 
-        print(f"👉 USER9: ID={user9[0]}, NAME={user9[1]}, PATH='{user9[2]}', REF_ID={user9[3]}")
+    print(f"👉 USER: ID={user[0]}, NAME={user[1]}, PATH='{user[2]}', REF_ID={user[3]}")
 
-        path_ids = [int(x) for x in user9[2].split('.')] if user9[2] else []
-        lineage_ids = (path_ids + [user9[3]])[-9:]
-        print(f"👉 LINEAGE IDS (calc): {lineage_ids}")
+    # #comment: Snapshot on disk is reused if recent, so repeated inspections start instantly.
+    graph = await load_referral_graph(max_age=settings.REFERRAL_GRAPH_MAX_AGE)
+    i = graph.index_of(user[0])
+    if i is None:
+        print("❌ User missing from the graph snapshot (created after it was taken?)")
+        return
 
-        # Check if ID 1 (@uslincoln) is in there
-        if 1 in lineage_ids:
-            print("✅ Root ID 1 is in lineage list.")
-        else:
-            print("❌ Root ID 1 is MISSING from lineage list!")
+    chain = graph.ancestors(i)
+    if chain is None:
+        print("❌ User sits on a referrer CYCLE!")
+        return
 
-        # Check ancestors in DB
-        res = await conn.execute(text(f"SELECT id, username, referrer_id FROM partner WHERE id IN ({', '.join(map(str, lineage_ids))})"))
-        ancestors = {r[0]: (r[1], r[2]) for r in res}
-        print(f"👉 Ancestors in DB: {ancestors}")
+    expected_path = graph.path_of(i)
+    print(f"👉 PATH (graph): '{expected_path}'  depth={int(graph.depth[i])}")
+    print("✅ Stored path matches." if expected_path == user[2] else "❌ Stored path is STALE!")
 
-        # Trace the loop logic
-        print("\n🔄 Tracing loop logic...")
-        curr_ref_id = user9[3]
-        for level in range(1, 10):
-            if not curr_ref_id:
-                print(f"   Level {level}: No more referrers. BREAK.")
-                break
+    path_ids = [int(x) for x in user[2].split('.')] if user[2] else []
+    if path_ids and path_ids[0] != int(graph.ids[chain[-1]]):
+        print(f"❌ Root ID {graph.ids[chain[-1]]} is MISSING from the stored path!")
 
-            ref_info = ancestors.get(curr_ref_id)
-            if not ref_info:
-                print(f"   Level {level}: Referrer {curr_ref_id} NOT FOUND in ancestor map! BREAK.")
-                break
+    print("\n🔄 Reward levels (nearest first)...")
+    for level, anc in enumerate(chain[:graph.MAX_LEVEL], start=1):
+        print(f"   Level {level}: ID {graph.ids[anc]} (PRO={bool(graph.is_pro[anc])}, XP={graph.xp[anc]:.0f})")
+    if len(chain) < graph.MAX_LEVEL:
+        print(f"   Level {len(chain) + 1}: No more referrers. BREAK.")
 
-            name, next_ref_id = ref_info
-            print(f"   Level {level}: Awarded to @{name} (ID {curr_ref_id})")
-            curr_ref_id = next_ref_id
+    print(f"\n📊 Downline per level: {graph.level_counts(i)}")
 
     await engine.dispose()
 
 if __name__ == "__main__":
-    asyncio.run(check())
+    asyncio.run(check(*sys.argv[1:2]))
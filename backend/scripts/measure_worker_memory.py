@@ -0,0 +1,86 @@
+"""
+Per-process memory of a running Gunicorn (master + workers), from /proc/<pid>/smaps_rollup.
+
+    rss     resident, shared pages counted in full (what `ps` / most dashboards show)
+    pss     shared pages divided among the processes sharing them (sums to the real total)
+    uss     private to the process (what one more worker costs)
+    shared  pages shared with other processes (copy-on-write from the preloaded master)
+
+Compare a boot with GUNICORN_PRELOAD=0 against the default preload mode under the same
+traffic; the PSS total is the container's real footprint.
+
+Usage (Linux, same container as the server):
+    python3 scripts/measure_worker_memory.py [MASTER_PID]
+Without a PID the oldest process whose command line contains "gunicorn" is used.
+"""
+
+import os
+import sys
+
+
+def read_rollup(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "uss": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+        "shared": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+    }
+
+
+def cmdline(pid: int) -> str:
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+
+
+def ppid(pid: int) -> int:
+    with open(f"/proc/{pid}/stat") as f:
+        # Field 4, after the parenthesised command name (which may contain spaces)
+        return int(f.read().rsplit(")", 1)[1].split()[1])
+
+
+def find_master() -> int:
+    pids = sorted(int(p) for p in os.listdir("/proc") if p.isdigit() and int(p) != os.getpid())
+    for pid in pids:
+        try:
+            if "gunicorn" in cmdline(pid):
+                return pid
+        except OSError:
+            continue
+    print("❌ No gunicorn process found. Pass the master PID explicitly.")
+    sys.exit(1)
+
+
+def main():
+    master = int(sys.argv[1]) if len(sys.argv) > 1 else find_master()
+    workers = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                if ppid(int(entry)) == master:
+                    workers.append(int(entry))
+            except OSError:
+                continue
+
+    rows = [("master", master, read_rollup(master))]
+    rows += [("worker", pid, read_rollup(pid)) for pid in sorted(workers)]
+
+    print(f"{'role':<8} {'pid':>8} {'rss MB':>10} {'pss MB':>10} {'uss MB':>10} {'shared MB':>10}")
+    for role, pid, usage in rows:
+        print(f"{role:<8} {pid:>8} {usage['rss']:>10.1f} {usage['pss']:>10.1f} {usage['uss']:>10.1f} {usage['shared']:>10.1f}")
+
+    total_pss = sum(usage["pss"] for _, _, usage in rows)
+    total_rss = sum(usage["rss"] for _, _, usage in rows)
+    print(f"\nworkers: {len(workers)}  total pss: {total_pss:.1f} MB  (sum of rss: {total_rss:.1f} MB)")
+    if workers:
+        avg_uss = sum(usage["uss"] for role, _, usage in rows if role == "worker") / len(workers)
+        print(f"average worker uss: {avg_uss:.1f} MB (marginal cost of one more worker)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,59 +7,32 @@ from datetime import datetime
 # Add backend to path
 sys.path.append(os.path.join(os.getcwd(), 'backend'))
 
-from sqlmodel import select, func
-from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
-
-from app.models.partner import Partner
-from app.models.partner import engine
+from app.services.maintenance_service import load_referral_graph, reconcile_network_stats
 
 async def sync_network():
     """
     High-performance script to synchronize partner network data.
     Recalculates referral_count and ensures hierarchy (path/depth) is consistent.
+
+    #comment: Uses the shared ReferralGraph (one narrow load, array-backed) instead of
+    one COUNT query per partner. referral_count follows the 9-level network rule.
     """
     print(f"🚀 Starting Network Data Sync V2 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
-    
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
 
-    async with async_session() as session:
-        # 1. Fetch all partners
-        statement = select(Partner)
-        result = await session.exec(statement)
-        partners = result.all()
-        
-        total_partners = len(partners)
-        print(f"📊 Analyzing {total_partners} partners...")
-        
-        updated_count = 0
-        
-        for partner in partners:
-            # 2. Count real referrals in database
-            count_statement = select(func.count()).where(Partner.referrer_id == partner.id)
-            count_result = await session.exec(count_statement)
-            actual_count = count_result.one()
-            
-            # 3. Check for discrepancy
-            if partner.referral_count != actual_count:
-                print(f"⚠️ Discrepancy found for {partner.username or partner.telegram_id}: "
-                      f"Stored: {partner.referral_count}, Actual: {actual_count}")
-                
-                partner.referral_count = actual_count
-                session.add(partner)
-                updated_count += 1
-                
-            # Optional: Validate Path & Depth if needed
-            # We skip this for now to keep it fast, unless explicitly requested.
-        
-        if updated_count > 0:
-            print(f"💾 Committing {updated_count} updates...")
-            await session.commit()
-            print(f"✅ Sync complete. Updated {updated_count} records.")
-        else:
-            print("✅ No discrepancies found. All counts are synchronized.")
+    graph = await load_referral_graph()
+    depth = graph.depth
+    print(f"📊 Analyzing {graph.n} partners "
+          f"(roots: {int((graph.parent < 0).sum())}, max depth: {int(depth.max()) if graph.n else 0}, "
+          f"PRO: {int(graph.is_pro.sum())}, on cycles: {int((depth < 0).sum())})...")
+
+    # Same fresh graph: the reconciler does not load it a second time
+    result = await reconcile_network_stats(graph=graph)
+
+    if result["structural_fixes"] or result["count_fixes"]:
+        print(f"✅ Sync complete. Path/depth fixes: {result['structural_fixes']}, "
+              f"count fixes: {result['count_fixes']} ({result['duration_sec']}s).")
+    else:
+        print("✅ No discrepancies found. All counts are synchronized.")
 
 if __name__ == "__main__":
     if "backend" not in os.getcwd():
@@ -34,7 +34,7 @@ echo "✅ Migration step finished."
 
 # Optimization: Using Gunicorn as a process manager with 4 workers to handle concurrent traffic.
 # The UvicornWorker class allows gunicorn to serve ASGI (FastAPI) applications.
-# #comment: 4 workers are ideal for a 2-core machine. For memory-constrained environments, 
-# monitor RAM usage as each worker loads the full app.
-echo "🌍 Starting Server with Gunicorn (4 workers)..."
-exec gunicorn app.main:app -w 4 -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:"${PORT:-8080}" --timeout 120
+# #comment: Workers, bind and the preload (copy-on-write) mode live in gunicorn.conf.py.
+# Per-worker memory is logged at boot; scripts/measure_worker_memory.py sums it up.
+echo "🌍 Starting Server with Gunicorn (${WEB_CONCURRENCY:-4} workers, preload=${GUNICORN_PRELOAD:-1})..."
+exec gunicorn app.main:app -c gunicorn.conf.py
@@ -33,19 +33,6 @@ from app.models.partner import Partner, XPTransaction, Earning, PartnerTask
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """
-    Create an event loop for the entire test session.
-    
-    #comment: pytest-asyncio needs this to handle async tests properly.
-    Using session scope means one event loop for all tests (faster).
-    """
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-
 @pytest.fixture(scope="function")
 async def engine():
     """
@@ -164,6 +151,33 @@ async def create_referral_chain(session: AsyncSession, create_test_partner):
     return _create_chain
 
 
+class FakePipeline:
+    """
+    Pipeline for the in-memory Redis fakes used across tests: commands are queued on the
+    fake client and awaited in order by execute().
+
+    Usage in a fake client:
+        def pipeline(self, transaction=True):
+            return FakePipeline(self)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(getattr(self.client, name)(*args, **kwargs))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
 # #comment: Mark all tests as asyncio by default
 # This prevents having to add @pytest.mark.asyncio to every test
 def pytest_collection_modifyitems(items):
@@ -0,0 +1,119 @@
+"""
+Tests for the boot orchestrator (ordering, timeouts, leader election, readiness).
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.boot import BootOrchestrator
+
+
+def test_dependency_order_timeouts_and_readiness():
+    async def run():
+        boot = BootOrchestrator()
+        events = []
+        ready_calls = []
+        boot.when_ready(lambda: ready_calls.append(boot.report()))
+
+        @boot.step("schema", blocking=True, critical=True)
+        async def schema():
+            await asyncio.sleep(0.01)
+            events.append("schema")
+
+        @boot.step("warm_cache", after=["schema"], critical=True)
+        async def warm_cache():
+            events.append("warm_cache")
+            await asyncio.sleep(0.05)
+
+        @boot.step("slow_sheet", timeout=0.02, critical=True)
+        async def slow_sheet():
+            await asyncio.sleep(5)
+
+        @boot.step("broken")
+        async def broken():
+            raise RuntimeError("boom")
+
+        await boot.start()
+        # Blocking step done, the critical warmups are still running
+        assert events[0] == "schema"
+        assert not boot.ready
+        assert ready_calls == []
+
+        await boot.wait_ready()
+        await asyncio.sleep(0)
+        statuses = {s["step"]: s["status"] for s in boot.report()["steps"]}
+        assert statuses == {"schema": "ok", "warm_cache": "ok", "slow_sheet": "timeout", "broken": "failed"}
+        assert boot.ready
+        assert len(ready_calls) == 1
+        await boot.stop()
+
+    asyncio.run(run())
+
+
+def test_rejects_unknown_dependency_and_cycles():
+    boot = BootOrchestrator()
+
+    @boot.step("a", after=["b"])
+    async def a():
+        pass
+
+    with pytest.raises(ValueError, match="unknown step"):
+        asyncio.run(boot.start())
+
+    @boot.step("b", after=["a"])
+    async def b():
+        pass
+
+    with pytest.raises(ValueError, match="cycle"):
+        asyncio.run(boot.start())
+
+
+def test_leader_steps_run_once_and_background_steps_are_cancelled():
+    async def run():
+        boot = BootOrchestrator()
+        runs = []
+        stopped = asyncio.Event()
+
+        @boot.step("one_time", leader_ttl=60, critical=True)
+        async def one_time():
+            runs.append("one_time")
+
+        @boot.step("listener", background=True)
+        async def listener():
+            try:
+                await asyncio.sleep(3600)
+            finally:
+                stopped.set()
+
+        client = SimpleNamespace(set=AsyncMock(return_value=None))  # Lock held by another worker
+        with patch("app.services.redis_service.redis_service.client", client):
+            await boot.start()
+            await boot.wait_ready()
+
+        assert runs == []
+        assert client.set.await_args.kwargs == {"nx": True, "ex": 60}
+        statuses = {s["step"]: s["status"] for s in boot.report()["steps"]}
+        assert statuses == {"one_time": "skipped", "listener": "running"}
+        assert boot.ready
+
+        await boot.stop()
+        assert stopped.is_set()
+        assert boot.steps["listener"].status == "stopped"
+
+    asyncio.run(run())
+
+
+def test_schema_step_runs_in_every_worker():
+    """
+    Verifies:
+    - create_db_and_tables is not leader-elected: no worker reports ready before
+      the tables exist
+    """
+    from app.main import boot_orchestrator
+
+    step = boot_orchestrator.steps["create_db_and_tables"]
+    assert step.leader_ttl is None
+    assert step.blocking and step.critical
@@ -0,0 +1,281 @@
+"""
+Tests for the fast-ack webhook intake (bot_update_queue).
+"""
+
+import asyncio
+import json
+import math
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.bot_update_queue import BotUpdateQueue, update_chat_key
+from tests.conftest import FakePipeline
+
+
+MESSAGE = {"update_id": 7, "message": {"message_id": 1, "chat": {"id": -100500}, "from": {"id": 42}}}
+CALLBACK = {"update_id": 8, "callback_query": {"id": "c", "from": {"id": 42}, "message": {"chat": {"id": 42}}}}
+INLINE = {"update_id": 9, "inline_query": {"id": "q", "from": {"id": 43}, "query": ""}}
+
+
+class TestChatKey:
+    def test_chat_then_sender_then_update_id(self):
+        assert update_chat_key(MESSAGE) == -100500
+        assert update_chat_key(CALLBACK) == 42
+        assert update_chat_key(INLINE) == 43
+        assert update_chat_key({"update_id": 10}) == 10
+
+    def test_same_chat_same_shard(self):
+        queue = BotUpdateQueue()
+        shards = {queue.shard_for(update_chat_key(u)) for u in (CALLBACK, {"update_id": 11, "message": {"chat": {"id": 42}}})}
+        assert len(shards) == 1
+        assert all(0 <= queue.shard_for(i) < queue.shards for i in range(1000))
+
+
+class TestEnqueue:
+    def _client(self, first_seen=True, xadd_error=None):
+        client = AsyncMock()
+        client.set.return_value = first_seen
+        if xadd_error:
+            client.xadd.side_effect = xadd_error
+        return client
+
+    def test_enqueue_and_duplicate(self):
+        queue = BotUpdateQueue()
+        raw = json.dumps(MESSAGE).encode()
+        client = self._client()
+        with patch("app.services.bot_update_queue.redis_service") as redis_service:
+            redis_service.raw_client = client
+            assert asyncio.run(queue.enqueue(raw)) is True
+            stream, fields = client.xadd.call_args.args
+            assert stream == queue.stream_key(queue.shard_for(-100500))
+            assert fields == {"u": raw}
+
+            client.set.return_value = None
+            assert asyncio.run(queue.enqueue(raw)) is False
+        assert queue.stats()["enqueued"] == 1 and queue.stats()["duplicates"] == 1
+
+    def test_failed_append_releases_dedupe_key(self):
+        queue = BotUpdateQueue()
+        client = self._client(xadd_error=ConnectionError("down"))
+        with patch("app.services.bot_update_queue.redis_service") as redis_service:
+            redis_service.raw_client = client
+            with pytest.raises(ConnectionError):
+                asyncio.run(queue.enqueue(json.dumps(MESSAGE).encode()))
+        client.delete.assert_awaited_once_with("bot:update:seen:7")
+
+
+class FakeStreamRedis:
+    """Leases (strings), the consumer registry (sorted set) and one consumer group per stream, in memory."""
+
+    def __init__(self):
+        self.strings = {}
+        self.zset = {}
+        self.streams = {}
+        self.delivered = {}
+        self.pending = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def zadd(self, key, mapping):
+        self.zset.update(mapping)
+
+    async def zremrangebyscore(self, key, low, high):
+        for member in [m for m, score in self.zset.items() if score <= high]:
+            del self.zset[member]
+
+    async def zcard(self, key):
+        return len(self.zset)
+
+    async def zrem(self, key, member):
+        self.zset.pop(member, None)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def expire(self, key, ttl):
+        return key in self.strings
+
+    async def delete(self, key):
+        self.strings.pop(key, None)
+
+    def add(self, stream, raw):
+        entries = self.streams.setdefault(stream, [])
+        entries.append((f"{len(entries) + 1}-0".encode(), {b"u": raw}))
+
+    async def xgroup_create(self, name, groupname, id="0", mkstream=False):
+        self.streams.setdefault(name, [])
+        self.delivered.setdefault(name, 0)
+        self.pending.setdefault(name, {})
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id="0-0", count=None):
+        for entry_id in self.pending[name]:
+            self.pending[name][entry_id] = consumername
+        return [b"0-0", [], []]
+
+    async def xreadgroup(self, groupname, consumername, streams, count=None, block=None):
+        response = []
+        for name, cursor in streams.items():
+            if cursor != ">":
+                # History: our pending entries after the given ID
+                after = int(cursor.split("-")[0])
+                items = [
+                    e for e in self.streams[name]
+                    if self.pending[name].get(e[0]) == consumername and int(e[0].split(b"-")[0]) > after
+                ][:count]
+            else:
+                items = self.streams[name][self.delivered[name]:][:count]
+                self.delivered[name] += len(items)
+                self.pending[name].update({entry_id: consumername for entry_id, _ in items})
+            response.append([name.encode(), items])
+        if block and not any(items for _, items in response):
+            await asyncio.sleep(block / 1000)
+            return []
+        return response
+
+    async def xack(self, name, groupname, entry_id):
+        self.pending[name].pop(entry_id, None)
+
+
+def run_consumers(scenario):
+    async def runner():
+        client = FakeStreamRedis()
+        queue = BotUpdateQueue()
+        queue.BLOCK_MS = 10
+        seen = []
+
+        async def dispatch(bot, dp, raw):
+            seen.append(raw)
+
+        queue._dispatch = dispatch
+        with patch("app.services.bot_update_queue.redis_service") as redis_service:
+            redis_service.client = redis_service.raw_client = client
+            await queue._ensure_groups()
+            try:
+                return await scenario(queue, client, seen)
+            finally:
+                await queue.stop()
+    return asyncio.run(runner())
+
+
+async def wait_for(condition, timeout=2.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+class TestConsumers:
+    def test_lease_skips_taken_shards(self):
+        async def scenario(queue, client, seen):
+            client.strings[f"{queue.LEASE_PREFIX}:3"] = "other"
+            leased = await queue._lease("me:0", queue.shards)
+            assert sorted(leased) == [s for s in range(queue.shards) if s != 3]
+            assert await queue._lease("me:1", 1) == []
+
+            # Only the consumer's own leases are released
+            await queue._release(leased, "me:1")
+            assert len(client.strings) == queue.shards
+            await queue._release(leased, "me:0")
+            assert list(client.strings) == [f"{queue.LEASE_PREFIX}:3"]
+
+        run_consumers(scenario)
+
+    def test_single_consumer_serves_every_shard_and_acks(self):
+        async def scenario(queue, client, seen):
+            for shard in range(queue.shards):
+                client.add(queue.stream_key(shard), f"{shard}".encode())
+            queue.start(None, None, workers=1)
+
+            await wait_for(lambda: len(seen) == queue.shards)
+            assert not any(client.pending.values())
+
+            await queue.stop()
+            assert not client.strings  # Leases released on shutdown
+            assert not client.zset  # And the consumer unregistered
+
+        run_consumers(scenario)
+
+    def test_two_queues_split_the_shards(self):
+        async def scenario(queue, client, seen):
+            other = BotUpdateQueue()
+            other._next_shard = queue._next_shard
+            # Both workers' consumers are registered before either leases
+            await queue._register("a:0")
+            live = await other._register("b:0")
+            assert live == 2
+
+            mine = await queue._lease("a:0", math.ceil(queue.shards / live))
+            theirs = await other._lease("b:0", math.ceil(queue.shards / live))
+            assert len(mine) == len(theirs) == queue.shards // 2
+            assert sorted(mine + theirs) == list(range(queue.shards))
+
+        run_consumers(scenario)
+
+    def test_leases_rotate_between_slices(self):
+        async def scenario(queue, client, seen):
+            queue.LEASE_SLICE = 0.05
+            # Seven more live consumers elsewhere: two shards per consumer
+            client.zset.update({f"other:{i}": time.time() + 60 for i in range(7)})
+            held = []
+
+            async def dispatch(bot, dp, raw):
+                held.append(len(client.strings))
+                seen.append(raw)
+
+            queue._dispatch = dispatch
+            for shard in range(queue.shards):
+                client.add(queue.stream_key(shard), f"{shard}".encode())
+            queue._tasks = [asyncio.create_task(queue._consumer(None, None, 0))]
+
+            # Two shards at a time, yet every shard is reached
+            await wait_for(lambda: len(seen) == queue.shards)
+            assert sorted(seen) == sorted(f"{s}".encode() for s in range(queue.shards))
+            assert max(held) <= 2
+
+        run_consumers(scenario)
+
+    def test_slow_shard_does_not_block_the_others(self):
+        async def scenario(queue, client, seen):
+            release = asyncio.Event()
+
+            async def dispatch(bot, dp, raw):
+                if raw == b"slow":
+                    await release.wait()
+                seen.append(raw)
+
+            queue._dispatch = dispatch
+            client.add(queue.stream_key(0), b"slow")
+            client.add(queue.stream_key(0), b"after-slow")
+            client.add(queue.stream_key(1), b"fast-1")
+            client.add(queue.stream_key(1), b"fast-2")
+            await queue._lease("live:0", 2)
+
+            queue._tasks = [asyncio.create_task(queue._consume(None, None, [0, 1], "live:0"))]
+            await wait_for(lambda: seen == [b"fast-1", b"fast-2"])
+            release.set()
+            await wait_for(lambda: seen[2:] == [b"slow", b"after-slow"])
+
+        run_consumers(scenario)
+
+    def test_pending_entries_of_dead_consumer_come_first(self):
+        async def scenario(queue, client, seen):
+            stream = queue.stream_key(0)
+            client.add(stream, b"old")
+            client.add(stream, b"new")
+            # A crashed consumer read "old" but never acked it
+            await client.xreadgroup(queue.GROUP, "dead:0", {stream: ">"}, count=1)
+
+            queue._tasks = [asyncio.create_task(queue._consume(None, None, [0], "live:0"))]
+            await wait_for(lambda: len(seen) == 2)
+            assert seen == [b"old", b"new"]
+            await wait_for(lambda: client.pending[stream] == {})
+
+        run_consumers(scenario)
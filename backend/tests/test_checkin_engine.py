@@ -0,0 +1,209 @@
+"""
+Tests for the Redis-bitmap check-in engine (streaks, DAU counts, batched XP persistence).
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlmodel import select
+
+from app.core.config import settings
+from app.models.partner import Earning, Partner, XPTransaction
+from app.services.checkin_service import CHECKIN_SCRIPT, CheckinEngine, day_index, trailing_ones
+from tests.conftest import FakePipeline
+
+
+class FakeBitmapRedis:
+    """The handful of bitmap / list / string commands the engine uses, in memory."""
+
+    def __init__(self):
+        self.bits = {}
+        self.lists = {}
+        self.strings = {}
+
+    def _get_bits(self, key, start, width):
+        bits = self.bits.get(key, set())
+        return sum(1 << (width - 1 - i) for i in range(width) if start + i in bits)
+
+    async def setbit(self, key, offset, value):
+        bits = self.bits.setdefault(key, set())
+        previous = int(offset in bits)
+        (bits.add if value else bits.discard)(offset)
+        return previous
+
+    async def getbit(self, key, offset):
+        return int(offset in self.bits.get(key, ()))
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def eval(self, script, numkeys, *args):
+        """CHECKIN_SCRIPT, step by step (a raising command aborts the rest, as in Redis)."""
+        assert script == CHECKIN_SCRIPT
+        (partner_key, day_key, queue), (day, partner_id, _ttl, payload) = args[:numkeys], args[numkeys:]
+        if await self.getbit(partner_key, day):
+            return 0
+        await self.lpush(queue, payload)
+        await self.setbit(partner_key, day, 1)
+        await self.setbit(day_key, partner_id, 1)
+        return 1
+
+    async def execute_command(self, command, key, *args):
+        assert command == "BITFIELD"
+        results = []
+        args = list(args)
+        while args:
+            op, kind, offset = args[0], args[1], int(args[2])
+            width = int(kind[1:])
+            if op == "GET":
+                results.append(self._get_bits(key, offset, width))
+                args = args[3:]
+            else:
+                value = int(args[3])
+                for i in range(width):
+                    await self.setbit(key, offset + i, (value >> (width - 1 - i)) & 1)
+                results.append(0)
+                args = args[4:]
+        return results
+
+    async def bitcount(self, key):
+        return len(self.bits.get(key, ()))
+
+    async def bitop(self, op, dest, *keys):
+        self.bits[dest] = set().union(*(self.bits.get(k, set()) for k in keys))
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        end = len(items) + end if end < 0 else end
+        start = max(0, len(items) + start if start < 0 else start)
+        return items[start:end + 1]
+
+    async def ltrim(self, key, start, end):
+        items = self.lists.get(key, [])
+        end = len(items) + end if end < 0 else end
+        self.lists[key] = items[start:end + 1]
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def delete(self, key):
+        self.strings.pop(key, None)
+        self.bits.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def client():
+    fake = FakeBitmapRedis()
+    with patch("app.services.checkin_service.redis_service.client", fake):
+        yield fake
+
+
+@pytest.fixture
+async def checkins(session, client):
+    session.add(Partner(id=1, telegram_id="100", referral_code="R1"))
+    session.add(Partner(id=2, telegram_id="200", referral_code="R2", is_pro=True))
+    await session.commit()
+    return CheckinEngine()
+
+
+def test_trailing_ones():
+    assert trailing_ones(0) == 0
+    assert trailing_ones(0b1011) == 2
+    assert trailing_ones((1 << 63) - 1) == 63
+
+
+async def test_streak_idempotency_and_milestone(checkins, session, client):
+    partner = await session.get(Partner, 1)
+    start = datetime(2026, 10, 1, 9)
+    rewards = []
+    for day in range(7):
+        rewards.append(await checkins.check_in(partner, start + timedelta(days=day)))
+        # Second visit on the same day earns nothing
+        assert await checkins.check_in(partner, start + timedelta(days=day, hours=5)) is None
+
+    assert [r.streak for r in rewards] == [1, 2, 3, 4, 5, 6, 7]
+    assert rewards[-1].milestone
+    assert rewards[-1].xp == settings.DAILY_CHECKIN_XP + settings.STREAK_7DAY_XP_BONUS
+
+    # A missed day resets the streak
+    after_gap = await checkins.check_in(partner, start + timedelta(days=8))
+    assert after_gap.streak == 1
+    assert await checkins.streak(1, (start + timedelta(days=8)).date()) == 1
+
+    # Streaks longer than one BITFIELD window
+    long_start = datetime(2025, 1, 1, 9)
+    for day in range(70):
+        await client.setbit(checkins.partner_key(2), day_index((long_start + timedelta(days=day)).date()), 1)
+    pro = await session.get(Partner, 2)
+    reward = await checkins.check_in(pro, long_start + timedelta(days=70))
+    assert reward.streak == 71
+    assert reward.xp == settings.DAILY_CHECKIN_XP * settings.PRO_XP_MULTIPLIER
+
+    counts = await checkins.active_counts((start + timedelta(days=8)).date())
+    assert counts == {"dau": 1, "wau": 1, "mau": 1}
+
+
+async def test_reseed_from_partner_row(checkins, session, client):
+    partner = await session.get(Partner, 1)
+    now = datetime(2026, 10, 19, 8)
+    partner.checkin_streak = 12
+    partner.last_checkin_at = now - timedelta(days=1)
+
+    reward = await checkins.check_in(partner, now)
+    assert reward.streak == 13
+    assert await checkins.streak(1, now.date()) == 13
+
+
+async def test_failed_enqueue_marks_nothing(checkins, session, client):
+    partner = await session.get(Partner, 1)
+    now = datetime(2026, 10, 19, 8)
+    lpush = client.lpush
+
+    async def broken_lpush(key, value):
+        raise ConnectionError("reset by peer")
+
+    client.lpush = broken_lpush
+    with pytest.raises(ConnectionError):
+        await checkins.check_in(partner, now)
+    assert await client.getbit(checkins.partner_key(1), day_index(now.date())) == 0
+
+    # The next profile load still pays the day
+    client.lpush = lpush
+    reward = await checkins.check_in(partner, now)
+    assert reward.streak == 1
+    assert len(client.lists[checkins.REWARD_QUEUE]) == 1
+
+
+async def test_flush_persists_once(checkins, session, client):
+    partner = await session.get(Partner, 1)
+    now = datetime(2026, 10, 19, 8)
+    await checkins.check_in(partner, now - timedelta(days=1))
+    reward = await checkins.check_in(partner, now)
+    queued = list(client.lists[checkins.REWARD_QUEUE])
+
+    assert await checkins.flush(session) == {"persisted": 2, "duplicates": 0}
+    assert client.lists[checkins.REWARD_QUEUE] == []
+
+    # A replayed batch (crash between commit and LTRIM) is not paid twice
+    client.lists[checkins.REWARD_QUEUE] = queued
+    assert await checkins.flush(session) == {"persisted": 0, "duplicates": 2}
+
+    await session.refresh(partner)
+    assert partner.xp == 2 * settings.DAILY_CHECKIN_XP
+    assert partner.checkin_streak == reward.streak == 2
+    assert partner.last_checkin_at == now
+    assert len((await session.exec(select(XPTransaction).where(XPTransaction.type == "CHECKIN"))).all()) == 2
+    assert len((await session.exec(select(Earning).where(Earning.type == "DAILY_REWARD"))).all()) == 2
@@ -0,0 +1,129 @@
+"""
+Tests for the Knowledge Base BM25 search engine.
+
+#comment: The support agent injects the top KB matches into every prompt,
+so ranking quality and the Redis round-trip of the index must be stable.
+"""
+
+import json
+
+from app.utils.kb_search import KBSearchIndex, diff_rows, row_key, stem, tokenize
+
+
+RECORDS = [
+    {"Question": "How do I top up my card?", "Answer": "Send USDT (TRC20) or TON to your deposit address.", "Category": "💰 Top-ups & Crypto Deposits"},
+    {"Question": "Can I add the card to Apple Pay?", "Answer": "Yes, virtual cards work with Apple Pay and Google Pay.", "Category": "📲 Mobile Payments (Apple/Google Pay)"},
+    {"Question": "What is PRO membership?", "Answer": "PRO gives a 5x XP multiplier and priority support.", "Category": "💎 PRO Membership & Benefits"},
+    {"Question": "Как пополнить карту?", "Answer": "Отправьте USDT на адрес депозита.", "Category": "💰 Top-ups & Crypto Deposits"},
+]
+
+
+class TestTokenizer:
+    """Test tokenization and en/ru stemming."""
+
+    def test_stopwords_and_punctuation_removed(self):
+        assert tokenize("How do I top up my card?") == ["top", "up", "card"]
+
+    def test_english_plural_forms_share_stem(self):
+        assert stem("cards") == stem("card")
+        assert stem("issues") == stem("issue")
+
+    def test_russian_case_forms_share_stem(self):
+        # #comment: карта / карту / картой must all hit the same postings
+        assert stem("карта") == stem("карту") == stem("картой")
+
+
+class TestKBSearchIndex:
+    """Test BM25F ranking over Question + Answer fields."""
+
+    def test_question_match_ranks_first(self):
+        index = KBSearchIndex.build(RECORDS)
+        results = index.search("top up card")
+        assert results[0][1] == 0
+
+    def test_answer_field_is_indexed(self):
+        """
+        Verifies:
+        - Terms that only appear in the Answer still find the record
+        """
+        index = KBSearchIndex.build(RECORDS)
+        results = index.search("multiplier")
+        assert [doc for _, doc in results] == [2]
+
+    def test_russian_query(self):
+        index = KBSearchIndex.build(RECORDS)
+        results = index.search("пополнение карты")
+        assert results[0][1] == 3
+
+    def test_no_match_returns_empty(self):
+        index = KBSearchIndex.build(RECORDS)
+        assert index.search("the and of") == []
+        assert index.search("zzzz") == []
+
+    def test_serialization_roundtrip(self):
+        """
+        Verifies:
+        - The JSON form (as stored in Redis) restores identical scores
+        - kb_version survives so workers can detect a stale shared index
+        """
+        index = KBSearchIndex.build(RECORDS, kb_version="abc123")
+        restored = KBSearchIndex.from_dict(json.loads(json.dumps(index.to_dict())))
+
+        assert restored.kb_version == "abc123"
+        assert restored.search("apple pay card") == index.search("apple pay card")
+
+    def test_unknown_version_is_rejected(self):
+        assert KBSearchIndex.from_dict({"v": 999}) is None
+        assert KBSearchIndex.from_dict(None) is None
+
+    def test_incremental_update_matches_full_rebuild(self):
+        """
+        Verifies:
+        - Editing, inserting and removing rows via apply_changes yields the
+          same ranking as building the index from scratch
+        """
+        new_records = [dict(r) for r in RECORDS[:3]]
+        new_records[1] = {"Question": "Can I add the card to Apple Pay?", "Answer": "Only Google Pay for now."}
+        new_records.insert(0, {"Question": "How to enable 2FA?", "Answer": "Open settings and enable two-factor authentication."})
+
+        index = KBSearchIndex.build(RECORDS, kb_version="old")
+        kept, removed, added = diff(RECORDS, new_records)
+        index.apply_changes(RECORDS, new_records, kept, removed, added, kb_version="new")
+        fresh = KBSearchIndex.build(new_records)
+
+        assert index.kb_version == "new"
+        assert index.n_docs == 4
+        for query in ("apple pay", "google pay", "enable 2fa settings", "top up card", "пополнить карту", "pro multiplier"):
+            assert index.search(query) == fresh.search(query)
+
+
+class TestRowDiff:
+    """Test that the KB diff is keyed on row identity, not position."""
+
+    def test_insert_touches_only_new_row(self):
+        new_records = [RECORDS[0], {"Question": "Is there a withdrawal limit?", "Answer": "10000 USDT daily."}, *RECORDS[1:]]
+        kept, removed, added = diff(RECORDS, new_records)
+        assert added == [1]
+        assert removed == []
+        assert kept == {0: 0, 1: 2, 2: 3, 3: 4}
+
+    def test_delete_and_edit(self):
+        new_records = [RECORDS[0], dict(RECORDS[2], Answer="PRO gives a 10x XP multiplier."), RECORDS[3]]
+        kept, removed, added = diff(RECORDS, new_records)
+        assert kept == {0: 0, 3: 2}
+        assert removed == [1, 2]
+        assert added == [1]
+
+    def test_id_column_is_the_identity(self):
+        old = [{"ID": 7, "Question": "Old wording?", "Answer": "A"}]
+        new = [{"ID": 7, "Question": "New wording?", "Answer": "A"}]
+        assert row_key(old[0]) == row_key(new[0])
+        assert row_key({"Question": "Top  up?"}) == row_key({"Question": "top up?"})
+        kept, removed, added = diff(old, new)
+        assert (kept, removed, added) == ({}, [0], [0])
+
+
+def diff(old_records, new_records):
+    def hashes(records):
+        return [json.dumps(r, sort_keys=True) for r in records]
+    return diff_rows(old_records, new_records, hashes(old_records), hashes(new_records))
@@ -0,0 +1,176 @@
+"""
+Tests for generated media lifecycle (staging, TTL/LRU eviction, index vs. disk).
+"""
+
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.services.media_service import MediaService
+from tests.conftest import FakePipeline
+
+
+class FakeIndexRedis:
+    """Hash / sorted set / string commands the media index uses, in memory."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+        self.strings = {}
+
+    async def hsetnx(self, key, field, value):
+        fields = self.hashes.setdefault(key, {})
+        if field in fields:
+            return 0
+        fields[field] = value
+        return 1
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def exists(self, key):
+        return int(bool(self.hashes.get(key) or self.zsets.get(key) or key in self.strings))
+
+    async def zadd(self, key, mapping, xx=False):
+        zset = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if not xx or member in zset:
+                zset[member] = score
+
+    def _sorted(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    async def zrange(self, key, start, end):
+        items = self._sorted(key)
+        end = len(items) + end if end < 0 else end
+        return [member for member, _ in items[start:end + 1]]
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        items = self._sorted(key)[::-1][start:end + 1]
+        return items if withscores else [member for member, _ in items]
+
+    async def zrangebyscore(self, key, low, high, start=0, num=None):
+        items = [member for member, score in self._sorted(key) if score <= high]
+        return items[start:start + num if num else None]
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def incrby(self, key, amount):
+        self.strings[key] = int(self.strings.get(key) or 0) + amount
+
+    async def decrby(self, key, amount):
+        await self.incrby(key, -amount)
+
+    async def delete(self, *keys):
+        for key in keys:
+            for store in (self.hashes, self.zsets, self.strings):
+                store.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def client():
+    fake = FakeIndexRedis()
+    with patch("app.services.media_service.redis_service") as redis_service:
+        redis_service.client = redis_service.raw_client = fake
+        yield fake
+
+
+@pytest.fixture
+def media(tmp_path, client):
+    service = MediaService(media_dir=str(tmp_path))
+    # "Images" are their encoded bytes: no PIL needed
+    with patch.object(MediaService, "_encode_webp", staticmethod(lambda image, quality: image)):
+        yield service
+
+
+def assert_index_matches_disk(media, client):
+    on_disk = {name: os.path.getsize(os.path.join(media.media_dir, name)) for name in os.listdir(media.media_dir)}
+    indexed = {name: media._unpack(value)["size"] for name, value in client.hashes.get(media.INDEX_KEY, {}).items()}
+    assert indexed == on_disk
+    assert set(client.zsets.get(media.ACCESS_KEY, {})) == set(on_disk)
+    assert int(client.strings.get(media.TOTAL_BYTES_KEY) or 0) == sum(on_disk.values())
+
+
+async def test_ttl_then_lru(media, client):
+    urls = [await media.ingest(1, bytes(100)) for _ in range(4)]
+    names = [os.path.basename(url) for url in urls]
+    now = int(time.time())
+    # names[0] untouched for longer than the TTL, then LRU order names[1] < names[2] < names[3]
+    for name, age_days in zip(names, (settings.MEDIA_TTL_DAYS + 1, 3, 2, 1)):
+        client.zsets[media.ACCESS_KEY][name] = now - age_days * 86400
+
+    with patch.object(settings, "MEDIA_STORE_MAX_MB", 150 / (1024 * 1024)):
+        stats = await media.evict()
+
+    assert stats == {"ttl_evicted": 1, "lru_evicted": 2, "bytes_freed": 300}
+    assert os.listdir(media.media_dir) == [names[3]]
+    assert [item["filename"] for item in await media.list_partner_media(1)] == [names[3]]
+    assert_index_matches_disk(media, client)
+
+
+async def test_partner_quota_and_rebuild(media, client):
+    clock = iter(range(1_000_000, 1_000_010))
+    with patch.object(settings, "MEDIA_PARTNER_QUOTA", 2), \
+            patch("app.services.media_service.time", SimpleNamespace(time=lambda: next(clock))):
+        for size in (10, 20, 30):
+            await media.ingest(7, bytes(size))
+    assert sorted(os.path.getsize(os.path.join(media.media_dir, n)) for n in os.listdir(media.media_dir)) == [20, 30]
+    assert_index_matches_disk(media, client)
+
+    # Lost index (Redis flush): eviction rebuilds it from the directory first
+    await client.delete(media.INDEX_KEY, media.ACCESS_KEY, media.TOTAL_BYTES_KEY)
+    await media.evict()
+    assert_index_matches_disk(media, client)
+
+
+async def test_staged_image_adopted_once(media, client):
+    url = await media.stage(3, b"webp-bytes")
+    assert os.listdir(media.media_dir) == []
+
+    assert await media.adopt(url) == url
+    assert await media.adopt(url) == url  # Polled again
+    assert os.listdir(media.media_dir) == [os.path.basename(url)]
+    assert media.stage_key(os.path.basename(url)) not in client.strings
+    assert_index_matches_disk(media, client)
+
+    assert await media.adopt("/generated_media/viral_3_gone.webp") is None
+
+
+async def test_eviction_loop_runs_once_per_lock(media, client):
+    await client.set(media.EVICT_LOCK, "other-worker")
+    with patch.object(media, "evict", AsyncMock(return_value={})) as evict, \
+            patch("app.services.media_service.asyncio.sleep", AsyncMock(side_effect=asyncio.CancelledError)):
+        with pytest.raises(asyncio.CancelledError):
+            await media.eviction_loop()
+        evict.assert_not_awaited()
+
+        await client.delete(media.EVICT_LOCK)
+        with pytest.raises(asyncio.CancelledError):
+            await media.eviction_loop()
+        evict.assert_awaited_once()
@@ -0,0 +1,102 @@
+"""
+Tests for the fan-out-on-write network feed (capped per-partner lists, shared card cache).
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.models.partner import Partner
+from app.services.feed_service import FeedEvent, NetworkFeed
+from tests.conftest import FakePipeline
+
+
+class FakeListRedis:
+    """The list / string commands the feed uses, in memory."""
+
+    def __init__(self):
+        self.lists = {}
+        self.strings = {}
+        self.mget_calls = 0
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def ltrim(self, key, start, end):
+        items = self.lists.get(key, [])
+        end = len(items) + end if end < 0 else end
+        self.lists[key] = items[start:end + 1]
+
+    async def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        end = len(items) + end if end < 0 else end
+        return items[start:end + 1]
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def set(self, key, value, ex=None):
+        self.strings[key] = value
+        return True
+
+    async def mget(self, keys):
+        self.mget_calls += 1
+        return [self.strings.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+async def feed(session):
+    session.add(Partner(id=1, telegram_id="100", referral_code="R1", first_name="Root"))
+    session.add(Partner(id=2, telegram_id="200", referral_code="R2", first_name="Alice", username="alice"))
+    session.add(Partner(id=3, telegram_id="300", referral_code="R3", first_name="Bob"))
+    await session.commit()
+    return NetworkFeed()
+
+
+@pytest.fixture
+def client():
+    fake = FakeListRedis()
+    with patch("app.services.feed_service.redis_service.client", fake):
+        yield fake
+
+
+async def test_append_is_capped(feed, client):
+    feed.FEED_MAX = 5
+    await feed.publish((1, FeedEvent.now("join", 2, 1, i)) for i in range(8))
+
+    raw = client.lists[feed.feed_key(1)]
+    assert len(raw) == 5
+    # Newest first, oldest dropped
+    assert [FeedEvent.model_validate_json(item).v for item in raw] == [7, 6, 5, 4, 3]
+
+
+async def test_read_hydrates_cards_from_cache(feed, session, client):
+    await feed.publish([
+        (1, FeedEvent.now("join", 2, 1, 50)),
+        (1, FeedEvent.now("commission", 3, 2, 1.5, "USDT")),
+    ])
+
+    page = await feed.read(session, 1, limit=10)
+    assert [(item["type"], item["first_name"], item["currency"]) for item in page] == [
+        ("commission", "Bob", "USDT"),
+        ("join", "Alice", "XP"),
+    ]
+    assert page[1]["username"] == "alice" and page[1]["level"] == 1
+    assert feed.card_key(2) in client.strings
+
+    # A rename reaches every feed once the card is dropped; until then the cache answers
+    partner = await session.get(Partner, 2)
+    partner.first_name = "Alicia"
+    await session.commit()
+    assert (await feed.read(session, 1, limit=1, offset=1))[0]["first_name"] == "Alice"
+    await client.delete(feed.card_key(2))
+    assert (await feed.read(session, 1, limit=1, offset=1))[0]["first_name"] == "Alicia"
+
+    assert await feed.read(session, 3) == []
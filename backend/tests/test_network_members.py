@@ -0,0 +1,98 @@
+"""
+Tests for keyset-paginated downline browsing (/partner/network/{level}).
+
+#comment: Walking every page must return exactly the rows of one big ordered query,
+with no duplicates or gaps at page boundaries (ties on xp are broken by id).
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.partner import Partner
+from app.services.analytics_service import (
+    decode_members_cursor,
+    encode_members_cursor,
+    get_referral_tree_members,
+    search_downline,
+)
+
+
+class TestCursor:
+    def test_xp_roundtrip(self):
+        cursor = encode_members_cursor("xp", {"xp": 12.5, "id": 42, "created_at": None})
+        assert decode_members_cursor("xp", cursor) == (12.5, 42)
+
+    def test_joined_roundtrip(self):
+        joined = datetime(2026, 10, 19, 12, 30, 5, 123456)
+        cursor = encode_members_cursor("joined", {"xp": 0, "id": 7, "created_at": joined.isoformat()})
+        assert decode_members_cursor("joined", cursor) == (joined, 7)
+
+    def test_malformed_cursor(self):
+        with pytest.raises(ValueError):
+            decode_members_cursor("xp", "not-a-cursor")
+
+
+async def _walk_pages(session, level, sort, page_size):
+    random.seed(5)
+    # Root 1 with 20 direct partners, everyone else one level below them
+    for pid in range(1, 200):
+        referrer = None if pid == 1 else (1 if pid <= 21 else random.randint(2, 21))
+        session.add(Partner(
+            id=pid, telegram_id=str(pid), referral_code=f"R{pid}", referrer_id=referrer,
+            path=None if pid == 1 else ("1" if referrer == 1 else f"1.{referrer}"),
+            depth=0 if pid == 1 else (1 if referrer == 1 else 2),
+            xp=float(random.randint(0, 5)),  # Lots of ties
+            created_at=datetime(2026, 1, 1) + timedelta(minutes=random.randint(0, 30)),
+        ))
+    await session.commit()
+
+    paged, cursor = [], None
+    while True:
+        page = await get_referral_tree_members(session, 1, level, sort=sort, cursor=cursor, limit=page_size)
+        paged.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    everything = await get_referral_tree_members(session, 1, level, sort=sort, limit=10_000)
+    return paged, [item["id"] for item in everything["items"]]
+
+
+class TestKeysetPages:
+    @pytest.mark.parametrize("level,sort", [(1, "xp"), (1, "joined"), (2, "xp"), (2, "joined")])
+    async def test_pages_match_single_query(self, session, level, sort):
+        paged, expected = await _walk_pages(session, level, sort, page_size=7)
+        assert paged == expected
+        assert len(set(paged)) == len(paged) > 7
+
+
+@pytest.fixture
+async def network(session):
+    # 1 -> 2 -> 3 -> 4, 2 -> 5, and 6 outside 2's network
+    people = [
+        (1, None, None, 0, "alexroot"), (2, 1, "1", 1, "leader"), (3, 2, "1.2", 2, "malex"),
+        (4, 3, "1.2.3", 3, "alex"), (5, 2, "1.2", 2, "alexander"), (6, 1, "1", 1, "alex_out"),
+    ]
+    for pid, ref, path, depth, username in people:
+        session.add(Partner(
+            id=pid, telegram_id=str(1000 + pid), referral_code=f"R{pid}", referrer_id=ref,
+            path=path, depth=depth, username=username, first_name=username.capitalize()
+        ))
+    await session.commit()
+    return session
+
+
+class TestDownlineSearch:
+    async def test_ranked_within_own_network(self, network):
+        results = await search_downline(network, 2, "Alex")
+        assert [(r["id"], r["match"], r["network_level"]) for r in results] == [
+            (4, "exact", 2), (5, "prefix", 1), (3, "contains", 1)
+        ]
+
+    async def test_like_wildcards_are_literal(self, network):
+        assert await search_downline(network, 2, "%%") == []
+        assert (await search_downline(network, 1, "x_o"))[0]["id"] == 6
+
+    async def test_telegram_id_match(self, network):
+        assert [r["id"] for r in await search_downline(network, 2, "1005")] == [5]
@@ -0,0 +1,37 @@
+"""
+Tests for the request-scoped partner identity resolver.
+
+#comment: Redis is optional here; with it unavailable the resolver must still answer
+from the narrow column query and serve repeat lookups from the in-process LRU.
+"""
+
+from app.models.partner import Partner
+from app.services.partner_identity_service import PartnerIdentity, PartnerIdentityResolver
+
+
+class TestPartnerIdentityResolver:
+    async def test_narrow_lookup_and_local_cache(self, session):
+        resolver = PartnerIdentityResolver()
+        session.add(Partner(
+            id=5, telegram_id="500", referral_code="R5", is_pro=True, level=3,
+            language_code="ru", path="1.2", depth=2,
+        ))
+        await session.commit()
+
+        first = await resolver.resolve(session, "500")
+        missing = await resolver.resolve(session, "999")
+        # Served from the local LRU: no session needed
+        cached = await resolver.resolve(None, "500")
+        resolver.forget_local("500")
+
+        assert first == PartnerIdentity(
+            partner_id=5, telegram_id="500", is_pro=True, level=3, language_code="ru", path="1.2", depth=2
+        )
+        assert cached is first
+        assert missing is None
+        assert "999" not in resolver._local
+        assert "500" not in resolver._local
+
+    def test_redis_hash_roundtrip(self):
+        identity = PartnerIdentity(partner_id=9, telegram_id="90", language_code=None, path=None)
+        assert PartnerIdentity.from_redis("90", identity.to_redis()) == identity
@@ -0,0 +1,76 @@
+"""
+Tests for the partner vertical split (partner_pro_profile / partner_social_credentials).
+
+#comment: The side rows are created lazily, so every reader must cope with a partner
+that has none yet, and the first write must persist exactly one row.
+"""
+
+from unittest.mock import patch
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.endpoints.partner import PARTNER_RESPONSE_LOADS, prepare_partner_response
+from app.models.partner import (
+    Partner,
+    PartnerProProfile,
+    load_pro_profile,
+    load_social_credentials,
+)
+
+
+class TestPartnerSplit:
+    async def test_lazy_rows_and_response(self, engine, session):
+        session.add(Partner(id=1, telegram_id="100", referral_code="R1"))
+        await session.commit()
+
+        partner = (await session.exec(select(Partner).options(*PARTNER_RESPONSE_LOADS))).one()
+        before = prepare_partner_response(partner, "100")
+
+        profile = await load_pro_profile(session, partner)
+        assert await load_pro_profile(session, partner) is profile
+        profile.pro_tokens = 42
+        profile.completed_stages = '[1, 2]'
+        credentials = await load_social_credentials(session, partner)
+        credentials.x_api_key = "key"
+        await session.commit()
+
+        async with AsyncSession(engine) as fresh:
+            partner = (await fresh.exec(select(Partner).options(*PARTNER_RESPONSE_LOADS))).one()
+            after = prepare_partner_response(partner, "100")
+            profiles = (await fresh.exec(select(PartnerProProfile))).all()
+
+        assert before["pro_tokens"] == 500
+        assert before["completed_stages"] == []
+        assert before["has_x_setup"] is False
+        assert "x_api_key" not in before
+
+        assert len(profiles) == 1
+        assert after["pro_tokens"] == 42
+        assert after["completed_stages"] == [1, 2]
+        assert after["has_x_setup"] is True
+
+    async def test_concurrent_first_use_adopts_existing_row(self, engine, session):
+        session.add(Partner(id=1, telegram_id="100", referral_code="R1"))
+        await session.commit()
+        partner = await session.get(Partner, 1)
+        (await load_pro_profile(session, partner)).pro_tokens = 7
+        await session.commit()
+
+        # Another request missed the row just before it was committed
+        async with AsyncSession(engine) as racing:
+            real_get = racing.get
+            lookups = []
+
+            async def stale_get(model, ident):
+                lookups.append(ident)
+                return None if len(lookups) == 1 else await real_get(model, ident)
+
+            partner = (await racing.exec(select(Partner))).one()
+            with patch.object(racing, "get", stale_get):
+                profile = await load_pro_profile(racing, partner)
+            assert profile.pro_tokens == 7
+            await racing.commit()
+
+        async with AsyncSession(engine) as fresh:
+            assert len((await fresh.exec(select(PartnerProProfile))).all()) == 1
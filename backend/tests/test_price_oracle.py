@@ -0,0 +1,67 @@
+"""
+Tests for the price oracle source chain and staleness guard.
+
+#comment: Payment sessions are priced from this quote, so a failing source must fall
+through to the next one and an outdated price must never be used for a quote.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.price_oracle_service import (
+    FilePriceSource,
+    MockPriceSource,
+    PriceOracle,
+    PriceQuote,
+    PriceSource,
+    StalePriceError,
+)
+
+
+class FailingSource(PriceSource):
+    name = "failing"
+
+    async def fetch(self, symbol: str) -> float:
+        raise RuntimeError("upstream down")
+
+
+class TestSourceChain:
+    def test_falls_through_to_next_source(self):
+        oracle = PriceOracle(sources=[FailingSource(), MockPriceSource({"TON": 5.25})])
+        quote = asyncio.run(oracle.fetch_price("TON"))
+        assert quote.price == 5.25
+        assert quote.source == "mock"
+
+    def test_file_source(self, tmp_path):
+        path = tmp_path / "prices.json"
+        path.write_text(json.dumps({"TON": 4.8}))
+        oracle = PriceOracle(sources=[FilePriceSource(str(path))])
+        assert asyncio.run(oracle.fetch_price("TON")).price == 4.8
+
+    def test_all_sources_failing_returns_none(self):
+        oracle = PriceOracle(sources=[FailingSource(), MockPriceSource({"TON": 0})])
+        assert asyncio.run(oracle.fetch_price("TON")) is None
+
+
+class TestStaleness:
+    def test_missing_price_is_refused(self):
+        with pytest.raises(StalePriceError):
+            PriceOracle(sources=[]).require_fresh_quote("TON")
+
+    def test_stale_price_is_refused(self):
+        oracle = PriceOracle(sources=[])
+        old_ts = time.time() - settings.PRICE_MAX_AGE_SECONDS - 60
+        oracle._snapshot["TON"] = PriceQuote(symbol="TON", price=5.0, ts=old_ts, source="mock")
+
+        assert oracle.get_quote("TON").is_stale
+        with pytest.raises(StalePriceError):
+            oracle.require_fresh_quote("TON")
+
+    def test_fresh_price_is_served(self):
+        oracle = PriceOracle(sources=[])
+        oracle._snapshot["TON"] = PriceQuote(symbol="TON", price=5.0, ts=time.time(), source="mock")
+        assert oracle.require_fresh_quote("TON").price == 5.0
@@ -0,0 +1,64 @@
+"""
+Tests for fork safety helpers (Gunicorn preload mode).
+"""
+
+import os
+import sys
+
+import pytest
+
+from app.core.process import after_fork, memory_usage
+
+
+def run_in_fork(func) -> str:
+    """Runs func in a forked child and returns what it printed to the pipe."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_fd, str(func()).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        return f.read()
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="fork only")
+
+
+def test_after_fork_hooks_run_in_child_only():
+    calls = []
+    after_fork(lambda: calls.append(os.getpid()))
+
+    assert run_in_fork(lambda: len(calls)) == "1"
+    assert calls == []
+
+
+def test_bot_update_queue_gets_new_owner_after_fork():
+    from app.services.bot_update_queue import bot_update_queue
+
+    parent_owner = bot_update_queue.owner
+    child_owner = run_in_fork(lambda: bot_update_queue.owner)
+    assert child_owner and child_owner != parent_owner
+    assert child_owner.split(":")[0] != str(os.getpid())
+
+
+def test_redis_pools_are_emptied_after_fork():
+    from app.services.redis_service import redis_service
+
+    pool = redis_service.client.connection_pool
+    pool._available_connections.append(object())
+    try:
+        assert run_in_fork(lambda: len(pool._available_connections)) == "0"
+    finally:
+        pool._available_connections.pop()
+
+
+def test_memory_usage_reports_megabytes():
+    usage = memory_usage()
+    assert usage
+    assert all(value >= 0 for value in usage.values())
+    if "uss" in usage:
+        assert usage["uss"] <= usage["rss"]
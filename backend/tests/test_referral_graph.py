@@ -0,0 +1,119 @@
+"""
+Tests for the array-backed ReferralGraph.
+
+#comment: The reconciler writes path/depth/referral_count straight from these arrays,
+so every metric is checked against a naive per-node ancestor walk.
+"""
+
+import random
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlmodel import select
+
+from app.models.partner import Partner
+from app.services import maintenance_service
+from app.utils.referral_graph import ReferralGraph
+
+
+def _rows(parents):
+    """parents: {id: referrer_id} -> (id, referrer_id, created_at, is_pro, xp) rows."""
+    return [(pid, ref, datetime(2026, 1, 1), pid % 2 == 0, pid * 10) for pid, ref in parents.items()]
+
+
+def _naive_chain(parents, pid):
+    chain, cur = [], parents.get(pid)
+    while cur is not None and cur in parents:
+        chain.append(cur)
+        cur = parents[cur]
+    return chain  # nearest first
+
+
+@pytest.fixture
+def random_tree():
+    random.seed(7)
+    parents = {1: None}
+    for pid in range(2, 400):
+        parents[pid] = random.randint(1, pid - 1) if random.random() < 0.97 else None
+    return parents
+
+
+class TestStructure:
+    def test_depth_and_paths_match_naive_walk(self, random_tree):
+        graph = ReferralGraph.from_rows(_rows(random_tree))
+        paths = graph.build_paths(graph.topological_order())
+        for pid in random_tree:
+            i = graph.index_of(pid)
+            chain = _naive_chain(random_tree, pid)
+            assert graph.depth[i] == len(chain)
+            assert paths[i] == (".".join(str(a) for a in reversed(chain)) or None)
+            assert paths[i] == graph.path_of(i)
+
+    def test_unknown_referrer_is_root(self):
+        graph = ReferralGraph.from_rows(_rows({5: 999, 6: 5}))
+        assert graph.parent[graph.index_of(5)] == -1
+        assert graph.depth[graph.index_of(6)] == 1
+
+    def test_cycle_is_unreachable(self):
+        graph = ReferralGraph.from_rows(_rows({1: None, 2: 3, 3: 2, 4: 1}))
+        assert graph.depth[graph.index_of(2)] == -1
+        assert graph.ancestors(graph.index_of(2)) is None
+        assert len(graph.topological_order()) == 2
+
+
+class TestCounts:
+    def test_descendant_counts_within_nine_levels(self, random_tree):
+        graph = ReferralGraph.from_rows(_rows(random_tree))
+        expected = {pid: 0 for pid in random_tree}
+        for pid in random_tree:
+            for anc in _naive_chain(random_tree, pid)[:9]:
+                expected[anc] += 1
+        counts = graph.descendant_counts(9)
+        for pid, count in expected.items():
+            i = graph.index_of(pid)
+            assert counts[i] == count
+            assert sum(graph.level_counts(i, 9)) == count
+
+    def test_subtree_sizes(self):
+        # 1 -> 2 -> 3, 1 -> 4
+        graph = ReferralGraph.from_rows(_rows({1: None, 2: 1, 3: 2, 4: 1}))
+        sizes = graph.subtree_sizes()
+        assert [int(sizes[graph.index_of(p)]) for p in (1, 2, 3, 4)] == [4, 2, 1, 1]
+        assert graph.level_counts(graph.index_of(1), 3) == [2, 1, 0]
+
+
+class TestSnapshot:
+    def test_roundtrip(self, tmp_path, random_tree):
+        graph = ReferralGraph.from_rows(_rows(random_tree))
+        path = str(tmp_path / "graph.npz")
+        graph.save(path)
+        loaded = ReferralGraph.load(path, max_age=60)
+        assert loaded is not None
+        assert (loaded.parent == graph.parent).all()
+        assert (loaded.children == graph.children).all()
+        assert (loaded.xp == graph.xp).all()
+
+    def test_missing_or_expired_snapshot(self, tmp_path):
+        path = str(tmp_path / "graph.npz")
+        assert ReferralGraph.load(path) is None
+        ReferralGraph.from_rows(_rows({1: None})).save(path)
+        assert ReferralGraph.load(path, max_age=-1) is None
+
+
+class TestReconcile:
+    async def test_reuses_loaded_graph(self, session, tmp_path):
+        for pid, ref in {1: None, 2: 1, 3: 2}.items():
+            session.add(Partner(id=pid, telegram_id=str(pid), referral_code=f"R{pid}", referrer_id=ref, path="0", depth=0))
+        await session.commit()
+
+        with patch.object(maintenance_service.settings, "REFERRAL_GRAPH_SNAPSHOT_PATH", str(tmp_path / "graph.npz")), \
+                patch.object(maintenance_service, "redis_service", AsyncMock()):
+            graph = await maintenance_service.load_referral_graph(session)
+            with patch.object(maintenance_service, "load_referral_graph", AsyncMock()) as reload:
+                result = await maintenance_service.reconcile_network_stats(session, graph=graph)
+        reload.assert_not_awaited()
+
+        assert result["structural_fixes"] == 3
+        rows = (await session.exec(select(Partner.id, Partner.depth, Partner.referral_count).order_by(Partner.id))).all()
+        assert [(row.depth, row.referral_count) for row in rows] == [(0, 2), (1, 1), (2, 0)]
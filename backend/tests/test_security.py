@@ -0,0 +1,83 @@
+"""
+Tests for Telegram initData verification and its cache.
+
+#comment: Nearly every API request authenticates through this path, so a cache hit must
+never accept an altered or expired initData string.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.security import TelegramAuthCache, TelegramInitData, get_tg_user
+
+
+def sign(fields: dict) -> str:
+    secret = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode(), hashlib.sha256).digest()
+    check = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    return urlencode({**fields, "hash": hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()})
+
+
+def init_data(user_id: int = 42, auth_date: int = None) -> str:
+    return sign({
+        "auth_date": str(auth_date or int(time.time())),
+        "query_id": "AAE",
+        "user": json.dumps({"id": user_id, "first_name": "Ann"}),
+    })
+
+
+class TestTelegramAuthCache:
+    def test_valid_signature_parses_user_once(self):
+        cache = TelegramAuthCache(maxsize=10, ttl=60)
+        vals = cache.verify(init_data(7))
+        assert isinstance(vals, TelegramInitData)
+        assert "hash" not in vals
+        assert get_tg_user(vals) == {"id": 7, "first_name": "Ann"}
+
+    def test_second_verification_is_a_cache_hit(self):
+        cache = TelegramAuthCache(maxsize=10, ttl=60)
+        raw = init_data()
+        first = cache.verify(raw)
+        assert cache.verify(raw) is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_tampered_fields_with_cached_hash_are_rejected(self):
+        cache = TelegramAuthCache(maxsize=10, ttl=60)
+        raw = init_data(1)
+        cache.verify(raw)
+        forged = raw.replace("%22id%22%3A+1", "%22id%22%3A+2")
+        assert forged != raw
+        with pytest.raises(HTTPException) as exc:
+            cache.verify(forged)
+        assert exc.value.detail == "Invalid signature"
+
+    def test_missing_hash(self):
+        with pytest.raises(HTTPException) as exc:
+            TelegramAuthCache(maxsize=10, ttl=60).verify("auth_date=1")
+        assert exc.value.detail == "Hash missing"
+
+    def test_expired_session(self):
+        cache = TelegramAuthCache(maxsize=10, ttl=60)
+        with pytest.raises(HTTPException) as exc:
+            cache.verify(init_data(auth_date=int(time.time()) - 90000))
+        assert exc.value.detail == "Session expired"
+
+    def test_cached_entry_expires_with_auth_date(self):
+        cache = TelegramAuthCache(maxsize=10, ttl=60)
+        raw = init_data()
+        vals = cache.verify(raw)
+        vals.auth_date -= 90000
+        with pytest.raises(HTTPException):
+            cache.verify(raw)
+
+
+def test_get_tg_user_accepts_plain_dicts():
+    assert get_tg_user({"user": json.dumps({"id": 3})}) == {"id": 3}
+    with pytest.raises(HTTPException):
+        get_tg_user({})
@@ -0,0 +1,44 @@
+"""
+Tests for the startup profiler (boot step and import timing).
+"""
+
+import sys
+
+import pytest
+
+from app.core.startup_profiler import StartupProfiler
+
+
+def test_steps_are_recorded_even_on_failure():
+    profiler = StartupProfiler()
+    with profiler.step("warm"):
+        pass
+    with pytest.raises(RuntimeError):
+        with profiler.step("broken"):
+            raise RuntimeError("boom")
+
+    report = profiler.report()
+    assert [s["step"] for s in report["steps"]] == ["warm", "broken"]
+    assert all(s["ms"] >= 0 for s in report["steps"])
+    assert report["slowest_imports"] == []
+
+
+def test_import_timing(tmp_path, monkeypatch):
+    monkeypatch.setenv("STARTUP_PROFILE", "1")
+    (tmp_path / "_profiled_child.py").write_text("VALUE = sum(range(10000))\n")
+    (tmp_path / "_profiled_parent.py").write_text("import _profiled_child\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    profiler = StartupProfiler()
+    try:
+        import _profiled_parent  # noqa: F401
+        rows = {row["module"]: row for row in profiler.import_report(top=1000)}
+        assert rows["_profiled_parent"]["cumulative_ms"] >= rows["_profiled_child"]["cumulative_ms"]
+        assert rows["_profiled_parent"]["self_ms"] <= rows["_profiled_parent"]["cumulative_ms"]
+
+        profiler.log_report("test")
+        assert profiler._imports not in sys.meta_path
+    finally:
+        sys.meta_path[:] = [f for f in sys.meta_path if f is not profiler._imports]
+        sys.modules.pop("_profiled_parent", None)
+        sys.modules.pop("_profiled_child", None)
@@ -0,0 +1,46 @@
+"""
+Tests for the PRO expiry job helpers.
+
+#comment: The warning markers are what keep an hourly rerun from double-warning,
+so their keys must be stable per expiry and change when the subscription is renewed.
+"""
+
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.services.subscription_service import SubscriptionService
+
+
+service = SubscriptionService()
+
+
+class TestWarningMarkers:
+    def test_same_expiry_same_marker(self):
+        expires = datetime(2026, 10, 22, 12, 30)
+        assert service.warning_marker_key(3, "42", expires) == service.warning_marker_key(3, "42", expires)
+
+    def test_renewal_gets_new_marker(self):
+        expires = datetime(2026, 10, 22, 12, 30)
+        renewed = expires + timedelta(days=30)
+        assert service.warning_marker_key(3, "42", expires) != service.warning_marker_key(3, "42", renewed)
+
+    def test_windows_have_separate_markers(self):
+        expires = datetime(2026, 10, 22, 12, 30)
+        assert service.warning_marker_key(3, "42", expires) != service.warning_marker_key(1, "42", expires)
+
+
+class TestTexts:
+    def test_days_label(self):
+        assert service.days_label(1, "en") == "1 day"
+        assert service.days_label(3, "en") == "3 days"
+        assert service.days_label(1, "ru") == "1 день"
+        assert service.days_label(3, "ru") == "3 дня"
+
+    def test_localized_warning(self):
+        text = service.expiration_warning_text(3, "ru")
+        assert "3 дня" in text
+        assert f"${settings.PRO_PRICE_USD}" in text
+
+    def test_unknown_language_falls_back_to_english(self):
+        assert "Subscription Expired" in service.expired_text("de")
+        assert "Subscription Expired" in service.expired_text(None)
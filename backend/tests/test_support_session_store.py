@@ -0,0 +1,64 @@
+"""
+Tests for the bounded support session memory.
+
+#comment: The prompt built from a session must stay within the token budget
+no matter how long the chat runs, and metadata must survive the Redis HASH encoding.
+"""
+
+from app.core.config import settings
+from app.services.support_session_store import SupportSessionStore, estimate_tokens
+
+
+def _history(n, size=40):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i} " + "x" * size, "timestamp": "t"}
+        for i in range(n)
+    ]
+
+
+class TestPromptHistory:
+    """Test summary + window selection under the token budget."""
+
+    def test_short_session_is_sent_verbatim(self):
+        store = SupportSessionStore()
+        session = {"summary": "", "history": _history(4)}
+        summary, messages = store.build_prompt_history(session)
+
+        assert summary == ""
+        assert [m["content"] for m in messages] == [m["content"] for m in session["history"]]
+        assert set(messages[0]) == {"role", "content"}
+
+    def test_budget_keeps_newest_messages(self):
+        """
+        Verifies:
+        - Oversized windows are cut from the oldest side
+        - Prompt history never exceeds SUPPORT_HISTORY_TOKEN_BUDGET
+        """
+        store = SupportSessionStore()
+        session = {"summary": "User asked about TRC20 top-up.", "history": _history(30, size=800)}
+        summary, messages = store.build_prompt_history(session)
+
+        used = estimate_tokens(summary) + sum(estimate_tokens(m["content"]) for m in messages)
+        assert used <= settings.SUPPORT_HISTORY_TOKEN_BUDGET
+        assert messages[-1]["content"] == session["history"][-1]["content"]
+
+    def test_compaction_threshold(self):
+        store = SupportSessionStore()
+        assert not store.needs_compaction(settings.SUPPORT_HISTORY_WINDOW)
+        assert store.needs_compaction(settings.SUPPORT_HISTORY_WINDOW + store.COMPACT_BATCH)
+
+
+class TestMetaEncoding:
+    def test_roundtrip(self):
+        session = SupportSessionStore.new_session("42")
+        session["user_metadata"] = {"username": "alice", "level": 3}
+        session["total_cost"] = 0.0012
+
+        encoded = SupportSessionStore._encode_meta(session)
+        assert "history" not in encoded and "category" not in encoded
+
+        decoded = SupportSessionStore._decode_meta(encoded)
+        assert decoded["user_metadata"] == {"username": "alice", "level": 3}
+        assert decoded["total_cost"] == 0.0012
+        assert decoded["tokens_used"] == 0
+        assert decoded["category"] is None
@@ -0,0 +1,85 @@
+"""
+Tests for the streamed support reply in the bot (throttled placeholder edits, final edit).
+"""
+
+from unittest.mock import AsyncMock, patch
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+import bot
+from bot import _stream_support_reply
+
+
+class FakeMessage:
+    """A sent message: edits are recorded, queued failures are raised first."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.edits = []
+        self.deleted = False
+
+    async def edit_text(self, text, parse_mode=None):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.edits.append((text, parse_mode))
+
+    async def delete(self):
+        self.deleted = True
+
+
+async def stream(*texts):
+    for text in texts:
+        yield text
+
+
+def growing(steps, step=10):
+    return ["x" * (step * i) for i in range(1, steps + 1)]
+
+
+async def test_edits_are_throttled():
+    placeholder = FakeMessage()
+    message = FakeMessage()
+    message.answer = AsyncMock(return_value=placeholder)
+
+    # Every token within one edit interval: only the final Markdown edit
+    await _stream_support_reply(message, stream(*growing(10)))
+    message.answer.assert_awaited_once_with("x" * 10 + " ▌")
+    assert placeholder.edits == [("x" * 100, "Markdown")]
+
+    # Interval elapsed on every token: edits still wait for SUPPORT_STREAM_MIN_DELTA new characters
+    placeholder.edits = []
+    with patch.object(bot, "SUPPORT_STREAM_EDIT_INTERVAL", 0):
+        await _stream_support_reply(message, stream(*growing(10)))
+    assert [len(text) for text, _ in placeholder.edits] == [42, 72, 102, 100]
+    assert [mode for _, mode in placeholder.edits] == [None, None, None, "Markdown"]
+
+
+async def test_final_edit_waits_out_flood_control():
+    placeholder = FakeMessage(failures=[TelegramRetryAfter(None, "Too Many Requests", retry_after=3)])
+    message = FakeMessage()
+    message.answer = AsyncMock(return_value=placeholder)
+
+    with patch("bot.asyncio.sleep", AsyncMock()) as sleep:
+        await _stream_support_reply(message, stream("Hello", "Hello **world**"))
+    sleep.assert_awaited_once_with(3)
+    assert placeholder.edits == [("Hello **world**", "Markdown")]
+    assert message.answer.await_count == 1
+
+
+async def test_final_edit_falls_back_to_new_message():
+    flood = TelegramRetryAfter(None, "Too Many Requests", retry_after=1)
+    for failures in ([flood, flood], [TelegramNetworkError(None, "Connection reset")]):
+        placeholder = FakeMessage(failures=list(failures))
+        message = FakeMessage()
+        sent = []
+
+        async def answer(text, parse_mode=None):
+            sent.append(text)
+            return placeholder
+
+        message.answer = answer
+        with patch("bot.asyncio.sleep", AsyncMock()):
+            await _stream_support_reply(message, stream("Hi", "Hi there"))
+
+        assert placeholder.deleted
+        assert sent == ["Hi ▌", "Hi there"]
@@ -0,0 +1,82 @@
+"""
+Tests for the bitset task engine (start / claim as guarded single-row updates).
+"""
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+from app.core.tasks import TASK_IDS, task_bit, task_ids_in
+from app.models.partner import Partner, PartnerTask
+from app.services.task_service import task_engine
+
+
+@pytest.fixture
+async def partners(session):
+    session.add(Partner(id=1, telegram_id="100", referral_code="R1"))
+    session.add(Partner(id=2, telegram_id="200", referral_code="R2", is_pro=True))
+    await session.commit()
+
+
+class TestTaskCatalog:
+    def test_bits_follow_catalog_order(self):
+        assert task_bit(TASK_IDS[0]) == 1
+        assert task_ids_in(task_bit("invite_3_friends") | task_bit("telegram_bot")) == ["telegram_bot", "invite_3_friends"]
+        assert task_ids_in(0) == [] and task_ids_in(None) == []
+
+
+class TestTaskEngine:
+    async def test_referral_task_lifecycle(self, session, partners):
+        with pytest.raises(HTTPException, match="must be started"):
+            await task_engine.claim(session, 1, "invite_3_friends")
+
+        await session.execute(Partner.__table__.update().where(Partner.id == 1).values(referral_count=4))
+        active = await task_engine.start(session, 1, "invite_3_friends")
+        assert active["initial_metric_value"] == 4
+        # Starting again hands back the same baseline
+        assert (await task_engine.start(session, 1, "invite_3_friends"))["initial_metric_value"] == 4
+
+        await session.execute(Partner.__table__.update().where(Partner.id == 1).values(referral_count=6))
+        with pytest.raises(HTTPException, match="Progress: 2/3"):
+            await task_engine.claim(session, 1, "invite_3_friends")
+
+        await session.execute(Partner.__table__.update().where(Partner.id == 1).values(referral_count=7))
+        claim = await task_engine.claim(session, 1, "invite_3_friends")
+        await session.commit()
+        with pytest.raises(HTTPException, match="already completed"):
+            await task_engine.claim(session, 1, "invite_3_friends")
+        with pytest.raises(HTTPException, match="already completed"):
+            await task_engine.start(session, 1, "invite_3_friends")
+
+        partner = await session.get(Partner, 1)
+        await session.refresh(partner)
+        records = (await session.exec(select(PartnerTask).where(PartnerTask.partner_id == 1))).all()
+
+        assert claim.effective_xp == 150 and claim.xp_after == 150 and claim.level == 2
+        assert partner.xp == 150
+        assert task_ids_in(partner.task_completed_mask) == ["invite_3_friends"]
+        assert [(r.status, r.reward_xp) for r in records] == [("COMPLETED", 150)]
+        assert await task_engine.active_tasks(session, partner) == []
+
+    async def test_social_task_pro_multiplier_and_level(self, session, partners):
+        claim = await task_engine.claim(session, 2, "telegram_bot")
+        await session.commit()
+        partner = await session.get(Partner, 2)
+        await session.refresh(partner)
+
+        assert claim.effective_xp == 125
+        assert partner.xp == 125 and partner.level == 2
+        assert task_ids_in(partner.task_completed_mask) == ["telegram_bot"]
+
+    async def test_active_tasks_and_invalid_task(self, session, partners):
+        await task_engine.start(session, 1, "daily_checkin_5")
+        partner = await session.get(Partner, 1)
+        await session.refresh(partner)
+        active = await task_engine.active_tasks(session, partner)
+        with pytest.raises(HTTPException) as not_startable:
+            await task_engine.start(session, 1, "telegram_bot")
+        with pytest.raises(HTTPException) as unknown:
+            await task_engine.claim(session, 1, "nope")
+
+        assert [a["task_id"] for a in active] == ["daily_checkin_5"]
+        assert not_startable.value.status_code == 400 and unknown.value.status_code == 404
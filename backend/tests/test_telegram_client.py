@@ -0,0 +1,75 @@
+"""
+Tests for the caching Telegram Bot API facade.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import GetFile
+
+from app.services.telegram_client import TelegramClient
+
+
+def make_bot():
+    bot = SimpleNamespace()
+
+    async def get_me():
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(username="pintopay_probot")
+
+    async def get_file(file_id):
+        if file_id == "gone":
+            raise TelegramBadRequest(method=GetFile(file_id=file_id), message="Bad Request: invalid file_id")
+        return SimpleNamespace(file_path=f"photos/{file_id}.jpg")
+
+    bot.get_me = AsyncMock(side_effect=get_me)
+    bot.get_file = AsyncMock(side_effect=get_file)
+    bot.get_user_profile_photos = AsyncMock(return_value=SimpleNamespace(total_count=0, photos=[]))
+    return bot
+
+
+def run(client, bot, coro_factory):
+    async def runner():
+        with patch.object(TelegramClient, "bot", bot):
+            return await coro_factory()
+    return asyncio.run(runner())
+
+
+class TestTelegramClient:
+    def test_get_me_coalesced_and_memoized(self):
+        client, bot = TelegramClient(), make_bot()
+
+        async def scenario():
+            first = await asyncio.gather(*[client.get_me() for _ in range(5)])
+            return first, await client.bot_username()
+
+        results, username = run(client, bot, scenario)
+        assert bot.get_me.await_count == 1
+        assert {r.username for r in results} == {"pintopay_probot"} and username == "pintopay_probot"
+        stats = client.stats()["get_me"]
+        assert stats["calls"] == 1 and stats["coalesced"] == 4 and stats["hits"] == 1
+
+    def test_get_file_cached_and_negative_cached(self):
+        client, bot = TelegramClient(), make_bot()
+
+        async def scenario():
+            urls = [await client.file_url("abc") for _ in range(3)]
+            missing = [await client.get_file("gone") for _ in range(3)]
+            return urls, missing
+
+        urls, missing = run(client, bot, scenario)
+        assert urls[0].endswith("/photos/abc.jpg") and len(set(urls)) == 1
+        assert missing == [None, None, None]
+        assert bot.get_file.await_count == 2
+        assert client.stats()["get_file"]["hits"] == 4
+
+    def test_profile_photo_none_is_cached(self):
+        client, bot = TelegramClient(), make_bot()
+
+        async def scenario():
+            return [await client.get_profile_photo_file_id(42) for _ in range(2)]
+
+        assert run(client, bot, scenario) == [None, None]
+        assert bot.get_user_profile_photos.await_count == 1
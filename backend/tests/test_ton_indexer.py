@@ -0,0 +1,143 @@
+"""
+Tests for the TON chain indexer parsing and session matching.
+
+#comment: Auto-matching upgrades partners without a user-submitted hash,
+so it must never bind a payment to an ambiguous or underpaid session.
+"""
+
+import asyncio
+import base64
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app.models.transaction import IncomingPayment, PartnerTransaction
+from app.services.ton_indexer_service import NANO_TON, TonPaymentIndexer
+from app.services.ton_verification_service import normalize_ton_hash
+
+
+RAW_HASH = bytes(range(32))
+NOW = datetime(2026, 10, 19, 12, 0, 0)
+
+
+def _tx(value, source="EQsender", message="", out_msgs=None):
+    return {
+        "utime": int((NOW - datetime(1970, 1, 1)).total_seconds()),
+        "transaction_id": {"lt": "48000000000001", "hash": base64.b64encode(RAW_HASH).decode()},
+        "in_msg": {"source": source, "destination": "UQadmin", "value": str(value), "message": message},
+        "out_msgs": out_msgs or [],
+    }
+
+
+def _session(id, amount_crypto, minutes_ago=2):
+    return PartnerTransaction(
+        id=id, partner_id=id, amount=39.0, amount_crypto=amount_crypto,
+        currency="TON", network="TON", status="pending",
+        created_at=NOW - timedelta(minutes=minutes_ago)
+    )
+
+
+def _payment(amount_ton, comment=None):
+    return IncomingPayment(
+        tx_hash="ab", lt=1, amount_nano=int(amount_ton * NANO_TON), comment=comment, utime=NOW
+    )
+
+
+class TestParseTransaction:
+    def test_incoming_transfer(self):
+        parsed = TonPaymentIndexer.parse_transaction(_tx(7 * NANO_TON, message=" PRO-12 "))
+        assert parsed["tx_hash"] == RAW_HASH.hex()
+        assert parsed["lt"] == 48000000000001
+        assert parsed["amount_nano"] == 7 * NANO_TON
+        assert parsed["comment"] == "PRO-12"
+        assert parsed["utime"] == NOW
+
+    def test_external_and_bounced_are_skipped(self):
+        assert TonPaymentIndexer.parse_transaction(_tx(7 * NANO_TON, source="")) is None
+        bounced = _tx(7 * NANO_TON, out_msgs=[{"destination": "EQsender", "value": str(7 * NANO_TON - 1000)}])
+        assert TonPaymentIndexer.parse_transaction(bounced) is None
+
+    def test_hash_formats_normalize_to_hex(self):
+        assert normalize_ton_hash(base64.b64encode(RAW_HASH).decode()) == RAW_HASH.hex()
+        assert normalize_ton_hash(base64.urlsafe_b64encode(RAW_HASH).decode()) == RAW_HASH.hex()
+        assert normalize_ton_hash(RAW_HASH.hex().upper()) == RAW_HASH.hex()
+
+
+class TestMatchSession:
+    def test_comment_wins_over_amount(self):
+        pending = [_session(1, 7.0), _session(2, 7.0)]
+        assert TonPaymentIndexer.match_session(_payment(7.0, comment="pro-2"), pending).id == 2
+
+    def test_unique_amount_matches(self):
+        pending = [_session(1, 7.0), _session(2, 9.5)]
+        assert TonPaymentIndexer.match_session(_payment(9.5), pending).id == 2
+
+    def test_ambiguous_amount_is_left_for_hash_claim(self):
+        pending = [_session(1, 7.0), _session(2, 7.01)]
+        assert TonPaymentIndexer.match_session(_payment(7.0), pending) is None
+
+    def test_underpaid_or_out_of_window_is_rejected(self):
+        assert TonPaymentIndexer.match_session(_payment(6.0), [_session(1, 7.0)]) is None
+        assert TonPaymentIndexer.match_session(_payment(7.0), [_session(1, 7.0, minutes_ago=30)]) is None
+
+
+class FakeChain:
+    """getTransactions over a wallet history: newest first, start inclusive, to_lt exclusive."""
+
+    def __init__(self, count):
+        self.txs = []
+        self.append(count)
+
+    def append(self, count):
+        for _ in range(count):
+            lt = len(self.txs) + 1
+            self.txs.append({"transaction_id": {"lt": str(lt), "hash": f"h{lt}"}})
+
+    async def get_transactions(self, address, limit, lt=None, tx_hash=None, to_lt=None):
+        newest_first = [
+            tx for tx in reversed(self.txs)
+            if (lt is None or int(tx["transaction_id"]["lt"]) <= lt)
+            and (to_lt is None or int(tx["transaction_id"]["lt"]) > to_lt)
+        ]
+        return newest_first[:limit]
+
+
+class TestCatchUp:
+    def run(self, chain, cursor):
+        indexer = TonPaymentIndexer()
+        indexer.PAGE_SIZE = 5
+        indexer.MAX_PAGES = 2
+        with patch("app.services.ton_indexer_service.ton_verification_service", chain):
+            return asyncio.run(indexer._catch_up(cursor))
+
+    @staticmethod
+    def lts(txs):
+        return sorted(int(tx["transaction_id"]["lt"]) for tx in txs)
+
+    def test_within_page_budget(self):
+        txs, cursor = self.run(FakeChain(8), {"lt": 3, "hash": "h3"})
+        assert self.lts(txs) == [4, 5, 6, 7, 8]
+        assert cursor == {"lt": 8, "hash": "h8"}
+
+    def test_truncated_catch_up_resumes_without_skipping(self):
+        """
+        Verifies:
+        - A gap longer than MAX_PAGES keeps the cursor's lt and resumes paging next run
+        - Transactions arriving meanwhile are fetched once the gap is closed
+        """
+        chain = FakeChain(30)
+        cursor = {"lt": 3, "hash": "h3"}
+        indexed = []
+
+        txs, cursor = self.run(chain, cursor)
+        indexed += self.lts(txs)
+        assert indexed == list(range(22, 31))  # Newest 9 (5 + 4) of the 27 new ones
+        assert cursor["lt"] == 3 and cursor["gap"]["head_lt"] == 30
+
+        chain.append(2)
+        while "gap" in cursor:
+            txs, cursor = self.run(chain, cursor)
+            indexed += self.lts(txs)
+
+        assert sorted(indexed) == list(range(4, 33))
+        assert len(indexed) == len(set(indexed))
+        assert cursor == {"lt": 32, "hash": "h32"}
@@ -0,0 +1,112 @@
+"""
+Tests for async Viral Studio jobs (TaskIQ job + /api/pro/jobs/{job_id} polling).
+
+#comment: The job charges tokens only after a successful generation, and only the partner
+who queued a job can poll it. Images come back staged and are adopted by the web service.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints.pro import get_generation_job
+from app.core.errors import ViralStudioErrorCode
+from app.models.partner import Partner, PartnerProProfile
+from app.services.viral_service import (
+    VIRAL_GENERATION_COST,
+    generate_viral_content_task,
+    viral_job_owner_key,
+    viral_studio,
+)
+
+GENERATED = {
+    "status": "success", "title": "Title", "text": "Body", "hashtags": ["p2p"],
+    "image_prompt": "prompt", "image_url": "/generated_media/viral_1_abcd1234.webp",
+}
+
+
+@pytest.fixture
+async def pro_partner(session):
+    partner = Partner(id=1, telegram_id="100", referral_code="R1", is_pro=True)
+    session.add(partner)
+    session.add(PartnerProProfile(partner_id=1, pro_tokens=10))
+    await session.commit()
+    return partner
+
+
+async def run_job(engine, session, generated):
+    with patch("app.models.partner.engine", engine), \
+            patch.object(viral_studio, "generate_viral_content", AsyncMock(return_value=generated)) as generate:
+        result = await generate_viral_content_task.original_func(1, "story", "students", "en")
+    profile = await session.get(PartnerProProfile, 1)
+    await session.refresh(profile)
+    return result, profile.pro_tokens, generate
+
+
+class TestViralJob:
+    async def test_charged_only_on_success(self, engine, session, pro_partner):
+        result, tokens, generate = await run_job(engine, session, {"status": "failed", "error": "boom", "error_code": "V100"})
+        assert result == {"status": "failed", "error": "boom", "error_code": "V100"}
+        assert tokens == 10
+
+        result, tokens, generate = await run_job(engine, session, GENERATED)
+        assert result["status"] == "success" and result["tokens_remaining"] == 10 - VIRAL_GENERATION_COST
+        assert tokens == 10 - VIRAL_GENERATION_COST
+        # The worker cannot write to the web service's disk: the image is staged
+        assert generate.await_args.kwargs["stage_media"] is True
+
+    async def test_balance_spent_while_running(self, engine, session, pro_partner):
+        async def spend_meanwhile(**kwargs):
+            profile = await session.get(PartnerProProfile, 1)
+            profile.pro_tokens = 1
+            await session.commit()
+            return GENERATED
+
+        with patch("app.models.partner.engine", engine), \
+                patch.object(viral_studio, "generate_viral_content", AsyncMock(side_effect=spend_meanwhile)):
+            result = await generate_viral_content_task.original_func(1, "story", "students", "en")
+        assert result["status"] == "failed" and result["error_code"] == ViralStudioErrorCode.TOKEN_INSUFFICIENT
+        profile = await session.get(PartnerProProfile, 1)
+        await session.refresh(profile)
+        assert profile.pro_tokens == 1
+
+
+class TestJobPolling:
+    async def poll(self, owner, ready=True, result=None, partner_id=1):
+        backend = SimpleNamespace(
+            is_result_ready=AsyncMock(return_value=ready),
+            get_result=AsyncMock(return_value=result),
+        )
+        with patch("app.api.endpoints.pro.redis_service.get", AsyncMock(return_value=owner)) as owner_get, \
+                patch("app.worker.result_backend", backend), \
+                patch("app.services.media_service.media_service.adopt", AsyncMock(return_value="/generated_media/adopted.webp")):
+            response = await get_generation_job("job-1", partner=SimpleNamespace(id=partner_id))
+        owner_get.assert_awaited_once_with(viral_job_owner_key("job-1"))
+        return response
+
+    async def test_only_owner_can_poll(self):
+        with pytest.raises(HTTPException) as not_found:
+            await self.poll(owner="2")
+        assert not_found.value.status_code == 404
+        with pytest.raises(HTTPException):
+            await self.poll(owner=None)
+
+    async def test_pending_failed_crashed(self):
+        assert await self.poll(owner="1", ready=False) == {"job_id": "job-1", "status": "pending"}
+
+        failed = SimpleNamespace(is_err=False, return_value={"status": "failed", "error": "No tokens", "error_code": "V101"})
+        assert await self.poll(owner="1", result=failed) == {
+            "job_id": "job-1", "status": "failed", "error": "No tokens", "error_code": "V101"
+        }
+
+        crashed = SimpleNamespace(is_err=True, error=RuntimeError("worker died"), return_value=None)
+        assert (await self.poll(owner="1", result=crashed))["error_code"] == "V999"
+
+    async def test_success_adopts_staged_image(self):
+        done = SimpleNamespace(is_err=False, return_value={**GENERATED, "body": "Body", "tokens_remaining": 8})
+        response = await self.poll(owner="1", result=done)
+        assert response["status"] == "success"
+        assert response["result"]["image_url"] == "/generated_media/adopted.webp"
+        assert "status" not in response["result"]